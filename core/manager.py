@@ -1396,6 +1396,8 @@ class Manager(QtCore.QObject):
                 logger.info('Deactivating module {0}.{1}'.format(base, module))
                 self.deactivateModule(base, module)
             QtCore.QCoreApplication.processEvents()
+        if self.rm is not None:
+            self.rm.closeConnections()
         self.sigManagerQuit.emit(self, False)
 
     @QtCore.Slot()
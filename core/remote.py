@@ -23,10 +23,16 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import logging
 logger = logging.getLogger(__name__)
 
+import inspect
+import traceback
+from concurrent.futures import Future
 from qtpy.QtCore import QObject
 from urllib.parse import urlparse
+import socket
 import ssl
+from .util.array_transport import ArrayReceiver, ArraySender, is_transportable, unpack_array
 from .util.models import DictTableModel, ListTableModel
+from .util.mutex import Mutex
 import rpyc
 from rpyc.utils.server import ThreadedServer
 from rpyc.utils.authenticators import SSLAuthenticator
@@ -47,6 +53,11 @@ class RemoteObjectManager(QObject):
         self.remoteModules.headers[0] = 'Remote Modules'
         self.sharedModules = DictTableModel()
         self.sharedModules.headers[0] = 'Shared Modules'
+        # connections to module servers shared by all remote modules of a server
+        self._connections = dict()
+        # pools of connections for asynchronous calls (see call_async), one per module server
+        self._connection_pools = dict()
+        self._connection_lock = Mutex()
 
     def makeRemoteService(self):
         """ A function that returns a class containing a module list hat can be manipulated from the host.
@@ -65,6 +76,8 @@ class RemoteObjectManager(QObject):
                 """ code that runs when a connection is created
                     (to init the service, if needed)
                 """
+                self._array_sender = ArraySender()
+                _set_nodelay(conn)
                 logger.info('Client connected!')
 
             def on_disconnect(self, conn):
@@ -95,6 +108,67 @@ class RemoteObjectManager(QObject):
                         logger.error('Client requested a module that is not '
                                 'shared.')
                         return None
+
+            def exposed_pack_array(self, obj, key=None, reference_id=None):
+                """ Packs a numpy array for the binary transfer to the client.
+
+                  @param object obj: the array
+                  @param key: optional, key of the transfer for delta encoding
+                  @param int reference_id: id of the last array with this key the client holds
+
+                  @return bytes: packed array, None if obj is no array that can be packed
+                """
+                if not is_transportable(obj):
+                    return None
+                return self._array_sender.pack(obj, key, reference_id)
+
+            def exposed_is_method(self, name, attr):
+                """ Checks whether an attribute of a shared module is a method.
+
+                  @param str name: unique module name
+                  @param str attr: name of the attribute
+
+                  @return bool: True if the attribute is a method
+                """
+                return inspect.ismethod(getattr(self.modules.storage[str(name)], attr, None))
+
+            def exposed_call_method(self, name, attr, args, kwargs, reference_ids):
+                """ Calls a method of a shared module. Numpy arrays in the result (also the
+                    items of a returned tuple) are packed for the binary transfer.
+
+                  @param str name: unique module name
+                  @param str attr: name of the method
+                  @param tuple args: positional arguments
+                  @param tuple kwargs: (name, value) pairs of the keyword arguments
+                  @param tuple reference_ids: (index, id) pairs of the arrays of earlier calls
+                                              the client holds
+
+                  @return tuple: the result, see _pack_result
+                """
+                name = str(name)
+                result = getattr(self.modules.storage[name], attr)(*args, **dict(kwargs))
+                return _pack_result(self._array_sender, (name, attr), result,
+                                    dict(reference_ids))
+
+            def exposed_call_batch(self, calls):
+                """ Calls several methods of shared modules one after another, so they only
+                    need a single round trip.
+
+                  @param tuple calls: (name, attr, args, kwargs) tuple for each call, see
+                                      exposed_call_method
+
+                  @return tuple: ('error', traceback string) for each failed call and the packed
+                                 result (see _pack_result) for all others
+                """
+                results = list()
+                for name, attr, args, kwargs in calls:
+                    try:
+                        result = getattr(self.modules.storage[str(name)], attr)(*args,
+                                                                                **dict(kwargs))
+                        results.append(_pack_result(self._array_sender, None, result, dict()))
+                    except Exception:
+                        results.append(('error', traceback.format_exc()))
+                return tuple(results)
         return RemoteModuleService
 
     def createServer(self, hostname, port, certfile=None, keyfile=None):
@@ -126,6 +200,57 @@ class RemoteObjectManager(QObject):
         if hasattr(self, 'server'):
             self.server.close()
 
+    def getConnection(self, host, port, certfile=None, keyfile=None):
+        """ Get the connection to a module server. All remote modules of a server share one
+            connection, which is opened on first use (or again if it has been closed).
+
+          @param str host: host that the remote module server is running on
+          @param int port: port that the remote module server is listening on
+          @param str certfile: filename of certificate or None if SSL is not used
+          @param str keyfile: filename of key or None if SSL is not used
+
+          @return rpyc.Connection: connection to the module server
+        """
+        key = (host, port, certfile, keyfile)
+        with self._connection_lock:
+            connection = self._connections.get(key)
+            if connection is None or connection.closed:
+                connection = connect(host, port, certfile=certfile, keyfile=keyfile)
+                self._connections[key] = connection
+        return connection
+
+    def getConnectionPool(self, host, port, certfile=None, keyfile=None):
+        """ Get the pool of connections for asynchronous calls to a module server. All remote
+            modules of a server share one pool.
+
+          @param str host: host that the remote module server is running on
+          @param int port: port that the remote module server is listening on
+          @param str certfile: filename of certificate or None if SSL is not used
+          @param str keyfile: filename of key or None if SSL is not used
+
+          @return ConnectionPool: pool of connections to the module server
+        """
+        key = (host, port, certfile, keyfile)
+        with self._connection_lock:
+            if key not in self._connection_pools:
+                self._connection_pools[key] = ConnectionPool(host, port, certfile=certfile,
+                                                             keyfile=keyfile)
+            return self._connection_pools[key]
+
+    def closeConnections(self):
+        """ Close the connections to all module servers.
+        """
+        with self._connection_lock:
+            for connection in self._connections.values():
+                try:
+                    connection.close()
+                except:
+                    logger.exception('Error while closing connection to module server.')
+            self._connections.clear()
+            for pool in self._connection_pools.values():
+                pool.close()
+            self._connection_pools.clear()
+
     def shareModule(self, name, obj):
         """ Add a module to the list of modules that can be accessed remotely.
 
@@ -157,7 +282,8 @@ class RemoteObjectManager(QObject):
         """
         parsed = urlparse(url)
         name = parsed.path.replace('/', '')
-        return self.getRemoteModule(parsed.hostname, parsed.port, name)
+        return self.getRemoteModule(parsed.hostname, parsed.port, name, certfile=certfile,
+                                    keyfile=keyfile)
 
     def getRemoteModule(self, host, port, name, certfile=None, keyfile=None):
         """ Get a remote module via its host, port and name.
@@ -170,7 +296,9 @@ class RemoteObjectManager(QObject):
 
           @return object: remote module
         """
-        module = RemoteModule(host, port, name, certfile=certfile, keyfile=keyfile)
+        connection = self.getConnection(host, port, certfile=certfile, keyfile=keyfile)
+        pool = self.getConnectionPool(host, port, certfile=certfile, keyfile=keyfile)
+        module = RemoteModule(connection, name, pool=pool)
         self.remoteModules.append(module)
         return module.module
 
@@ -213,18 +341,374 @@ class RPyCServer(QObject):
         self.server.start()
 
 
+def connect(host, port, certfile=None, keyfile=None):
+    """ Open a connection to a module server.
+
+      @param str host: host that the remote module server is running on
+      @param int port: port that the remote module server is listening on
+      @param str certfile: filename of certificate or None if SSL is not used
+      @param str keyfile: filename of key or None if SSL is not used
+
+      @return rpyc.Connection: connection to the module server
+    """
+    if certfile is not None and keyfile is not None:
+        connection = rpyc.ssl_connect(
+            host,
+            port=port,
+            config={'allow_all_attrs': True},
+            certfile=certfile,
+            keyfile=keyfile)
+    else:
+        connection = rpyc.connect(host, port, config={'allow_all_attrs': True})
+    _set_nodelay(connection)
+    return connection
+
+
+class ConnectionPool:
+    """ Connections to a module server that asynchronous calls (see call_async) are distributed
+        over. The module server handles each connection in its own thread, so calls sent on
+        different connections are executed at the same time. The connections are opened on
+        first use.
+    """
+    def __init__(self, host, port, certfile=None, keyfile=None, size=4):
+        """
+          @param str host: host that the remote module server is running on
+          @param int port: port that the remote module server is listening on
+          @param str certfile: filename of certificate or None if SSL is not used
+          @param str keyfile: filename of key or None if SSL is not used
+          @param int size: number of connections
+        """
+        self._address = (host, port, certfile, keyfile)
+        self._connections = [None] * max(int(size), 1)
+        self._next_index = 0
+        self._lock = Mutex()
+
+    def get_connection(self):
+        """ Get the next connection of the pool (round robin).
+
+          @return rpyc.Connection: connection to the module server
+        """
+        with self._lock:
+            index = self._next_index
+            self._next_index = (index + 1) % len(self._connections)
+            connection = self._connections[index]
+            if connection is None or connection.closed:
+                host, port, certfile, keyfile = self._address
+                connection = connect(host, port, certfile=certfile, keyfile=keyfile)
+                self._connections[index] = connection
+        return connection
+
+    def close(self):
+        """ Close all connections of the pool.
+        """
+        with self._lock:
+            for index, connection in enumerate(self._connections):
+                if connection is None:
+                    continue
+                try:
+                    connection.close()
+                except:
+                    logger.exception('Error while closing connection to module server.')
+                self._connections[index] = None
+
+
+def _set_nodelay(connection):
+    """ Disables Nagle's algorithm on the socket of a connection. Requests and replies are small
+        messages, which would otherwise be delayed until the previous one has been acknowledged.
+
+      @param rpyc.Connection connection: the connection
+    """
+    connection._channel.stream.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
 class RemoteModule:
     """ This class represents a module on a remote computer and holds a reference to it.
     """
-    def __init__(self, host, port, name, certfile=None, keyfile=None):
-        if certfile is not None and keyfile is not None:
-            self.connection = rpyc.ssl_connect(
-                host,
-                port=port,
-                config={'allow_all_attrs': True},
-                certfile=certfile,
-                keyfile=keyfile)
-        else:
-            self.connection = rpyc.connect(host, port, config={'allow_all_attrs': True})
-        self.module = self.connection.root.getModule(name)
+    def __init__(self, connection, name, pool=None):
+        """
+          @param rpyc.Connection connection: connection to the module server (see
+                                             RemoteObjectManager.getConnection)
+          @param str name: unique name of the remote module
+          @param ConnectionPool pool: optional, connections for asynchronous calls (see
+                                      RemoteObjectManager.getConnectionPool)
+        """
+        self.connection = connection
+        self.module = RemoteModuleProxy(self.connection, self.connection.root.getModule(name), name,
+                                        pool=pool)
         self.name = name
+
+
+class RemoteModuleProxy:
+    """ Proxy of a module shared by a remote qudi.
+
+    Method calls go through the module server, so numpy arrays in their results (also the items
+    of returned tuples) arrive as local arrays, transferred as packed binary buffers (see
+    core.util.array_transport). Everything else is forwarded to the remote module reference.
+    """
+    def __init__(self, connection, module, name, pool=None):
+        """
+          @param rpyc.Connection connection: connection to the module server
+          @param object module: remote reference to the module
+          @param str name: unique name of the remote module
+          @param ConnectionPool pool: optional, connections for asynchronous calls. They are sent
+                                      on the connection of the module if None.
+        """
+        object.__setattr__(self, '_connection', connection)
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_module', module)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_methods', dict())
+        object.__setattr__(self, '_reference_ids', dict())
+        object.__setattr__(self, '_array_receiver', ArrayReceiver())
+        object.__setattr__(self, '_lock', Mutex())
+
+    def __getattr__(self, attr):
+        if not attr.startswith('_') and self._is_method(attr):
+            return RemoteMethod(self, attr)
+        return getattr(self._module, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._module, attr, value)
+
+    def __dir__(self):
+        return dir(self._module)
+
+    def __repr__(self):
+        return '<RemoteModuleProxy {0}: {1!r}>'.format(self._name, self._module)
+
+    def _is_method(self, attr):
+        """ Asks the module server (once) whether an attribute is a method. Module servers
+            without method dispatch report no methods, so everything is forwarded.
+
+          @param str attr: name of the attribute
+
+          @return bool: True if calls of the attribute go through the module server
+        """
+        if attr not in self._methods:
+            try:
+                self._methods[attr] = bool(self._connection.root.is_method(self._name, attr))
+            except AttributeError:
+                self._methods[attr] = False
+        return self._methods[attr]
+
+    def _call_method(self, attr, args, kwargs):
+        """ Calls a method of the remote module through the module server.
+
+          @param str attr: name of the method
+          @param tuple args: positional arguments
+          @param dict kwargs: keyword arguments
+
+          @return object: the result with numpy arrays unpacked
+        """
+        with self._lock:
+            reference_ids = self._reference_ids.setdefault(attr, dict())
+            packed_result = self._connection.root.call_method(
+                self._name, attr, args, tuple(kwargs.items()), tuple(reference_ids.items()))
+            return _unpack_result(self._array_receiver, attr, packed_result, reference_ids)
+
+    def _call_method_async(self, attr, args, kwargs):
+        """ Sends a method call to the module server without waiting for the result. Arrays in
+            the result are transferred without delta encoding, so calls can overlap.
+
+          @param str attr: name of the method
+          @param tuple args: positional arguments
+          @param dict kwargs: keyword arguments
+
+          @return RemoteFuture: the pending result
+        """
+        connection = self._connection if self._pool is None else self._pool.get_connection()
+        call_method = rpyc.async_(connection.root.call_method)
+        return RemoteFuture(call_method(self._name, attr, args, tuple(kwargs.items()), tuple()))
+
+
+class RemoteMethod:
+    """ Method of a remote module called through the module server (see RemoteModuleProxy).
+    """
+    def __init__(self, proxy, attr):
+        self._proxy = proxy
+        self._attr = attr
+
+    def __call__(self, *args, **kwargs):
+        return self._proxy._call_method(self._attr, args, kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(getattr(self._proxy._module, self._attr), attr)
+
+
+class RemoteFuture:
+    """ Pending result of a method call sent with call_async.
+    """
+    def __init__(self, async_result):
+        """
+          @param rpyc.AsyncResult async_result: the pending result of call_method
+        """
+        self._async_result = async_result
+
+    def done(self):
+        """ @return bool: True if the result has arrived """
+        return self._async_result.ready
+
+    def result(self, timeout=None):
+        """ Waits for the result of the call.
+
+          @param float timeout: optional, maximum time in seconds to wait
+
+          @return object: the result, numpy arrays unpacked
+        """
+        if timeout is not None:
+            self._async_result.set_expiry(timeout)
+        return _unpack_result(None, None, self._async_result.value, None)
+
+
+def call_async(module, attr, *args, **kwargs):
+    """ Calls a method of a module without waiting for the result if the module is remote.
+
+        Several calls can be sent before waiting for the first result. They are distributed over
+        the connection pool of the module server, so they are executed at the same time, and
+        the calls on each connection are pipelined.
+
+        futures = [call_async(magnet, 'get_pos', [axis]) for axis in axes]
+        positions = [future.result() for future in futures]
+
+      @param object module: the module (local or remote)
+      @param str attr: name of the method
+      @param args: positional arguments of the method
+      @param kwargs: keyword arguments of the method
+
+      @return RemoteFuture|concurrent.futures.Future: the result, use .result() to wait for it.
+                                                      Local modules are called right away.
+    """
+    if isinstance(module, RemoteModuleProxy) and module._is_method(attr):
+        return module._call_method_async(attr, args, kwargs)
+    future = Future()
+    try:
+        future.set_result(getattr(module, attr)(*args, **kwargs))
+    except Exception as err:
+        future.set_exception(err)
+    return future
+
+
+class RemoteCallBatch:
+    """ Collects method calls of modules and sends the calls of remote modules to each module
+        server in a single round trip. Calls of local modules are executed in place.
+
+        with RemoteCallBatch() as batch:
+            pos = batch.call(magnet, 'get_pos')
+            status = batch.call(magnet, 'get_status')
+        print(pos.result(), status.result())
+    """
+    def __init__(self):
+        self._calls = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+        return False
+
+    def call(self, module, attr, *args, **kwargs):
+        """ Adds a method call to the batch.
+
+          @param object module: the module (local or remote)
+          @param str attr: name of the method
+          @param args: positional arguments of the method
+          @param kwargs: keyword arguments of the method
+
+          @return concurrent.futures.Future: the result, available after execute
+        """
+        future = Future()
+        self._calls.append((future, module, attr, args, kwargs))
+        return future
+
+    def execute(self):
+        """ Executes all calls added since the last execution, one round trip per module server.
+        """
+        calls, self._calls = self._calls, list()
+        remote_calls = dict()
+        for future, module, attr, args, kwargs in calls:
+            if isinstance(module, RemoteModuleProxy) and module._is_method(attr):
+                remote_calls.setdefault(id(module._connection), (module._connection, list()))[
+                    1].append((future, (module._name, attr, args, tuple(kwargs.items()))))
+                continue
+            try:
+                future.set_result(getattr(module, attr)(*args, **kwargs))
+            except Exception as err:
+                future.set_exception(err)
+
+        for connection, connection_calls in remote_calls.values():
+            try:
+                results = connection.root.call_batch(
+                    tuple(remote_call for future, remote_call in connection_calls))
+            except Exception as err:
+                for future, remote_call in connection_calls:
+                    future.set_exception(err)
+                continue
+            for (future, remote_call), packed_result in zip(connection_calls, results):
+                if packed_result[0] == 'error':
+                    future.set_exception(RuntimeError(
+                        'Remote call {0}.{1} failed:\n{2}'.format(remote_call[0], remote_call[1],
+                                                                   packed_result[1])))
+                else:
+                    future.set_result(_unpack_result(None, None, packed_result, None))
+        return
+
+
+def _pack_result(sender, key, result, reference_ids):
+    """ Packs numpy arrays in the result of a method call.
+
+      @param ArraySender sender: the sender of the connection
+      @param tuple key: (module name, method name), None to pack without delta encoding
+      @param object result: the result of the method call
+      @param dict reference_ids: id of the array of an earlier call the client holds by the index
+                                 of the array in the result (None if the result is the array)
+
+      @return tuple: ('value', result) if nothing was packed, ('array', bytes) for an array and
+                     ('tuple', items, indices) for a tuple with packed arrays at the indices
+    """
+    if is_transportable(result):
+        return 'array', sender.pack(result, None if key is None else key + (None,),
+                                    reference_ids.get(None))
+    if isinstance(result, tuple):
+        indices = tuple(index for index, item in enumerate(result) if is_transportable(item))
+        if indices:
+            items = tuple(sender.pack(item, None if key is None else key + (index,),
+                                      reference_ids.get(index))
+                          if index in indices else item for index, item in enumerate(result))
+            return 'tuple', items, indices
+    return 'value', result
+
+
+def _unpack_result(receiver, attr, packed_result, reference_ids):
+    """ Unpacks the numpy arrays in the result of a method call packed by _pack_result.
+
+      @param ArrayReceiver receiver: the receiver of the connection, None for results packed
+                                     without delta encoding
+      @param str attr: name of the method
+      @param tuple packed_result: the packed result
+      @param dict reference_ids: ids of the arrays received by index, updated in place
+
+      @return object: the result
+    """
+    kind = packed_result[0]
+    if receiver is None:
+        if kind == 'array':
+            return unpack_array(packed_result[1])
+        if kind == 'tuple':
+            items, indices = packed_result[1], packed_result[2]
+            return tuple(unpack_array(item) if index in indices else item
+                         for index, item in enumerate(items))
+        return packed_result[1]
+    if kind == 'array':
+        result = receiver.unpack(packed_result[1], (attr, None))
+        reference_ids[None] = receiver.get_reference_id((attr, None))
+        return result
+    if kind == 'tuple':
+        items, indices = packed_result[1], packed_result[2]
+        result = list(items)
+        for index in indices:
+            result[index] = receiver.unpack(items[index], (attr, index))
+            reference_ids[index] = receiver.get_reference_id((attr, index))
+        return tuple(result)
+    return packed_result[1]
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the binary transport of numpy arrays between qudi instances (see core.remote).
+
+Instead of pickling an array or accessing it element by element through a remote reference, the
+array is packed into a single bytes object: a length-prefixed JSON header (dtype, shape, transfer
+ids, compression) followed by the raw array buffer. Large arrays are compressed with zlib. If the
+receiver still holds the array of an earlier transfer with the same key (e.g. the last data trace
+of a fast counter), only the bitwise difference (XOR) to it is compressed and sent, which is mostly
+zeros for slowly changing data.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import struct
+import zlib
+import numpy as np
+
+# Arrays of at least this size (in bytes) are compressed (and delta encoded)
+COMPRESSION_THRESHOLD = 65536
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+def is_transportable(obj):
+    """
+    Checks whether an object is a numpy array which can be packed with pack_array.
+
+    @param object obj: the object to check
+
+    @return bool: True for numpy arrays of bool, integer, float or complex dtype
+    """
+    return isinstance(obj, np.ndarray) and obj.dtype.kind in 'biufc'
+
+
+def pack_array(array, compress=False, reference=None, transfer_id=0, reference_id=None):
+    """
+    Packs a numpy array into bytes.
+
+    @param numpy.ndarray array: the array to pack (see is_transportable)
+    @param bool compress: compress the array buffer with zlib (if it gets smaller)
+    @param numpy.ndarray reference: optional, array of an earlier transfer known to the receiver.
+                                    Only the difference to it is sent if compress is True and
+                                    shape and dtype match.
+    @param int transfer_id: id of this transfer, used as reference_id by later transfers
+    @param int reference_id: id of the transfer of the reference array
+
+    @return bytes: the packed array
+    """
+    # np.ascontiguousarray would turn 0-d arrays into 1-d arrays
+    array = np.asarray(array, order='C')
+    header = {'dtype': array.dtype.str,
+              'shape': list(array.shape),
+              'id': transfer_id,
+              'reference': None,
+              'compression': None}
+
+    buffer = array.reshape(-1).view(np.uint8)
+    if (compress and reference is not None and reference.shape == array.shape
+            and reference.dtype == array.dtype):
+        buffer = np.bitwise_xor(buffer, np.ascontiguousarray(reference).reshape(-1).view(np.uint8))
+        header['reference'] = reference_id
+
+    data = buffer.tobytes()
+    if compress:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            data = compressed
+            header['compression'] = 'zlib'
+
+    header = json.dumps(header).encode('utf-8')
+    return b''.join((_HEADER_LENGTH.pack(len(header)), header, data))
+
+
+def get_array_header(data):
+    """
+    Reads the header of a packed array.
+
+    @param bytes data: the packed array
+
+    @return dict: header with the keys 'dtype', 'shape', 'id', 'reference' and 'compression'
+    """
+    header_length, = _HEADER_LENGTH.unpack_from(data)
+    return json.loads(bytes(data[_HEADER_LENGTH.size:_HEADER_LENGTH.size + header_length]))
+
+
+def unpack_array(data, reference=None):
+    """
+    Unpacks an array packed with pack_array.
+
+    @param bytes data: the packed array
+    @param numpy.ndarray reference: the reference array, if the array was packed as difference
+                                    to it
+
+    @return numpy.ndarray: the unpacked (writable) array
+    """
+    header_length, = _HEADER_LENGTH.unpack_from(data)
+    header = get_array_header(data)
+    data = data[_HEADER_LENGTH.size + header_length:]
+    if header['compression'] == 'zlib':
+        data = zlib.decompress(data)
+    elif header['compression'] is not None:
+        raise ValueError('Unknown compression "{0}" of packed array.'
+                         ''.format(header['compression']))
+
+    dtype = np.dtype(header['dtype'])
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if header['reference'] is not None:
+        if reference is None:
+            raise ValueError('Packed array is a difference to an array of an earlier transfer, '
+                             'but no reference array has been given.')
+        buffer = np.bitwise_xor(buffer,
+                                np.ascontiguousarray(reference, dtype=dtype).reshape(-1).view(
+                                    np.uint8))
+    else:
+        buffer = buffer.copy()
+    return buffer.view(dtype).reshape(tuple(header['shape']))
+
+
+class ArraySender:
+    """
+    Packs arrays for a single receiver (i.e. connection). It remembers the last array sent with each
+    key, so following arrays with the same key can be sent as difference to it, as long as the
+    receiver still has the same array (see ArrayReceiver.get_reference_id).
+    """
+
+    def __init__(self, compression_threshold=COMPRESSION_THRESHOLD):
+        """
+        @param int compression_threshold: arrays of at least this size in bytes are compressed
+        """
+        self.compression_threshold = compression_threshold
+        self._transfer_id = 0
+        self._sent = dict()
+
+    def pack(self, array, key=None, reference_id=None):
+        """
+        Packs an array.
+
+        @param numpy.ndarray array: the array to pack (see is_transportable)
+        @param key: optional, hashable key of the transfer
+        @param int reference_id: id of the last array with this key the receiver holds
+
+        @return bytes: the packed array
+        """
+        self._transfer_id += 1
+        compress = array.nbytes >= self.compression_threshold
+        reference = None
+        if key is not None:
+            last_id, last_array = self._sent.pop(key, (None, None))
+            if reference_id is not None and last_id == reference_id:
+                reference = last_array
+            if compress:
+                self._sent[key] = (self._transfer_id, np.array(array, copy=True))
+        return pack_array(array,
+                          compress=compress,
+                          reference=reference,
+                          transfer_id=self._transfer_id,
+                          reference_id=reference_id)
+
+
+class ArrayReceiver:
+    """
+    Unpacks arrays sent by an ArraySender and keeps the last array received with each key as
+    reference for following transfers.
+    """
+
+    def __init__(self):
+        self._received = dict()
+
+    def get_reference_id(self, key):
+        """
+        @param key: hashable key of the transfer
+
+        @return int: id of the last transfer with this key, None if there is none
+        """
+        return self._received.get(key, (None, None))[0]
+
+    def unpack(self, data, key=None):
+        """
+        Unpacks an array.
+
+        @param bytes data: the packed array
+        @param key: optional, hashable key of the transfer
+
+        @return numpy.ndarray: the unpacked array
+        """
+        header = get_array_header(data)
+        reference = None
+        if header['reference'] is not None:
+            reference_id, reference = self._received.get(key, (None, None))
+            if reference_id != header['reference']:
+                raise ValueError('Reference array of packed array with key {0} is not available.'
+                                 ''.format(key))
+        array = unpack_array(data, reference)
+        if key is not None:
+            self._received[key] = (header['id'], array.copy())
+        return array
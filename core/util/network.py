@@ -19,13 +19,55 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import weakref
 import rpyc.core.netref
 import rpyc.utils.classic
 
+from core.util.array_transport import unpack_array
+
+
 def netobtain(obj):
-    """
+    """ Returns a local copy of an object if it is a reference to an object of a remote qudi.
+
+    @param object obj: the object or remote reference
+
+    @return object: local object
+
+    Remote numpy arrays are transferred as packed binary buffers (see core.util.array_transport)
+    if the remote side is a qudi module server, all other objects are pickled.
     """
     if isinstance(obj, rpyc.core.netref.BaseNetref):
+        packed = _pack_remote_array(obj)
+        if packed is not None:
+            return unpack_array(packed)
         return rpyc.utils.classic.obtain(obj)
     else:
         return obj
+
+
+def get_connection(netref):
+    """ Returns the rpyc connection a remote reference belongs to.
+
+    @param rpyc.core.netref.BaseNetref netref: the remote reference
+
+    @return rpyc.core.protocol.Connection: the connection
+    """
+    connection = object.__getattribute__(netref, '____conn__')
+    # older rpyc versions hold a weak reference to the connection
+    if isinstance(connection, weakref.ref):
+        connection = connection()
+    return connection
+
+
+def _pack_remote_array(netref):
+    """ Lets the qudi module server pack the remote object if it is a numpy array.
+
+    @param rpyc.core.netref.BaseNetref netref: the remote reference
+
+    @return bytes: the packed array, None if the object is no array or the remote side is no
+                   qudi module server
+    """
+    try:
+        return get_connection(netref).root.pack_array(netref)
+    except AttributeError:
+        return None
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains helpers for run-length encoded digital pulse streams as played by the Swabian
+Instruments PulseStreamer and a compact binary file format to store them.
+
+A pulse stream is a numpy structured array of dtype PULSE_STREAM_DTYPE. Each record holds the
+duration of a pulse in ticks (samples) and the bitmask of the digital channels being high. Bit n-1
+of the bitmask corresponds to the qudi digital channel 'd_chn'.
+
+A pulse stream file consists of a 16 byte header (PULSE_STREAM_MAGIC and the format version as
+little-endian uint32 followed by 4 reserved bytes) and the packed records. It can be read with
+numpy alone and grows by appending records.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import numpy as np
+
+PULSE_STREAM_DTYPE = np.dtype([('ticks', '<u4'), ('digi', 'u1')])
+PULSE_STREAM_MAGIC = b'QDPULSES'
+PULSE_STREAM_VERSION = 1
+_HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('reserved', '<u4')])
+_MAX_TICKS = np.iinfo(PULSE_STREAM_DTYPE['ticks']).max
+
+
+def get_bitmasks(digital_states, length):
+    """
+    Combines the states of several digital channels into one bitmask per entry.
+
+    @param dict digital_states: digital channel descriptors ('d_ch1' to 'd_ch8') as keys and bool
+                                arrays of equal length as values
+    @param int length: length of the state arrays (needed if no channel is given)
+
+    @return numpy.ndarray: uint8 bitmasks
+    """
+    bitmasks = np.zeros(length, dtype='uint8')
+    for chnl, states in digital_states.items():
+        bit = int(chnl.rsplit('ch', 1)[-1]) - 1
+        if not 0 <= bit < 8:
+            raise ValueError('Digital channel "{0}" can not be part of a pulse stream. Only '
+                             'channels d_ch1 to d_ch8 are supported.'.format(chnl))
+        bitmasks |= np.asarray(states, dtype='uint8') << np.uint8(bit)
+    return bitmasks
+
+
+def run_length_encode(durations, bitmasks):
+    """
+    Creates a pulse stream from consecutive states with the given durations.
+
+    Consecutive entries with equal bitmasks are merged and entries of zero duration are dropped.
+    Pulses longer than the uint32 tick range are split.
+
+    @param numpy.ndarray durations: duration of each state in ticks
+    @param numpy.ndarray bitmasks: bitmask of each state
+
+    @return numpy.ndarray: pulse stream of dtype PULSE_STREAM_DTYPE
+    """
+    durations = np.asarray(durations, dtype='int64')
+    bitmasks = np.asarray(bitmasks, dtype='uint8')
+    non_empty = durations > 0
+    durations = durations[non_empty]
+    bitmasks = bitmasks[non_empty]
+    if durations.size == 0:
+        return np.empty(0, dtype=PULSE_STREAM_DTYPE)
+
+    run_starts = np.flatnonzero(np.concatenate(([True], bitmasks[1:] != bitmasks[:-1])))
+    run_durations = np.add.reduceat(durations, run_starts)
+    run_bitmasks = bitmasks[run_starts]
+
+    # number of records needed for each run
+    records = (run_durations + (_MAX_TICKS - 1)) // _MAX_TICKS
+    pulses = np.empty(int(records.sum()), dtype=PULSE_STREAM_DTYPE)
+    pulses['digi'] = np.repeat(run_bitmasks, records)
+    pulses['ticks'] = _MAX_TICKS
+    pulses['ticks'][np.cumsum(records) - 1] = run_durations - (records - 1) * _MAX_TICKS
+    return pulses
+
+
+def encode_samples(digital_samples):
+    """
+    Creates a pulse stream from sampled digital channels.
+
+    @param dict digital_samples: digital channel descriptors as keys and bool sample arrays of
+                                 equal length as values
+
+    @return numpy.ndarray: pulse stream of dtype PULSE_STREAM_DTYPE
+    """
+    length = len(next(iter(digital_samples.values()))) if digital_samples else 0
+    bitmasks = get_bitmasks(digital_samples, length)
+    if length == 0:
+        return np.empty(0, dtype=PULSE_STREAM_DTYPE)
+    change_indices = np.flatnonzero(bitmasks[1:] != bitmasks[:-1]) + 1
+    run_starts = np.concatenate(([0], change_indices))
+    run_durations = np.diff(np.concatenate((run_starts, [length])))
+    return run_length_encode(run_durations, bitmasks[run_starts])
+
+
+def save_pulse_stream(filepath, pulses, append=False):
+    """
+    Writes a pulse stream to file.
+
+    When appending, a pulse continuing the last pulse in the file is merged with it.
+
+    @param str filepath: path of the pulse stream file
+    @param numpy.ndarray pulses: pulse stream of dtype PULSE_STREAM_DTYPE
+    @param bool append: append to an existing file instead of creating a new one
+    """
+    pulses = np.asarray(pulses, dtype=PULSE_STREAM_DTYPE)
+    if not append or not os.path.isfile(filepath):
+        header = np.zeros(1, dtype=_HEADER)
+        header['magic'] = PULSE_STREAM_MAGIC
+        header['version'] = PULSE_STREAM_VERSION
+        with open(filepath, 'wb') as file:
+            header.tofile(file)
+            pulses.tofile(file)
+        return
+
+    with open(filepath, 'r+b') as file:
+        file.seek(0, os.SEEK_END)
+        if pulses.size > 0 and file.tell() >= _HEADER.itemsize + PULSE_STREAM_DTYPE.itemsize:
+            file.seek(-PULSE_STREAM_DTYPE.itemsize, os.SEEK_END)
+            last_pulse = np.fromfile(file, dtype=PULSE_STREAM_DTYPE, count=1)[0]
+            combined_ticks = int(last_pulse['ticks']) + int(pulses[0]['ticks'])
+            if last_pulse['digi'] == pulses[0]['digi'] and combined_ticks <= _MAX_TICKS:
+                pulses = pulses.copy()
+                pulses['ticks'][0] = combined_ticks
+                file.seek(-PULSE_STREAM_DTYPE.itemsize, os.SEEK_END)
+        pulses.tofile(file)
+    return
+
+
+def load_pulse_stream(filepath):
+    """
+    Reads a pulse stream file.
+
+    @param str filepath: path of the pulse stream file
+
+    @return numpy.ndarray: pulse stream of dtype PULSE_STREAM_DTYPE
+    """
+    with open(filepath, 'rb') as file:
+        header = np.fromfile(file, dtype=_HEADER, count=1)
+        if header.size != 1 or header['magic'][0] != PULSE_STREAM_MAGIC:
+            raise ValueError('File "{0}" is not a pulse stream file.'.format(filepath))
+        if header['version'][0] > PULSE_STREAM_VERSION:
+            raise ValueError('Pulse stream file "{0}" has unsupported format version {1:d}.'
+                             ''.format(filepath, int(header['version'][0])))
+        return np.fromfile(file, dtype=PULSE_STREAM_DTYPE)
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains circular buffers for continuously acquired data traces.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import bisect
+import collections
+import numpy as np
+import os
+
+
+class RingBuffer:
+    """
+    Fixed size circular buffer holding a trace of samples for several channels.
+
+    Every sample is stored twice, at the head index and one buffer length behind it. This way the
+    whole trace in chronological order is always a contiguous slice of the underlying array and
+    can be handed out as view without copying. Appending a sample costs O(channels) regardless
+    of the trace length.
+
+    @param int length: number of samples per channel
+    @param int channels: number of channels
+    @param dtype: optional, numpy data type of the samples
+    @param fill_value: optional, initial value of all samples
+    """
+
+    def __init__(self, length, channels=1, dtype=np.float64, fill_value=0):
+        self._length = int(length)
+        self._data = np.full((int(channels), 2 * self._length), fill_value, dtype=dtype)
+        # index of the oldest sample, which is the position the next sample is written to
+        self._head = 0
+
+    @property
+    def length(self):
+        return self._length
+
+    @property
+    def channels(self):
+        return self._data.shape[0]
+
+    @property
+    def view(self):
+        """
+        The trace of all channels, oldest sample first and newest sample last.
+
+        @return numpy.ndarray: view of shape (channels, length) into the buffer. It is only valid
+                               until the next change of the buffer, which overwrites the
+                               oldest sample of the view. Copy it to keep it.
+        """
+        return self._data[:, self._head:self._head + self._length]
+
+    def append(self, values):
+        """
+        Appends one sample per channel and discards the oldest one.
+
+        @param array_like values: new sample for each channel
+        """
+        self._data[:, self._head] = values
+        self._data[:, self._head + self._length] = values
+        self._head = (self._head + 1) % self._length
+
+    def extend(self, values):
+        """
+        Appends several samples per channel at once.
+
+        @param numpy.ndarray values: new samples of shape (channels, number of samples)
+        """
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values.reshape((self.channels, -1))
+        values = values[:, -self._length:]
+        positions = (self._head + np.arange(values.shape[1])) % self._length
+        self._data[:, positions] = values
+        self._data[:, positions + self._length] = values
+        self._head = (self._head + values.shape[1]) % self._length
+
+    def set_last(self, number, values):
+        """
+        Overwrites the newest samples.
+
+        @param int number: number of samples to overwrite (counted from the newest one)
+        @param array_like values: value(s) per channel, broadcastable to (channels, number)
+        """
+        number = min(int(number), self._length)
+        positions = np.arange(self._head + self._length - number, self._head + self._length)
+        values = np.broadcast_to(np.asarray(values).reshape((self.channels, -1)),
+                                 (self.channels, number))
+        self._data[:, positions] = values
+        self._data[:, (positions + self._length) % (2 * self._length)] = values
+
+    def clear(self, fill_value=0):
+        """
+        Resets all samples to fill_value.
+        """
+        self._data[...] = fill_value
+        self._head = 0
+
+
+class RunningMedian:
+    """
+    Median over the last samples of several channels, updated incrementally.
+
+    For every channel the samples inside the window are kept in sorted order. A new sample is
+    inserted and the sample leaving the window removed via bisection instead of sorting the
+    whole window again.
+
+    @param int window: number of samples the median is taken over
+    @param int channels: number of channels
+    """
+
+    def __init__(self, window, channels=1):
+        self._window = max(int(window), 1)
+        self._history = [collections.deque() for _ in range(int(channels))]
+        self._sorted = [list() for _ in range(int(channels))]
+
+    @property
+    def window(self):
+        return self._window
+
+    def update(self, values):
+        """
+        Adds one sample per channel and returns the current medians.
+
+        @param array_like values: new sample for each channel
+        @return numpy.ndarray: median of the samples in the window for each channel
+        """
+        medians = np.empty(len(self._history))
+        for channel, value in enumerate(values):
+            history = self._history[channel]
+            ordered = self._sorted[channel]
+            value = float(value)
+            history.append(value)
+            bisect.insort(ordered, value)
+            if len(history) > self._window:
+                del ordered[bisect.bisect_left(ordered, history.popleft())]
+            middle = len(ordered) // 2
+            if len(ordered) % 2:
+                medians[channel] = ordered[middle]
+            else:
+                medians[channel] = 0.5 * (ordered[middle - 1] + ordered[middle])
+        return medians
+
+    def clear(self):
+        """
+        Removes all samples from the window.
+        """
+        for history, ordered in zip(self._history, self._sorted):
+            history.clear()
+            del ordered[:]
+
+
+class SweepBuffer:
+    """
+    Fixed capacity store for repeatedly acquired sweeps (e.g. ODMR lines) with running averages.
+
+    The newest sweeps are kept in a preallocated circular array. Running sums over all sweeps and
+    over the newest average_length sweeps are updated with every appended sweep, so appending and
+    averaging cost O(1) with respect to the number of sweeps acquired so far. To keep rounding
+    errors from accumulating, the windowed sum is recalculated every time the buffer wraps around.
+
+    If a history_file is given, every sweep is additionally appended to that binary file and the
+    complete history is available memory-mapped via history(). Otherwise sweeps older than the
+    capacity are dropped.
+
+    @param int capacity: number of sweeps kept in memory
+    @param tuple sweep_shape: shape of a single sweep, e.g. (channels, frequencies)
+    @param int average_length: optional, number of newest sweeps to average (0 means all)
+    @param str history_file: optional, path of a file to spill the full sweep history to
+    @param dtype: optional, numpy data type of the sweeps
+    """
+
+    def __init__(self, capacity, sweep_shape, average_length=0, history_file=None,
+                 dtype=np.float64):
+        self._capacity = max(int(capacity), 1)
+        self._sweep_shape = tuple(sweep_shape)
+        self._data = np.zeros((self._capacity,) + self._sweep_shape, dtype=dtype)
+        # index of the newest sweep
+        self._head = -1
+        # number of sweeps appended in total
+        self._count = 0
+        # number of sweeps held in memory (less than capacity after growing it)
+        self._stored = 0
+        self._total_sum = np.zeros(self._sweep_shape, dtype=np.float64)
+        self._window_sum = np.zeros(self._sweep_shape, dtype=np.float64)
+        # number of sweeps contained in the window sum
+        self._window_count = 0
+        self._average_length = 0
+
+        self._history_file_path = history_file
+        self._history_file = None if history_file is None else open(history_file, 'wb')
+
+        self.set_average_length(average_length)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def sweep_shape(self):
+        return self._sweep_shape
+
+    @property
+    def count(self):
+        """
+        Number of sweeps appended since creation or the last clear.
+        """
+        return self._count
+
+    @property
+    def stored(self):
+        """
+        Number of sweeps currently held in memory.
+        """
+        return self._stored
+
+    @property
+    def average_length(self):
+        return self._average_length
+
+    @property
+    def history_file(self):
+        return self._history_file_path
+
+    def append(self, sweep):
+        """
+        Adds a new sweep and updates the running sums.
+
+        @param array_like sweep: the new sweep of shape sweep_shape
+        """
+        sweep = np.asarray(sweep, dtype=self._data.dtype).reshape(self._sweep_shape)
+        window = self._average_length
+        # remove the sweep leaving the averaging window before it is overwritten
+        if 0 < window == self._window_count:
+            self._window_sum -= self._data[(self._head - window + 1) % self._capacity]
+
+        self._head = (self._head + 1) % self._capacity
+        self._data[self._head] = sweep
+        self._count += 1
+        self._stored = min(self._stored + 1, self._capacity)
+        self._total_sum += sweep
+        if window > 0:
+            self._window_sum += sweep
+            self._window_count = min(self._window_count + 1, window)
+            if self._head == self._capacity - 1:
+                self._update_window_sum()
+
+        if self._history_file is not None:
+            self._history_file.write(sweep.tobytes())
+            self._history_file.flush()
+
+    def average(self):
+        """
+        Mean of the newest average_length sweeps or of all sweeps if average_length is 0.
+
+        @return numpy.ndarray: averaged sweep of shape sweep_shape
+        """
+        if self._count == 0:
+            return np.zeros(self._sweep_shape, dtype=np.float64)
+        if self._average_length <= 0:
+            return self._total_sum / self._count
+        return self._window_sum / self._window_count
+
+    def recent(self, number=None):
+        """
+        Copy of the newest sweeps held in memory, newest sweep first.
+
+        @param int number: optional, maximum number of sweeps to return. Default is all stored.
+        @return numpy.ndarray: array of shape (sweeps, ) + sweep_shape
+        """
+        number = self.stored if number is None else min(int(number), self.stored)
+        indices = (self._head - np.arange(number)) % self._capacity
+        return self._data[indices]
+
+    def history(self):
+        """
+        All sweeps since creation or the last clear, newest sweep first.
+
+        @return numpy.ndarray: memory-mapped (if spilled to disk) or in-memory array of shape
+                               (sweeps, ) + sweep_shape
+        """
+        if self._history_file is None or self._count == 0:
+            return self.recent()
+        self._history_file.flush()
+        history = np.memmap(self._history_file_path, dtype=self._data.dtype, mode='r',
+                            shape=(self._count,) + self._sweep_shape)
+        return history[::-1]
+
+    def set_average_length(self, average_length):
+        """
+        Changes the number of newest sweeps to average. Grows the capacity if necessary.
+
+        @param int average_length: number of sweeps to average (0 means all)
+        """
+        self._average_length = max(int(average_length), 0)
+        self.set_capacity(self._average_length)
+        self._update_window_sum()
+
+    def set_capacity(self, capacity):
+        """
+        Grows the number of sweeps kept in memory. The capacity never shrinks.
+
+        @param int capacity: minimum capacity
+        """
+        if capacity <= self._capacity:
+            return
+        stored = self.recent()[::-1]
+        self._data = np.zeros((int(capacity),) + self._sweep_shape, dtype=self._data.dtype)
+        self._data[:stored.shape[0]] = stored
+        self._capacity = int(capacity)
+        self._head = stored.shape[0] - 1 if stored.shape[0] > 0 else -1
+
+    def clear(self):
+        """
+        Removes all sweeps, also from the history file.
+        """
+        self._data[...] = 0
+        self._head = -1
+        self._count = 0
+        self._stored = 0
+        self._total_sum[...] = 0
+        self._window_sum[...] = 0
+        self._window_count = 0
+        if self._history_file is not None:
+            self._history_file.seek(0)
+            self._history_file.truncate()
+
+    def close(self, remove_history=True):
+        """
+        Closes the history file.
+
+        @param bool remove_history: optional, delete the history file from disk
+        """
+        if self._history_file is not None:
+            self._history_file.close()
+            self._history_file = None
+            if remove_history:
+                try:
+                    os.remove(self._history_file_path)
+                except OSError:
+                    pass
+
+    def _update_window_sum(self):
+        """
+        Recalculates the sum over the averaging window from the stored sweeps.
+        """
+        if self._average_length > 0:
+            window = self.recent(self._average_length)
+            self._window_sum = np.sum(window, axis=0, dtype=np.float64)
+            self._window_count = window.shape[0]
+        else:
+            self._window_count = 0
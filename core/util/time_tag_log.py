@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the binary time tag log fast counters can record the raw detection events of a
+measurement to, and the re-binning of such a log into the histogram of any bin width and record
+length.
+
+Each detection event is a record of dtype TIME_TAG_DTYPE holding the number of the sweep (trigger)
+it belongs to and its time since the start of the sweep in units of the time tag resolution. For
+gated measurements the gate of an event is its sweep number modulo the number of gates.
+
+A time tag log file consists of a 40 byte header (TIME_TAG_LOG_MAGIC, the format version and the
+number of gates as little-endian uint32, the resolution in seconds as float64, the number of sweeps
+and the number of records as uint64) followed by the packed records. It is written in place through
+a memory map and can be read with numpy alone.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import numpy as np
+
+TIME_TAG_DTYPE = np.dtype([('sweep', '<u8'), ('time', '<u8')])
+TIME_TAG_LOG_MAGIC = b'QDTIMTAG'
+TIME_TAG_LOG_VERSION = 1
+_HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('number_of_gates', '<u4'),
+                    ('resolution', '<f8'), ('number_of_sweeps', '<u8'), ('number_of_tags', '<u8')])
+
+
+class TimeTagLogWriter:
+    """
+    Writes a time tag log file. The file grows in chunks which are filled through a memory map.
+    It is truncated to its final size by close().
+    """
+
+    def __init__(self, filepath, resolution, number_of_gates=0, chunk_size=1048576, append=False):
+        """
+        Creates the file (an existing file is overwritten) or opens an existing log to append to.
+
+        @param str filepath: path of the time tag log file
+        @param float resolution: time tag resolution in seconds
+        @param int number_of_gates: number of gates, 0 for an ungated measurement
+        @param int chunk_size: minimum number of records the file grows by
+        @param bool append: optional, continue an existing log file recorded with the same
+                            resolution and number of gates instead of overwriting it. A new file
+                            is created if the file does not exist.
+        """
+        self.filepath = filepath
+        self.resolution = float(resolution)
+        self.number_of_gates = max(int(number_of_gates), 0)
+        self.number_of_sweeps = 0
+        self.number_of_tags = 0
+        self._chunk_size = max(int(chunk_size), 1)
+        self._capacity = 0
+        self._tags = None
+        if append and os.path.isfile(filepath):
+            self._open_existing()
+        else:
+            with open(filepath, 'wb') as file:
+                self._get_header().tofile(file)
+
+    def append(self, sweeps, times):
+        """
+        Appends detection events to the log.
+
+        @param numpy.ndarray sweeps: sweep number of each event
+        @param numpy.ndarray times: time of each event since the start of its sweep in units of
+                                    the resolution
+        """
+        sweeps = np.asarray(sweeps)
+        if sweeps.size == 0:
+            return
+        end = self.number_of_tags + sweeps.size
+        self._reserve(end)
+        self._tags['sweep'][self.number_of_tags:end] = sweeps
+        self._tags['time'][self.number_of_tags:end] = times
+        self.number_of_tags = end
+        self.number_of_sweeps = max(self.number_of_sweeps, int(sweeps.max()) + 1)
+        return
+
+    def add_sweeps(self, number_of_sweeps):
+        """
+        Sets the number of sweeps recorded, including the last sweeps without any event.
+
+        @param int number_of_sweeps: total number of sweeps
+        """
+        self.number_of_sweeps = max(self.number_of_sweeps, int(number_of_sweeps))
+        return
+
+    def flush(self):
+        """
+        Writes the records and the header to disk, so the file can be read while recording.
+        """
+        if self._tags is not None:
+            self._tags.flush()
+        self._write_header()
+        return
+
+    def close(self):
+        """
+        Writes the header and truncates the file to the records written.
+        """
+        self._release()
+        with open(self.filepath, 'r+b') as file:
+            file.truncate(_HEADER.itemsize + self.number_of_tags * TIME_TAG_DTYPE.itemsize)
+        self._write_header()
+        return
+
+    def _reserve(self, number_of_tags):
+        if number_of_tags <= self._capacity:
+            return
+        capacity = max(number_of_tags, 2 * self._capacity, self._chunk_size)
+        self._release()
+        with open(self.filepath, 'r+b') as file:
+            file.truncate(_HEADER.itemsize + capacity * TIME_TAG_DTYPE.itemsize)
+        self._tags = np.memmap(self.filepath, dtype=TIME_TAG_DTYPE, mode='r+',
+                               offset=_HEADER.itemsize, shape=(capacity,))
+        self._capacity = capacity
+        return
+
+    def _release(self):
+        if self._tags is not None:
+            self._tags.flush()
+            self._tags = None
+        self._capacity = 0
+        return
+
+    def _open_existing(self):
+        header = _read_header(self.filepath)
+        if (int(header['number_of_gates'][0]) != self.number_of_gates
+                or float(header['resolution'][0]) != self.resolution):
+            raise ValueError('Unable to append to time tag log file "{0}". It has been recorded '
+                             'with a different resolution or number of gates.'
+                             ''.format(self.filepath))
+        self.number_of_sweeps = int(header['number_of_sweeps'][0])
+        self.number_of_tags = int(header['number_of_tags'][0])
+        # Drop the unused capacity of a file that has not been closed
+        with open(self.filepath, 'r+b') as file:
+            file.truncate(_HEADER.itemsize + self.number_of_tags * TIME_TAG_DTYPE.itemsize)
+        return
+
+    def _get_header(self):
+        header = np.zeros(1, dtype=_HEADER)
+        header['magic'] = TIME_TAG_LOG_MAGIC
+        header['version'] = TIME_TAG_LOG_VERSION
+        header['number_of_gates'] = self.number_of_gates
+        header['resolution'] = self.resolution
+        header['number_of_sweeps'] = self.number_of_sweeps
+        header['number_of_tags'] = self.number_of_tags
+        return header
+
+    def _write_header(self):
+        with open(self.filepath, 'r+b') as file:
+            self._get_header().tofile(file)
+        return
+
+
+def _read_header(filepath):
+    header = np.fromfile(filepath, dtype=_HEADER, count=1)
+    if header.size != 1 or header['magic'][0] != TIME_TAG_LOG_MAGIC:
+        raise ValueError('File "{0}" is not a time tag log file.'.format(filepath))
+    if header['version'][0] > TIME_TAG_LOG_VERSION:
+        raise ValueError('Time tag log file "{0}" has unsupported format version {1:d}.'
+                         ''.format(filepath, int(header['version'][0])))
+    return header
+
+
+def load_time_tag_log(filepath):
+    """
+    Opens a time tag log file without reading the records into memory.
+
+    @param str filepath: path of the time tag log file
+
+    @return tuple(numpy.memmap, dict): read-only records of dtype TIME_TAG_DTYPE and a dict with
+                                       the keys 'resolution', 'number_of_gates' and
+                                       'number_of_sweeps'
+    """
+    header = _read_header(filepath)
+    info_dict = {'resolution': float(header['resolution'][0]),
+                 'number_of_gates': int(header['number_of_gates'][0]),
+                 'number_of_sweeps': int(header['number_of_sweeps'][0])}
+    number_of_tags = int(header['number_of_tags'][0])
+    if number_of_tags == 0:
+        return np.empty(0, dtype=TIME_TAG_DTYPE), info_dict
+    tags = np.memmap(filepath, dtype=TIME_TAG_DTYPE, mode='r', offset=_HEADER.itemsize,
+                     shape=(number_of_tags,))
+    return tags, info_dict
+
+
+def histogram_time_tags(tags, resolution, bin_width, record_length, number_of_gates=0,
+                        chunk_size=4194304):
+    """
+    Bins detection events into a histogram of the time since the start of the sweep, like the
+    fast counter data trace of a measurement with the given settings.
+
+    @param numpy.ndarray tags: records of dtype TIME_TAG_DTYPE (e.g. from load_time_tag_log)
+    @param float resolution: time tag resolution in seconds
+    @param float bin_width: width of a histogram bin in seconds
+    @param float record_length: length of the histogram (of each gate) in seconds
+    @param int number_of_gates: number of gates, 0 for an ungated histogram
+    @param int chunk_size: number of records binned at once
+
+    @return numpy.ndarray: int64 histogram, 1D for ungated, 2D (gate, bin) for gated histograms
+    """
+    # Round up like the fast counters do, but ignore floating point errors of the ratio
+    number_of_bins = max(int(np.ceil(record_length / bin_width * (1 - 1e-9))), 1)
+    number_of_gates = max(int(number_of_gates), 0)
+    histogram = np.zeros(number_of_bins * max(number_of_gates, 1), dtype=np.int64)
+
+    # Integer division if the bin width is a multiple of the resolution (no rounding errors)
+    bin_width_res = bin_width / resolution
+    integer_bin_width = int(round(bin_width_res))
+    if integer_bin_width < 1 or abs(bin_width_res - integer_bin_width) > 1e-9 * bin_width_res:
+        integer_bin_width = None
+
+    for start in range(0, len(tags), max(int(chunk_size), 1)):
+        chunk = tags[start:start + chunk_size]
+        if integer_bin_width is None:
+            bins = np.floor(chunk['time'] / bin_width_res).astype(np.int64)
+        else:
+            bins = (chunk['time'] // np.uint64(integer_bin_width)).astype(np.int64)
+        in_range = bins < number_of_bins
+        bins = bins[in_range]
+        if number_of_gates > 0:
+            gates = (chunk['sweep'][in_range] % np.uint64(number_of_gates)).astype(np.int64)
+            bins += gates * number_of_bins
+        histogram += np.bincount(bins, minlength=histogram.size)
+
+    if number_of_gates > 0:
+        return histogram.reshape((number_of_gates, number_of_bins))
+    return histogram
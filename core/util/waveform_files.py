@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains helpers to write waveform files for AWGs (e.g. Tektronix WFM/WFMX) in place.
+
+The file is created with its final size on the first chunk and each chunk of samples is written
+directly at its offset through a memory map. Marker bits are packed into the mapped file, so
+neither temporary files nor intermediate sample arrays are needed.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+# One WFM sample: float32 analog value followed by one marker byte (packed, 5 bytes)
+WFM_SAMPLE_DTYPE = np.dtype([('f0', '<f4'), ('f1', 'u1')])
+
+
+class MappedWaveformFile:
+    """
+    Waveform file with a header, a data region of known size and an optional footer, which is
+    filled chunk by chunk through memory maps.
+    """
+
+    def __init__(self, path, header, data_bytes, footer=b''):
+        """
+        Creates the file with its final size. The data region is left empty (zero-filled on most
+        systems) until written.
+
+        @param str path: path of the file to create (an existing file is overwritten)
+        @param bytes header: file header
+        @param int data_bytes: size of the data region following the header
+        @param bytes footer: optional file footer following the data region
+        """
+        self.path = path
+        self.data_offset = len(header)
+        self.data_bytes = int(data_bytes)
+        with open(path, 'wb') as file:
+            file.write(header)
+            file.truncate(self.data_offset + self.data_bytes)
+            if footer:
+                file.seek(self.data_offset + self.data_bytes)
+                file.write(footer)
+
+    def map(self, offset, dtype, count):
+        """
+        Memory maps a part of the data region.
+
+        @param int offset: offset in bytes with respect to the start of the data region
+        @param dtype: numpy dtype of the mapped array
+        @param int count: number of array items to map
+
+        @return numpy.memmap: writable 1D array mapped to the file
+        """
+        return np.memmap(self.path, dtype=np.dtype(dtype), mode='r+',
+                         offset=self.data_offset + int(offset), shape=(int(count),))
+
+
+def pack_markers(out, marker_1=None, marker_2=None):
+    """
+    Packs two marker channels into the marker bytes in place. Marker 1 is bit 0 and marker 2 is
+    bit 1 of each byte.
+
+    @param numpy.ndarray out: uint8 array to write the marker bytes to (e.g. a memory map)
+    @param numpy.ndarray marker_1: optional, bool samples of marker 1
+    @param numpy.ndarray marker_2: optional, bool samples of marker 2
+    """
+    if marker_2 is not None:
+        np.left_shift(_as_bytes(marker_2), 1, out=out)
+        if marker_1 is not None:
+            np.bitwise_or(out, _as_bytes(marker_1), out=out)
+    elif marker_1 is not None:
+        out[...] = _as_bytes(marker_1)
+    else:
+        out[...] = 0
+    return
+
+
+def _as_bytes(marker):
+    """
+    Reinterprets bool marker samples as uint8 without copying.
+
+    @param numpy.ndarray marker: marker samples
+
+    @return numpy.ndarray: uint8 view of the samples
+    """
+    marker = np.asarray(marker)
+    return marker.view('uint8') if marker.dtype == bool else marker
@@ -24,7 +24,6 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import os
 import time
 import visa
-import numpy as np
 
 from collections import OrderedDict
 from ftplib import FTP
@@ -32,6 +31,7 @@ from lxml import etree as ET
 
 from core.module import Base, ConfigOption
 from core.util.modules import get_home_dir
+from core.util.waveform_files import MappedWaveformFile, pack_markers
 from interface.pulser_interface import PulserInterface, PulserConstraints
 
 
@@ -80,6 +80,8 @@ class AWG70K(Base, PulserInterface):
         self.awg_model = ''  # String describing the model
 
         self.ftp_working_dir = 'waves'  # subfolder of FTP root dir on AWG disk to work in
+        # WFMX files being written chunk by chunk and the number of samples written so far
+        self._waveform_files = dict()
         return
 
     def on_activate(self):
@@ -358,58 +360,47 @@ class AWG70K(Base, PulserInterface):
             mrk_ch_1 = 'd_ch{0:d}'.format(a_ch_num * 2 - 1)
             mrk_ch_2 = 'd_ch{0:d}'.format(a_ch_num * 2)
 
-            start = time.time()
-            # Encode marker information in an array of bytes (uint8). Avoid intermediate copies!!!
-            if mrk_ch_1 in digital_samples and mrk_ch_2 in digital_samples:
-                mrk_bytes = digital_samples[mrk_ch_2].view('uint8')
-                tmp_bytes = digital_samples[mrk_ch_1].view('uint8')
-                np.left_shift(mrk_bytes, 1, out=mrk_bytes)
-                np.add(mrk_bytes, tmp_bytes, out=mrk_bytes)
-            elif mrk_ch_1 in digital_samples:
-                mrk_bytes = digital_samples[mrk_ch_1].view('uint8')
-            else:
-                mrk_bytes = None
-            self.log.debug('Prepare digital channel data: {0}'.format(time.time()-start))
-
             # Create waveform name string
             wfm_name = '{0}_ch{1:d}'.format(name, a_ch_num)
 
-            # Check if waveform already exists and delete if necessary.
-            if wfm_name in self.get_waveform_names():
-                self.delete_waveform(wfm_name)
-
-            # Write WFMX file for waveform
+            # Write WFMX file for waveform. The marker bytes are packed directly into the file.
             start = time.time()
             self._write_wfmx(filename=wfm_name,
                              analog_samples=analog_samples[a_ch],
-                             marker_bytes=mrk_bytes,
+                             marker_1=digital_samples.get(mrk_ch_1),
+                             marker_2=digital_samples.get(mrk_ch_2),
                              is_first_chunk=is_first_chunk,
                              is_last_chunk=is_last_chunk,
                              total_number_of_samples=total_number_of_samples)
             self.log.debug('Write WFMX file: {0}'.format(time.time() - start))
 
-            # transfer waveform to AWG and load into workspace
-            start = time.time()
-            self._send_file(filename=wfm_name + '.wfmx')
-            self.log.debug('Send WFMX file: {0}'.format(time.time() - start))
-
-            start = time.time()
-            self.write('MMEM:OPEN "{0}"'.format(os.path.join(
-                self._ftp_dir, self.ftp_working_dir, wfm_name + '.wfmx')))
-            # Wait for everything to complete
-            timeout_old = self.awg.timeout
-            # increase this time so that there is no timeout for loading longer sequences
-            # which might take some minutes
-            self.awg.timeout = 5e6
-            # the answer of the *opc-query is received as soon as the loading is finished
-            opc = int(self.query('*OPC?'))
-            # Just to make sure
-            while wfm_name not in self.get_waveform_names():
-                time.sleep(0.25)
+            # transfer waveform to AWG and load into workspace once the file is complete
+            if is_last_chunk:
+                # Check if waveform already exists and delete if necessary.
+                if wfm_name in self.get_waveform_names():
+                    self.delete_waveform(wfm_name)
+
+                start = time.time()
+                self._send_file(filename=wfm_name + '.wfmx')
+                self.log.debug('Send WFMX file: {0}'.format(time.time() - start))
+
+                start = time.time()
+                self.write('MMEM:OPEN "{0}"'.format(os.path.join(
+                    self._ftp_dir, self.ftp_working_dir, wfm_name + '.wfmx')))
+                # Wait for everything to complete
+                timeout_old = self.awg.timeout
+                # increase this time so that there is no timeout for loading longer sequences
+                # which might take some minutes
+                self.awg.timeout = 5e6
+                # the answer of the *opc-query is received as soon as the loading is finished
+                opc = int(self.query('*OPC?'))
+                # Just to make sure
+                while wfm_name not in self.get_waveform_names():
+                    time.sleep(0.25)
 
-            # reset the timeout
-            self.awg.timeout = timeout_old
-            self.log.debug('Load WFMX file into workspace: {0}'.format(time.time() - start))
+                # reset the timeout
+                self.awg.timeout = timeout_old
+                self.log.debug('Load WFMX file into workspace: {0}'.format(time.time() - start))
 
             # Append created waveform name to waveform list
             waveforms.append(wfm_name)
@@ -1556,79 +1547,63 @@ class AWG70K(Base, PulserInterface):
                 ftp.storbinary('STOR ' + filename, file)
         return 0
 
-    def _write_wfmx(self, filename, analog_samples, marker_bytes, is_first_chunk, is_last_chunk,
-                    total_number_of_samples):
+    def _write_wfmx(self, filename, analog_samples, marker_1, marker_2, is_first_chunk,
+                    is_last_chunk, total_number_of_samples):
         """
-        Appends a sampled chunk of a whole waveform to a wfmx-file. Create the file
+        Writes a sampled chunk of a whole waveform to a wfmx-file. Create the file
         if it is the first chunk.
         If both flags (is_first_chunk, is_last_chunk) are set to TRUE it means
         that the whole ensemble is written as a whole in one big chunk.
 
-        @param name: string, represents the name of the sampled ensemble
-        @param analog_samples: dict containing float32 numpy ndarrays, contains the
-                                       samples for the analog channels that
-                                       are to be written by this function call.
-        @param marker_bytes: np.ndarray containing bool numpy ndarrays, contains the samples
-                                      for the digital channels that
-                                      are to be written by this function call.
-        @param total_number_of_samples: int, The total number of samples in the
-                                        entire waveform. Has to be known in advance.
+        The file is created with its final size and the chunks are written in place through memory
+        maps. The analog samples (4 bytes each, np.float32) follow the header and the marker bytes
+        (1 byte each) follow the analog samples.
+
+        @param filename: string, represents the name of the sampled waveform
+        @param analog_samples: float32 numpy ndarray, contains the samples of the analog channel
+                               that are to be written by this function call.
+        @param marker_1: bool numpy ndarray or None, contains the samples of the first marker
+                         channel that are to be written by this function call.
+        @param marker_2: bool numpy ndarray or None, contains the samples of the second marker
+                         channel that are to be written by this function call.
         @param is_first_chunk: bool, indicates if the current chunk is the
                                first write to this file.
         @param is_last_chunk: bool, indicates if the current chunk is the last
                               write to this file.
-
-        @return list: the list contains the string names of the created files for the passed
-                      presampled arrays
+        @param total_number_of_samples: int, The total number of samples in the
+                                        entire waveform. Has to be known in advance.
         """
-        # The memory overhead of the tmp file write/read process in bytes. Only used if wfmx file is
-        # written in chunks in order to avoid excessive memory usage.
-        tmp_bytes_overhead = 16777216  # 16 MB
-
         if not filename.endswith('.wfmx'):
             filename += '.wfmx'
         wfmx_path = os.path.join(self._tmp_work_dir, filename)
-        tmp_path = os.path.join(self._tmp_work_dir, 'digital_tmp.bin')
 
-        # if it is the first chunk, create the .WFMX file with header.
+        # if it is the first chunk, create the .WFMX file with header and its final size.
         if is_first_chunk:
-            # create header
-            header = self._create_xml_header(total_number_of_samples, marker_bytes is not None)
-            # write header
-            with open(wfmx_path, 'wb') as wfmxfile:
-                wfmxfile.write(header.encode('utf8'))
-            # Check if a tmp digital samples file is present and delete it if necessary.
-            if os.path.isfile(tmp_path):
-                os.remove(tmp_path)
-
-        # append analog samples to the .WFMX file.
-        # Write digital samples in temporary file if not the entire samples are passed at once.
-        with open(wfmx_path, 'ab') as wfmxfile:
-            # append analog samples in binary format. One sample is 4 bytes (np.float32).
-            wfmxfile.write(analog_samples)
-
-        # Write digital samples to tmp file if chunkwise writing is used and it's not the last chunk
-        if not is_last_chunk and marker_bytes is not None:
-            with open(tmp_path, 'ab') as tmp_file:
-                tmp_file.write(marker_bytes)
-
-        # If this is the last chunk, write digital samples from tmp file to wfmx file (if present)
-        # and also append the currently passed digital samples to wfmx file.
-        # Read from tmp file in chunks of tmp_bytes_overhead in order to avoid too much memory
-        # overhead.
-        if is_last_chunk and marker_bytes is not None:
-            with open(wfmx_path, 'ab') as wfmxfile:
-                # Copy over digital samples from tmp file. Delete tmp file afterwards.
-                if os.path.isfile(tmp_path):
-                    with open(tmp_path, 'rb') as tmp_file:
-                        while True:
-                            tmp = tmp_file.read(tmp_bytes_overhead)
-                            if not tmp:
-                                break
-                            wfmxfile.write(tmp)
-                    os.remove(tmp_path)
-                # Append current digital samples array to wfmx file
-                wfmxfile.write(marker_bytes)
+            markers_active = marker_1 is not None or marker_2 is not None
+            header = self._create_xml_header(total_number_of_samples, markers_active)
+            data_bytes = total_number_of_samples * (5 if markers_active else 4)
+            self._waveform_files[wfmx_path] = [
+                MappedWaveformFile(wfmx_path, header.encode('utf8'), data_bytes), 0]
+
+        wfmx_file, start_ind = self._waveform_files[wfmx_path]
+        chunk_length = analog_samples.size
+
+        mapped_samples = wfmx_file.map(4 * start_ind, 'float32', chunk_length)
+        mapped_samples[:] = analog_samples
+        mapped_samples.flush()
+        del mapped_samples
+
+        if wfmx_file.data_bytes > 4 * total_number_of_samples:
+            mapped_markers = wfmx_file.map(4 * total_number_of_samples + start_ind, 'uint8',
+                                           chunk_length)
+            pack_markers(mapped_markers, marker_1, marker_2)
+            mapped_markers.flush()
+            del mapped_markers
+
+        if is_last_chunk:
+            del self._waveform_files[wfmx_path]
+        else:
+            self._waveform_files[wfmx_path][1] += chunk_length
         return
 
     def _create_xml_header(self, number_of_samples, markers_active):
@@ -24,12 +24,12 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import os
 import time
 import visa
-import numpy as np
 from ftplib import FTP
 from collections import OrderedDict
 
 from core.util.modules import get_home_dir
 from core.module import Base, ConfigOption
+from core.util.waveform_files import MappedWaveformFile, WFM_SAMPLE_DTYPE, pack_markers
 from interface.pulser_interface import PulserInterface, PulserConstraints
 
 
@@ -74,6 +74,8 @@ class AWG7k(Base, PulserInterface):
         self.awg = None  # This variable will hold a reference to the awg visa resource
 
         self.ftp_working_dir = 'waves'  # subfolder of FTP root dir on AWG disk to work in
+        # WFM files being written chunk by chunk and the number of samples written so far
+        self._waveform_files = dict()
 
         self.installed_options = list()  # will hold the encoded installed options available on awg
         self._ch_state_dict = {
@@ -1293,48 +1295,39 @@ class AWG7k(Base, PulserInterface):
             mrk_ch_1 = 'd_ch{0:d}'.format(a_ch_num * 2 - 1)
             mrk_ch_2 = 'd_ch{0:d}'.format(a_ch_num * 2)
 
-            start = time.time()
-            # Encode marker information in an array of bytes (uint8). Avoid intermediate copies!!!
-            if mrk_ch_1 in digital_samples and mrk_ch_2 in digital_samples:
-                mrk_bytes = digital_samples[mrk_ch_2].view('uint8')
-                tmp_bytes = digital_samples[mrk_ch_1].view('uint8')
-                # Marker bits live in the LSB of the byte, as opposed to the AWG70k
-                np.left_shift(mrk_bytes, 1, out=mrk_bytes)
-                np.left_shift(tmp_bytes, 0, out=tmp_bytes)
-                np.add(mrk_bytes, tmp_bytes, out=mrk_bytes)
-            else:
-                mrk_bytes = None
-            self.log.debug('Prepared digital channel data: {0}'.format(time.time() - start))
-
             # Create waveform name string
             wfm_name = '{0}_ch{1:d}'.format(name, a_ch_num)
 
-            # Write WFM file for waveform
+            # Write WFM file for waveform. The marker bytes are packed directly into the file.
+            # Marker bits live in the LSB of the byte.
             start = time.time()
             self._write_wfm(filename=wfm_name,
                             analog_samples=analog_samples[a_ch],
-                            marker_bytes=mrk_bytes,
+                            marker_1=digital_samples.get(mrk_ch_1),
+                            marker_2=digital_samples.get(mrk_ch_2),
                             is_first_chunk=is_first_chunk,
                             is_last_chunk=is_last_chunk,
                             total_number_of_samples=total_number_of_samples)
 
             self.log.debug('Wrote WFM file to local HDD: {0}'.format(time.time() - start))
 
-            # transfer waveform to AWG and load into workspace
-            start = time.time()
-            self._send_file(filename=wfm_name + '.wfm')
-            self.log.debug('Sent WFM file to AWG HDD: {0}'.format(time.time() - start))
-
-            # Load waveform to the AWG fast memory (waveform will appear in "User Defined" list)
-            start = time.time()
-            self.write('MMEM:IMP "{0}","{1}",WFM'.format(wfm_name, wfm_name + '.wfm'))
-            # Wait for everything to complete
-            while int(self.query('*OPC?')) != 1:
-                time.sleep(0.2)
-            # Just to make sure
-            while wfm_name not in self.get_waveform_names():
-                time.sleep(0.2)
-            self.log.debug('Loaded WFM file into workspace: {0}'.format(time.time() - start))
+            # transfer waveform to AWG and load into workspace once the file is complete
+            if is_last_chunk:
+                start = time.time()
+                self._send_file(filename=wfm_name + '.wfm')
+                self.log.debug('Sent WFM file to AWG HDD: {0}'.format(time.time() - start))
+
+                # Load waveform to the AWG fast memory (waveform will appear in "User Defined"
+                # list)
+                start = time.time()
+                self.write('MMEM:IMP "{0}","{1}",WFM'.format(wfm_name, wfm_name + '.wfm'))
+                # Wait for everything to complete
+                while int(self.query('*OPC?')) != 1:
+                    time.sleep(0.2)
+                # Just to make sure
+                while wfm_name not in self.get_waveform_names():
+                    time.sleep(0.2)
+                self.log.debug('Loaded WFM file into workspace: {0}'.format(time.time() - start))
 
             # Append created waveform name to waveform list
             waveforms.append(wfm_name)
@@ -1429,77 +1422,62 @@ class AWG7k(Base, PulserInterface):
 
     # ======== Wfm Technical ========
 
-    def _write_wfm(self, filename, analog_samples, marker_bytes, is_first_chunk, is_last_chunk,
-                   total_number_of_samples):
+    def _write_wfm(self, filename, analog_samples, marker_1, marker_2, is_first_chunk,
+                   is_last_chunk, total_number_of_samples):
         """
-        Appends a sampled chunk of a whole waveform to a wfm-file. Create the file
+        Writes a sampled chunk of a whole waveform to a wfm-file. Create the file
         if it is the first chunk.
         If both flags (is_first_chunk, is_last_chunk) are set to TRUE it means
         that the whole ensemble is written as a whole in one big chunk.
 
+        The file is created with its final size (including the footer) and the chunks are written
+        in place through memory maps. Each sample is a float32 analog value followed by the marker
+        byte.
+
         @param filename: string, represents the name of the sampled waveform
-        @param analog_samples: dict containing float32 numpy ndarrays, contains the
-                                       samples for the analog channels that
-                                       are to be written by this function call.
-        @param marker_bytes: np.ndarray containing bool numpy ndarrays, contains the samples
-                                      for the digital channels that
-                                      are to be written by this function call.
-        @param total_number_of_samples: int, The total number of samples in the
-                                        entire waveform. Has to be known in advance.
+        @param analog_samples: float32 numpy ndarray, contains the samples of the analog channel
+                               that are to be written by this function call.
+        @param marker_1: bool numpy ndarray or None, contains the samples of the first marker
+                         channel that are to be written by this function call.
+        @param marker_2: bool numpy ndarray or None, contains the samples of the second marker
+                         channel that are to be written by this function call.
         @param is_first_chunk: bool, indicates if the current chunk is the
                                first write to this file.
         @param is_last_chunk: bool, indicates if the current chunk is the last
                               write to this file.
+        @param total_number_of_samples: int, The total number of samples in the
+                                        entire waveform. Has to be known in advance.
         """
-        # The memory overhead of the tmp file write/read process in bytes.
-        tmp_bytes_overhead = 104857600  # 100 MB
-        tmp_samples = tmp_bytes_overhead // 5
-        if tmp_samples > len(analog_samples):
-            tmp_samples = len(analog_samples)
-
         if not filename.endswith('.wfm'):
             filename += '.wfm'
         wfm_path = os.path.join(self._tmp_work_dir, filename)
 
-        # if it is the first chunk, create the WFM file with header.
+        # if it is the first chunk, create the WFM file with header, footer and its final size.
         if is_first_chunk:
-            with open(wfm_path, 'wb') as wfm_file:
-                # write the first line, which is the header file, if first chunk is passed:
-                num_bytes = str(int(total_number_of_samples * 5))
-                num_digits = str(len(num_bytes))
-                header = 'MAGIC 1000\r\n#{0}{1}'.format(num_digits, num_bytes)
-                wfm_file.write(header.encode())
-
-        # For the WFM file format unfortunately we need to write the digital sampels together
-        # with the analog samples. Therefore we need a temporary copy of all samples for each
-        # analog channel.
-        write_array = np.zeros(tmp_samples, dtype='float32, uint8')
-
-        # Consecutively prepare and write chunks of maximal size tmp_bytes_overhead to file
-        samples_written = 0
-        with open(wfm_path, 'ab') as wfm_file:
-            while samples_written < len(analog_samples):
-                write_end = samples_written + write_array.size
-                # Prepare tmp write array
-                write_array['f0'] = analog_samples[samples_written:write_end]
-                if marker_bytes is not None:
-                    write_array['f1'] = marker_bytes[samples_written:write_end]
-                # Write to file
-                wfm_file.write(write_array)
-                # Increment write counter
-                samples_written = write_end
-                # Reduce write array size if
-                if 0 < total_number_of_samples - samples_written < write_array.size:
-                    write_array.resize(total_number_of_samples - samples_written)
-
+            num_bytes = str(int(total_number_of_samples * 5))
+            num_digits = str(len(num_bytes))
+            header = 'MAGIC 1000\r\n#{0}{1}'.format(num_digits, num_bytes)
+            # the footer encodes the sample rate, which was used for that file:
+            footer = 'CLOCK {0:16.10E}\r\n'.format(self.get_sample_rate())
+            self._waveform_files[wfm_path] = [
+                MappedWaveformFile(wfm_path, header.encode(), total_number_of_samples * 5,
+                                   footer.encode()),
+                0]
+
+        wfm_file, start_ind = self._waveform_files[wfm_path]
+        chunk_length = analog_samples.size
+
+        # Write analog samples and marker bytes directly into the interleaved file records
+        write_array = wfm_file.map(5 * start_ind, WFM_SAMPLE_DTYPE, chunk_length)
+        write_array['f0'] = analog_samples
+        pack_markers(write_array['f1'], marker_1, marker_2)
+        write_array.flush()
         del write_array
 
-        # append footer if it's the last chunk to write
         if is_last_chunk:
-            # the footer encodes the sample rate, which was used for that file:
-            footer = 'CLOCK {0:16.10E}\r\n'.format(self.get_sample_rate())
-            with open(wfm_path, 'ab') as wfm_file:
-                wfm_file.write(footer.encode())
+            del self._waveform_files[wfm_path]
+        else:
+            self._waveform_files[wfm_path][1] += chunk_length
         return
 
     # ================ Sequence ================
@@ -340,6 +340,45 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
                 np.ones(count_data.shape) * line_path[1, 0] * 100
             ]).transpose()
 
+    def has_multi_line_scan(self):
+        """ The dummy scanner can scan several lines at once.
+
+        @return bool: True
+        """
+        return True
+
+    def scan_lines(self, line_paths=None, pixel_clock=False):
+        """ Scans several lines in one go and returns the counts on those lines.
+
+        @param float[l][4][k] line_paths: l lines of 4-part tuples defining the voltage points
+        @param bool pixel_clock: whether we need to output a pixel clock for these lines
+
+        @return float[l][k][m]: the photon counts per second
+        """
+        if not isinstance(line_paths, (frozenset, list, set, tuple, np.ndarray, )):
+            self.log.error('Given voltage list is no array type.')
+            return np.array([[[-1.]]])
+
+        line_paths = np.asarray(line_paths, dtype=np.float64)
+        lines, axes, samples = line_paths.shape
+        path = line_paths.transpose(1, 0, 2).reshape((axes, lines * samples))
+
+        count_data = np.random.uniform(0, 2e4, path.shape[1])
+        for i in range(self._num_points):
+            count_data += self.twoD_gaussian_function((path[0], path[1]), *(self._points[i])
+                ) * self.gaussian_function(path[2], *(self._points_z[i]))
+
+        time.sleep(path.shape[1] * 1. / self._clock_frequency)
+
+        # update the scanner position instance variable
+        self._current_position = list(path[:, -1])
+
+        return np.array([
+                count_data,
+                5e5 - count_data,
+                np.repeat(line_paths[:, 1, 0], samples) * 100
+            ]).transpose().reshape((lines, samples, 3))
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
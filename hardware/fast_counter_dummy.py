@@ -26,6 +26,7 @@ import numpy as np
 
 from core.module import Base, ConfigOption
 from core.util.modules import get_main_dir
+from core.util.time_tag_log import TimeTagLogWriter
 from interface.fast_counter_interface import FastCounterInterface
 
 
@@ -38,6 +39,7 @@ class FastCounterDummy(Base, FastCounterInterface):
         module.Class: 'fast_counter_dummy.FastCounterDummy'
         gated: False
         #load_trace: None # path to the saved dummy trace
+        #time_tags: 1000000 # number of synthetic events written to a time tag log
 
     """
     _modclass = 'fastcounterinterface'
@@ -46,6 +48,11 @@ class FastCounterDummy(Base, FastCounterInterface):
     # config option
     _gated = ConfigOption('gated', False, missing='warn')
     trace_path = ConfigOption('load_trace', None)
+    _number_of_time_tags = ConfigOption('time_tags', 1000000, missing='nothing')
+
+    # resolution and number of sweeps of the synthetic time tags
+    _time_tag_resolution = 1e-12
+    _time_tag_sweeps = 100000
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -68,6 +75,7 @@ class FastCounterDummy(Base, FastCounterInterface):
         self.statusvar = 0
         self._binwidth = 1
         self._gate_length_bins = 8192
+        self._time_tag_log_path = None
         return
 
     def on_deactivate(self):
@@ -163,6 +171,9 @@ class FastCounterDummy(Base, FastCounterInterface):
 
         if self._gated:
             self._count_data = self._count_data.transpose()
+
+        if self._time_tag_log_path is not None:
+            self._write_synthetic_time_tags(self._time_tag_log_path)
         return 0
 
     def pause_measure(self):
@@ -235,3 +246,56 @@ class FastCounterDummy(Base, FastCounterInterface):
         freq = 950.
         time.sleep(0.5)
         return freq
+
+    def has_time_tag_log(self):
+        """ Check whether the fast counter can record the time tags of a measurement to file.
+
+        @return bool: True if set_time_tag_log is supported, False otherwise
+        """
+        return True
+
+    def set_time_tag_log(self, filepath):
+        """ Sets the file the detection events of the following measurements are recorded to.
+
+        @param str filepath: path of the time tag log file, None to stop recording
+
+        @return str: path of the time tag log file, None if not recording
+
+        The dummy writes synthetic events, distributed like the counts of the dummy trace, when
+        the measurement is started.
+        """
+        self._time_tag_log_path = filepath
+        return self._time_tag_log_path
+
+    def _write_synthetic_time_tags(self, filepath, chunk_size=1000000):
+        """ Draws synthetic events from the distribution of the dummy trace and writes them to a
+        time tag log. Each event gets a random time within its bin and a random sweep (of the
+        gate of its row for a gated trace).
+
+        @param str filepath: path of the time tag log file
+        @param int chunk_size: number of events drawn at once
+        """
+        counts = np.atleast_2d(self._count_data).clip(min=0)
+        number_of_gates = counts.shape[0] if self._gated else 0
+        number_of_bins = counts.shape[1]
+        total_counts = counts.sum()
+        probabilities = counts.reshape(-1) / max(total_counts, 1)
+        bin_width = self.get_binwidth() / self._time_tag_resolution
+
+        log = TimeTagLogWriter(filepath, self._time_tag_resolution, number_of_gates)
+        remaining = int(self._number_of_time_tags) if total_counts > 0 else 0
+        while remaining > 0:
+            number_of_tags = min(remaining, chunk_size)
+            remaining -= number_of_tags
+            gates, bins = np.divmod(
+                np.random.choice(probabilities.size, number_of_tags, p=probabilities),
+                number_of_bins)
+            times = (bins + np.random.random_sample(number_of_tags)) * bin_width
+            sweeps = np.random.randint(0, self._time_tag_sweeps, number_of_tags)
+            if number_of_gates > 0:
+                sweeps = sweeps * number_of_gates + gates
+            order = np.argsort(sweeps, kind='mergesort')
+            log.append(sweeps[order], times[order].astype(np.uint64))
+        log.add_sweeps(self._time_tag_sweeps * max(number_of_gates, 1))
+        log.close()
+        return
@@ -1433,6 +1433,45 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
         # return values is a rate of counts/s
         return all_data.transpose()
 
+    def has_multi_line_scan(self):
+        """ Several lines can be scanned with a single finite analog output and counter task.
+
+        @return bool: True
+        """
+        return True
+
+    def scan_lines(self, line_paths=None, pixel_clock=False):
+        """ Scans several lines in one go and returns the counts on those lines.
+
+        @param float[l][c][m] line_paths: l lines, each an array of c-tuples defining the voltage
+                                          points (m = samples per line)
+        @param bool pixel_clock: whether we need to output a pixel clock for these lines
+
+        @return float[l][m][n]: l lines of m (samples per line) n-channel photon counts per second
+
+        The lines are joined into one long path, which is handed to scan_line. scan_line sizes
+        the finite analog output, clock and counter tasks to the length of the path it is given,
+        so all lines are written into the analog output buffer at once and scanned with a
+        single set of tasks, configured and started only once. This is the whole multi-line
+        implementation.
+        """
+        if not isinstance(line_paths, (frozenset, list, set, tuple, np.ndarray, )):
+            self.log.error('Given line_paths list is not array type.')
+            return np.array([[[-1.]]])
+
+        line_paths = np.asarray(line_paths, dtype=np.float64)
+        if line_paths.ndim != 3:
+            self.log.error('Given line_paths must be an array of shape (lines, axes, samples).')
+            return np.array([[[-1.]]])
+        lines, axes, samples = line_paths.shape
+
+        # one long line through all lines, which is scanned by one set of tasks
+        line_path = line_paths.transpose(1, 0, 2).reshape((axes, lines * samples))
+        all_data = self.scan_line(line_path, pixel_clock=pixel_clock)
+        if np.ndim(all_data) != 2 or np.shape(all_data)[0] != lines * samples:
+            return np.array([[[-1.]]])
+        return all_data.reshape((lines, samples, -1))
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
@@ -27,10 +27,12 @@ from qtpy import QtCore
 from core.module import Base, ConfigOption
 from core.util.modules import get_main_dir
 from core.util.mutex import Mutex
+from core.util.time_tag_log import TimeTagLogWriter
 from interface.slow_counter_interface import SlowCounterInterface
 from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 from interface.fast_counter_interface import FastCounterInterface
+from hardware.picoquant.picoharp_tttr import TTTRHistogram, TTTRFifoReader
 
 # =============================================================================
 # Wrapper around the PHLib.DLL. The current file is based on the header files
@@ -98,6 +100,8 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         module.Class: 'picoquant.picoharp300.PicoHarp300'
         deviceID: 0 # a device index from 0 to 7.
         mode: 0 # 0: histogram mode, 2: T2 mode, 3: T3 mode
+        gated: False # optional, assign the syncs to the gates one after another (fast counter)
+        fifo_buffers: 8 # optional, number of TTTR read buffers queued for the decoding
         
     """
     _modclass = 'PicoHarp300'
@@ -105,9 +109,9 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 
     _deviceID = ConfigOption('deviceID', 0, missing='warn') # a device index from 0 to 7.
     _mode = ConfigOption('mode', 0, missing='warn')
+    _gated = ConfigOption('gated', False, missing='nothing')
+    _fifo_buffers = ConfigOption('fifo_buffers', 8, missing='nothing')
 
-    sigReadoutPicoharp = QtCore.Signal()
-    sigAnalyzeData = QtCore.Signal(object, object)
     sigStart = QtCore.Signal()
 
     def __init__(self, config, **kwargs):
@@ -133,6 +137,14 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         self._photon_source2 = None #for compatibility reasons with second APD
         self._count_channel = 1
 
+        # Histogram of the TTTR records for the fast counter (see configure)
+        self._tttr_histogram = None
+        # Reader and decoder threads of the TTTR records (see start_measure)
+        self._fifo_reader = None
+        # Time tag log of the photons (see set_time_tag_log)
+        self._time_tag_log_path = None
+        self._time_tag_resolution_s = self.T2_RESOLUTION_PS * 1e-12
+
         #locking for thread safety
         self.threadlock = Mutex()
 
@@ -152,18 +164,16 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         # anything to pass through:
 
         self.sigStart.connect(self.start_measure)
-        self.sigReadoutPicoharp.connect(self.get_fresh_data_loop, QtCore.Qt.QueuedConnection) # ,QtCore.Qt.QueuedConnection
-        self.sigAnalyzeData.connect(self.analyze_received_data, QtCore.Qt.QueuedConnection)
         self.result = []
 
 
     def on_deactivate(self):
         """ Deactivates and disconnects the device.
         """
-
+        if self._fifo_reader is not None and self._fifo_reader.is_running:
+            self.stop_measure()
         self.close_connection()
-        self.sigReadoutPicoharp.disconnect()
-        self.sigAnalyzeData.disconnect()
+        self.sigStart.disconnect()
 
     def _create_errorcode(self):
         """ Create a dictionary with the errorcode for the device.
@@ -226,6 +236,8 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         self.BINSTEPSMAX = 8
         self.HISTCHAN = 65536    # number of histogram channels 2^16
         self.TTREADMAX = 131072  # 128K event records (2^17)
+        self.T2_RESOLUTION_PS = 4   # fixed resolution of the T2 time tags
+        self.FLAG_FIFOFULL = 0x0003  # TTTR FIFO overflow in T-modes
 
         # in Hz:
         self.COUNTFREQ = 10
@@ -691,11 +703,14 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
     # To check whether you can use the TTTR mode (must be purchased in
     # addition) you can call PH_GetFeatures to check.
 
-    def tttr_read_fifo(self):#, num_counts):
+    def tttr_read_fifo(self, buffer=None):
         """ Read out the buffer of the FIFO.
 
-        @param int num_counts: number of TTTR records to be fetched. Maximal
-                               TTREADMAX
+        @param numpy.ndarray buffer: optional, preallocated uint32 array to
+                                     read the TTTR records into. Its length
+                                     (maximal TTREADMAX) is the number of
+                                     records to be fetched. A new array of
+                                     length TTREADMAX is created if None.
 
         @return tuple (buffer, actual_num_counts):
                     buffer = data array where the TTTR data are stored.
@@ -734,9 +749,9 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         #     If it is zero, the record marks an overflow.
         #     If it is >=1 the individual bits are external markers.
 
-        num_counts = self.TTREADMAX
-
-        buffer = np.zeros((num_counts,), dtype=np.uint32)
+        if buffer is None:
+            buffer = np.zeros((self.TTREADMAX,), dtype=np.uint32)
+        num_counts = min(buffer.size, self.TTREADMAX)
 
         actual_num_counts = ctypes.c_int32()
 
@@ -1058,29 +1073,44 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 
     #FIXME: The interface connection to the fast counter must be established!
 
-    def configure(self, bin_width_ns, record_length_ns, number_of_gates = 0):
-        """
-        Configuration of the fast counter.
-        bin_width_ns: Length of a single time bin in the time trace histogram
-                      in nanoseconds.
-        record_length_ns: Total length of the timetrace/each single gate in
-                          nanoseconds.
-        number_of_gates: Number of gates in the pulse sequence. Ignore for
-                         ungated counter.
-        """
-        #        self.initialize(mode=3)
-        self._bin_width_ns = bin_width_ns
-        self._record_length_ns = record_length_ns
-        self._number_of_gates = number_of_gates
+    def configure(self, bin_width_s, record_length_s, number_of_gates=0):
+        """ Configuration of the fast counter.
 
-        #FIXME: actualle only an unsigned array will be needed. Change that later.
-        #        self.data_trace = np.zeros(number_of_gates, dtype=np.int64 )
-        self.data_trace = [0]*number_of_gates
-        self.count = 0
+        @param float bin_width_s: Length of a single time bin in the time
+                                  trace histogram in seconds.
+        @param float record_length_s: Total length of the timetrace/each
+                                      single gate in seconds.
+        @param int number_of_gates: optional, number of gates in the pulse
+                                    sequence. Ignore for not gated counter.
 
-        self.result = []
-        self.initialize(2)
-        return
+        @return tuple(binwidth_s, record_length_s, number_of_gates):
+                    binwidth_s: float the actual set binwidth in seconds
+                    gate_length_s: the actual record length in seconds
+                    number_of_gates: the number of gated, which are accepted, None if not-gated
+        """
+        # Use the TTTR mode of the config (T2 if the device is configured for histogram mode)
+        mode = self.MODE_T3 if self._mode == self.MODE_T3 else self.MODE_T2
+        self.initialize(mode)
+
+        # The histogram bins are integer multiples of the time resolution of the records
+        if mode == self.MODE_T3:
+            resolution_ps = self.get_resolution()
+        else:
+            resolution_ps = self.T2_RESOLUTION_PS
+        bin_width = max(int(round(bin_width_s * 1e12 / resolution_ps)), 1)
+        self._time_tag_resolution_s = resolution_ps * 1e-12
+        self._bin_width_ns = bin_width * resolution_ps / 1000
+        number_of_bins = int(np.ceil(record_length_s * 1e9 / self._bin_width_ns))
+        self._record_length_ns = number_of_bins * self._bin_width_ns
+        self._number_of_gates = number_of_gates if self._gated else 0
+
+        self._tttr_histogram = TTTRHistogram(mode=mode,
+                                             bin_width=bin_width,
+                                             number_of_bins=number_of_bins,
+                                             number_of_gates=self._number_of_gates)
+        return (self._bin_width_ns * 1e-9,
+                self._record_length_ns * 1e-9,
+                self._number_of_gates if self._gated else None)
 
     def get_status(self):
         """
@@ -1113,23 +1143,32 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
     def continue_measure(self):
         """
         Continues the current measurement if the fast counter is in pause state.
+
+        The device is restarted, so its time tags start from zero again. The
+        histogram is kept, only the decoder state of the previous run is reset
+        and the time tag log of the measurement is continued.
         """
+        self.lock()
         self.meas_run = True
-        self.start(self._record_length_ns/1e6)
+        with self.threadlock:
+            if self._tttr_histogram is not None:
+                self._tttr_histogram.start_new_run()
+                self._open_time_tag_log(append=True)
+        self.start(self.ACQTMAX)
+        self._start_fifo_reader()
 
     def is_gated(self):
         """
         Boolean return value indicates if the fast counter is a gated counter
         (TRUE) or not (FALSE).
         """
-        return False
+        return bool(self._gated)
 
     def get_binwidth(self):
         """
         returns the width of a single timebin in the timetrace in seconds
         """
-        #FIXME: Must be implemented
-        return 2e-9
+        return self._bin_width_ns * 1e-9
 
     def get_data_trace(self):
         """
@@ -1143,9 +1182,16 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
             returnarray[gate_index, timebin_index]
         """
 
-        info_dict = {'elapsed_sweeps': None,
+        if self._tttr_histogram is None:
+            self.log.error('PicoHarp: Fast counter has not been configured.')
+            return np.zeros(0, dtype=np.int64), {'elapsed_sweeps': None, 'elapsed_time': None}
+
+        with self.threadlock:
+            data_trace = self._tttr_histogram.histogram.copy()
+            elapsed_sweeps = self._tttr_histogram.elapsed_sweeps
+        info_dict = {'elapsed_sweeps': elapsed_sweeps,
                      'elapsed_time': None}  # TODO : implement that according to hardware capabilities
-        return self.data_trace, info_dict
+        return data_trace, info_dict
 
     # =========================================================================
     #  Test routine for continuous readout
@@ -1160,43 +1206,119 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 
         self.meas_run = True
 
-        # start the device:
-        self.start(int(self._record_length_ns/1e6))
+        with self.threadlock:
+            if self._tttr_histogram is not None:
+                self._tttr_histogram.reset()
+                self._open_time_tag_log(append=False)
 
-        self.sigReadoutPicoharp.emit()
+        # start the device. The acquisition runs until stop_measure is called (or at most ACQTMAX)
+        self.start(self.ACQTMAX)
+        self._start_fifo_reader()
 
     def stop_measure(self):
-        """ By setting the Flag, the measurement should stop.  """
+        """ Stops the device, reads and analyzes the remaining records and
+        waits for the reader and decoder threads to finish.
+        """
+        if self._fifo_reader is not None and self._fifo_reader.is_running:
+            self._fifo_reader.stop()
+            self._log_fifo_reader_counters()
+        else:
+            self.stop_device()
         self.meas_run = False
 
+        with self.threadlock:
+            if self._tttr_histogram is not None and self._tttr_histogram.time_tag_log is not None:
+                self._tttr_histogram.time_tag_log.close()
+                self._tttr_histogram.time_tag_log = None
+        if self.module_state() == 'locked':
+            self.unlock()
 
-    def get_fresh_data_loop(self):
-        """ This method will be run infinitely until the measurement stops. """
+    def has_time_tag_log(self):
+        """ Check whether the fast counter can record the time tags of a measurement to file.
 
-        # for testing one can also take another array:
-        buffer, actual_counts = self.tttr_read_fifo()
-        #        buffer, actual_counts = [1,2,3,4,5,6,7,8,9], 9
+        @return bool: True if set_time_tag_log is supported, False otherwise
+        """
+        return True
 
-        # This analysis signel should be analyzed in a queued thread:
-        self.sigAnalyzeData.emit(buffer[0:actual_counts-1], actual_counts)
+    def set_time_tag_log(self, filepath):
+        """ Sets the file the photons of the following measurements are recorded to.
 
-        if not self.meas_run:
-            with self.threadlock:
-                self.unlock()
-                self.stop_device()
-                return
+        @param str filepath: path of the time tag log file, None to stop recording
 
-        print('get new data.')
-        # get the next data:
-        self.sigReadoutPicoharp.emit()
+        @return str: path of the time tag log file, None if not recording
 
+        The photons are written by the decoder thread with the time since their
+        sync in units of the record resolution.
+        """
+        self._time_tag_log_path = filepath
+        return self._time_tag_log_path
 
+    def _open_time_tag_log(self, append):
+        """ Opens the time tag log the decoder thread writes the photons to,
+        if set_time_tag_log has been called with a file path.
 
-    def analyze_received_data(self, arr_data, actual_counts):
+        @param bool append: continue the log of the paused measurement instead
+                            of overwriting the file
+        """
+        if self._time_tag_log_path is None:
+            return
+        try:
+            self._tttr_histogram.time_tag_log = TimeTagLogWriter(
+                self._time_tag_log_path,
+                resolution=self._time_tag_resolution_s,
+                number_of_gates=self._tttr_histogram.number_of_gates,
+                append=append)
+        except ValueError as err:
+            self.log.error('PicoHarp: Time tags are not recorded. {0}'.format(err))
+
+    def get_acquisition_counters(self):
+        """ Counters of the current (or last) TTTR acquisition.
+
+        @return dict: number of records read from the FIFO ('read_records'),
+                      analyzed ('processed_records'), dropped since no free
+                      buffer was available ('dropped_records') and number of
+                      device FIFO overflows ('fifo_overflows')
+        """
+        reader = self._fifo_reader
+        if reader is None:
+            return {'read_records': 0, 'processed_records': 0, 'dropped_records': 0,
+                    'fifo_overflows': 0}
+        return {'read_records': reader.read_records,
+                'processed_records': reader.processed_records,
+                'dropped_records': reader.dropped_records,
+                'fifo_overflows': reader.fifo_overflows}
+
+    def _start_fifo_reader(self):
+        """ Starts reading the FIFO in a reader thread and analyzing the
+        records in a decoder thread. Both run until stop_measure is called.
+        """
+        self._fifo_reader = TTTRFifoReader(
+            read_fifo=lambda buffer: self.tttr_read_fifo(buffer)[1],
+            process_records=self.analyze_received_data,
+            records_per_read=self.TTREADMAX,
+            number_of_buffers=self._fifo_buffers,
+            fifo_full=lambda: bool(self.get_flags() & self.FLAG_FIFOFULL),
+            stop_device=self.stop_device,
+            log=self.log)
+        self._fifo_reader.start()
+
+    def _log_fifo_reader_counters(self):
+        """ Reports records lost during the last acquisition. """
+        counters = self.get_acquisition_counters()
+        self.log.debug('PicoHarp: TTTR acquisition finished. {0}'.format(counters))
+        if counters['dropped_records'] > 0:
+            self.log.warning('PicoHarp: {0:d} of {1:d} TTTR records were dropped since the '
+                             'analysis could not keep up. Consider increasing "fifo_buffers".'
+                             ''.format(counters['dropped_records'], counters['read_records']))
+        if counters['fifo_overflows'] > 0:
+            self.log.warning('PicoHarp: The device FIFO overflowed during the acquisition.')
+
+    def analyze_received_data(self, arr_data):
         """ Analyze the actual data obtained from the TTTR mode of the device.
 
-        @param arr_data: numpy uint32 array with length 'actual_counts'.
-        @param actual_counts: int, number of read out events from the buffer.
+        @param arr_data: numpy uint32 array with the read out records.
+
+        This method is called in the decoder thread of the FIFO reader.
 
         Write the obtained arr_data to the predefined array data_trace,
         initialized in the configure method.
@@ -1272,36 +1394,9 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
                       the channel-number are set to high (i.e. 1).
         """
 
-        # at first just a simple test
-        time.sleep(0.2)
-
-        self.data_trace[self.count] = actual_counts
-        self.count += 1
-
-        if self.count > self._number_of_gates-1:
-            self.count = 0
-
-        if actual_counts == self.TTREADMAX:
-            self.log.warning('Overflow!')
-
-        print('Data analyzed.')
-
-#        self.result = []
-#        for entry in arr_data[0:actual_counts-1]:
-#
-#            # apply three bitmasks to extract the relavent numbers:
-#            overflow = entry & (2**(32-1) )
-#            marker_ch = entry & (2**(32-2)  + 2**(32-3) + 2**(32-4))
-#            time_tag = entry & (2**32 -1 - 2**(32-1) + 2**(32-2) + 2**(32-3) + 2**(32-4))
-
-
-
-
-
-
-
-
-
-
-
+        if self._tttr_histogram is None:
+            return
 
+        with self.threadlock:
+            self._tttr_histogram.add_records(arr_data)
+        return
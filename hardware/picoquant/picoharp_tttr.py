@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains numpy vectorized decoding and histogramming of the TTTR records (T2 and T3
+mode) of the PicoQuant PicoHarp 300. It does not depend on the device library, so it can be used
+offline with recorded or synthetic record streams.
+
+PicoHarp 300 T2 record (32 bit, starting from the MSB):
+    [ 4 bit channel | 28 bit time tag (4 ps resolution) ]
+PicoHarp 300 T3 record (32 bit, starting from the MSB):
+    [ 4 bit channel | 12 bit dtime (start-stop time) | 16 bit nsync (sync counter) ]
+
+The channel code 15 marks a special record. If the lower 4 bits of the time tag (T2) or dtime (T3)
+are zero it is an overflow of the time tag (T2) or sync counter (T3). Otherwise the bits are the
+external markers.
+
+TTTRFifoReader reads the FIFO of the device in a reader thread into a pool of preallocated buffers
+and hands them over to a decoder thread through a bounded queue.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import queue
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODE_T2 = 2
+MODE_T3 = 3
+T2_WRAPAROUND = 210698240
+T3_WRAPAROUND = 65536
+T2_RESOLUTION_PS = 4
+SPECIAL_CHANNEL = 15
+
+
+def decode_t2_records(records, overflow_offset=0):
+    """
+    Decodes T2 records.
+
+    @param numpy.ndarray records: uint32 T2 records
+    @param int overflow_offset: time tag offset accumulated by the overflows of earlier records
+
+    @return tuple: (channels, times, markers, overflow_offset)
+                    channels: uint8 array, channel of each record (15 for special records)
+                    times: int64 array, time of each record in units of 4 ps
+                    markers: uint8 array, marker bits of each record (0 for photons and overflows)
+                    overflow_offset: int, offset to pass on with the next records
+    """
+    records = np.asarray(records, dtype=np.uint32)
+    channels = (records >> np.uint32(28)).astype(np.uint8)
+    time_tags = records & np.uint32(0x0FFFFFFF)
+    special = channels == SPECIAL_CHANNEL
+    markers = np.where(special, time_tags & np.uint32(0xF), 0).astype(np.uint8)
+    overflows = np.cumsum(special & (markers == 0), dtype=np.int64)
+
+    times = overflows * T2_WRAPAROUND
+    times += overflow_offset
+    times += time_tags
+    if overflows.size > 0:
+        overflow_offset += int(overflows[-1]) * T2_WRAPAROUND
+    return channels, times, markers, overflow_offset
+
+
+def decode_t3_records(records, overflow_offset=0):
+    """
+    Decodes T3 records.
+
+    @param numpy.ndarray records: uint32 T3 records
+    @param int overflow_offset: sync counter offset accumulated by the overflows of earlier records
+
+    @return tuple: (channels, dtimes, nsyncs, markers, overflow_offset)
+                    channels: uint8 array, channel of each record (15 for special records)
+                    dtimes: uint16 array, time since the last sync in units of the resolution
+                    nsyncs: int64 array, number of the sync the record belongs to
+                    markers: uint8 array, marker bits of each record (0 for photons and overflows)
+                    overflow_offset: int, offset to pass on with the next records
+    """
+    records = np.asarray(records, dtype=np.uint32)
+    channels = (records >> np.uint32(28)).astype(np.uint8)
+    dtimes = ((records >> np.uint32(16)) & np.uint32(0xFFF)).astype(np.uint16)
+    special = channels == SPECIAL_CHANNEL
+    markers = np.where(special, dtimes & np.uint16(0xF), 0).astype(np.uint8)
+    overflows = np.cumsum(special & (markers == 0), dtype=np.int64)
+
+    nsyncs = overflows * T3_WRAPAROUND
+    nsyncs += overflow_offset
+    nsyncs += records & np.uint32(0xFFFF)
+    if overflows.size > 0:
+        overflow_offset += int(overflows[-1]) * T3_WRAPAROUND
+    return channels, dtimes, nsyncs, markers, overflow_offset
+
+
+class TTTRHistogram:
+    """
+    Bins the photons of a stream of PicoHarp 300 TTTR records into a histogram of the time since
+    the last sync, which is read record chunk by record chunk.
+
+    The sync is the sync counter in T3 mode and the records of the sync channel in T2 mode.
+    For a gated histogram the syncs are assigned to the gates one after another, i.e. the gate of
+    a photon is the number of its sync modulo the number of gates.
+    """
+
+    def __init__(self, mode, bin_width, number_of_bins, number_of_gates=0, photon_channels=None,
+                 sync_channel=0):
+        """
+        @param int mode: MODE_T2 or MODE_T3
+        @param int bin_width: width of a histogram bin in units of the record time resolution
+                              (4 ps in T2 mode, the device resolution in T3 mode)
+        @param int number_of_bins: number of histogram bins (per gate)
+        @param int number_of_gates: number of gates, 0 for an ungated histogram
+        @param list photon_channels: optional, channels whose records are binned. All channels
+                                     (except the sync channel in T2 mode) if None.
+        @param int sync_channel: the channel of the sync records (T2 mode only)
+        """
+        if mode not in (MODE_T2, MODE_T3):
+            raise ValueError('TTTR histogram mode must be {0:d} (T2) or {1:d} (T3), not {2}.'
+                             ''.format(MODE_T2, MODE_T3, mode))
+        self.mode = mode
+        self.bin_width = max(int(bin_width), 1)
+        self.number_of_bins = max(int(number_of_bins), 1)
+        self.number_of_gates = max(int(number_of_gates), 0)
+        self.photon_channels = None if photon_channels is None else list(photon_channels)
+        self.sync_channel = int(sync_channel)
+        # Optional time tag log (core.util.time_tag_log.TimeTagLogWriter) the photons are written to
+        self.time_tag_log = None
+        self.reset()
+
+    @property
+    def is_gated(self):
+        return self.number_of_gates > 0
+
+    def reset(self):
+        """
+        Clears the histogram, the counters and the state carried over between record chunks.
+        """
+        shape = (self.number_of_bins,)
+        if self.is_gated:
+            shape = (self.number_of_gates, self.number_of_bins)
+        self.histogram = np.zeros(shape, dtype=np.int64)
+        # Counters
+        self.processed_records = 0
+        self.binned_photons = 0
+        self.overflows = 0
+        self.marker_counts = np.zeros(4, dtype=np.int64)
+        self.number_of_syncs = 0
+        # State carried over between record chunks
+        self._overflow_offset = 0
+        self._last_sync_time = None
+        self._sync_offset = 0
+        return
+
+    def start_new_run(self):
+        """
+        Prepares the decoding of a restarted acquisition (e.g. after a pause) without clearing the
+        histogram. The device starts the time tags and the sync counter from zero again, so the
+        state carried over between record chunks is reset.
+        """
+        self._overflow_offset = 0
+        self._last_sync_time = None
+        if self.mode == MODE_T3:
+            # Continue the sync numbering after the last sync of the previous run
+            self._sync_offset = self.number_of_syncs + 1
+        return
+
+    @property
+    def elapsed_sweeps(self):
+        """
+        Number of complete sweeps (syncs for an ungated histogram, gate cycles otherwise).
+        """
+        if self.is_gated:
+            return self.number_of_syncs // self.number_of_gates
+        return self.number_of_syncs
+
+    def add_records(self, records):
+        """
+        Decodes a chunk of records and adds its photons to the histogram.
+
+        @param numpy.ndarray records: uint32 TTTR records in the order read from the device
+
+        @return int: number of photons added to the histogram
+        """
+        records = np.asarray(records, dtype=np.uint32)
+        if records.size == 0:
+            return 0
+
+        if self.mode == MODE_T3:
+            channels, dtimes, nsyncs, markers, self._overflow_offset = decode_t3_records(
+                records, self._overflow_offset)
+            photons = self._get_photon_mask(channels)
+            photon_syncs = nsyncs[photons] + self._sync_offset
+            delays = dtimes[photons]
+            self.number_of_syncs = self._sync_offset + int(nsyncs[-1])
+        else:
+            channels, times, markers, self._overflow_offset = decode_t2_records(
+                records, self._overflow_offset)
+            photon_syncs, delays = self._get_t2_delays(channels, times)
+
+        special = channels == SPECIAL_CHANNEL
+        self.processed_records += records.size
+        self.overflows += int(np.count_nonzero(special & (markers == 0)))
+        marker_bits = np.unpackbits(markers[special][:, np.newaxis], axis=1)[:, :3:-1]
+        self.marker_counts += marker_bits.sum(axis=0, dtype=np.int64)
+        if self.time_tag_log is not None:
+            self.time_tag_log.append(photon_syncs, delays)
+            self.time_tag_log.add_sweeps(self.number_of_syncs)
+        return self._bin_photons(photon_syncs, delays)
+
+    def _get_photon_mask(self, channels):
+        if self.photon_channels is None:
+            photons = channels != SPECIAL_CHANNEL
+            if self.mode == MODE_T2:
+                photons &= channels != self.sync_channel
+            return photons
+        return np.isin(channels, self.photon_channels)
+
+    def _get_t2_delays(self, channels, times):
+        """
+        Assigns the T2 photons to the last sync record before them.
+
+        @return tuple: (photon_syncs, delays)
+                        photon_syncs: int64 array, number of the sync of each photon
+                        delays: int64 array, time since the sync of each photon
+        """
+        is_sync = channels == self.sync_channel
+        sync_times = times[is_sync]
+        photons = self._get_photon_mask(channels)
+        photon_times = times[photons]
+
+        # index of the last sync before each photon within this chunk (-1: earlier chunk)
+        sync_indices = np.searchsorted(sync_times, photon_times, side='right') - 1
+        reference_times = np.empty(photon_times.size, dtype=np.int64)
+        in_chunk = sync_indices >= 0
+        reference_times[in_chunk] = sync_times[sync_indices[in_chunk]]
+        if self._last_sync_time is None:
+            # photons before the first sync can not be assigned
+            keep = in_chunk
+        else:
+            reference_times[~in_chunk] = self._last_sync_time
+            keep = np.ones(photon_times.size, dtype=bool)
+
+        photon_syncs = (self.number_of_syncs + sync_indices)[keep]
+        delays = (photon_times - reference_times)[keep]
+
+        if sync_times.size > 0:
+            self._last_sync_time = int(sync_times[-1])
+            self.number_of_syncs += sync_times.size
+        return photon_syncs, delays
+
+    def _bin_photons(self, photon_syncs, delays):
+        bins = np.asarray(delays, dtype=np.int64) // self.bin_width
+        in_range = (bins >= 0) & (bins < self.number_of_bins)
+        bins = bins[in_range]
+        if self.is_gated:
+            gates = np.asarray(photon_syncs, dtype=np.int64)[in_range] % self.number_of_gates
+            bins += gates * self.number_of_bins
+        counts = np.bincount(bins, minlength=self.histogram.size)
+        self.histogram.reshape(-1)[:] += counts
+        self.binned_photons += bins.size
+        return bins.size
+
+
+class TTTRFifoReader:
+    """
+    Acquisition pipeline for TTTR records. A reader thread reads the device FIFO into a pool of
+    preallocated buffers and passes the filled buffers on to a decoder thread through a bounded
+    queue. A buffer returns to the pool after its records have been processed, so it is never
+    overwritten while being processed.
+
+    If no free buffer is available, the FIFO is still read (into a spare buffer) to keep the device
+    FIFO from overflowing, but the records are dropped and counted.
+
+    All device functions (read_fifo, fifo_full, stop_device) are only called in the reader thread.
+    """
+
+    def __init__(self, read_fifo, process_records, records_per_read, number_of_buffers=8,
+                 fifo_full=None, stop_device=None, log=None):
+        """
+        @param callable read_fifo: reads records into the passed uint32 array (of length
+                                   records_per_read) and returns the number of records read
+        @param callable process_records: called in the decoder thread with the array of records of
+                                         each read
+        @param int records_per_read: maximum number of records per read (buffer size)
+        @param int number_of_buffers: number of buffers in the pool
+        @param callable fifo_full: optional, returns True if the device FIFO has overflowed
+        @param callable stop_device: optional, stops the device measurement before the final reads
+        @param logging.Logger log: optional, logger to report errors to
+        """
+        self._read_fifo = read_fifo
+        self._process_records = process_records
+        self._fifo_full = fifo_full
+        self._stop_device = stop_device
+        self._log = logger if log is None else log
+
+        number_of_buffers = max(int(number_of_buffers), 1)
+        self._free_buffers = queue.Queue()
+        for ii in range(number_of_buffers):
+            self._free_buffers.put(np.zeros(int(records_per_read), dtype=np.uint32))
+        self._spare_buffer = np.zeros(int(records_per_read), dtype=np.uint32)
+        self._filled_buffers = queue.Queue(maxsize=number_of_buffers)
+
+        self._stop_request = threading.Event()
+        self._reader_thread = None
+        self._decoder_thread = None
+
+        # Counters
+        self.read_records = 0
+        self.processed_records = 0
+        self.dropped_records = 0
+        self.fifo_overflows = 0
+        self.error = None
+
+    @property
+    def is_running(self):
+        return self._reader_thread is not None and self._reader_thread.is_alive()
+
+    def start(self):
+        """
+        Starts the reader and decoder threads.
+        """
+        if self._reader_thread is not None:
+            raise RuntimeError('TTTRFifoReader can only be started once.')
+        self._reader_thread = threading.Thread(target=self._read_loop, name='TTTRFifoReader',
+                                               daemon=True)
+        self._decoder_thread = threading.Thread(target=self._decode_loop, name='TTTRDecoder',
+                                                daemon=True)
+        self._decoder_thread.start()
+        self._reader_thread.start()
+        return
+
+    def stop(self, timeout=None):
+        """
+        Stops the acquisition. The reader thread stops the device, reads the remaining records from
+        the FIFO and the decoder thread processes all of them before both threads end.
+
+        @param float timeout: optional, maximum time in seconds to wait for each thread
+
+        @return bool: True if both threads have ended
+        """
+        self._stop_request.set()
+        for thread in (self._reader_thread, self._decoder_thread):
+            if thread is not None:
+                thread.join(timeout)
+        return not any(thread is not None and thread.is_alive() for thread in
+                       (self._reader_thread, self._decoder_thread))
+
+    def _read_loop(self):
+        try:
+            stopping = False
+            while True:
+                if not stopping and self._stop_request.is_set():
+                    # Read the records remaining in the FIFO after the device has been stopped
+                    stopping = True
+                    if self._stop_device is not None:
+                        self._stop_device()
+                number_of_records = self._read_buffer()
+                if stopping and number_of_records == 0:
+                    break
+                if not stopping and self._fifo_full is not None and self._fifo_full():
+                    self.fifo_overflows += 1
+                    self._log.error('TTTR FIFO of the device has overflowed. Records are lost.')
+                    self._stop_request.set()
+        except Exception as err:
+            self.error = err
+            self._log.exception('Reading the TTTR FIFO failed.')
+        finally:
+            self._filled_buffers.put(None)
+        return
+
+    def _read_buffer(self):
+        try:
+            buffer = self._free_buffers.get_nowait()
+        except queue.Empty:
+            buffer = None
+
+        if buffer is None:
+            number_of_records = int(self._read_fifo(self._spare_buffer))
+            self.dropped_records += number_of_records
+        else:
+            number_of_records = int(self._read_fifo(buffer))
+            if number_of_records > 0:
+                self._filled_buffers.put((buffer, number_of_records))
+            else:
+                self._free_buffers.put(buffer)
+        self.read_records += number_of_records
+        return number_of_records
+
+    def _decode_loop(self):
+        while True:
+            item = self._filled_buffers.get()
+            if item is None:
+                break
+            buffer, number_of_records = item
+            try:
+                self._process_records(buffer[:number_of_records])
+            except Exception as err:
+                self.error = err
+                self._log.exception('Processing of TTTR records failed.')
+            finally:
+                self._free_buffers.put(buffer)
+            self.processed_records += number_of_records
+        return
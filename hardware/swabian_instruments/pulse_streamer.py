@@ -27,13 +27,13 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from core.module import Base, ConfigOption
 from core.util.modules import get_home_dir
+from core.util.pulse_stream import load_pulse_stream, save_pulse_stream
 from interface.pulser_interface import PulserInterface, PulserConstraints
 from collections import OrderedDict
 
 import grpc
 import os
 import hardware.swabian_instruments.pulse_streamer_pb2 as pulse_streamer_pb2
-import dill
 
 class PulseStreamer(Base, PulserInterface):
     """ Methods to control PulseStreamer.
@@ -224,13 +224,19 @@ class PulseStreamer(Base, PulserInterface):
                            '"load_asset" call ignored.'.format(asset_name))
             return -1
 
-        # get samples from file
+        # get pulses from file
         filepath = os.path.join(self.host_waveform_directory, asset_name + '.pstream')
-        pulse_sequence_raw = dill.load(open(filepath, 'rb'))
+        try:
+            pulse_sequence_raw = load_pulse_stream(filepath)
+        except ValueError:
+            self.log.exception('Unable to read pulse stream file of asset "{0}".\n'
+                               '"load_asset" call ignored.'.format(asset_name))
+            return -1
 
         pulse_sequence = []
-        for pulse in pulse_sequence_raw:
-            pulse_sequence.append(pulse_streamer_pb2.PulseMessage(ticks=pulse[0], digi=pulse[1], ao0=0, ao1=1))
+        for ticks, digi in zip(pulse_sequence_raw['ticks'].tolist(),
+                               pulse_sequence_raw['digi'].tolist()):
+            pulse_sequence.append(pulse_streamer_pb2.PulseMessage(ticks=ticks, digi=digi, ao0=0, ao1=1))
 
         blank_pulse = pulse_streamer_pb2.PulseMessage(ticks=0, digi=0, ao0=0, ao1=0)
         laser_on = pulse_streamer_pb2.PulseMessage(ticks=0, digi=self._convert_to_bitmask([self._laser_channel]), ao0=0, ao1=0)
@@ -242,6 +248,19 @@ class PulseStreamer(Base, PulserInterface):
         self.current_loaded_asset = asset_name
         return 0
 
+    def write_pulse_stream(self, name, pulses):
+        """ Saves a pulse stream compiled directly from a PulseBlockEnsemble (see
+        SequenceGeneratorLogic.compile_pulse_stream) as asset on the host PC.
+
+        @param str name: name of the asset to create
+        @param numpy.ndarray pulses: pulse stream of dtype core.util.pulse_stream.PULSE_STREAM_DTYPE
+
+        @return list: names of the created files
+        """
+        filename = name + '.pstream'
+        save_pulse_stream(os.path.join(self.host_waveform_directory, filename), pulses)
+        return [filename]
+
     def clear_all(self):
         """ Clears all loaded waveforms from the pulse generators RAM.
 
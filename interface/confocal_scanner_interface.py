@@ -162,6 +162,33 @@ class ConfocalScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    def has_multi_line_scan(self):
+        """ Asks the scanner whether it can scan several lines in one hardware run with scan_lines.
+
+        @return bool: True if scan_lines is supported, False otherwise
+
+        Scanners not implementing scan_lines do not need to implement this method either.
+        Callers have to fall back to scan_line for every single line in that case.
+        """
+        return False
+
+    def scan_lines(self, line_paths=None, pixel_clock=False):
+        """ Scans several lines of equal length in one go and returns the counts on those lines.
+
+        @param float[l][n][k] line_paths: l lines, each an array of n axes with k pixel positions
+        @param bool pixel_clock: whether we need to output a pixel clock for these lines
+
+        @return float[l][k][m]: the photon counts per second for l lines of k pixels with m
+                                channels
+
+        The lines are scanned one after another without stopping in between, so the next line
+        starts right at the last pixel of the previous one. Only available if
+        has_multi_line_scan returns True.
+        """
+        raise NotImplementedError(
+            'Scanner {0} does not support scanning several lines at once.'.format(
+                type(self).__name__))
+
     @abc.abstractmethod
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
@@ -169,3 +169,25 @@ class FastCounterInterface(metaclass=InterfaceMetaclass):
         If the hardware does not support these features, the values should be None
         """
         pass
+
+    def has_time_tag_log(self):
+        """ Check whether the fast counter can record the time tags of a measurement to file.
+
+        @return bool: True if set_time_tag_log is supported, False otherwise (default)
+        """
+        return False
+
+    def set_time_tag_log(self, filepath):
+        """ Sets the time tag log file of the following measurements.
+
+        @param str filepath: path of the time tag log file, None to stop recording
+
+        @return str: path of the time tag log file, None if not recording
+
+        Each start_measure creates the file anew and writes the detection events to it in the
+        format of core.util.time_tag_log, in addition to the histogram of get_data_trace.
+        The file is complete after stop_measure.
+        Raises NotImplementedError if has_time_tag_log returns False (default).
+        """
+        raise NotImplementedError(
+            'Fast counter {0} does not support recording time tags.'.format(type(self).__name__))
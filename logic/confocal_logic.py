@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from qtpy import QtCore
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 import time
 import datetime
@@ -264,6 +265,10 @@ class ConfocalLogic(GenericLogic):
     return_slowness = StatusVar(default=50)
     max_history_length = StatusVar(default=10)
 
+    # config options
+    # maximum duration of the image lines sent to the scanner at once (in s)
+    _scan_batch_duration = ConfigOption('scan_batch_duration', 0.5)
+
     # signals
     signal_start_scanning = QtCore.Signal(str)
     signal_continue_scanning = QtCore.Signal(str)
@@ -298,11 +303,18 @@ class ConfocalLogic(GenericLogic):
         self.depth_img_is_xz = True
         self.permanent_scan = False
 
+        # precomputed scanner path and the batch of lines currently scanned
+        self._scan_trajectory = None
+        self._scan_batch = None
+        self._scan_executor = None
+        self._multi_line_scan = False
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
         self._scanning_device = self.confocalscanner1()
         self._save_logic = self.savelogic()
+        self._scan_executor = ThreadPoolExecutor(max_workers=1)
 
         # Reads in the maximal scanning range. The unit of that scan range is micrometer!
         self.x_range = self._scanning_device.get_position_range()[0]
@@ -356,6 +368,8 @@ class ConfocalLogic(GenericLogic):
         for state in reversed(self.history):
             self._statusVariables['history_{0}'.format(histindex)] = state.serialize()
             histindex += 1
+        self._scan_executor.shutdown(wait=True)
+        self._scan_executor = None
         return 0
 
     def switch_hardware(self, to_on=False):
@@ -484,10 +498,6 @@ class ConfocalLogic(GenericLogic):
         self._YL = self._Y
         self._AL = np.zeros(self._XL.shape)
 
-        # Arrays for retrace line
-        self._return_XL = np.linspace(self._XL[-1], self._XL[0], self.return_slowness)
-        self._return_AL = np.zeros(self._return_XL.shape)
-
         if self._zscan:
             self._image_vert_axis = self._Z
             # update image scan direction from setting
@@ -530,10 +540,6 @@ class ConfocalLogic(GenericLogic):
                 z_value_matrix = np.full((len(self._Y), len(self._image_vert_axis)), self._Z)
                 self.depth_image[:, :, 2] = z_value_matrix.transpose()
 
-                # now we are scanning along the y-axis, so we need a new return line along Y:
-                self._return_YL = np.linspace(self._YL[-1], self._YL[0], self.return_slowness)
-                self._return_AL = np.zeros(self._return_YL.shape)
-
             self.sigImageDepthInitialized.emit()
 
         # xy scan is in xy plane
@@ -557,7 +563,8 @@ class ConfocalLogic(GenericLogic):
                 (len(self._image_vert_axis), len(self._X)))
 
             self.sigImageXYInitialized.emit()
-        return 0
+
+        return self._compute_scan_trajectory()
 
     def start_scanner(self):
         """Setting up the scanner device and starts the scanning procedure
@@ -590,6 +597,7 @@ class ConfocalLogic(GenericLogic):
             self.set_position('scanner')
             return -1
 
+        self._multi_line_scan = self._scanning_device.has_multi_line_scan()
         self.signal_scan_lines_next.emit()
         return 0
 
@@ -600,6 +608,8 @@ class ConfocalLogic(GenericLogic):
         """
         self.module_state.lock()
         self._scanning_device.module_state.lock()
+        # the image might have been restored from the history in the meantime
+        self._compute_scan_trajectory()
 
         clock_status = self._scanning_device.set_up_scanner_clock(
             clock_frequency=self._clock_frequency)
@@ -619,6 +629,7 @@ class ConfocalLogic(GenericLogic):
             self.set_position('scanner')
             return -1
 
+        self._multi_line_scan = self._scanning_device.has_multi_line_scan()
         self.signal_scan_lines_next.emit()
         return 0
 
@@ -708,130 +719,34 @@ class ConfocalLogic(GenericLogic):
         return self._scanning_device.get_scanner_count_channels()
 
     def _scan_line(self):
-        """scanning an image in either depth or xy
+        """ Collects the counts of the last batch of image lines and starts the next batch.
 
+        The next batch is handed to the scanner before the counts of the finished one are written
+        into the image, so the scanner keeps running while the image is updated.
         """
-        # stops scanning
-        if self.stopRequested:
-            with self.threadlock:
-                self.kill_scanner()
-                self.stopRequested = False
-                self.module_state.unlock()
-                self.signal_xy_image_updated.emit()
-                self.signal_depth_image_updated.emit()
-                self.set_position('scanner')
-                if self._zscan:
-                    self._depth_line_pos = self._scan_counter
-                else:
-                    self._xy_line_pos = self._scan_counter
-                # add new history entry
-                new_history = ConfocalHistoryEntry(self)
-                new_history.snapshot(self)
-                self.history.append(new_history)
-                if len(self.history) > self.max_history_length:
-                    self.history.pop(0)
-                self.history_index = len(self.history) - 1
-                return
-
         image = self.depth_image if self._zscan else self.xy_image
-        n_ch = len(self.get_scanner_axes())
         s_ch = len(self.get_scanner_count_channels())
-
-        try:
-            if self._scan_counter == 0:
-                # make a line from the current cursor position to
-                # the starting position of the first scan line of the scan
-                rs = self.return_slowness
-                lsx = np.linspace(self._current_x, image[self._scan_counter, 0, 0], rs)
-                lsy = np.linspace(self._current_y, image[self._scan_counter, 0, 1], rs)
-                lsz = np.linspace(self._current_z, image[self._scan_counter, 0, 2], rs)
-                if n_ch <= 3:
-                    start_line = np.vstack([lsx, lsy, lsz][0:n_ch])
-                else:
-                    start_line = np.vstack(
-                        [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
-                # move to the start position of the scan, counts are thrown away
-                start_line_counts = self._scanning_device.scan_line(start_line)
-                if np.any(start_line_counts == -1):
+        number_of_rows, pixels = image.shape[0], image.shape[1]
+
+        finished_batch = self._scan_batch
+        self._scan_batch = None
+        line_counts = None
+        next_row = self._scan_counter
+        if finished_batch is not None:
+            first_row, rows, future = finished_batch
+            next_row = first_row + rows
+            try:
+                line_counts = future.result()
+                if np.any(line_counts == -1):
+                    line_counts = None
                     self.stopRequested = True
-                    self.signal_scan_lines_next.emit()
-                    return
-
-            # adjust z of line in image to current z before building the line
-            if not self._zscan:
-                z_shape = image[self._scan_counter, :, 2].shape
-                image[self._scan_counter, :, 2] = self._current_z * np.ones(z_shape)
-
-            # make a line in the scan, _scan_counter says which one it is
-            lsx = image[self._scan_counter, :, 0]
-            lsy = image[self._scan_counter, :, 1]
-            lsz = image[self._scan_counter, :, 2]
-            if n_ch <= 3:
-                line = np.vstack([lsx, lsy, lsz][0:n_ch])
-            else:
-                line = np.vstack(
-                    [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
-
-            # scan the line in the scan
-            line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
-            if np.any(line_counts == -1):
-                self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
-
-            # make a line to go to the starting position of the next scan line
-            if self.depth_img_is_xz or not self._zscan:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                        self._return_XL,
-                        image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                        image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape)
-                    ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            self._return_XL,
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
-                            np.ones(self._return_XL.shape) * self._current_a
-                        ])
-            else:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape)
-                        ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
-                            np.ones(self._return_YL.shape) * self._current_a
-                        ])
-
-            # return the scanner to the start of next line, counts are thrown away
-            return_line_counts = self._scanning_device.scan_line(return_line)
-            if np.any(return_line_counts == -1):
+            except:
+                self.log.exception('The scan went wrong, killing the scanner.')
                 self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
-
-            # update image with counts from the line we just scanned
-            if self._zscan:
-                if self.depth_img_is_xz:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                else:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                self.signal_depth_image_updated.emit()
-            else:
-                self.xy_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                self.signal_xy_image_updated.emit()
-
-            # next line in scan
-            self._scan_counter += 1
 
+        try:
             # stop scanning when last line scan was performed and makes scan not continuable
-            if self._scan_counter >= np.size(self._image_vert_axis):
+            if next_row >= number_of_rows:
                 if not self.permanent_scan:
                     self.stop_scanning()
                     if self._zscan:
@@ -839,13 +754,139 @@ class ConfocalLogic(GenericLogic):
                     else:
                         self._xyscan_continuable = False
                 else:
-                    self._scan_counter = 0
+                    next_row = 0
+
+            if not self.stopRequested:
+                self._scan_batch = self._start_scan_batch(next_row)
 
-            self.signal_scan_lines_next.emit()
+            # update image with counts from the lines just scanned
+            if line_counts is not None:
+                image[first_row:first_row + rows, :, 3:3 + s_ch] = line_counts[:, :pixels, :s_ch]
+                self._scan_counter = next_row
+                if self._zscan:
+                    self.signal_depth_image_updated.emit()
+                else:
+                    self.signal_xy_image_updated.emit()
         except:
             self.log.exception('The scan went wrong, killing the scanner.')
-            self.stop_scanning()
-            self.signal_scan_lines_next.emit()
+            self.stopRequested = True
+
+        # the scan goes on as soon as the running batch is done
+        if self._scan_batch is not None:
+            return
+
+        # stops scanning
+        with self.threadlock:
+            self.kill_scanner()
+            self.stopRequested = False
+            self.module_state.unlock()
+            self.signal_xy_image_updated.emit()
+            self.signal_depth_image_updated.emit()
+            self.set_position('scanner')
+            if self._zscan:
+                self._depth_line_pos = self._scan_counter
+            else:
+                self._xy_line_pos = self._scan_counter
+            # add new history entry
+            new_history = ConfocalHistoryEntry(self)
+            new_history.snapshot(self)
+            self.history.append(new_history)
+            if len(self.history) > self.max_history_length:
+                self.history.pop(0)
+            self.history_index = len(self.history) - 1
+
+    def _compute_scan_trajectory(self):
+        """ Precomputes the scanner path for all lines of the current image.
+
+        Each row of the trajectory holds the scan line followed by the return line back to the
+        start of that line. A batch of consecutive image lines is therefore one contiguous block
+        of the trajectory. The z position of xy scans and the a position are filled in when a
+        batch is started, since they can still be changed during the scan.
+        """
+        image = self.depth_image if self._zscan else self.xy_image
+        n_ch = len(self.get_scanner_axes())
+        n_pos = min(n_ch, 3)
+        rows, pixels = image.shape[0], image.shape[1]
+        return_samples = self.return_slowness
+
+        trajectory = np.empty((rows, n_ch, pixels + return_samples))
+        trajectory[:, :n_pos, :pixels] = image[:, :, :n_pos].transpose(0, 2, 1)
+
+        # return line from the end of each line back to its start
+        line_start = image[:, 0, :n_pos, np.newaxis]
+        line_end = image[:, -1, :n_pos, np.newaxis]
+        ramp = np.linspace(0, 1, return_samples)
+        trajectory[:, :n_pos, pixels:] = line_end + (line_start - line_end) * ramp
+        if n_ch > 3:
+            trajectory[:, 3:, :] = self._current_a
+
+        self._scan_trajectory = trajectory
+        return 0
+
+    def _start_scan_batch(self, first_row):
+        """ Sends the next lines of the trajectory to the scanner in the scan executor.
+
+        As many lines as fit into scan_batch_duration are scanned in one go.
+        signal_scan_lines_next is emitted as soon as the scanner has finished.
+
+        @param int first_row: index of the first image line of the batch
+
+        @return tuple: first row, number of rows and the future of the scanner call
+        """
+        image = self.depth_image if self._zscan else self.xy_image
+        n_ch = len(self.get_scanner_axes())
+        samples_per_row = self._scan_trajectory.shape[2]
+
+        rows = int(self._scan_batch_duration * self._clock_frequency / samples_per_row)
+        rows = max(1, min(rows, image.shape[0] - first_row))
+        batch = self._scan_trajectory[first_row:first_row + rows]
+
+        # adjust z of lines in image to current z before building the lines
+        if not self._zscan:
+            image[first_row:first_row + rows, :, 2] = self._current_z
+            if n_ch > 2:
+                batch[:, 2, :] = self._current_z
+        if n_ch > 3:
+            batch[:, 3, :] = self._current_a
+
+        start_line = None
+        if first_row == 0:
+            # make a line from the current cursor position to
+            # the starting position of the first scan line of the scan
+            current = np.array([self._current_x, self._current_y, self._current_z,
+                                self._current_a][:n_ch])[:, np.newaxis]
+            ramp = np.linspace(0, 1, self.return_slowness)
+            start_line = current + (batch[0, :, :1] - current) * ramp
+
+        future = self._scan_executor.submit(self._scan_lines, batch, start_line)
+        future.add_done_callback(lambda f: self.signal_scan_lines_next.emit())
+        return first_row, rows, future
+
+    def _scan_lines(self, lines, start_line=None):
+        """ Scans a batch of image lines. Runs in the scan executor.
+
+        @param numpy.ndarray lines: scanner path of shape (lines, axes, samples per line)
+        @param numpy.ndarray start_line: optional, path of shape (axes, samples) to move to the
+                                         first line, counts are thrown away
+
+        @return numpy.ndarray: counts of shape (lines, samples per line, channels)
+
+        Scanners without multi-line support (see has_multi_line_scan) scan the lines one by one.
+        """
+        if start_line is not None:
+            start_line_counts = self._scanning_device.scan_line(start_line)
+            if np.any(start_line_counts == -1):
+                return start_line_counts
+        if self._multi_line_scan:
+            return self._scanning_device.scan_lines(lines, pixel_clock=True)
+
+        line_counts = list()
+        for line in lines:
+            counts = self._scanning_device.scan_line(line, pixel_clock=True)
+            if np.any(counts == -1):
+                return counts
+            line_counts.append(counts)
+        return np.stack(line_counts)
 
     def save_xy_data(self, colorscale_range=None, percentile_range=None):
         """ Save the current confocal xy data to file.
@@ -907,14 +948,14 @@ class ConfocalLogic(GenericLogic):
                 'of entries where the Signal is in counts/s:'] = self.xy_image[:, :, 3 + n]
 
             filelabel = 'confocal_xy_image_{0}'.format(ch.replace('/', ''))
-            self._save_logic.save_data(image_data,
-                                       filepath=filepath,
-                                       timestamp=timestamp,
-                                       parameters=parameters,
-                                       filelabel=filelabel,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       plotfig=figs[ch])
+            self._save_logic.save_data_async(image_data,
+                                             filepath=filepath,
+                                             timestamp=timestamp,
+                                             parameters=parameters,
+                                             filelabel=filelabel,
+                                             fmt='%.6e',
+                                             delimiter='\t',
+                                             plotfig=figs[ch])
 
         # prepare the full raw data in an OrderedDict:
         data = OrderedDict()
@@ -927,15 +968,16 @@ class ConfocalLogic(GenericLogic):
 
         # Save the raw data to file
         filelabel = 'confocal_xy_data'
-        self._save_logic.save_data(data,
-                                   filepath=filepath,
-                                   timestamp=timestamp,
-                                   parameters=parameters,
-                                   filelabel=filelabel,
-                                   fmt='%.6e',
-                                   delimiter='\t')
-
-        self.log.debug('Confocal Image saved.')
+        self._save_logic.save_data_async(data,
+                                         filepath=filepath,
+                                         timestamp=timestamp,
+                                         parameters=parameters,
+                                         filelabel=filelabel,
+                                         fmt='%.6e',
+                                         delimiter='\t',
+                                         copy_data=False)
+
+        self.log.debug('Confocal Image queued for saving.')
         self.signal_xy_data_saved.emit()
         return
 
@@ -1000,14 +1042,14 @@ class ConfocalLogic(GenericLogic):
                 'of entries where the Signal is in counts/s:'] = self.depth_image[:, :, 3 + n]
 
             filelabel = 'confocal_depth_image_{0}'.format(ch.replace('/', ''))
-            self._save_logic.save_data(image_data,
-                                       filepath=filepath,
-                                       timestamp=timestamp,
-                                       parameters=parameters,
-                                       filelabel=filelabel,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       plotfig=figs[ch])
+            self._save_logic.save_data_async(image_data,
+                                             filepath=filepath,
+                                             timestamp=timestamp,
+                                             parameters=parameters,
+                                             filelabel=filelabel,
+                                             fmt='%.6e',
+                                             delimiter='\t',
+                                             plotfig=figs[ch])
 
         # prepare the full raw data in an OrderedDict:
         data = OrderedDict()
@@ -1020,15 +1062,16 @@ class ConfocalLogic(GenericLogic):
 
         # Save the raw data to file
         filelabel = 'confocal_depth_data'
-        self._save_logic.save_data(data,
-                                   filepath=filepath,
-                                   timestamp=timestamp,
-                                   parameters=parameters,
-                                   filelabel=filelabel,
-                                   fmt='%.6e',
-                                   delimiter='\t')
-
-        self.log.debug('Confocal Image saved.')
+        self._save_logic.save_data_async(data,
+                                         filepath=filepath,
+                                         timestamp=timestamp,
+                                         parameters=parameters,
+                                         filelabel=filelabel,
+                                         fmt='%.6e',
+                                         delimiter='\t',
+                                         copy_data=False)
+
+        self.log.debug('Confocal Image queued for saving.')
         self.signal_depth_data_saved.emit()
         return
 
@@ -22,11 +22,14 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 from qtpy import QtCore
 from collections import OrderedDict
 import numpy as np
+import os
 import time
 import matplotlib.pyplot as plt
 
-from core.module import Connector, StatusVar
+from core.module import Connector, ConfigOption, StatusVar
+from core.util.ringbuffer import RingBuffer, RunningMedian
 from logic.generic_logic import GenericLogic
+from logic.save_logic import DataStreamWriter
 from interface.slow_counter_interface import CountingMode
 from core.util.mutex import Mutex
 
@@ -62,6 +65,9 @@ class CounterLogic(GenericLogic):
     counter1 = Connector(interface='SlowCounterInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # number of samples buffered in memory before they are written to the data file while saving
+    _save_chunk_size = ConfigOption('save_chunk_size', 1000)
+
     # status vars
     _count_length = StatusVar('count_length', 300)
     _smooth_window_length = StatusVar('smooth_window_length', 10)
@@ -80,6 +86,8 @@ class CounterLogic(GenericLogic):
 
         #locking for thread safety
         self.threadlock = Mutex()
+        # serializes the updates of the count trace buffers and the copies handed out
+        self._buffer_lock = Mutex()
 
         self.log.debug('The following configuration was found.')
 
@@ -115,10 +123,10 @@ class CounterLogic(GenericLogic):
         number_of_detectors = constraints.max_detectors
 
         # initialize data arrays
-        self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-        self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
+        self._init_count_buffers()
         self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
         self._already_counted_samples = 0  # For gated counting
+        # rows recorded while saving. A DataStreamWriter during saving, afterwards an array.
         self._data_to_save = []
 
         # Flag to stop the loop
@@ -140,9 +148,41 @@ class CounterLogic(GenericLogic):
         if self.module_state() == 'locked':
             self._stopCount_wait()
 
+        # Make sure all streamed data ends up on disk
+        if isinstance(self._data_to_save, DataStreamWriter):
+            self._data_to_save.close()
+
         self.sigCountDataNext.disconnect()
         return
 
+    @property
+    def countdata(self):
+        """ The count trace of all channels with shape (channels, count_length).
+
+        The oldest sample comes first, the newest one last. This is a copy, since the view of the
+        ring buffer is overwritten by the next sample arriving in the counting thread.
+        """
+        with self._buffer_lock:
+            return self._count_buffer.view.copy()
+
+    @property
+    def countdata_smoothed(self):
+        """ The median filtered count trace of all channels with shape (channels, count_length).
+
+        This is a copy, see countdata.
+        """
+        with self._buffer_lock:
+            return self._smoothed_buffer.view.copy()
+
+    def _init_count_buffers(self):
+        """ Creates the ring buffers for the count traces and the running median filter.
+        """
+        channels = len(self.get_channels())
+        self._count_buffer = RingBuffer(self._count_length, channels)
+        self._smoothed_buffer = RingBuffer(self._count_length, channels)
+        self._running_median = RunningMedian(self._smooth_window_length, channels)
+        return
+
     def get_hardware_constraints(self):
         """
         Retrieve the hardware constrains from the counter device.
@@ -260,16 +300,25 @@ class CounterLogic(GenericLogic):
 
     def start_saving(self, resume=False):
         """
-        Sets up start-time and initializes data array, if not resuming, and changes saving state.
-        If the counter is not running it will be started in order to have data to save.
+        Sets up start-time and opens the data file to stream into, if not resuming, and changes
+        saving state. If the counter is not running it will be started in order to have data to
+        save.
+
+        The counts are written in chunks to a binary data file in the 'Counter' directory while
+        they are acquired, so memory consumption stays constant and the data survives a crash.
 
         @return bool: saving state
         """
-        if not resume:
-            self._data_to_save = []
-            self._saving_start_time = time.time()
+        # the count loop writes to the data stream while holding the threadlock
+        with self.threadlock:
+            if not resume:
+                self._saving_start_time = time.time()
+                self._open_save_stream()
+            elif not isinstance(self._data_to_save, DataStreamWriter) or self._data_to_save.closed:
+                # continue with the previously recorded data in a new file
+                self._open_save_stream(previous_rows=self._data_to_save[:])
 
-        self._saving = True
+            self._saving = True
 
         # If the counter is not running, then it should start running so there is data to save
         if self.module_state() != 'locked':
@@ -278,17 +327,62 @@ class CounterLogic(GenericLogic):
         self.sigSavingStatusChanged.emit(self._saving)
         return self._saving
 
+    def _open_save_stream(self, previous_rows=None):
+        """
+        Opens a new data file to stream the count trace into while saving.
+
+        @param numpy.ndarray previous_rows: optional, rows to write to the new file first
+        """
+        if isinstance(self._data_to_save, DataStreamWriter):
+            self._data_to_save.close()
+
+        parameters = OrderedDict()
+        parameters['Start counting time'] = time.strftime('%d.%m.%Y %Hh:%Mmin:%Ss', time.localtime(self._saving_start_time))
+        parameters['Count frequency (Hz)'] = self._count_frequency
+        parameters['Oversampling (Samples)'] = self._counting_samples
+        parameters['Smooth Window Length (# of events)'] = self._smooth_window_length
+
+        # gated counting only records the first channel
+        if self._counting_mode == CountingMode['CONTINUOUS']:
+            channels = len(self.get_channels())
+        else:
+            channels = 1
+        header = 'Time (s)'
+        for i in range(channels):
+            header = header + '\tSignal{0} (counts/s)'.format(i)
+
+        self._data_to_save = self._save_logic.open_data_stream(
+            column_header=header,
+            columns=channels + 1,
+            parameters=parameters,
+            filepath=self._save_logic.get_path_for_module(module_name='Counter'),
+            filelabel='count_trace',
+            module_name='counter_logic',
+            chunk_size=self._save_chunk_size)
+        if previous_rows is not None and len(previous_rows) > 0:
+            self._data_to_save.write(previous_rows)
+        return
+
     def save_data(self, to_file=True, postfix=''):
-        """ Save the counter trace data and writes it to a file.
+        """ Stop saving the counter trace data and keep the data file.
 
-        @param bool to_file: indicate, whether data have to be saved to file
+        @param bool to_file: indicate, whether data have to be saved to file. If False the streamed
+                             data file is removed and the data is only returned.
         @param str postfix: an additional tag, which will be added to the filename upon save
 
-        @return dict parameters: Dictionary which contains the saving parameters
+        @return (numpy.ndarray, dict): The recorded data (rows of time and counts) and a
+                                       dictionary which contains the saving parameters
         """
-        # stop saving thus saving state has to be set to False
-        self._saving = False
-        self._saving_stop_time = time.time()
+        # stop saving thus saving state has to be set to False. The count loop checks the saving
+        # state and writes to the data stream while holding the threadlock, so the stream is
+        # closed under the same lock.
+        with self.threadlock:
+            self._saving = False
+            self._saving_stop_time = time.time()
+            stream_open = (isinstance(self._data_to_save, DataStreamWriter)
+                           and not self._data_to_save.closed)
+            if stream_open:
+                self._data_to_save.close()
 
         # write the parameters:
         parameters = OrderedDict()
@@ -298,25 +392,29 @@ class CounterLogic(GenericLogic):
         parameters['Oversampling (Samples)'] = self._counting_samples
         parameters['Smooth Window Length (# of events)'] = self._smooth_window_length
 
-        if to_file:
-            # If there is a postfix then add separating underscore
-            if postfix == '':
-                filelabel = 'count_trace'
-            else:
-                filelabel = 'count_trace_' + postfix
-
-            # prepare the data in a dict or in an OrderedDict:
-            header = 'Time (s)'
-            for i, detector in enumerate(self.get_channels()):
-                header = header + ',Signal{0} (counts/s)'.format(i)
+        if not stream_open:
+            self.log.warning('Saving of the count trace has not been started. Nothing to save.')
+            self.sigSavingStatusChanged.emit(self._saving)
+            return np.array(self._data_to_save), parameters
 
-            data = {header: self._data_to_save}
-            filepath = self._save_logic.get_path_for_module(module_name='Counter')
+        file_path = self._data_to_save.file_path
 
-            fig = self.draw_figure(data=np.array(self._data_to_save))
-            self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
-                                       filelabel=filelabel, plotfig=fig, delimiter='\t')
-            self.log.info('Counter Trace saved to:\n{0}'.format(filepath))
+        if to_file:
+            # If there is a postfix then add separating underscore
+            if postfix != '':
+                root, ext = os.path.splitext(file_path)
+                os.replace(file_path, root + '_' + postfix + ext)
+                file_path = root + '_' + postfix + ext
+
+            # memory-mapped, so the data does not have to be loaded completely
+            self._data_to_save, header = self._save_logic.load_data_stream(file_path)
+            if len(self._data_to_save) > 0:
+                fig = self.draw_figure(data=self._data_to_save)
+                self._save_logic.save_figure(fig, file_path, module_name='counter_logic')
+            self.log.info('Counter Trace saved to:\n{0}'.format(file_path))
+        else:
+            self._data_to_save, header = self._save_logic.load_data_stream(file_path, mmap=False)
+            os.remove(file_path)
 
         self.sigSavingStatusChanged.emit(self._saving)
         return self._data_to_save, parameters
@@ -433,9 +531,7 @@ class CounterLogic(GenericLogic):
 
             # initialising the data arrays
             self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
-            self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-            self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
-            self._sampling_data = np.empty([len(self.get_channels()), self._counting_samples])
+            self._init_count_buffers()
 
             # the sample index for gated counting
             self._already_counted_samples = 0
@@ -516,9 +612,10 @@ class CounterLogic(GenericLogic):
         else:
             filelabel = 'snapshot_count_trace_' + name_tag
 
+        countdata = self.countdata
         stop_time = self._count_length / self._count_frequency
-        time_step_size = stop_time / len(self.countdata)
-        x_axis = np.arange(0, stop_time, time_step_size)
+        time_step_size = stop_time / countdata.shape[1]
+        x_axis = np.arange(countdata.shape[1]) * time_step_size
 
         # prepare the data in a dict or in an OrderedDict:
         data = OrderedDict()
@@ -528,7 +625,7 @@ class CounterLogic(GenericLogic):
         datastr = 'Time (s)'
 
         for i, ch in enumerate(chans):
-            savearr[i+1] = self.countdata[i]
+            savearr[i+1] = countdata[i]
             datastr += ',Signal {0} (counts/s)'.format(i)
 
         data[datastr] = savearr.transpose()
@@ -560,39 +657,36 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        for i, ch in enumerate(self.get_channels()):
-            # remember the new count data in circular array
-            self.countdata[i, 0] = np.average(self.rawdata[i])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1, axis=1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1, axis=1)
-        # calculate the median and save it
-        window = -int(self._smooth_window_length / 2) - 1
-        for i, ch in enumerate(self.get_channels()):
-            self.countdata_smoothed[i, window:] = np.median(self.countdata[i,
-                                                            -self._smooth_window_length:])
+        # remember the new count data in circular array
+        new_counts = np.average(self.rawdata, axis=1)
+        with self._buffer_lock:
+            self._count_buffer.append(new_counts)
+            self._update_smoothed(new_counts)
 
         # save the data if necessary
         if self._saving:
-             # if oversampling is necessary
+            # one row (timestamp, counts of all channels) per sample
+            rows = np.empty((self._counting_samples, len(self.get_channels()) + 1))
+            rows[:, 0] = time.time() - self._saving_start_time
             if self._counting_samples > 1:
-                chans = self.get_channels()
-                self._sampling_data = np.empty([len(chans) + 1, self._counting_samples])
-                self._sampling_data[0, :] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    self._sampling_data[i+1, 0] = self.rawdata[i]
-
-                self._data_to_save.extend(list(self._sampling_data))
-            # if we don't want to use oversampling
+                rows[:, 1:] = self.rawdata[:, :self._counting_samples].transpose()
             else:
-                # append tuple to data stream (timestamp, average counts)
-                chans = self.get_channels()
-                newdata = np.empty((len(chans) + 1, ))
-                newdata[0] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    newdata[i+1] = self.countdata[i, -1]
-                self._data_to_save.append(newdata)
+                rows[0, 1:] = new_counts
+            self._data_to_save.write(rows)
+        return
+
+    def _update_smoothed(self, new_counts):
+        """
+        Appends the median over the last smooth_window_length samples to the smoothed trace.
+
+        The median is also assigned to the last half window of the smoothed trace, so it is
+        centered on the window it was calculated from.
+
+        @param numpy.ndarray new_counts: the newest sample of every channel
+        """
+        median = self._running_median.update(new_counts)
+        self._smoothed_buffer.append(median)
+        self._smoothed_buffer.set_last(int(self._smooth_window_length / 2) + 1, median)
         return
 
     def _process_data_gated(self):
@@ -601,28 +695,24 @@ class CounterLogic(GenericLogic):
         @return:
         """
         # remember the new count data in circular array
-        self.countdata[0] = np.average(self.rawdata[0])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1)
-        # calculate the median and save it
-        self.countdata_smoothed[-int(self._smooth_window_length / 2) - 1:] = np.median(
-            self.countdata[-self._smooth_window_length:])
+        new_counts = np.average(self.rawdata, axis=1)
+        with self._buffer_lock:
+            self._count_buffer.append(new_counts)
+            self._update_smoothed(new_counts)
 
         # save the data if necessary
         if self._saving:
             # if oversampling is necessary
             if self._counting_samples > 1:
-                self._sampling_data = np.empty((self._counting_samples, 2))
-                self._sampling_data[:, 0] = time.time() - self._saving_start_time
-                self._sampling_data[:, 1] = self.rawdata[0]
-                self._data_to_save.extend(list(self._sampling_data))
+                rows = np.empty((self._counting_samples, 2))
+                rows[:, 0] = time.time() - self._saving_start_time
+                rows[:, 1] = self.rawdata[0]
+                self._data_to_save.write(rows)
             # if we don't want to use oversampling
             else:
                 # append tuple to data stream (timestamp, average counts)
-                self._data_to_save.append(np.array((time.time() - self._saving_start_time,
-                                                    self.countdata[-1])))
+                self._data_to_save.write((time.time() - self._saving_start_time,
+                                          new_counts[0]))
         return
 
     def _process_data_finite_gated(self):
@@ -630,19 +720,18 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        if self._already_counted_samples+len(self.rawdata[0]) >= len(self.countdata):
-            needed_counts = len(self.countdata) - self._already_counted_samples
-            self.countdata[0:needed_counts] = self.rawdata[0][0:needed_counts]
-            self.countdata = np.roll(self.countdata, -needed_counts)
+        if self._already_counted_samples + self.rawdata.shape[1] >= self._count_length:
+            needed_counts = self._count_length - self._already_counted_samples
+            with self._buffer_lock:
+                self._count_buffer.extend(self.rawdata[:, :needed_counts])
             self._already_counted_samples = 0
             self.stopRequested = True
         else:
-            # replace the first part of the array with the new data:
-            self.countdata[0:len(self.rawdata[0])] = self.rawdata[0]
-            # roll the array by the amount of data it had been inserted:
-            self.countdata = np.roll(self.countdata, -len(self.rawdata[0]))
+            # append the new data to the circular array
+            with self._buffer_lock:
+                self._count_buffer.extend(self.rawdata)
             # increment the index counter:
-            self._already_counted_samples += len(self.rawdata[0])
+            self._already_counted_samples += self.rawdata.shape[1]
         return
 
     def _stopCount_wait(self, timeout=5.0):
@@ -19,6 +19,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import copy
+import numpy as np
 
 from core.module import Connector
 from logic.generic_logic import GenericLogic
@@ -189,6 +190,26 @@ class ScannerTiltInterfuse(GenericLogic, ConfocalScannerInterface):
             line_path[:][2] += self._calc_dz(line_path[:][0], line_path[:][1])
         return self._scanning_device.scan_line(line_path, pixel_clock)
 
+    def has_multi_line_scan(self):
+        """ Asks the underlying scanner whether it can scan several lines in one go.
+
+        @return bool: True if scan_lines is supported, False otherwise
+        """
+        return self._scanning_device.has_multi_line_scan()
+
+    def scan_lines(self, line_paths=None, pixel_clock=False):
+        """ Scans several lines in one go and returns the counts on those lines.
+
+        @param float[l][4][k] line_paths: l lines of 4-part tuples defining the pixel positions
+        @param bool pixel_clock: whether we need to output a pixel clock for these lines
+
+        @return float[l][k][m]: the photon counts per second
+        """
+        if self.tiltcorrection:
+            line_paths = np.array(line_paths, dtype=np.float64)
+            line_paths[:, 2, :] += self._calc_dz(line_paths[:, 0, :], line_paths[:, 1, :])
+        return self._scanning_device.scan_lines(line_paths, pixel_clock)
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
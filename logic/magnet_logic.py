@@ -26,6 +26,7 @@ import time
 
 from collections import OrderedDict
 from core.module import Connector, ConfigOption, StatusVar
+from core.remote import call_async
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 from interface.slow_counter_interface import CountingMode
@@ -981,9 +982,12 @@ class MagnetLogic(GenericLogic):
         current_dist = 0.0
 
         while True:
+            # Send the position query before waiting, so the round trip to a remote magnet
+            # overlaps the check time instead of adding to it.
+            pending_pos = call_async(self._magnet_device, 'get_pos', list(end_pos_dict))
             time.sleep(self._checktime)
 
-            curr_pos = self.get_pos(list(end_pos_dict))
+            curr_pos = pending_pos.result()
 
             for axis_label in start_pos_dict:
                 current_dist = (end_pos_dict[axis_label] - curr_pos[axis_label]) ** 2
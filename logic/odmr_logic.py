@@ -25,6 +25,8 @@ from collections import OrderedDict
 from interface.microwave_interface import MicrowaveMode
 from interface.microwave_interface import TriggerEdge
 import numpy as np
+import os
+import tempfile
 import time
 import datetime
 import matplotlib.pyplot as plt
@@ -32,6 +34,7 @@ import lmfit
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.ringbuffer import SweepBuffer
 from core.module import Connector, ConfigOption, StatusVar
 
 
@@ -54,6 +57,9 @@ class ODMRLogic(GenericLogic):
                     'LIST',
                     missing='warn',
                     converter=lambda x: MicrowaveMode[x.upper()])
+    # Keep the full sweep history in a memory-mapped temporary file instead of dropping sweeps
+    # that do not fit into the preallocated raw data buffer anymore.
+    sweep_history_on_disk = ConfigOption('sweep_history_on_disk', False)
 
     clock_frequency = StatusVar('clock_frequency', 200)
     cw_mw_frequency = StatusVar('cw_mw_frequency', 2870e6)
@@ -124,12 +130,9 @@ class ODMRLogic(GenericLogic):
 
         # Initalize the ODMR data arrays (mean signal and sweep matrix)
         self._initialize_odmr_plots()
-        # Raw data array
-        self.odmr_raw_data = np.zeros(
-            [self.number_of_lines,
-             len(self._odmr_counter.get_odmr_channels()),
-            self.odmr_plot_x.size]
-            )
+        # Raw data buffer
+        self._sweep_buffer = None
+        self._init_sweep_buffer(self.number_of_lines)
 
         # Switch off microwave and set CW frequency and power
         self.mw_off()
@@ -156,6 +159,8 @@ class ODMRLogic(GenericLogic):
                 break
         # Switch off microwave source for sure (also if CW mode is active or module is still locked)
         self._mw_device.off()
+        # Remove the sweep history file if there is one
+        self._sweep_buffer.close()
         # Disconnect signals
         self.sigNextLine.disconnect()
 
@@ -201,6 +206,35 @@ class ODMRLogic(GenericLogic):
         else:
             return None
 
+    @property
+    def odmr_raw_data(self):
+        """ All recorded sweeps with shape (sweeps, channels, frequencies), newest sweep first.
+
+        Contains only the sweeps still held in the raw data buffer unless the sweep history is
+        kept on disk (memory-mapped array in that case).
+        """
+        return self._sweep_buffer.history()
+
+    def _init_sweep_buffer(self, capacity):
+        """ Creates a new raw data buffer for the current sweep settings.
+
+        @param int capacity: number of sweeps to keep in memory
+        """
+        if self._sweep_buffer is not None:
+            self._sweep_buffer.close()
+        history_file = None
+        if self.sweep_history_on_disk:
+            file_handle, history_file = tempfile.mkstemp(prefix='qudi_odmr_sweeps_',
+                                                         suffix='.dat')
+            os.close(file_handle)
+        self._sweep_buffer = SweepBuffer(
+            capacity=max(capacity, self.number_of_lines),
+            sweep_shape=(len(self._odmr_counter.get_odmr_channels()), self.odmr_plot_x.size),
+            average_length=self.lines_to_average,
+            history_file=history_file)
+        self._sweep_buffer_overflow_warned = False
+        return
+
     def _initialize_odmr_plots(self):
         """ Initializing the ODMR plots (line and matrix). """
         self.odmr_plot_x = np.arange(self.mw_start, self.mw_stop + self.mw_step, self.mw_step)
@@ -245,18 +279,9 @@ class ODMRLogic(GenericLogic):
         """
         self.lines_to_average = int(lines_to_average)
 
-        if self.lines_to_average <= 0:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                axis=0,
-                dtype=np.float64
-            )
-        else:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                axis=0,
-                dtype=np.float64
-            )
+        with self.threadlock:
+            self._sweep_buffer.set_average_length(self.lines_to_average)
+            self.odmr_plot_y = self._sweep_buffer.average()
 
         self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
         self.sigParameterUpdated.emit({'average_length': self.lines_to_average})
@@ -342,6 +367,8 @@ class ODMRLogic(GenericLogic):
         """
         if isinstance(number_of_lines, int):
             self.number_of_lines = number_of_lines
+            with self.threadlock:
+                self._sweep_buffer.set_capacity(self.number_of_lines)
         else:
             self.log.warning('set_matrix_line_number failed. '
                              'Input parameter number_of_lines is no integer.')
@@ -606,18 +633,14 @@ class ODMRLogic(GenericLogic):
                 return -1
 
             self._initialize_odmr_plots()
-            # initialize raw_data array
+            # initialize raw_data buffer
             estimated_number_of_lines = self.run_time * self.clock_frequency / self.odmr_plot_x.size
             estimated_number_of_lines = int(1.5 * estimated_number_of_lines)  # Safety
             if estimated_number_of_lines < self.number_of_lines:
                 estimated_number_of_lines = self.number_of_lines
             self.log.debug('Estimated number of raw data lines: {0:d}'
                            ''.format(estimated_number_of_lines))
-            self.odmr_raw_data = np.zeros(
-                [estimated_number_of_lines,
-                 len(self._odmr_counter.get_odmr_channels()),
-                 self.odmr_plot_x.size]
-            )
+            self._init_sweep_buffer(estimated_number_of_lines)
             self.sigNextLine.emit()
             return 0
 
@@ -710,45 +733,28 @@ class ODMRLogic(GenericLogic):
                 self.sigNextLine.emit()
                 return
 
-            # Add new count data to raw_data array and append if array is too small
+            # Add new count data to raw data buffer
             if self._clearOdmrData:
-                self.odmr_raw_data[:, :, :] = 0
+                self._sweep_buffer.clear()
                 self._clearOdmrData = False
-            if self.elapsed_sweeps == (self.odmr_raw_data.shape[0] - 1):
-                expanded_array = np.zeros(self.odmr_raw_data.shape)
-                self.odmr_raw_data = np.concatenate((self.odmr_raw_data, expanded_array), axis=0)
-                self.log.warning('raw data array in ODMRLogic was not big enough for the entire '
-                                 'measurement. Array will be expanded.\nOld array shape was '
-                                 '({0:d}, {1:d}), new shape is ({2:d}, {3:d}).'
-                                 ''.format(self.odmr_raw_data.shape[0] - self.number_of_lines,
-                                           self.odmr_raw_data.shape[1],
-                                           self.odmr_raw_data.shape[0],
-                                           self.odmr_raw_data.shape[1]))
-
-            # shift data in the array "up" and add new data at the "bottom"
-            self.odmr_raw_data = np.roll(self.odmr_raw_data, 1, axis=0)
-
-            self.odmr_raw_data[0] = new_counts
-
-            # Add new count data to mean signal
-            if self._clearOdmrData:
-                self.odmr_plot_y[:, :] = 0
-
-            if self.lines_to_average <= 0:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
-            else:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
-
-            # Set plot slice of matrix
-            self.odmr_plot_xy = self.odmr_raw_data[:self.number_of_lines, :, :]
+            if (self._sweep_buffer.count == self._sweep_buffer.capacity
+                    and self._sweep_buffer.history_file is None
+                    and not self._sweep_buffer_overflow_warned):
+                self.log.warning('Raw data buffer in ODMRLogic is full ({0:d} sweeps). The oldest '
+                                 'sweeps will be dropped from the saved raw data. Set the config '
+                                 'option "sweep_history_on_disk" to keep all sweeps.'
+                                 ''.format(self._sweep_buffer.capacity))
+                self._sweep_buffer_overflow_warned = True
+            self._sweep_buffer.append(new_counts)
+
+            # Update mean signal from running sums
+            self.odmr_plot_y = self._sweep_buffer.average()
+
+            # Set plot slice of matrix (newest line first)
+            self.odmr_plot_xy = np.zeros(
+                (self.number_of_lines,) + self._sweep_buffer.sweep_shape)
+            recent_lines = self._sweep_buffer.recent(self.number_of_lines)
+            self.odmr_plot_xy[:recent_lines.shape[0]] = recent_lines
 
             # Update elapsed time/sweeps
             self.elapsed_sweeps += 1
@@ -810,6 +816,7 @@ class ODMRLogic(GenericLogic):
 
         if tag is None:
             tag = ''
+        raw_data = self.odmr_raw_data
         for nch, channel in enumerate(self.get_odmr_channels()):
             # two paths to save the raw data and the odmr scan data.
             filepath = self._save_logic.get_path_for_module(module_name='ODMR')
@@ -827,7 +834,7 @@ class ODMRLogic(GenericLogic):
             data2 = OrderedDict()
             data['frequency (Hz)'] = self.odmr_plot_x
             data['count data (counts/s)'] = self.odmr_plot_y[nch]
-            data2['count data (counts/s)'] = self.odmr_raw_data[:self.elapsed_sweeps, nch, :]
+            data2['count data (counts/s)'] = raw_data[:self.elapsed_sweeps, nch, :]
 
             parameters = OrderedDict()
             parameters['Microwave CW Power (dBm)'] = self.cw_mw_power
@@ -202,11 +202,19 @@ class PulseAnalyzer(PulseAnalyzerBase):
                                                 and the measurement error corresponding to each
                                                 data point.
         """
-        analysis_method = self._analysis_methods[self._current_analysis_method]
-
-        kwargs = self._get_analysis_method_kwargs(analysis_method)
+        analysis_method, kwargs = self.get_analysis_method()
         return analysis_method(laser_data=laser_data, **kwargs)
 
+    def get_analysis_method(self):
+        """
+        Returns the currently selected analysis method together with the appropriate keyword
+        arguments (other than "laser_data") to call it with.
+
+        @return (callable, dict): the analysis method and its keyword arguments
+        """
+        analysis_method = self._analysis_methods[self._current_analysis_method]
+        return analysis_method, self._get_analysis_method_kwargs(analysis_method)
+
     def _get_analysis_method_kwargs(self, method):
         """
         Get the proper values for keyword arguments other than "laser_data" for <method>.
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi asset store persisting PulseBlocks, PulseBlockEnsembles and
+PulseSequences in a single SQLite database file.
+
+Each pulse object is stored as its pickled dict representation (get_dict_representation) which
+only consists of builtin types and numpy arrays. Changes to the pulse object classes therefore do
+not break loading of stored objects.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import pickle
+import sqlite3
+
+from collections import OrderedDict
+from core.util.mutex import Mutex
+from logic.pulsed.pulse_objects import PulseBlock, PulseBlockEnsemble, PulseSequence
+
+# Placeholder for the values of a LazyAssetDict that have not been loaded yet
+_NOT_LOADED = object()
+
+
+class PulseAssetStore:
+    """
+    Single file storage for pulse objects. The objects are indexed by their kind ('block',
+    'ensemble' or 'sequence') and name and are loaded one by one on demand.
+
+    Writes are committed immediately unless they are issued inside a "with store.batch():" block.
+    In that case they are collected and committed in a single transaction when leaving the
+    outermost batch block.
+    """
+    _kinds = {PulseBlock: 'block', PulseBlockEnsemble: 'ensemble', PulseSequence: 'sequence'}
+
+    def __init__(self, filepath):
+        """
+        @param str filepath: path of the database file. It is created if it does not exist.
+        """
+        self.filepath = filepath
+        self._lock = Mutex(recursive=True)
+        self._pending = OrderedDict()
+        self._batch_depth = 0
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS assets (kind TEXT NOT NULL, '
+                                     'name TEXT NOT NULL, data BLOB NOT NULL, '
+                                     'PRIMARY KEY (kind, name))')
+
+    def close(self):
+        """
+        Commits pending writes and closes the database file.
+        """
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+    def batch(self):
+        """
+        Context manager collecting all writes until the outermost batch is left.
+
+        @return PulseAssetStore: this store
+        """
+        return self
+
+    def __enter__(self):
+        with self._lock:
+            self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._lock:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+        return False
+
+    def names(self, kind):
+        """
+        Returns the sorted names of all stored objects of a kind.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+
+        @return list: sorted object names
+        """
+        with self._lock:
+            names = {row[0] for row in self._connection.execute(
+                'SELECT name FROM assets WHERE kind=?', (kind,))}
+            for (pending_kind, name), data in self._pending.items():
+                if pending_kind != kind:
+                    continue
+                if data is None:
+                    names.discard(name)
+                else:
+                    names.add(name)
+        return sorted(names)
+
+    def load(self, kind, name):
+        """
+        Loads a single pulse object.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+        @param str name: name of the object
+
+        @return PulseBlock|PulseBlockEnsemble|PulseSequence: the loaded object, None if no object
+                                                            of this kind and name is stored
+        """
+        with self._lock:
+            if (kind, name) in self._pending:
+                data = self._pending[(kind, name)]
+            else:
+                row = self._connection.execute('SELECT data FROM assets WHERE kind=? AND name=?',
+                                               (kind, name)).fetchone()
+                data = None if row is None else row[0]
+        if data is None:
+            return None
+
+        dict_repr = pickle.loads(data)
+        if kind == 'block':
+            return PulseBlock.block_from_dict(dict_repr)
+        elif kind == 'ensemble':
+            return PulseBlockEnsemble.ensemble_from_dict(dict_repr)
+        return PulseSequence.sequence_from_dict(dict_repr)
+
+    def save(self, asset):
+        """
+        Stores a pulse object, replacing a stored object of the same kind and name.
+
+        @param PulseBlock|PulseBlockEnsemble|PulseSequence asset: the object to store
+        """
+        dict_repr = asset.get_dict_representation()
+        if isinstance(asset, PulseSequence):
+            # Store the sequence steps as plain dicts
+            dict_repr['ensemble_list'] = [dict(step) for step in dict_repr['ensemble_list']]
+        data = pickle.dumps(dict_repr, protocol=pickle.HIGHEST_PROTOCOL)
+        self._write(self._kinds[type(asset)], asset.name, data)
+        return
+
+    def delete(self, kind, name):
+        """
+        Removes a pulse object from the store.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+        @param str name: name of the object
+        """
+        self._write(kind, name, None)
+        return
+
+    def flush(self):
+        """
+        Commits all pending writes in a single transaction.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            to_save = [(kind, name, data) for (kind, name), data in self._pending.items() if
+                       data is not None]
+            to_delete = [key for key, data in self._pending.items() if data is None]
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO assets (kind, name, data) VALUES (?, ?, ?)', to_save)
+                self._connection.executemany('DELETE FROM assets WHERE kind=? AND name=?',
+                                             to_delete)
+            self._pending.clear()
+        return
+
+    def _write(self, kind, name, data):
+        with self._lock:
+            self._pending.pop((kind, name), None)
+            self._pending[(kind, name)] = data
+            if self._batch_depth == 0:
+                self.flush()
+        return
+
+
+class LazyAssetDict(OrderedDict):
+    """
+    OrderedDict of pulse objects by name. The names are known in advance but the objects are only
+    loaded by the loader callable on first access. Objects that fail to load are removed.
+    """
+
+    def __init__(self, loader, names=None):
+        """
+        @param callable loader: called with the object name, returns the loaded object or None
+        @param list names: names of the objects available from the loader
+        """
+        super().__init__()
+        self._loader = loader
+        if names is not None:
+            for name in names:
+                super().__setitem__(name, _NOT_LOADED)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if value is _NOT_LOADED:
+            value = self._loader(key)
+            if value is None:
+                super().__delitem__(key)
+                raise KeyError(key)
+            super().__setitem__(key, value)
+        return value
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, list(self))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *args):
+        try:
+            value = self[key]
+        except KeyError:
+            if args:
+                return args[0]
+            raise
+        super().__delitem__(key)
+        return value
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def items(self):
+        items = list()
+        for key in list(self):
+            value = self.get(key, _NOT_LOADED)
+            if value is not _NOT_LOADED:
+                items.append((key, value))
+        return items
+
+    def loaded_items(self):
+        """
+        Returns the (name, object) pairs of all objects already loaded without loading others.
+
+        @return list: (name, object) tuples
+        """
+        return [(key, value) for key, value in super().items() if value is not _NOT_LOADED]
+
+    def copy(self):
+        return OrderedDict(self.items())
@@ -31,6 +31,8 @@ class BasicPulseExtractor(PulseExtractorBase):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # edges found by the last ungated edge detection and the data they were found in
+        self._edge_cache = dict()
 
     def gated_conv_deriv(self, count_data, conv_std_dev=20.0):
         """
@@ -44,7 +46,7 @@ class BasicPulseExtractor(PulseExtractorBase):
         @param float conv_std_dev: The standard deviation of the gaussian filter used for smoothing
 
         @return dict: The extracted laser pulses of the timetrace as well as the indices for rising
-                      and falling flanks.
+                      and falling flanks and the bin indices of the laser pulses in count_data.
         """
         # Create return dictionary
         return_dict = {'laser_counts_arr': np.zeros(0, dtype='int64'),
@@ -75,6 +77,8 @@ class BasicPulseExtractor(PulseExtractorBase):
         else:
             # slice the data array to cut off anything but laser pulses
             laser_arr = count_data[:, rising_ind:falling_ind]
+            return_dict['laser_bin_indices'] = np.arange(count_data.size).reshape(
+                count_data.shape)[:, rising_ind:falling_ind]
 
         return_dict['laser_counts_arr'] = laser_arr.astype('int64')
         return_dict['laser_indices_rising'] = rising_ind
@@ -108,11 +112,16 @@ class BasicPulseExtractor(PulseExtractorBase):
             trace.
 
             The maxima and minima are not found sequentially, pulse by pulse,
-            but are rather globally obtained. I.e. the convolved and derived
-            array is searched iteratively for a maximum and a minimum, and after
-            finding those the array entries within the 4 times
-            self.conv_std_dev (2*self.conv_std_dev to the left and
-            2*self.conv_std_dev) are set to zero.
+            but are rather globally obtained. I.e. all maxima (minima) of the
+            convolved and derived array, which are the largest (smallest) value
+            within 2*conv_std_dev to the left and to the right, are found in a
+            single pass and the number_of_lasers largest (smallest) of them are
+            taken as edges.
+
+            The found edges are reused for subsequent calls as long as the
+            shape of the data, the number of lasers, conv_std_dev and the pulse
+            sequence stay the same and the total number of counts has not
+            doubled since the edges were detected.
 
             The crucial part is the knowledge of the number of laser pulses and
             the choice of the appropriate std_dev for the gauss filter.
@@ -131,126 +140,133 @@ class BasicPulseExtractor(PulseExtractorBase):
         if not isinstance(number_of_lasers, int):
             return return_dict
 
-        # apply gaussian filter to remove noise and compute the gradient of the timetrace sum
+        # The edges stay in place as long as the pulse sequence does not change. Detect them
+        # again only if the data has changed substantially since the last detection.
+        edge_key = ('conv_deriv', count_data.shape, number_of_lasers, conv_std_dev,
+                    self.sampling_information_revision)
+        total_counts = int(count_data.sum())
+        cached = self._edge_cache
+        if (cached.get('key') == edge_key
+                and cached['total_counts'] <= total_counts < 2 * cached['total_counts']):
+            rising_ind = cached['rising']
+            falling_ind = cached['falling']
+        else:
+            edges = self._detect_edges(count_data, number_of_lasers, conv_std_dev)
+            if edges is None:
+                # if gaussian smoothing or derivative failed, the returned array only contains
+                # zeros. Return also only zeros to indicate a failed pulse extraction.
+                self._edge_cache = dict()
+                return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
+                return return_dict
+            rising_ind, falling_ind = edges
+            self._edge_cache = {'key': edge_key,
+                                'total_counts': max(total_counts, 1),
+                                'rising': rising_ind,
+                                'falling': falling_ind}
+
+        # find the maximum laser length to use as size for the laser array
+        laser_length = np.max(falling_ind - rising_ind)
+
+        # slice the detected laser pulses of the timetrace according to the found rising edge
+        bin_indices = self._pulse_bin_indices(count_data.size, rising_ind, laser_length)
+        return_dict['laser_counts_arr'] = self.take_laser_pulses(count_data, bin_indices)
+        return_dict['laser_bin_indices'] = bin_indices
+        return_dict['laser_indices_rising'] = rising_ind.copy()
+        return_dict['laser_indices_falling'] = falling_ind.copy()
+        return return_dict
+
+    def _detect_edges(self, count_data, number_of_lasers, conv_std_dev):
+        """
+        Finds the rising and falling edges of the laser pulses in an ungated timetrace.
+
+        @param numpy.ndarray count_data: The raw timetrace data (1D) from an ungated fast counter
+        @param int number_of_lasers: The number of laser pulses to find
+        @param float conv_std_dev: The standard deviation of the gaussian used for smoothing
+
+        @return tuple: sorted arrays of rising and falling edge indices or None if smoothing failed
+
+        All maxima (minima) of the smoothed derivative which are the largest (smallest) value
+        within +-2*conv_std_dev are found in a single pass. The number_of_lasers strongest of them
+        are taken as edges and refined on a derivative with a small and fixed smoothing width.
+        """
+        # apply gaussian filter to remove noise and compute the gradient of the timetrace
         try:
             conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), conv_std_dev)
-        except:
-            conv = np.zeros(count_data.size)
-        try:
             conv_deriv = np.gradient(conv)
         except:
-            conv_deriv = np.zeros(conv.size)
-
-        # if gaussian smoothing or derivative failed, the returned array only contains zeros.
-        # Check for that and return also only zeros to indicate a failed pulse extraction.
-        if len(conv_deriv.nonzero()[0]) == 0:
-            return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
-            return return_dict
+            return None
+        if not conv_deriv.any():
+            return None
 
         # use a reference for array, because the exact position of the peaks or dips
         # (i.e. maxima or minima, which are the inflection points in the pulse) are distorted by
         # a large conv_std_dev value.
         try:
             conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), 10)
-        except:
-            conv = np.zeros(count_data.size)
-        try:
             conv_deriv_ref = np.gradient(conv)
         except:
-            conv_deriv_ref = np.zeros(conv.size)
-
-        # initialize arrays to contain indices for all rising and falling
-        # flanks, respectively
-        rising_ind = np.empty(number_of_lasers, dtype='int64')
-        falling_ind = np.empty(number_of_lasers, dtype='int64')
-
-        # Find as many rising and falling flanks as there are laser pulses in
-        # the trace:
-        for i in range(number_of_lasers):
-            # save the index of the absolute maximum of the derived time trace
-            # as rising edge position
-            rising_ind[i] = np.argmax(conv_deriv)
-
-            # refine the rising edge detection, by using a small and fixed
-            # conv_std_dev parameter to find the inflection point more precise
-            start_ind = int(rising_ind[i] - conv_std_dev)
-            if start_ind < 0:
-                start_ind = 0
-
-            stop_ind = int(rising_ind[i] + conv_std_dev)
-            if stop_ind > len(conv_deriv):
-                stop_ind = len(conv_deriv)
-
-            if start_ind == stop_ind:
-                stop_ind = start_ind + 1
-
-            rising_ind[i] = start_ind + np.argmax(conv_deriv_ref[start_ind:stop_ind])
-
-            # set this position and the surrounding of the saved edge to 0 to
-            # avoid a second detection
-            if rising_ind[i] < 2 * conv_std_dev:
-                del_ind_start = 0
-            else:
-                del_ind_start = rising_ind[i] - int(2 * conv_std_dev)
-            if (conv_deriv.size - rising_ind[i]) < 2 * conv_std_dev:
-                del_ind_stop = conv_deriv.size - 1
-            else:
-                del_ind_stop = rising_ind[i] + int(2 * conv_std_dev)
-                conv_deriv[del_ind_start:del_ind_stop] = 0
-
-            # save the index of the absolute minimum of the derived time trace
-            # as falling edge position
-            falling_ind[i] = np.argmin(conv_deriv)
-
-            # refine the falling edge detection, by using a small and fixed
-            # conv_std_dev parameter to find the inflection point more precise
-            start_ind = int(falling_ind[i] - conv_std_dev)
-            if start_ind < 0:
-                start_ind = 0
-
-            stop_ind = int(falling_ind[i] + conv_std_dev)
-            if stop_ind > len(conv_deriv):
-                stop_ind = len(conv_deriv)
+            conv_deriv_ref = np.zeros(conv_deriv.size)
 
-            if start_ind == stop_ind:
-                stop_ind = start_ind + 1
-
-            falling_ind[i] = start_ind + np.argmin(conv_deriv_ref[start_ind:stop_ind])
-
-            # set this position and the sourrounding of the saved flank to 0 to
-            #  avoid a second detection
-            if falling_ind[i] < 2 * conv_std_dev:
-                del_ind_start = 0
-            else:
-                del_ind_start = falling_ind[i] - int(2 * conv_std_dev)
-            if (conv_deriv.size - falling_ind[i]) < 2 * conv_std_dev:
-                del_ind_stop = conv_deriv.size - 1
-            else:
-                del_ind_stop = falling_ind[i] + int(2 * conv_std_dev)
-            conv_deriv[del_ind_start:del_ind_stop] = 0
-
-        # sort all indices of rising and falling flanks
+        rising_ind = self._find_extrema(conv_deriv, conv_deriv_ref, number_of_lasers,
+                                        conv_std_dev)
+        falling_ind = self._find_extrema(-conv_deriv, -conv_deriv_ref, number_of_lasers,
+                                         conv_std_dev)
         rising_ind.sort()
         falling_ind.sort()
+        return rising_ind, falling_ind
 
-        # find the maximum laser length to use as size for the laser array
-        laser_length = np.max(falling_ind - rising_ind)
+    @staticmethod
+    def _find_extrema(deriv, deriv_ref, number, conv_std_dev):
+        """
+        Returns the indices of the number largest maxima in deriv that are at least
+        2*conv_std_dev apart, refined to the maximum of deriv_ref within +-conv_std_dev.
 
-        # initialize the empty output array
-        laser_arr = np.zeros((number_of_lasers, laser_length), dtype='int64')
-        # slice the detected laser pulses of the timetrace and save them in the
-        # output array according to the found rising edge
-        for i in range(number_of_lasers):
-            if rising_ind[i] + laser_length > count_data.size:
-                lenarr = count_data[rising_ind[i]:].size
-                laser_arr[i, 0:lenarr] = count_data[rising_ind[i]:]
-            else:
-                laser_arr[i] = count_data[rising_ind[i]:rising_ind[i] + laser_length]
+        @param numpy.ndarray deriv: smoothed derivative to search maxima in
+        @param numpy.ndarray deriv_ref: less smoothed derivative to refine the positions with
+        @param int number: number of maxima to return
+        @param float conv_std_dev: The standard deviation of the gaussian used for smoothing
 
-        return_dict['laser_counts_arr'] = laser_arr.astype('int64')
-        return_dict['laser_indices_rising'] = rising_ind
-        return_dict['laser_indices_falling'] = falling_ind
-        return return_dict
+        @return numpy.ndarray: unsorted indices of the maxima
+        """
+        size = deriv.size
+        separation = max(int(2 * conv_std_dev), 1)
+
+        # maxima that are the largest value within the minimum separation (one peak per plateau)
+        is_peak = ndimage.maximum_filter1d(deriv, 2 * separation + 1, mode='nearest') == deriv
+        is_peak &= deriv > 0
+        is_peak[1:] &= ~is_peak[:-1]
+        peaks = np.flatnonzero(is_peak)
+        if peaks.size < number:
+            # not enough distinct edges, fill up with the largest remaining values
+            remaining = np.argsort(np.where(is_peak, -np.inf, deriv))[::-1]
+            peaks = np.concatenate((peaks, remaining[:number - peaks.size]))
+        if peaks.size > number:
+            peaks = peaks[np.argpartition(deriv[peaks], peaks.size - number)[-number:]]
+
+        # refine the edge detection, by using a small and fixed conv_std_dev parameter to find
+        # the inflection point more precise
+        start_ind = np.clip((peaks - conv_std_dev).astype('int64'), 0, size - 1)
+        stop_ind = np.clip((peaks + conv_std_dev).astype('int64'), start_ind + 1, size)
+        window = start_ind[:, np.newaxis] + np.arange(np.max(stop_ind - start_ind))
+        window_values = deriv_ref[np.minimum(window, size - 1)]
+        window_values[window >= stop_ind[:, np.newaxis]] = -np.inf
+        return start_ind + np.argmax(window_values, axis=1)
+
+    @staticmethod
+    def _pulse_bin_indices(size, start_ind, laser_length):
+        """
+        Bin indices of laser pulses of equal length in an ungated timetrace.
+
+        @param int size: number of bins in the timetrace
+        @param numpy.ndarray start_ind: first bin of each laser pulse
+        @param int laser_length: number of bins per laser pulse
+
+        @return 2D numpy.ndarray: bin indices, -1 for bins beyond the end of the timetrace.
+                                  dimensions: 0: laser number, 1: time bin
+        """
+        indices = np.asarray(start_ind, dtype='int64')[:, np.newaxis] + np.arange(laser_length)
+        indices[indices >= size] = -1
+        return indices
 
     def ungated_threshold(self, count_data, count_threshold=10, min_laser_length=200e-9,
                           threshold_tolerance=20e-9):
@@ -298,35 +314,34 @@ class BasicPulseExtractor(PulseExtractorBase):
         # get all bin indices with counts > threshold value
         bigger_indices = np.where(count_data >= count_threshold)[0]
 
-        # get all indices with consecutive numbering (bin chains not interrupted by
-        # values < threshold
-        index_list = np.split(bigger_indices,
-                              np.where(np.diff(bigger_indices) >= threshold_tolerance)[0] + 1)
-        for i, index_group in enumerate(index_list):
-            if index_group.size > 0:
-                start, end = index_list[i][0], index_list[i][-1]
-                index_list[i] = np.arange(start, end + 1)
-        consecutive_indices_unfiltered = index_list
+        # get first and last index of all bin chains not interrupted by more than
+        # threshold_tolerance values < threshold
+        if bigger_indices.size == 0:
+            return return_dict
+        gaps = np.flatnonzero(np.diff(bigger_indices) >= threshold_tolerance)
+        group_starts = bigger_indices[np.concatenate(([0], gaps + 1))]
+        group_ends = bigger_indices[np.concatenate((gaps, [bigger_indices.size - 1]))]
 
         # sort out all groups shorter than minimum laser length
-        consecutive_indices = [item for item in consecutive_indices_unfiltered if
-                               len(item) > min_laser_length]
+        group_lengths = group_ends - group_starts + 1
+        long_enough = group_lengths > min_laser_length
+        group_starts = group_starts[long_enough]
+        group_ends = group_ends[long_enough]
+        group_lengths = group_lengths[long_enough]
 
         # Check if the number of lasers matches the number of remaining index groups
-        if number_of_lasers != len(consecutive_indices):
+        if number_of_lasers != group_starts.size:
             return return_dict
 
-        # determine max length of laser pulse and initialize laser array
-        max_laser_length = max([index_array.size for index_array in consecutive_indices])
-        return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, max_laser_length),
-                                                   dtype='int64')
-
         # fill laser array with slices of raw data array. Also populate the rising/falling index
         # arrays
-        for i, index_group in enumerate(consecutive_indices):
-            return_dict['laser_indices_rising'][i] = index_group[0]
-            return_dict['laser_indices_falling'][i] = index_group[-1]
-            return_dict['laser_counts_arr'][i, :index_group.size] = count_data[index_group]
+        bin_indices = self._pulse_bin_indices(count_data.size, group_starts,
+                                              np.max(group_lengths))
+        bin_indices[np.arange(bin_indices.shape[1]) >= group_lengths[:, np.newaxis]] = -1
+        return_dict['laser_counts_arr'] = self.take_laser_pulses(count_data, bin_indices)
+        return_dict['laser_bin_indices'] = bin_indices
+        return_dict['laser_indices_rising'] = group_starts.astype('int64')
+        return_dict['laser_indices_falling'] = group_ends.astype('int64')
 
         return return_dict
 
@@ -375,16 +390,17 @@ class BasicPulseExtractor(PulseExtractorBase):
         safety_bins = round(safety / fc_binwidth)
         delay_bins = round(delay / fc_binwidth)
         # dimensions of laser pulse array
-        num_rows = len(laser_rising_bins)
         max_laser_length = max(laser_falling_bins - laser_rising_bins)
         num_col = max_laser_length + 2 * safety_bins
         # compute from laser_start_indices and laser length the respective position of the laser
         # pulses
-        laser_pulses = np.empty((num_rows, num_col))
-        for ii in range(num_rows):
-            laser_pulses[ii][:] = count_data[
-                np.arange(laser_rising_bins[ii] + delay_bins - safety_bins,
-                          laser_rising_bins[ii] + delay_bins + safety_bins + max_laser_length)]
+        gather_indices = (laser_rising_bins[:, np.newaxis] + delay_bins - safety_bins
+                          + np.arange(num_col))
+        laser_pulses = count_data[gather_indices].astype(float)
         # use the gated extraction method
         return_dict = self.gated_conv_deriv(laser_pulses, conv_std_dev)
+        # translate the bin indices of the gated laser pulses into bin indices of count_data
+        if 'laser_bin_indices' in return_dict:
+            return_dict['laser_bin_indices'] = np.mod(
+                gather_indices.ravel()[return_dict['laser_bin_indices']], count_data.size)
         return return_dict
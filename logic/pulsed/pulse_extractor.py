@@ -23,6 +23,7 @@ import os
 import sys
 import inspect
 import importlib
+import numpy as np
 
 from core.util.modules import get_main_dir
 
@@ -50,6 +51,10 @@ class PulseExtractorBase:
     def sampling_information(self):
         return self.__pulsedmeasurementlogic.sampling_information
 
+    @property
+    def sampling_information_revision(self):
+        return self.__pulsedmeasurementlogic.sampling_information_revision
+
     @property
     def fast_counter_settings(self):
         return self.__pulsedmeasurementlogic.fast_counter_settings
@@ -58,6 +63,23 @@ class PulseExtractorBase:
     def log(self):
         return self.__pulsedmeasurementlogic.log
 
+    @staticmethod
+    def take_laser_pulses(count_data, laser_bin_indices):
+        """
+        Gathers the laser pulses from count_data at the given bin indices.
+
+        @param numpy.ndarray count_data: 1D (ungated) or 2D (gated) raw timetrace data
+        @param numpy.ndarray laser_bin_indices: 2D array of indices into the flattened count_data
+                                                for each laser pulse (dim 0) and time bin (dim 1).
+                                                Bins with index -1 are set to zero.
+
+        @return 2D numpy.ndarray: the laser pulses. dimensions: 0: laser number, 1: time bin
+        """
+        flat_data = count_data.ravel()
+        laser_arr = flat_data[np.maximum(laser_bin_indices, 0)].astype('int64')
+        laser_arr[laser_bin_indices < 0] = 0
+        return laser_arr
+
 
 class PulseExtractor(PulseExtractorBase):
     """
@@ -76,6 +98,11 @@ class PulseExtractor(PulseExtractorBase):
     7) Make sure that no two extraction methods in any module share a keyword argument of different
        default data type.
     8) The keyword "method" must not be used in the extraction method parameters
+    9) Extraction methods return a dict with the keys "laser_counts_arr",
+       "laser_indices_rising" and "laser_indices_falling". Optionally the key
+       "laser_bin_indices" holds the indices of each laser pulse bin in the flattened
+       "count_data" (-1 for padding) as used by take_laser_pulses. Methods providing it allow
+       PulsedMeasurementLogic to update the laser pulses incrementally.
 
     See BasicPulseExtractor class for an example usage.
     """
@@ -217,12 +244,21 @@ class PulseExtractor(PulseExtractorBase):
             self.log.error('"is_gated" flag is set to True but the count data to extract laser '
                            'pulses from is in the format of an ungated timetrace (1D numpy array).')
 
+        extraction_method, kwargs = self.get_extraction_method()
+        return extraction_method(count_data=count_data, **kwargs)
+
+    def get_extraction_method(self):
+        """
+        Returns the currently selected extraction method together with the appropriate keyword
+        arguments (other than "count_data") to call it with.
+
+        @return (callable, dict): the extraction method and its keyword arguments
+        """
         if self.is_gated:
             extraction_method = self._gated_extraction_methods[self._current_extraction_method]
         else:
             extraction_method = self._ungated_extraction_methods[self._current_extraction_method]
-        kwargs = self._get_extraction_method_kwargs(extraction_method)
-        return extraction_method(count_data=count_data, **kwargs)
+        return extraction_method, self._get_extraction_method_kwargs(extraction_method)
 
     def _get_extraction_method_kwargs(self, method):
         """
@@ -25,12 +25,16 @@ import os
 import sys
 import inspect
 import importlib
+import itertools
 import numpy as np
 from collections import OrderedDict
 
 from logic.pulsed.sampling_functions import SamplingFunctions
 from core.util.modules import get_main_dir
 
+# Source of the PulseBlock version stamps. Each stamp is only handed out once per session.
+_block_versions = itertools.count()
+
 
 class PulseBlockElement(object):
     """
@@ -141,6 +145,11 @@ class PulseBlockElement(object):
 class PulseBlock(object):
     """
     Collection of Pulse_Block_Elements which is called a Pulse_Block.
+
+    Every change of the element list draws a new unique version stamp (attribute "version"), which
+    is used to detect changes of the block cheaply, e.g. for caching the analysis results in
+    SequenceGeneratorLogic. Therefore PulseBlockElements contained in a PulseBlock must not be
+    changed in place but replaced by a new element (block[index] = new_element).
     """
 
     def __init__(self, name, element_list=None):
@@ -158,9 +167,16 @@ class PulseBlock(object):
         self.analog_channels = set()
         self.digital_channels = set()
         self.channel_set = set()
+        self.version = next(_block_versions)
         self.refresh_parameters()
         return
 
+    def __setstate__(self, state):
+        # Copied or unpickled blocks get a fresh version stamp
+        self.__dict__.update(state)
+        self.version = next(_block_versions)
+        return
+
     def __repr__(self):
         repr_str = 'PulseBlock(name=\'{0}\', element_list=['.format(self.name)
         repr_str += ', '.join((repr(elem) for elem in self.element_list)) + '])'
@@ -233,6 +249,7 @@ class PulseBlock(object):
         else:
             raise TypeError('PulseBlock indices must be int or slice, not {0}'.format(type(key)))
         self.element_list[key] = copy.deepcopy(value)
+        self.version = next(_block_versions)
         return
 
     def __delitem__(self, key):
@@ -251,6 +268,7 @@ class PulseBlock(object):
         if len(self.element_list) == 0:
             self.init_length_s = 0.0
             self.increment_s = 0.0
+        self.version = next(_block_versions)
         return
 
     def __eq__(self, other):
@@ -279,6 +297,7 @@ class PulseBlock(object):
         self.init_length_s = 0.0
         self.increment_s = 0.0
         self.channel_set = set()
+        self.version = next(_block_versions)
 
         for elem in self.element_list:
             self.init_length_s += elem.init_length_s
@@ -302,6 +321,7 @@ class PulseBlock(object):
         if position is None:
             self.init_length_s -= self.element_list[-1].init_length_s
             self.increment_s -= self.element_list[-1].increment_s
+            self.version = next(_block_versions)
             return self.element_list.pop()
 
         if not isinstance(position, int):
@@ -316,6 +336,7 @@ class PulseBlock(object):
 
         self.init_length_s -= self.element_list[position].init_length_s
         self.increment_s -= self.element_list[position].increment_s
+        self.version = next(_block_versions)
         return self.element_list.pop(position)
 
     def insert(self, position, element):
@@ -348,6 +369,7 @@ class PulseBlock(object):
         self.increment_s += element.increment_s
 
         self.element_list.insert(position, copy.deepcopy(element))
+        self.version = next(_block_versions)
         return
 
     def append(self, element):
@@ -368,10 +390,12 @@ class PulseBlock(object):
         self.analog_channels = set()
         self.digital_channels = set()
         self.channel_set = set()
+        self.version = next(_block_versions)
         return
 
     def reverse(self):
         self.element_list.reverse()
+        self.version = next(_block_versions)
         return
 
     def get_dict_representation(self):
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi helper classes to run the extraction and analysis of laser pulses
+in a worker thread or process.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import logging
+import tempfile
+import importlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+
+# Extractor/analyzer instances and the settings they read, separate for each worker thread
+_worker_state = threading.local()
+
+
+class PulseWorker:
+    """
+    Runs the extraction and analysis of laser pulses in a single worker thread or process.
+
+    The extraction and analysis methods are not called on the instances held by PulseExtractor
+    and PulseAnalyzer but on separate instances of the same classes living in the worker. These
+    instances read the settings handed over with each job from a WorkerSettings object instead of
+    PulsedMeasurementLogic.
+
+    In a worker process the raw timetrace is handed over via a memory mapped temporary file
+    instead of being pickled.
+    """
+
+    def __init__(self, executor_type='thread'):
+        """
+        @param str executor_type: 'thread' or 'process'
+        """
+        self._shared_trace = None
+        self._pending_future = None
+        if executor_type == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        elif executor_type == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=1)
+            self._shared_trace = SharedTrace()
+        else:
+            raise ValueError('Unknown pulse worker executor type "{0}". Valid types are "thread" '
+                             'and "process".'.format(executor_type))
+        self.executor_type = executor_type
+
+    def submit(self, settings, raw_data=None, laser_data=None, extraction=None, analysis=None):
+        """
+        Submits a job extracting laser pulses from raw_data and/or analysing laser pulses.
+
+        @param dict settings: dict with keys 'fast_counter_settings', 'measurement_settings',
+                              'sampling_information' as read by extractor and analyzer classes
+                              and 'sampling_information_revision' (see
+                              PulsedMeasurementLogic.sampling_information_revision)
+        @param numpy.ndarray raw_data: raw timetrace to extract the laser pulses from
+        @param numpy.ndarray laser_data: laser pulses to analyse if no extraction is requested
+        @param tuple extraction: (method, kwargs) as returned by
+                                 PulseExtractor.get_extraction_method or None to skip extraction
+        @param tuple analysis: (method, kwargs) as returned by PulseAnalyzer.get_analysis_method
+                               or None to skip analysis
+
+        @return concurrent.futures.Future: future of the result dict as returned by
+                                           process_laser_pulses
+        """
+        if raw_data is not None and self._shared_trace is not None:
+            # the memory mapped file must not be overwritten while a job is still reading it
+            if self._pending_future is not None:
+                wait([self._pending_future])
+            raw_data = self._shared_trace.put(raw_data)
+        self._pending_future = self._executor.submit(process_laser_pulses,
+                                                     settings=settings,
+                                                     raw_data=raw_data,
+                                                     laser_data=laser_data,
+                                                     extraction=self._method_spec(extraction),
+                                                     analysis=self._method_spec(analysis))
+        return self._pending_future
+
+    def shutdown(self):
+        """
+        Waits for the running job to finish and frees all resources of the worker.
+        """
+        self._executor.shutdown(wait=True)
+        self._pending_future = None
+        if self._shared_trace is not None:
+            self._shared_trace.close()
+
+    @staticmethod
+    def _method_spec(method_tuple):
+        """
+        Converts a bound extraction/analysis method into a picklable description.
+
+        @param tuple method_tuple: (bound method, kwargs) or None
+
+        @return tuple: (module name, class name, method name, kwargs) or None
+        """
+        if method_tuple is None:
+            return None
+        method, kwargs = method_tuple
+        cls = type(method.__self__)
+        return cls.__module__, cls.__name__, method.__name__, kwargs
+
+
+class SharedTrace:
+    """
+    Numpy array in a memory mapped temporary file to share a raw timetrace with a worker process.
+
+    The file is reused as long as shape and dtype of the timetrace do not change. On Linux it is
+    placed in /dev/shm, so it never touches the disk.
+    """
+
+    def __init__(self):
+        self._array = None
+        self._path = None
+
+    def put(self, data):
+        """
+        Copies data into the shared file.
+
+        @param numpy.ndarray data: the array to share
+
+        @return tuple|numpy.ndarray: (file path, dtype string, shape) to open the array with
+                                     open_shared_trace or data itself if it is empty
+        """
+        if data.size == 0:
+            return data
+        if self._array is None or self._array.shape != data.shape or \
+                self._array.dtype != data.dtype:
+            self.close()
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            file_handle, self._path = tempfile.mkstemp(prefix='qudi_pulsed_', suffix='.dat',
+                                                       dir=directory)
+            os.close(file_handle)
+            self._array = np.memmap(self._path, dtype=data.dtype, mode='w+', shape=data.shape)
+        self._array[...] = data
+        return self._path, self._array.dtype.str, self._array.shape
+
+    def close(self):
+        """
+        Releases the memory map and deletes the shared file.
+        """
+        self._array = None
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+
+def open_shared_trace(path, dtype, shape):
+    """
+    Opens an array shared by SharedTrace.
+
+    @param str path: path of the shared file
+    @param str dtype: numpy dtype string of the array
+    @param tuple shape: shape of the array
+
+    @return numpy.memmap: copy-on-write view of the shared array
+    """
+    return np.memmap(path, dtype=np.dtype(dtype), mode='c', shape=tuple(shape))
+
+
+class WorkerSettings:
+    """
+    Stand-in for PulsedMeasurementLogic providing extractor and analyzer instances in a worker
+    with the settings of the job currently processed.
+    """
+
+    def __init__(self):
+        self.fast_counter_settings = dict()
+        self.measurement_settings = dict()
+        self.sampling_information = dict()
+        self.sampling_information_revision = None
+
+    @property
+    def log(self):
+        return logging.getLogger(__name__)
+
+    def update(self, settings):
+        """
+        Takes over the settings of a new job.
+
+        The sampling information object is only replaced if it has changed in
+        PulsedMeasurementLogic, so extraction methods caching results for the same sampling
+        information keep working in a worker process.
+
+        @param dict settings: settings as handed over to PulseWorker.submit
+        """
+        self.fast_counter_settings = settings['fast_counter_settings']
+        self.measurement_settings = settings['measurement_settings']
+        if settings['sampling_information_revision'] != self.sampling_information_revision:
+            self.sampling_information = settings['sampling_information']
+            self.sampling_information_revision = settings['sampling_information_revision']
+
+
+def _get_worker_method(spec):
+    """
+    Returns the method described by spec, bound to an instance living in the current worker.
+
+    @param tuple spec: (module name, class name, method name, kwargs)
+
+    @return callable: the bound method
+    """
+    if not hasattr(_worker_state, 'instances'):
+        _worker_state.settings = WorkerSettings()
+        _worker_state.instances = dict()
+    module_name, class_name, method_name = spec[:3]
+    instance = _worker_state.instances.get((module_name, class_name))
+    if instance is None:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        instance = cls(_worker_state.settings)
+        _worker_state.instances[(module_name, class_name)] = instance
+    return getattr(instance, method_name)
+
+
+def process_laser_pulses(settings, raw_data=None, laser_data=None, extraction=None,
+                         analysis=None):
+    """
+    Extracts and/or analyses laser pulses. Runs in the worker thread or process.
+
+    @param dict settings: settings as handed over to PulseWorker.submit
+    @param numpy.ndarray|tuple raw_data: raw timetrace or description of a SharedTrace
+    @param numpy.ndarray laser_data: laser pulses to analyse if extraction is None
+    @param tuple extraction: (module name, class name, method name, kwargs) or None
+    @param tuple analysis: (module name, class name, method name, kwargs) or None
+
+    @return dict: result dict with keys 'laser_data' and 'laser_bin_indices' (if extracted) and
+                  'signal' and 'error' (if analysed)
+    """
+    result = dict()
+    if extraction is not None:
+        method = _get_worker_method(extraction)
+        _worker_state.settings.update(settings)
+        if isinstance(raw_data, tuple):
+            raw_data = open_shared_trace(*raw_data)
+        return_dict = method(count_data=raw_data, **extraction[3])
+        # laser pulses might be a view into the shared raw timetrace
+        laser_data = np.asarray(return_dict['laser_counts_arr'])
+        result['laser_data'] = laser_data
+        result['laser_bin_indices'] = return_dict.get('laser_bin_indices')
+
+    if analysis is not None:
+        method = _get_worker_method(analysis)
+        _worker_state.settings.update(settings)
+        # Analyse only if extraction worked (non-zero array returned)
+        if laser_data.any():
+            result['signal'], result['error'] = method(laser_data=laser_data, **analysis[3])
+        else:
+            result['signal'] = np.zeros(laser_data.shape[0])
+            result['error'] = np.zeros(laser_data.shape[0])
+    return result
@@ -30,6 +30,9 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # laser data of the last analysis and its cumulative sums along the time bins (if needed)
+        self._cumsum_laser_data = None
+        self._cumsum_table = None
 
     def analyse_mean_norm(self, laser_data, signal_start=0.0, signal_end=200e-9, norm_start=300e-9,
                           norm_end=500e-9):
@@ -56,34 +59,24 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         norm_start_bin = round(norm_start / bin_width)
         norm_end_bin = round(norm_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum and mean of the data in the normalization window
-            tmp_data = laser_arr[norm_start_bin:norm_end_bin]
-            reference_sum = np.sum(tmp_data)
-            reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
-
-            # calculate the sum and mean of the data in the signal window
-            tmp_data = laser_arr[signal_start_bin:signal_end_bin]
-            signal_sum = np.sum(tmp_data)
-            signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        # calculate the sums of the data in the normalization and signal window for all lasers
+        (reference_sum, reference_length), (signal_sum, signal_length) = self._window_sums(
+            laser_data, (norm_start_bin, norm_end_bin), (signal_start_bin, signal_end_bin))
+        reference_mean = reference_sum / reference_length if reference_length != 0 else \
+            np.zeros(num_of_lasers)
+        signal_mean = signal_sum / signal_length if signal_length != 0 else \
+            np.zeros(num_of_lasers)
 
+        with np.errstate(divide='ignore', invalid='ignore'):
             # Calculate normalized signal while avoiding division by zero
-            if reference_mean > 0 and signal_mean >= 0:
-                signal_data[ii] = signal_mean / reference_mean
-            else:
-                signal_data[ii] = 0.0
+            valid = (reference_mean > 0) & (signal_mean >= 0)
+            signal_data = np.where(valid, signal_mean / reference_mean, 0.0)
 
             # Calculate measurement error while avoiding division by zero
-            if reference_sum > 0 and signal_sum > 0:
-                # calculate with respect to gaussian error 'evolution'
-                error_data[ii] = signal_data[ii] * np.sqrt(1 / signal_sum + 1 / reference_sum)
-            else:
-                error_data[ii] = 0.0
+            # (with respect to gaussian error 'evolution')
+            valid = (reference_sum > 0) & (signal_sum > 0)
+            error_data = np.where(
+                valid, signal_data * np.sqrt(1 / signal_sum + 1 / reference_sum), 0.0)
 
         return signal_data, error_data
 
@@ -106,23 +99,13 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         signal_start_bin = round(signal_start / bin_width)
         signal_end_bin = round(signal_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
+        # calculate the sum of the data in the signal window for all lasers
+        (signal, _), = self._window_sums(laser_data, (signal_start_bin, signal_end_bin))
 
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum of the data in the signal window
-            signal = laser_arr[signal_start_bin:signal_end_bin].sum()
-            signal_error = np.sqrt(signal)
-
-            # Avoid numpy C type variables overflow and NaN values
-            if signal < 0 or signal != signal:
-                signal_data[ii] = 0.0
-                error_data[ii] = 0.0
-            else:
-                signal_data[ii] = signal
-                error_data[ii] = signal_error
+        # Avoid numpy C type variables overflow and NaN values
+        valid = signal >= 0
+        signal_data = np.where(valid, signal, 0.0)
+        error_data = np.sqrt(signal_data)
 
         return signal_data, error_data
 
@@ -146,23 +129,55 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         signal_start_bin = round(signal_start / bin_width)
         signal_end_bin = round(signal_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the mean of the data in the signal window
-            signal = laser_arr[signal_start_bin:signal_end_bin].mean()
-            signal_sum = laser_arr[signal_start_bin:signal_end_bin].sum()
-            signal_error = np.sqrt(signal_sum) / (signal_end_bin - signal_start_bin)
-
-            # Avoid numpy C type variables overflow and NaN values
-            if signal < 0 or signal != signal:
-                signal_data[ii] = 0.0
-                error_data[ii] = 0.0
-            else:
-                signal_data[ii] = signal
-                error_data[ii] = signal_error
+        # calculate the mean of the data in the signal window for all lasers
+        (signal_sum, signal_length), = self._window_sums(laser_data,
+                                                         (signal_start_bin, signal_end_bin))
+        if signal_length == 0:
+            return np.zeros(num_of_lasers), np.zeros(num_of_lasers)
+        signal = signal_sum / signal_length
+
+        # Avoid numpy C type variables overflow and NaN values
+        valid = signal >= 0
+        signal_data = np.where(valid, signal, 0.0)
+        error_data = np.where(
+            valid, np.sqrt(np.abs(signal_sum)) / (signal_end_bin - signal_start_bin), 0.0)
 
         return signal_data, error_data
+
+    def _window_sums(self, laser_data, *windows):
+        """
+        Sums up the time bins of each window for all laser pulses.
+
+        @param numpy.ndarray laser_data: laser pulses, dim 0: laser number, dim 1: time bin
+        @param tuple windows: (start_bin, end_bin) tuples with slice semantics
+
+        @return list: tuple(numpy.ndarray, int) for each window with the sum for each laser pulse
+                      and the number of bins summed up
+
+        A new laser_data array is summed up directly over the windows. If the same laser_data
+        array is analysed again (e.g. with changed analysis windows), its cumulative sums along
+        the time bins are calculated once and every further window sum is looked up from them
+        without another pass over the data. laser_data must not be changed in place between
+        calls.
+        """
+        if self._cumsum_laser_data is not laser_data:
+            self._cumsum_laser_data = laser_data
+            self._cumsum_table = None
+        elif self._cumsum_table is None:
+            table = np.zeros((laser_data.shape[0], laser_data.shape[1] + 1),
+                             dtype=np.result_type(laser_data.dtype, np.int64))
+            np.cumsum(laser_data, axis=1, out=table[:, 1:])
+            self._cumsum_table = table
+
+        sums = list()
+        for start_bin, end_bin in windows:
+            start_bin, end_bin, _ = slice(start_bin, end_bin).indices(laser_data.shape[1])
+            length = max(end_bin - start_bin, 0)
+            if length == 0:
+                window_sum = np.zeros(laser_data.shape[0])
+            elif self._cumsum_table is None:
+                window_sum = laser_data[:, start_bin:end_bin].sum(axis=1)
+            else:
+                window_sum = self._cumsum_table[:, end_bin] - self._cumsum_table[:, start_bin]
+            sums.append((window_sum.astype(float), length))
+        return sums
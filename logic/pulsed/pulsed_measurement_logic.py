@@ -23,6 +23,7 @@ from qtpy import QtCore
 from collections import OrderedDict
 import numpy as np
 import copy
+import os
 import time
 import datetime
 import matplotlib.pyplot as plt
@@ -31,9 +32,11 @@ from core.module import Connector, ConfigOption, StatusVar
 from core.util.mutex import Mutex
 from core.util.network import netobtain
 from core.util import units
+from core.util.time_tag_log import load_time_tag_log, histogram_time_tags
 from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_extractor import PulseExtractor
 from logic.pulsed.pulse_analyzer import PulseAnalyzer
+from logic.pulsed.pulse_worker import PulseWorker
 
 
 class PulsedMeasurementLogic(GenericLogic):
@@ -56,6 +59,14 @@ class PulsedMeasurementLogic(GenericLogic):
     analysis_import_path = ConfigOption(name='additional_analysis_path', default=None)
     # Optional file type descriptor for saving raw data to file
     _raw_data_save_type = ConfigOption(name='raw_data_save_type', default='text')
+    # Only add the counts received since the last analysis to the laser pulses instead of
+    # extracting them from the whole timetrace on every analysis timer tick
+    _incremental_analysis = ConfigOption(name='incremental_analysis', default=False)
+    # Run extraction and analysis in a worker 'thread' or 'process' instead of the logic thread
+    _analysis_executor = ConfigOption(name='analysis_executor', default=None)
+    # Let the fast counter record the raw time tags of each measurement (if supported) so the
+    # raw data can be binned again later on with rebin_time_tag_log
+    _record_time_tags = ConfigOption(name='record_time_tags', default=False)
 
     # status variables
     # ext. microwave settings
@@ -111,6 +122,7 @@ class PulsedMeasurementLogic(GenericLogic):
     # Internal signals
     sigStartTimer = QtCore.Signal()
     sigStopTimer = QtCore.Signal()
+    sigPulseWorkerFinished = QtCore.Signal(object)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -136,6 +148,28 @@ class PulsedMeasurementLogic(GenericLogic):
         self.laser_data = np.zeros((10, 20), dtype='int64')
         self.raw_data = np.zeros((10, 20), dtype='int64')
 
+        # state of the incremental analysis: bin indices of the laser pulses in the raw data,
+        # the conditions they were extracted under and the analysis settings last used
+        self._laser_bin_indices = None
+        self._extraction_key = None
+        self._extraction_counts = 0
+        self._analysed_settings = None
+
+        # worker for extraction and analysis, the job in progress and the settings revision.
+        # Results of jobs submitted before the last settings change are dropped.
+        self._pulse_worker = None
+        self._pulse_worker_future = None
+        self._pulse_worker_job = None
+        self._pulse_worker_revision = 0
+        # incremented with every change of the sampling information, so cached results depending
+        # on it can be recognized as outdated
+        self._sampling_information_revision = 0
+
+        # time tag log of the last measurement and whether the fast counter settings have been
+        # changed by re-binning it (the fast counter is configured again on the next start)
+        self._time_tag_log_path = None
+        self._fast_counter_reconfigure = False
+
         self._saved_raw_data = OrderedDict()  # temporary saved raw data
         self._recalled_raw_data_tag = None  # the currently recalled raw data dict key
 
@@ -167,6 +201,15 @@ class PulsedMeasurementLogic(GenericLogic):
         self.__analysis_timer.timeout.connect(self._pulsed_analysis_loop,
                                               QtCore.Qt.QueuedConnection)
 
+        # Worker for extraction and analysis if configured
+        if self._analysis_executor:
+            try:
+                self._pulse_worker = PulseWorker(self._analysis_executor)
+            except ValueError:
+                self.log.exception('Unable to create pulse worker. Extraction and analysis of '
+                                   'laser pulses will run in the logic thread.')
+                self._pulse_worker = None
+
         # Fitting
         self.fc = self.fitlogic().make_fit_container('pulsed', '1d')
         self.fc.set_units(self._data_units)
@@ -206,6 +249,8 @@ class PulsedMeasurementLogic(GenericLogic):
         # Connect internal signals
         self.sigStartTimer.connect(self.__analysis_timer.start, QtCore.Qt.QueuedConnection)
         self.sigStopTimer.connect(self.__analysis_timer.stop, QtCore.Qt.QueuedConnection)
+        self.sigPulseWorkerFinished.connect(self._pulse_worker_finished,
+                                            QtCore.Qt.QueuedConnection)
         return
 
     def on_deactivate(self):
@@ -224,6 +269,11 @@ class PulsedMeasurementLogic(GenericLogic):
         self.__analysis_timer.timeout.disconnect()
         self.sigStartTimer.disconnect()
         self.sigStopTimer.disconnect()
+        self.sigPulseWorkerFinished.disconnect()
+        if self._pulse_worker is not None:
+            self._pulse_worker.shutdown()
+            self._pulse_worker = None
+            self._pulse_worker_future = None
         return
 
     ############################################################################
@@ -568,8 +618,13 @@ class PulsedMeasurementLogic(GenericLogic):
             self._sampling_information = info_dict
         else:
             self._sampling_information = dict()
+        self._sampling_information_revision += 1
         return
 
+    @property
+    def sampling_information_revision(self):
+        return self._sampling_information_revision
+
     @property
     def timer_interval(self):
         return float(self.__timer_interval)
@@ -645,6 +700,7 @@ class PulsedMeasurementLogic(GenericLogic):
         # Use threadlock to update settings during a running measurement
         with self._threadlock:
             self._pulseanalyzer.analysis_settings = settings_dict
+            self._pulse_worker_revision += 1
             self.sigAnalysisSettingsUpdated.emit(self.analysis_settings)
         return
 
@@ -670,6 +726,7 @@ class PulsedMeasurementLogic(GenericLogic):
         # Use threadlock to update settings during a running measurement
         with self._threadlock:
             self._pulseextractor.extraction_settings = settings_dict
+            self._pulse_worker_revision += 1
             self.sigExtractionSettingsUpdated.emit(self.extraction_settings)
         return
 
@@ -771,6 +828,11 @@ class PulsedMeasurementLogic(GenericLogic):
                 self.do_fit('No Fit', False)
                 self.do_fit('No Fit', True)
 
+                # apply the fast counter settings again if changed by re-binning a time tag log
+                if self._fast_counter_reconfigure:
+                    self._fast_counter_reconfigure = False
+                    self.set_fast_counter_settings()
+
                 # initialize data arrays
                 self._initialize_data_arrays()
 
@@ -786,6 +848,7 @@ class PulsedMeasurementLogic(GenericLogic):
                 if self.__use_ext_microwave:
                     self.microwave_on()
                 # start fast counter
+                self._set_up_time_tag_log()
                 self.fast_counter_on()
                 # start pulse generator
                 self.pulse_generator_on()
@@ -814,7 +877,7 @@ class PulsedMeasurementLogic(GenericLogic):
         """
         # Get raw data and analyze it a last time just before stopping the measurement.
         try:
-            self._pulsed_analysis_loop()
+            self._pulsed_analysis_loop(wait=True)
         except:
             pass
 
@@ -956,6 +1019,83 @@ class PulsedMeasurementLogic(GenericLogic):
             self.sigMeasurementDataUpdated.emit()
         return
 
+    @property
+    def time_tag_log_path(self):
+        return self._time_tag_log_path
+
+    def rebin_time_tag_log(self, bin_width=None, record_length=None, filepath=None):
+        """
+        Generates the raw data from a time tag log with another bin width and/or record length
+        and analyzes it again, without measuring again. Only possible while no measurement runs.
+
+        The fast counter settings of the logic are changed to the new bin width and record length
+        and are applied to the fast counter on the next measurement start.
+
+        @param float bin_width: bin width in seconds, the current one if None
+        @param float record_length: record length in seconds, the current one if None
+        @param str filepath: path of the time tag log, the log of the last measurement if None
+
+        @return int: error code (0:OK, -1:error)
+        """
+        with self._threadlock:
+            if self.module_state() == 'locked':
+                self.log.error('Unable to re-bin time tag log while a measurement is running.')
+                return -1
+            if filepath is None:
+                filepath = self._time_tag_log_path
+            if filepath is None:
+                self.log.error('Unable to re-bin time tag log. No time tags have been recorded.')
+                return -1
+
+            try:
+                tags, log_info = load_time_tag_log(filepath)
+            except (OSError, ValueError):
+                self.log.exception('Unable to load time tag log "{0}".'.format(filepath))
+                return -1
+
+            if bin_width is not None:
+                self.__fast_counter_binwidth = float(bin_width)
+            if record_length is not None:
+                self.__fast_counter_record_length = float(record_length)
+            self._fast_counter_reconfigure = True
+            self.sigFastCounterSettingsUpdated.emit(self.fast_counter_settings)
+
+            raw_data = histogram_time_tags(tags,
+                                           resolution=log_info['resolution'],
+                                           bin_width=self.__fast_counter_binwidth,
+                                           record_length=self.__fast_counter_record_length,
+                                           number_of_gates=log_info['number_of_gates'])
+            del tags
+
+            self._initialize_data_arrays()
+            self.raw_data = raw_data
+            self.__elapsed_sweeps = log_info['number_of_sweeps']
+
+            return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
+            self.laser_data = return_dict['laser_counts_arr']
+            tmp_signal, tmp_error = self._analyze_laser_pulses()
+            self._update_signal_data(tmp_signal, tmp_error)
+        return 0
+
+    def _set_up_time_tag_log(self):
+        """
+        Lets the fast counter record the time tags of the measurement to be started, if
+        configured and supported.
+        """
+        self._time_tag_log_path = None
+        if not self.fastcounter().has_time_tag_log():
+            if self._record_time_tags:
+                self.log.warning('Fast counter does not support recording time tags.')
+            return
+
+        filepath = None
+        if self._record_time_tags:
+            filepath = os.path.join(
+                self.savelogic().get_path_for_module('PulsedMeasurement'),
+                '{0}_time_tags.dat'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M-%S')))
+        self._time_tag_log_path = self.fastcounter().set_time_tag_log(filepath)
+        return
+
     @QtCore.Slot()
     def manually_pull_data(self):
         """ Analyse and display the data
@@ -1088,49 +1228,30 @@ class PulsedMeasurementLogic(GenericLogic):
                            'configured in measurement settings.')
         return
 
-    def _pulsed_analysis_loop(self):
+    def _pulsed_analysis_loop(self, wait=False):
         """ Acquires laser pulses from fast counter,
             calculates fluorescence signal and creates plots.
+
+        @param bool wait: if a pulse worker is used, wait for its result instead of receiving it
+                          via sigPulseWorkerFinished
         """
         with self._threadlock:
             if self.module_state() == 'locked':
-                # Update elapsed time
-
-                self._extract_laser_pulses()
+                if self._pulse_worker is not None:
+                    self._submit_pulse_worker_job(wait)
+                    return
 
-                tmp_signal, tmp_error = self._analyze_laser_pulses()
+                laser_data_changed = self._extract_laser_pulses()
 
-                # exclude laser pulses to ignore
-                if len(self._laser_ignore_list) > 0:
-                    # Convert relative negative indices into absolute positive indices
-                    while self._laser_ignore_list[0] < 0:
-                        neg_index = self._laser_ignore_list[0]
-                        self._laser_ignore_list[0] = len(tmp_signal) + neg_index
-                        self._laser_ignore_list.sort()
-
-                    tmp_signal = np.delete(tmp_signal, self._laser_ignore_list)
-                    tmp_error = np.delete(tmp_error, self._laser_ignore_list)
-
-                # order data according to alternating flag
-                if self._alternating:
-                    if len(self.signal_data[0]) != len(tmp_signal[::2]):
-                        self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
-                                       'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal[::2])))
-                        return
-                    self.signal_data[1] = tmp_signal[::2]
-                    self.signal_data[2] = tmp_signal[1::2]
-                    self.measurement_error[1] = tmp_error[::2]
-                    self.measurement_error[2] = tmp_error[1::2]
-                else:
-                    if len(self.signal_data[0]) != len(tmp_signal):
-                        self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
-                                       'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal)))
-                        return
-                    self.signal_data[1] = tmp_signal
-                    self.measurement_error[1] = tmp_error
+                # skip the analysis if neither the laser pulses nor the analysis settings changed
+                if not self._analysis_required(laser_data_changed):
+                    self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                              self.__timer_interval)
+                    return
 
-                # Compute alternative data array from signal
-                self._compute_alt_data()
+                tmp_signal, tmp_error = self._analyze_laser_pulses()
+                self._update_signal_data(tmp_signal, tmp_error)
+                return
 
             # emit signals
             self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
@@ -1138,17 +1259,246 @@ class PulsedMeasurementLogic(GenericLogic):
             self.sigMeasurementDataUpdated.emit()
             return
 
+    def _update_signal_data(self, tmp_signal, tmp_error):
+        """
+        Sorts the analysed signal of all laser pulses into the signal and error arrays and emits
+        the updated data.
+
+        @param numpy.ndarray tmp_signal: signal data point for each laser pulse
+        @param numpy.ndarray tmp_error: measurement error for each laser pulse
+        """
+        # exclude laser pulses to ignore
+        if len(self._laser_ignore_list) > 0:
+            # Convert relative negative indices into absolute positive indices
+            while self._laser_ignore_list[0] < 0:
+                neg_index = self._laser_ignore_list[0]
+                self._laser_ignore_list[0] = len(tmp_signal) + neg_index
+                self._laser_ignore_list.sort()
+
+            tmp_signal = np.delete(tmp_signal, self._laser_ignore_list)
+            tmp_error = np.delete(tmp_error, self._laser_ignore_list)
+
+        # order data according to alternating flag
+        if self._alternating:
+            if len(self.signal_data[0]) != len(tmp_signal[::2]):
+                self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
+                               'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal[::2])))
+                return
+            self.signal_data[1] = tmp_signal[::2]
+            self.signal_data[2] = tmp_signal[1::2]
+            self.measurement_error[1] = tmp_error[::2]
+            self.measurement_error[2] = tmp_error[1::2]
+        else:
+            if len(self.signal_data[0]) != len(tmp_signal):
+                self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
+                               'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal)))
+                return
+            self.signal_data[1] = tmp_signal
+            self.measurement_error[1] = tmp_error
+
+        # Compute alternative data array from signal
+        self._compute_alt_data()
+
+        # emit signals
+        self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                  self.__timer_interval)
+        self.sigMeasurementDataUpdated.emit()
+        return
+
+    def _analysis_required(self, laser_data_changed):
+        """
+        Checks whether the laser pulses need to be analysed (again) and remembers the analysis
+        settings used for it.
+
+        @param bool laser_data_changed: whether the laser pulses have changed since the last
+                                        analysis. None if they are still to be extracted.
+
+        @return bool: True if the laser pulses or the analysis settings have changed
+        """
+        analysis_settings = self._pulseanalyzer.analysis_settings
+        if laser_data_changed is False and analysis_settings == self._analysed_settings:
+            return False
+        self._analysed_settings = analysis_settings
+        return True
+
+    def _submit_pulse_worker_job(self, wait=False):
+        """
+        Gets the raw data from the fast counter and hands the extraction and analysis of the
+        laser pulses over to the pulse worker.
+
+        Only one job is processed at a time. While the worker is busy, timer ticks only update the
+        elapsed time display.
+
+        @param bool wait: wait for the result and apply it right away instead of receiving it via
+                          sigPulseWorkerFinished. A job still in progress is dropped.
+        """
+        if self._pulse_worker_future is not None:
+            if not wait:
+                self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                          self.__timer_interval)
+                return
+            self._pulse_worker_future = None
+
+        previous_raw_data = self._get_fast_counter_data()
+        laser_data_changed = None
+        if self._incremental_analysis:
+            laser_data_changed = self._update_laser_pulses(previous_raw_data)
+
+        # skip the analysis if neither the laser pulses nor the analysis settings changed
+        if not self._analysis_required(laser_data_changed):
+            self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                      self.__timer_interval)
+            return
+
+        settings = {'fast_counter_settings': self.fast_counter_settings,
+                    'measurement_settings': self.measurement_settings,
+                    'sampling_information': self.sampling_information,
+                    'sampling_information_revision': self.sampling_information_revision}
+        if laser_data_changed is None:
+            self._pulse_worker_job = (self._pulse_worker_revision,
+                                      self._get_extraction_key(),
+                                      int(self.raw_data.sum()))
+            future = self._pulse_worker.submit(
+                settings,
+                raw_data=self.raw_data,
+                extraction=self._pulseextractor.get_extraction_method(),
+                analysis=self._pulseanalyzer.get_analysis_method())
+        else:
+            self._pulse_worker_job = (self._pulse_worker_revision, None, None)
+            future = self._pulse_worker.submit(
+                settings,
+                laser_data=self.laser_data,
+                analysis=self._pulseanalyzer.get_analysis_method())
+
+        if wait:
+            self._apply_pulse_worker_result(future, self._pulse_worker_job)
+        else:
+            self._pulse_worker_future = future
+            future.add_done_callback(self.sigPulseWorkerFinished.emit)
+        return
+
+    @QtCore.Slot(object)
+    def _pulse_worker_finished(self, future):
+        """
+        Receives the result of the pulse worker in the logic thread.
+
+        @param concurrent.futures.Future future: the finished job
+        """
+        with self._threadlock:
+            # job dropped in the meantime
+            if future is not self._pulse_worker_future:
+                return
+            self._pulse_worker_future = None
+            if self.module_state() == 'locked':
+                self._apply_pulse_worker_result(future, self._pulse_worker_job)
+        return
+
+    def _apply_pulse_worker_result(self, future, job):
+        """
+        Takes over the laser pulses and signal data from a finished pulse worker job, unless the
+        settings have changed since it was submitted.
+
+        @param concurrent.futures.Future future: the finished job
+        @param tuple job: settings revision, extraction key and total counts of the raw data at
+                          the time the job was submitted
+        """
+        revision, extraction_key, extraction_counts = job
+        try:
+            result = future.result()
+        except:
+            self.log.exception('Extraction/analysis of laser pulses failed.')
+            return
+
+        if revision != self._pulse_worker_revision:
+            self.log.debug('Settings changed during extraction/analysis of laser pulses. '
+                           'Dropping outdated result.')
+            self._laser_bin_indices = None
+            self._analysed_settings = None
+            return
+
+        if 'laser_data' in result:
+            self.laser_data = result['laser_data']
+            self._laser_bin_indices = result['laser_bin_indices']
+            self._extraction_key = extraction_key
+            self._extraction_counts = extraction_counts
+        self._update_signal_data(result['signal'], result['error'])
+        return
+
     def _extract_laser_pulses(self):
+        """
+        Gets the raw data from the fast counter and extracts the laser pulses from it.
+
+        @return bool: True if the laser pulses have changed, False otherwise
+        """
+        previous_raw_data = self._get_fast_counter_data()
+
+        if self._incremental_analysis:
+            laser_data_changed = self._update_laser_pulses(previous_raw_data)
+            if laser_data_changed is not None:
+                return laser_data_changed
+
+        # extract laser pulses from raw data
+        return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
+        self.laser_data = return_dict['laser_counts_arr']
+
+        # remember where the laser pulses are located for incremental updates
+        self._laser_bin_indices = return_dict.get('laser_bin_indices')
+        self._extraction_key = self._get_extraction_key()
+        self._extraction_counts = int(self.raw_data.sum())
+        return True
+
+    def _get_fast_counter_data(self):
+        """
+        Gets the raw data from the fast counter and updates the elapsed time and sweeps.
+
+        @return numpy.ndarray: the previous raw data
+        """
         # Get counter raw data (including recalled raw data from previous measurement)
         fc_data, info_dict = self._get_raw_data()
+        previous_raw_data = self.raw_data
         self.raw_data = fc_data
         self.__elapsed_sweeps = info_dict['elapsed_sweeps']
         self.__elapsed_time = info_dict['elapsed_time']
+        return previous_raw_data
 
-        # extract laser pulses from raw data
-        return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
-        self.laser_data = return_dict['laser_counts_arr']
-        return
+    def _update_laser_pulses(self, previous_raw_data):
+        """
+        Adds the counts received since the previous timetrace to the laser pulses, using the bin
+        indices of the laser pulses from the last full extraction.
+
+        @param numpy.ndarray previous_raw_data: the timetrace the current laser pulses belong to
+
+        @return bool|None: True if the laser pulses have changed, False if no new counts have
+                           been received and None if a full extraction is needed
+
+        A full extraction is needed if the extraction method does not provide the bin indices,
+        if the measurement or extraction settings have changed or if the total number of counts
+        has doubled since the last full extraction (to refine the detected laser pulses).
+        """
+        if self._laser_bin_indices is None or previous_raw_data.shape != self.raw_data.shape:
+            return None
+        if self._extraction_key != self._get_extraction_key():
+            return None
+        total_counts = int(self.raw_data.sum())
+        if not self._extraction_counts <= total_counts < 2 * max(self._extraction_counts, 1):
+            return None
+
+        new_counts = self.raw_data - previous_raw_data
+        if not new_counts.any():
+            return False
+        self.laser_data = self.laser_data + self._pulseextractor.take_laser_pulses(
+            new_counts, self._laser_bin_indices)
+        return True
+
+    def _get_extraction_key(self):
+        """
+        Collects everything the position of the extracted laser pulses depends on.
+
+        @return tuple: raw data shape, extraction settings, number of lasers and sampling
+                       information revision
+        """
+        return (self.raw_data.shape, self._pulseextractor.extraction_settings,
+                self._number_of_lasers, self._sampling_information_revision)
 
     def _analyze_laser_pulses(self):
         # analyze pulses and get data points for signal array. Also check if extraction
@@ -1227,6 +1577,9 @@ class PulsedMeasurementLogic(GenericLogic):
         number_of_bins = int(self.__fast_counter_record_length / self.__fast_counter_binwidth)
         laser_length = number_of_bins if self.__fast_counter_gates > 0 else 500
         self.laser_data = np.zeros((self._number_of_lasers, laser_length), dtype='int64')
+        self._laser_bin_indices = None
+        self._analysed_settings = None
+        self._pulse_worker_revision += 1
 
         if self.__fast_counter_gates > 0:
             self.raw_data = np.zeros((self._number_of_lasers, number_of_bins), dtype='int64')
@@ -1272,14 +1625,14 @@ class PulsedMeasurementLogic(GenericLogic):
         parameters['gated counting'] = self.fast_counter_settings['is_gated']
         parameters['extraction parameters'] = self.extraction_settings
 
-        self.savelogic().save_data(data,
-                                   timestamp=timestamp,
-                                   parameters=parameters,
-                                   filepath=filepath,
-                                   filelabel=filelabel,
-                                   filetype='text',
-                                   fmt='%d',
-                                   delimiter='\t')
+        self.savelogic().save_data_async(data,
+                                         timestamp=timestamp,
+                                         parameters=parameters,
+                                         filepath=filepath,
+                                         filelabel=filelabel,
+                                         filetype='text',
+                                         fmt='%d',
+                                         delimiter='\t')
 
         #####################################################################
         ####                Save measurement data                        ####
@@ -1540,10 +1893,10 @@ class PulsedMeasurementLogic(GenericLogic):
         # plt.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3, ncol=2,
         #            mode="expand", borderaxespad=0.)
 
-        self.savelogic().save_data(data, timestamp=timestamp,
-                                   parameters=parameters, fmt='%.15e',
-                                   filepath=filepath, filelabel=filelabel, filetype='text',
-                                   delimiter='\t', plotfig=fig)
+        self.savelogic().save_data_async(data, timestamp=timestamp,
+                                         parameters=parameters, fmt='%.15e',
+                                         filepath=filepath, filelabel=filelabel, filetype='text',
+                                         delimiter='\t', plotfig=fig)
 
         #####################################################################
         ####                Save raw data timetrace                      ####
@@ -1563,11 +1916,12 @@ class PulsedMeasurementLogic(GenericLogic):
         parameters['alternating'] = self._alternating
         parameters['Controlled variable'] = list(self.signal_data[0])
 
-        self.savelogic().save_data(data, timestamp=timestamp,
-                                   parameters=parameters, fmt='%d',
-                                   filepath=filepath, filelabel=filelabel,
-                                   filetype=self._raw_data_save_type,
-                                   delimiter='\t')
+        # raw_trace is a fresh copy due to astype, no need to copy it again
+        self.savelogic().save_data_async(data, timestamp=timestamp,
+                                         parameters=parameters, fmt='%d',
+                                         filepath=filepath, filelabel=filelabel,
+                                         filetype=self._raw_data_save_type,
+                                         delimiter='\t', copy_data=False)
         return filepath
 
     def _compute_alt_data(self):
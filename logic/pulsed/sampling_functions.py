@@ -35,6 +35,10 @@ class SamplingBase:
     """
     params = OrderedDict()
     log = logging.getLogger(__name__)
+    # Set to True if get_samples evaluates every time point on its own, i.e. the samples do not
+    # depend on the start or length of the PulseBlockElement. Such sampling functions are sampled
+    # for many elements in a single get_samples call.
+    pointwise = False
 
     def __repr__(self):
         kwargs = []
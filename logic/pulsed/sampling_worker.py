@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi helper functions to sample compiled PulseBlockEnsembles. They do not
+depend on SequenceGeneratorLogic, so whole ensembles can be sampled in a worker process.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import time
+import numpy as np
+
+from collections import OrderedDict
+
+from logic.pulsed.sampling_functions import SamplingFunctions
+
+# Paths the sampling functions have been imported from in this worker process
+_imported_sampling_function_paths = None
+
+
+def sample_ensemble_chunk(compiled_ensemble, chunk_start, chunk_length, offset_bin, rotating_frame,
+                          sample_rate, analog_samples, digital_samples, grouped_max_length=256,
+                          segment_cache=None):
+    """
+    Samples a part of a compiled PulseBlockEnsemble into preallocated sample arrays.
+
+    Digital channels are filled run by run. Analog samples of all elements sharing the same
+    sampling function are calculated in a single get_samples call if the sampling function is
+    pointwise (see SamplingBase.pointwise), otherwise element by element.
+    Samples of elements sampled one by one are looked up in and added to the segment_cache. They
+    only need to be calculated again if the sampling function, the element length or the time of
+    the element (for rotating frame) changed.
+
+    @param dict compiled_ensemble: the ensemble as returned by
+                                   SequenceGeneratorLogic._compile_block_ensemble
+    @param int chunk_start: index of the first sample of the chunk within the ensemble
+    @param int chunk_length: number of samples in the chunk
+    @param int offset_bin: time offset (in samples) of the ensemble
+    @param bool rotating_frame: If True, the time runs on over the whole ensemble. Otherwise
+                                it starts at offset_bin for every element.
+    @param float sample_rate: the sample rate in samples/s
+    @param dict analog_samples: arrays of the chunk length to fill with analog samples
+    @param dict digital_samples: arrays of the chunk length to fill with digital samples
+    @param int grouped_max_length: elements shorter than this number of samples are sampled
+                                   together with all other elements using the same pointwise
+                                   sampling function
+    @param SegmentCache segment_cache: optional, cache of analog samples of single elements
+    """
+    chunk_end = chunk_start + chunk_length
+    start_bins = compiled_ensemble['element_start_bins']
+    end_bins = start_bins + compiled_ensemble['element_length_bins']
+
+    # Elements overlapping with the chunk and the part of them inside the chunk
+    first = np.searchsorted(end_bins, chunk_start, side='right')
+    last = np.searchsorted(start_bins, chunk_end, side='left')
+    element_starts = start_bins[first:last]
+    clipped_starts = np.maximum(element_starts, chunk_start)
+    clipped_lengths = np.minimum(end_bins[first:last], chunk_end) - clipped_starts
+
+    for chnl, samples in digital_samples.items():
+        states = compiled_ensemble['digital_states'][chnl][first:last]
+        samples[:] = np.repeat(states, clipped_lengths)
+
+    if not analog_samples:
+        return
+
+    # Time of each sample in the chunk (rotating frame) or since the start of its element
+    element_lengths = compiled_ensemble['element_length_bins'][first:last]
+    if rotating_frame:
+        time_arr = np.arange(offset_bin + chunk_start, offset_bin + chunk_end,
+                             dtype='float64') / sample_rate
+        time_starts = clipped_starts - chunk_start
+    else:
+        max_length = element_lengths.max() if len(element_lengths) > 0 else 0
+        time_arr = np.arange(offset_bin, offset_bin + max_length, dtype='float64') / sample_rate
+        time_starts = clipped_starts - element_starts
+
+    for chnl, samples in analog_samples.items():
+        function_ids = compiled_ensemble['analog_function_ids'][chnl][first:last]
+        level = compiled_ensemble['analog_levels'][chnl]
+        for function_id in np.unique(function_ids):
+            in_group = function_ids == function_id
+            if function_id < 0:
+                samples[concatenated_ranges(clipped_starts[in_group] - chunk_start,
+                                            clipped_lengths[in_group])] = 0
+                continue
+
+            function = compiled_ensemble['sampling_functions'][function_id]
+            # Elements of this sampling function can be cached if the function is hashable
+            function_keys = compiled_ensemble.get('sampling_function_keys')
+            if segment_cache is None or not function_keys or function_keys[function_id] is None:
+                segment_key = None
+            else:
+                segment_key = (function_keys[function_id], float(level), float(sample_rate))
+            # Short elements of pointwise sampling functions are sampled all at once. Long
+            # elements are sampled one by one directly into their part of the sample array.
+            if function.pointwise:
+                is_short = in_group & (clipped_lengths < grouped_max_length)
+                in_group &= np.logical_not(is_short)
+                if is_short.any():
+                    lengths = clipped_lengths[is_short]
+                    positions = concatenated_ranges(clipped_starts[is_short] - chunk_start,
+                                                    lengths)
+                    if rotating_frame:
+                        group_time_arr = time_arr[positions]
+                    else:
+                        group_time_arr = time_arr[concatenated_ranges(time_starts[is_short],
+                                                                      lengths)]
+                    samples[positions] = function.get_samples(group_time_arr) / level
+
+            for el_start, el_length, start, length, time_start in zip(
+                    element_starts[in_group], element_lengths[in_group],
+                    clipped_starts[in_group] - chunk_start, clipped_lengths[in_group],
+                    time_starts[in_group]):
+                if function.pointwise:
+                    # Segments are identified by their first time bin and their length
+                    if rotating_frame:
+                        first_bin = offset_bin + chunk_start + time_start
+                    else:
+                        first_bin = offset_bin + time_start
+                    element_samples = _get_segment(
+                        segment_cache, segment_key, level, first_bin, length,
+                        lambda: function.get_samples(time_arr[time_start:time_start + length]))
+                else:
+                    # Non-pointwise sampling functions need the whole element to be sampled,
+                    # even if only a part of it lies in the chunk
+                    first_bin = offset_bin + el_start if rotating_frame else offset_bin
+                    skipped = start + chunk_start - el_start
+                    element_samples = _get_segment(
+                        segment_cache, segment_key, level, first_bin, el_length,
+                        lambda: function.get_samples(
+                            np.arange(first_bin, first_bin + el_length,
+                                      dtype='float64') / sample_rate))[skipped:skipped + length]
+                samples[start:start + length] = element_samples
+    return
+
+
+def _get_segment(segment_cache, segment_key, level, first_bin, length, get_samples):
+    """
+    Returns the normalized analog samples of a segment from the segment cache or samples (and
+    caches) them.
+
+    @param SegmentCache segment_cache: the segment cache or None
+    @param tuple segment_key: sampling function key, level and sample rate of the segment or None
+                              if the segment can not be cached
+    @param float level: the pp-amplitude to normalize the samples with
+    @param int first_bin: time bin of the first sample of the segment
+    @param int length: number of samples of the segment
+    @param callable get_samples: returns the samples (not normalized) of the segment
+
+    @return numpy.ndarray: the samples of the segment normalized to the level
+    """
+    if segment_key is None:
+        return get_samples() / level
+    key = segment_key + (int(first_bin), int(length))
+    segment = segment_cache.get(key)
+    if segment is None:
+        segment = np.asarray(get_samples() / level, dtype='float32')
+        segment_cache.add(key, segment)
+    return segment
+
+
+class SegmentCache:
+    """
+    Least recently used cache of sampled analog segments (normalized float32 sample arrays) with
+    a limited total size in bytes.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        @param int max_bytes: maximum total size of the cached sample arrays
+        """
+        self.max_bytes = int(max_bytes)
+        self._segments = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._segments)
+
+    def get(self, key):
+        """
+        @param tuple key: segment key
+
+        @return numpy.ndarray: the cached samples or None
+        """
+        segment = self._segments.get(key)
+        if segment is not None:
+            self._segments.move_to_end(key)
+        return segment
+
+    def add(self, key, segment):
+        """
+        Adds a segment and drops the least recently used segments exceeding max_bytes.
+
+        @param tuple key: segment key
+        @param numpy.ndarray segment: the samples of the segment
+        """
+        if segment.nbytes > self.max_bytes:
+            return
+        old_segment = self._segments.pop(key, None)
+        if old_segment is not None:
+            self._bytes -= old_segment.nbytes
+        self._segments[key] = segment
+        self._bytes += segment.nbytes
+        while self._bytes > self.max_bytes:
+            self._bytes -= self._segments.popitem(last=False)[1].nbytes
+        return
+
+    def clear(self):
+        self._segments.clear()
+        self._bytes = 0
+        return
+
+
+def concatenated_ranges(starts, lengths):
+    """
+    Concatenates np.arange(start, start + length) for all given starts and lengths.
+
+    @param numpy.ndarray starts: start values of the ranges
+    @param numpy.ndarray lengths: lengths of the ranges
+
+    @return numpy.ndarray: the concatenated ranges (dtype int64)
+    """
+    lengths = np.asarray(lengths, dtype='int64')
+    range_offsets = np.asarray(starts, dtype='int64') - (np.cumsum(lengths) - lengths)
+    return np.arange(lengths.sum(), dtype='int64') + np.repeat(range_offsets, lengths)
+
+
+def get_picklable_ensemble(compiled_ensemble):
+    """
+    Replaces the sampling function objects of a compiled PulseBlockEnsemble by their dict
+    representation. Sampling function classes are imported from arbitrary paths and can therefore
+    not be unpickled in a freshly spawned worker process.
+
+    @param dict compiled_ensemble: the ensemble as returned by
+                                   SequenceGeneratorLogic._compile_block_ensemble
+
+    @return dict: shallow copy of compiled_ensemble to hand over to sample_ensemble
+    """
+    picklable_ensemble = compiled_ensemble.copy()
+    picklable_ensemble.pop('sampling_function_keys', None)
+    picklable_ensemble['sampling_functions'] = [
+        func.get_dict_representation() for func in compiled_ensemble['sampling_functions']]
+    return picklable_ensemble
+
+
+def sample_ensemble(compiled_ensemble, number_of_samples, offset_bin, rotating_frame, sample_rate,
+                    sampling_function_paths, grouped_max_length=256):
+    """
+    Samples a whole compiled PulseBlockEnsemble. Runs in a worker process.
+
+    @param dict compiled_ensemble: the ensemble as returned by get_picklable_ensemble
+    @param int number_of_samples: number of samples of the ensemble
+    @param int offset_bin: time offset (in samples) of the ensemble
+    @param bool rotating_frame: rotating frame flag of the ensemble
+    @param float sample_rate: the sample rate in samples/s
+    @param list sampling_function_paths: paths to import the sampling function classes from
+    @param int grouped_max_length: see sample_ensemble_chunk
+
+    @return tuple: (analog_samples, digital_samples, sampling_time)
+                    analog_samples:
+                        dict, float32 sample arrays with analog channel descriptors as keys
+                    digital_samples:
+                        dict, bool sample arrays with digital channel descriptors as keys
+                    sampling_time:
+                        float, time in seconds needed to sample the ensemble
+    """
+    global _imported_sampling_function_paths
+    start_time = time.time()
+    if _imported_sampling_function_paths != list(sampling_function_paths):
+        SamplingFunctions.import_sampling_functions(sampling_function_paths)
+        _imported_sampling_function_paths = list(sampling_function_paths)
+
+    compiled_ensemble = compiled_ensemble.copy()
+    compiled_ensemble['sampling_functions'] = [
+        getattr(SamplingFunctions, func_dict['name'])(**func_dict['params'])
+        for func_dict in compiled_ensemble['sampling_functions']]
+
+    analog_samples = {chnl: np.empty(number_of_samples, dtype='float32') for chnl in
+                      compiled_ensemble['analog_levels']}
+    digital_samples = {chnl: np.empty(number_of_samples, dtype=bool) for chnl in
+                       compiled_ensemble['digital_states']}
+    sample_ensemble_chunk(compiled_ensemble,
+                          chunk_start=0,
+                          chunk_length=number_of_samples,
+                          offset_bin=offset_bin,
+                          rotating_frame=rotating_frame,
+                          sample_rate=sample_rate,
+                          analog_samples=analog_samples,
+                          digital_samples=digital_samples,
+                          grouped_max_length=grouped_max_length)
+    return analog_samples, digital_samples, time.time() - start_time
@@ -22,18 +22,24 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 import numpy as np
 import os
+import hashlib
 import pickle
 import time
 import copy
 
+from concurrent.futures import ProcessPoolExecutor
 from qtpy import QtCore
 from collections import OrderedDict
 from core.module import StatusVar, Connector, ConfigOption
 from core.util.modules import get_main_dir, get_home_dir
+from core.util.pulse_stream import get_bitmasks, run_length_encode
 from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_objects import PulseBlock, PulseBlockEnsemble, PulseSequence
 from logic.pulsed.pulse_objects import PulseObjectGenerator, PulseBlockElement
+from logic.pulsed.pulse_asset_store import PulseAssetStore, LazyAssetDict
 from logic.pulsed.sampling_functions import SamplingFunctions
+from logic.pulsed.sampling_worker import sample_ensemble_chunk, sample_ensemble
+from logic.pulsed.sampling_worker import get_picklable_ensemble, SegmentCache
 
 
 class SequenceGeneratorLogic(GenericLogic):
@@ -62,6 +68,16 @@ class SequenceGeneratorLogic(GenericLogic):
                                        default=os.path.join(get_home_dir(), 'saved_pulsed_assets'),
                                        missing='warn')
     _overhead_bytes = ConfigOption(name='overhead_bytes', default=0, missing='nothing')
+    # Budget in bytes for waveforms kept on the device to skip re-sampling of unchanged
+    # PulseBlockEnsembles. 0 means no limit, a negative value disables the waveform cache.
+    _waveform_cache_bytes = ConfigOption(name='waveform_cache_bytes', default=0, missing='nothing')
+    # Number of worker processes sampling the PulseBlockEnsembles of a PulseSequence concurrently.
+    # 0 or 1 samples them one after another in the logic thread.
+    _sampling_processes = ConfigOption(name='sampling_processes', default=0, missing='nothing')
+    # Memory budget in bytes for analog samples of single PulseBlockElements kept in memory to
+    # skip their re-sampling (e.g. when only some parameters of a sweep changed). 0 disables it.
+    _segment_cache_bytes = ConfigOption(name='segment_cache_bytes', default=268435456,
+                                        missing='nothing')
     # Optional additional paths to import from
     additional_methods_dir = ConfigOption(name='additional_predefined_methods_path',
                                           default=None,
@@ -70,6 +86,12 @@ class SequenceGeneratorLogic(GenericLogic):
                                                    default=None,
                                                    missing='nothing')
 
+    # PulseBlockElements shorter than this number of samples are sampled together with all other
+    # elements using the same (pointwise) sampling function
+    _grouped_sampling_max_length = 256
+    # Number of analysis results of PulseBlockEnsembles and PulseSequences kept in memory
+    _analysis_cache_size = 128
+
     # status vars
     # Global parameters describing the channel usage and common parameters used during pulsed object
     # generation for predefined methods.
@@ -97,6 +119,9 @@ class SequenceGeneratorLogic(GenericLogic):
     sigSequenceDictUpdated = QtCore.Signal(dict)
     sigSampleEnsembleComplete = QtCore.Signal(object)
     sigSampleSequenceComplete = QtCore.Signal(object)
+    # Emitted for every PulseBlockEnsemble written during sampling of a PulseSequence with the
+    # number of written and total ensembles, the waveform name tag and the time needed in seconds
+    sigSampleSequenceProgress = QtCore.Signal(int, int, str, float)
     sigLoadedAssetUpdated = QtCore.Signal(str, str)
     sigGeneratorSettingsUpdated = QtCore.Signal(dict)
     sigSamplingSettingsUpdated = QtCore.Signal(dict)
@@ -143,6 +168,30 @@ class SequenceGeneratorLogic(GenericLogic):
         self._saved_pulse_blocks = OrderedDict()
         self._saved_pulse_block_ensembles = OrderedDict()
         self._saved_pulse_sequences = OrderedDict()
+        # Single file storage of the pulse objects (PulseAssetStore)
+        self._asset_store = None
+
+        # Waveforms written to the pulse generator in least recently used order. The keys are the
+        # waveform name tags, the values dicts with the cache key of the sampled waveforms.
+        self._waveform_cache = OrderedDict()
+
+        # Results of analyze_block_ensemble and analyze_sequence in least recently used order. The
+        # keys are created by _get_ensemble_analysis_key and _get_sequence_analysis_key.
+        self._analysis_cache = OrderedDict()
+
+        # Sets of the waveform and sequence names present on the pulse generator. Querying them
+        # can be slow (e.g. a SCPI query on an AWG), so they are cached until the pulser memory
+        # changes. None if the names need to be queried again.
+        self._sampled_waveform_set = None
+        self._sampled_sequence_set = None
+
+        # Sampled analog segments (see sampling_worker.SegmentCache), None if disabled
+        self._segment_cache = None
+
+        # Process pool sampling PulseBlockEnsembles of a PulseSequence and the paths the sampling
+        # function classes are imported from
+        self._sampling_pool = None
+        self._sampling_function_paths = list()
         return
 
     def on_activate(self):
@@ -157,18 +206,28 @@ class SequenceGeneratorLogic(GenericLogic):
         if isinstance(self._sampling_functions_import_path, str):
             sf_path_list.append(self._sampling_functions_import_path)
         SamplingFunctions.import_sampling_functions(sf_path_list)
+        self._sampling_function_paths = sf_path_list
 
         # Read back settings from device and update instance variables accordingly
         self._read_settings_from_device()
 
-        # Update saved blocks/ensembles/sequences from serialized files
-        self._saved_pulse_blocks = OrderedDict()
-        self._saved_pulse_block_ensembles = OrderedDict()
-        self._saved_pulse_sequences = OrderedDict()
+        # Open the asset store, move pickled objects of earlier versions into it and update saved
+        # blocks/ensembles/sequences from the asset store
+        self._asset_store = PulseAssetStore(os.path.join(self._assets_storage_dir,
+                                                         'pulse_assets.db'))
+        self._migrate_pickled_assets()
+        self._invalidate_sampled_names()
         self._update_blocks_from_file()
         self._update_ensembles_from_file()
         self._update_sequences_from_file()
 
+        self._waveform_cache = OrderedDict()
+        self._analysis_cache = OrderedDict()
+        if self._segment_cache_bytes > 0:
+            self._segment_cache = SegmentCache(self._segment_cache_bytes)
+        else:
+            self._segment_cache = None
+
         # Get instance of PulseObjectGenerator which takes care of collecting all predefined methods
         self._pog = PulseObjectGenerator(sequencegeneratorlogic=self)
 
@@ -178,6 +237,14 @@ class SequenceGeneratorLogic(GenericLogic):
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
+        if self._sampling_pool is not None:
+            self._sampling_pool.shutdown(wait=True)
+            self._sampling_pool = None
+
+        if self._asset_store is not None:
+            self._asset_store.close()
+            self._asset_store = None
+        self._segment_cache = None
         return
 
     # @_saved_pulse_blocks.constructor
@@ -263,11 +330,41 @@ class SequenceGeneratorLogic(GenericLogic):
 
     @property
     def sampled_waveforms(self):
-        return self.pulsegenerator().get_waveform_names()
+        waveforms = self.pulsegenerator().get_waveform_names()
+        self._sampled_waveform_set = frozenset(waveforms)
+        return waveforms
 
     @property
     def sampled_sequences(self):
-        return self.pulsegenerator().get_sequence_names()
+        sequences = self.pulsegenerator().get_sequence_names()
+        self._sampled_sequence_set = frozenset(sequences)
+        return sequences
+
+    def _get_sampled_waveform_set(self):
+        """
+        @return frozenset: names of the waveforms on the pulse generator, queried from the device
+                           only if the cached names have been invalidated
+        """
+        if self._sampled_waveform_set is None:
+            self._sampled_waveform_set = frozenset(self.pulsegenerator().get_waveform_names())
+        return self._sampled_waveform_set
+
+    def _get_sampled_sequence_set(self):
+        """
+        @return frozenset: names of the sequences on the pulse generator, queried from the device
+                           only if the cached names have been invalidated
+        """
+        if self._sampled_sequence_set is None:
+            self._sampled_sequence_set = frozenset(self.pulsegenerator().get_sequence_names())
+        return self._sampled_sequence_set
+
+    def _invalidate_sampled_names(self):
+        """
+        Discards the cached waveform and sequence names. Call after changing the pulser memory.
+        """
+        self._sampled_waveform_set = None
+        self._sampled_sequence_set = None
+        return
 
     @property
     def analog_channels(self):
@@ -416,15 +513,17 @@ class SequenceGeneratorLogic(GenericLogic):
             self.log.error('Can´t clear the pulser as it is running. Switch off the pulser and try again.')
             return -1
         self.pulsegenerator().clear_all()
-        # Delete all sampling information from all PulseBlockEnsembles and PulseSequences
-        for seq_name in self.saved_pulse_sequences:
-            seq = self.saved_pulse_sequences[seq_name]
-            seq.sampling_information = dict()
-            self.save_sequence(seq)
-        for ens_name in self.saved_pulse_block_ensembles:
-            ens = self.saved_pulse_block_ensembles[ens_name]
-            ens.sampling_information = dict()
-            self.save_ensemble(ens)
+        self._invalidate_sampled_names()
+        self._waveform_cache.clear()
+        # Delete all sampling information from all loaded PulseBlockEnsembles and PulseSequences.
+        # Objects not loaded yet drop their outdated sampling information when being loaded.
+        with self._asset_store.batch():
+            for seq_name, seq in self._saved_pulse_sequences.loaded_items():
+                seq.sampling_information = dict()
+                self.save_sequence(seq)
+            for ens_name, ens in self._saved_pulse_block_ensembles.loaded_items():
+                ens.sampling_information = dict()
+                self.save_ensemble(ens)
         self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
         self.sigAvailableSequencesUpdated.emit(self.sampled_sequences)
         self.sigLoadedAssetUpdated.emit('', '')
@@ -694,7 +793,7 @@ class SequenceGeneratorLogic(GenericLogic):
         return self._saved_pulse_blocks.get(name)
 
     def delete_block(self, name):
-        """ Remove the serialized object "name" from the block list and HDD.
+        """ Remove the object "name" from the block list and the asset store.
 
         @param name: string, name of the PulseBlock object to be removed.
         """
@@ -703,70 +802,55 @@ class SequenceGeneratorLogic(GenericLogic):
             del (self._saved_pulse_blocks[name])
 
         # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.block'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        self._asset_store.delete('block', name)
 
         self.sigBlockDictUpdated.emit(self.saved_pulse_blocks)
         return
 
     def _load_block_from_file(self, block_name):
         """
-        De-serializes a PulseBlock instance from file.
+        Loads a PulseBlock instance from the asset store.
 
-        @param str block_name: The name of the PulseBlock instance to de-serialize
-        @return PulseBlock: The de-serialized PulseBlock instance
+        @param str block_name: The name of the PulseBlock instance to load
+        @return PulseBlock: The loaded PulseBlock instance
         """
-        block = None
-        filepath = os.path.join(self._assets_storage_dir, '{0}.block'.format(block_name))
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'rb') as file:
-                    block = pickle.load(file)
-            except pickle.UnpicklingError:
-                self.log.error('Failed to de-serialize PulseBlock "{0}" from file.'
+        try:
+            return self._asset_store.load('block', block_name)
+        except:
+            self.log.exception('Failed to load PulseBlock "{0}" from asset store.'
                                ''.format(block_name))
-                os.remove(filepath)
-        return block
+            return None
 
     def _update_blocks_from_file(self):
         """
-        Update the saved_pulse_blocks dict by de-serializing stored file.
+        Update the saved_pulse_blocks dict from the asset store. The PulseBlocks are loaded on
+        first access.
         """
-        # Get all files in asset directory ending on ".block" and extract a sorted list of
-        # PulseBlock names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = sorted(f.name[:-6] for f in scan if f.is_file and f.name.endswith('.block'))
-
-        # Load all blocks from file
-        for block_name in names:
-            block = self._load_block_from_file(block_name)
-            if block is not None:
-                self._saved_pulse_blocks[block_name] = block
-
+        self._saved_pulse_blocks = LazyAssetDict(self._load_block_from_file,
+                                                 self._asset_store.names('block'))
         self.sigBlockDictUpdated.emit(self._saved_pulse_blocks)
         return
 
     def _save_block_to_file(self, block):
         """
-        Saves a single PulseBlock instance to file by serialization using pickle.
+        Saves a single PulseBlock instance to the asset store.
 
         @param PulseBlock block: The PulseBlock instance to be saved
         """
-        filename = '{0}.block'.format(block.name)
         try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(block, file)
+            self._asset_store.save(block)
         except:
-            self.log.error('Failed to serialize PulseBlock "{0}" to file.'.format(block.name))
+            self.log.exception('Failed to save PulseBlock "{0}" to asset store.'
+                               ''.format(block.name))
         return
 
     def _save_blocks_to_file(self):
         """
-        Saves the saved_pulse_blocks dict items to files.
+        Saves the saved_pulse_blocks dict items to the asset store.
         """
-        for block in self._saved_pulse_blocks.values():
-            self._save_block_to_file(block)
+        with self._asset_store.batch():
+            for block in self._saved_pulse_blocks.values():
+                self._save_block_to_file(block)
         return
 
     def save_ensemble(self, ensemble):
@@ -806,79 +890,62 @@ class SequenceGeneratorLogic(GenericLogic):
             del self._saved_pulse_block_ensembles[name]
 
         # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.ensemble'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        self._asset_store.delete('ensemble', name)
 
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
 
     def _load_ensemble_from_file(self, ensemble_name):
         """
-        De-serializes a PulseBlockEnsemble instance from file.
+        Loads a PulseBlockEnsemble instance from the asset store. Outdated sampling_information of
+        ensembles whose waveforms are no longer present on the pulse generator is deleted.
 
-        @param str ensemble_name: The name of the PulseBlockEnsemble instance to de-serialize
-        @return PulseBlockEnsemble: The de-serialized PulseBlockEnsemble instance
+        @param str ensemble_name: The name of the PulseBlockEnsemble instance to load
+        @return PulseBlockEnsemble: The loaded PulseBlockEnsemble instance
         """
-        ensemble = None
-        filepath = os.path.join(self._assets_storage_dir, '{0}.ensemble'.format(ensemble_name))
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'rb') as file:
-                    ensemble = pickle.load(file)
-            except pickle.UnpicklingError:
-                self.log.error('Failed to de-serialize PulseBlockEnsemble "{0}" from file. '
-                               'Deleting broken file.'.format(ensemble_name))
-                os.remove(filepath)
+        try:
+            ensemble = self._asset_store.load('ensemble', ensemble_name)
+        except:
+            self.log.exception('Failed to load PulseBlockEnsemble "{0}" from asset store.'
+                               ''.format(ensemble_name))
+            return None
+
+        if ensemble is not None and ensemble.sampling_information.get('waveforms'):
+            waveform_set = set(ensemble.sampling_information['waveforms'])
+            if not self._get_sampled_waveform_set().issuperset(waveform_set):
+                ensemble.sampling_information = dict()
         return ensemble
 
     def _update_ensembles_from_file(self):
         """
-        Update the saved_pulse_block_ensembles dict from temporary file.
+        Update the saved_pulse_block_ensembles dict from the asset store. The PulseBlockEnsembles
+        are loaded on first access.
         """
-        # Get all files in asset directory ending on ".ensemble" and extract a sorted list of
-        # PulseBlockEnsemble names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = sorted(f.name[:-9] for f in scan if f.is_file and f.name.endswith('.ensemble'))
-
-        # Get all waveforms currently stored on pulser hardware in order to delete outdated
-        # sampling_information dicts
-        sampled_waveforms = set(self.sampled_waveforms)
-
-        # Load all ensembles from file
-        for ensemble_name in names:
-            ensemble = self._load_ensemble_from_file(ensemble_name)
-            if ensemble is not None:
-                if ensemble.sampling_information.get('waveforms'):
-                    waveform_set = set(ensemble.sampling_information['waveforms'])
-                    if not sampled_waveforms.issuperset(waveform_set):
-                        ensemble.sampling_information = dict()
-                self._saved_pulse_block_ensembles[ensemble_name] = ensemble
-
+        self._saved_pulse_block_ensembles = LazyAssetDict(self._load_ensemble_from_file,
+                                                          self._asset_store.names('ensemble'))
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
 
     def _save_ensemble_to_file(self, ensemble):
         """
-        Saves a single PulseBlockEnsemble instance to file by serialization using pickle.
+        Saves a single PulseBlockEnsemble instance to the asset store.
 
         @param PulseBlockEnsemble ensemble: The PulseBlockEnsemble instance to be saved
         """
-        filename = '{0}.ensemble'.format(ensemble.name)
         try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(ensemble, file)
+            self._asset_store.save(ensemble)
         except:
-            self.log.error('Failed to serialize PulseBlockEnsemble "{0}" to file.'
-                           ''.format(ensemble.name))
+            self.log.exception('Failed to save PulseBlockEnsemble "{0}" to asset store.'
+                               ''.format(ensemble.name))
         return
 
     def _save_ensembles_to_file(self):
         """
-        Saves the saved_pulse_block_ensembles dict items to files.
+        Saves the saved_pulse_block_ensembles dict items to the asset store.
         """
-        for ensemble in self.saved_pulse_block_ensembles.values():
-            self._save_ensemble_to_file(ensemble)
+        with self._asset_store.batch():
+            for ensemble in self.saved_pulse_block_ensembles.values():
+                self._save_ensemble_to_file(ensemble)
         return
 
     def save_sequence(self, sequence):
@@ -923,126 +990,143 @@ class SequenceGeneratorLogic(GenericLogic):
             del self._saved_pulse_sequences[name]
 
         # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.sequence'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        self._asset_store.delete('sequence', name)
 
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
     def _load_sequence_from_file(self, sequence_name):
         """
-        De-serializes a PulseSequence instance from file.
+        Loads a PulseSequence instance from the asset store. Outdated sampling_information of
+        sequences no longer present on the pulse generator is deleted.
 
-        @param str sequence_name: The name of the PulseSequence instance to de-serialize
-        @return PulseSequence: The de-serialized PulseSequence instance
+        @param str sequence_name: The name of the PulseSequence instance to load
+        @return PulseSequence: The loaded PulseSequence instance
         """
-        filepath = os.path.join(self._assets_storage_dir, '{0}.sequence'.format(sequence_name))
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'rb') as file:
-                    sequence = pickle.load(file)
-                # FIXME: Due to the pickling the dict namespace merging gets lost on the way.
-                # Restored it here but a better way needs to be found.
-                for step in range(len(sequence)):
-                    sequence[step].__dict__ = sequence[step]
-            except pickle.UnpicklingError:
-                self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
+        try:
+            sequence = self._asset_store.load('sequence', sequence_name)
+        except:
+            self.log.exception('Failed to load PulseSequence "{0}" from asset store.'
                                ''.format(sequence_name))
-                os.remove(filepath)
-                return None
-
-        # Conversion for backwards compatibility
-        if len(sequence) > 0 and not isinstance(sequence[0].flag_high, list):
-            self.log.warning('Loading deprecated PulseSequence instances from disk. '
-                             'Attempting conversion to new format.\nIf you keep getting this '
-                             'message after reloading SequenceGeneratorLogic or restarting qudi, '
-                             'please regenerate the affected PulseSequence "{0}".'
-                             ''.format(sequence_name))
-            for step_no, step_params in enumerate(sequence):
-                # Try to convert "flag_high" step parameter
-                if isinstance(step_params.flag_high, str):
-                    if step_params.flag_high.upper() == 'OFF':
-                        sequence[step_no].flag_high = list()
-                    else:
-                        sequence[step_no].flag_high = [step_params.flag_high]
-                elif isinstance(step_params.flag_high, dict):
-                    sequence[step_no].flag_high = [flag for flag, state in
-                                                   step_params.flag_high.items() if state]
-                else:
-                    self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
-                                   '"flag_high" step parameter is of unknown type'
-                                   ''.format(sequence_name))
-                    os.remove(filepath)
-                    return None
-
-                # Try to convert "flag_trigger" step parameter
-                if isinstance(step_params.flag_trigger, str):
-                    if step_params.flag_trigger.upper() == 'OFF':
-                        sequence[step_no].flag_trigger = list()
-                    else:
-                        sequence[step_no].flag_trigger = [step_params.flag_trigger]
-                elif isinstance(step_params.flag_trigger, dict):
-                    sequence[step_no].flag_trigger = [flag for flag, state in
-                                                      step_params.flag_trigger.items() if state]
-                else:
-                    self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
-                                   '"flag_trigger" step parameter is of unknown type'
-                                   ''.format(sequence_name))
-                    os.remove(filepath)
-                    return None
-            self._save_sequence_to_file(sequence)
+            return None
+
+        if sequence is not None:
+            if sequence.name not in self._get_sampled_sequence_set():
+                sequence.sampling_information = dict()
+            elif sequence.sampling_information:
+                waveform_set = set(sequence.sampling_information['waveforms'])
+                if not self._get_sampled_waveform_set().issuperset(waveform_set):
+                    sequence.sampling_information = dict()
         return sequence
 
     def _update_sequences_from_file(self):
         """
-        Update the saved_pulse_sequences dict from files.
+        Update the saved_pulse_sequences dict from the asset store. The PulseSequences are loaded
+        on first access.
         """
-        # Get all files in asset directory ending on ".sequence" and extract a sorted list of
-        # PulseSequence names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = sorted(f.name[:-9] for f in scan if f.is_file and f.name.endswith('.sequence'))
-
-        # Get all waveforms and sequences currently stored on pulser hardware in order to delete
-        # outdated sampling_information dicts
-        sampled_waveforms = set(self.sampled_waveforms)
-        sampled_sequences = set(self.sampled_sequences)
-
-        # Load all sequences from file
-        for sequence_name in names:
-            sequence = self._load_sequence_from_file(sequence_name)
-            if sequence is not None:
-                if sequence.name not in sampled_sequences:
-                    sequence.sampling_information = dict()
-                elif sequence.sampling_information:
-                    waveform_set = set(sequence.sampling_information['waveforms'])
-                    if not sampled_waveforms.issuperset(waveform_set):
-                        sequence.sampling_information = dict()
-                self._saved_pulse_sequences[sequence_name] = sequence
-
+        self._saved_pulse_sequences = LazyAssetDict(self._load_sequence_from_file,
+                                                    self._asset_store.names('sequence'))
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
     def _save_sequence_to_file(self, sequence):
         """
-        Saves a single PulseSequence instance to file by serialization using pickle.
+        Saves a single PulseSequence instance to the asset store.
 
         @param PulseSequence sequence: The PulseSequence instance to be saved
         """
-        filename = '{0}.sequence'.format(sequence.name)
         try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(sequence, file)
+            self._asset_store.save(sequence)
         except:
-            self.log.error('Failed to serialize PulseSequence "{0}" to file.'.format(sequence.name))
+            self.log.exception('Failed to save PulseSequence "{0}" to asset store.'
+                               ''.format(sequence.name))
         return
 
     def _save_sequences_to_file(self):
         """
-        Saves the saved_pulse_sequences dict items to files.
+        Saves the saved_pulse_sequences dict items to the asset store.
+        """
+        with self._asset_store.batch():
+            for sequence in self.saved_pulse_sequences.values():
+                self._save_sequence_to_file(sequence)
+        return
+
+    def _migrate_pickled_assets(self):
+        """
+        Moves PulseBlocks, PulseBlockEnsembles and PulseSequences stored as individual pickle files
+        in the asset directory (the storage format of earlier versions) into the asset store.
+        Migrated files are moved to the subdirectory "migrated_pickle_files".
         """
-        for sequence in self.saved_pulse_sequences.values():
-            self._save_sequence_to_file(sequence)
+        with os.scandir(self._assets_storage_dir) as scan:
+            filenames = sorted(f.name for f in scan if f.is_file() and
+                               f.name.endswith(('.block', '.ensemble', '.sequence')))
+        if not filenames:
+            return
+
+        backup_dir = os.path.join(self._assets_storage_dir, 'migrated_pickle_files')
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+
+        self.log.info('Migrating {0:d} pickled pulse objects to asset store "{1}".'
+                      ''.format(len(filenames), self._asset_store.filepath))
+        with self._asset_store.batch():
+            for filename in filenames:
+                filepath = os.path.join(self._assets_storage_dir, filename)
+                try:
+                    with open(filepath, 'rb') as file:
+                        asset = pickle.load(file)
+                    if isinstance(asset, PulseSequence):
+                        # FIXME: Due to the pickling the dict namespace merging gets lost on the
+                        # way. Restored it here but a better way needs to be found.
+                        for step in range(len(asset)):
+                            asset[step].__dict__ = asset[step]
+                        self._convert_deprecated_sequence(asset)
+                    self._asset_store.save(asset)
+                except:
+                    self.log.exception('Failed to migrate pickled pulse object file "{0}" to '
+                                       'asset store.'.format(filename))
+                    continue
+                os.replace(filepath, os.path.join(backup_dir, filename))
+        return
+
+    def _convert_deprecated_sequence(self, sequence):
+        """
+        Converts the "flag_high" and "flag_trigger" step parameters of PulseSequences pickled by
+        earlier versions to lists.
+
+        @param PulseSequence sequence: The PulseSequence instance to convert in place
+        """
+        if len(sequence) == 0 or isinstance(sequence[0].flag_high, list):
+            return
+
+        self.log.warning('Loading deprecated PulseSequence "{0}". Attempting conversion to new '
+                         'format.'.format(sequence.name))
+        for step_no, step_params in enumerate(sequence):
+            # Try to convert "flag_high" step parameter
+            if isinstance(step_params.flag_high, str):
+                if step_params.flag_high.upper() == 'OFF':
+                    sequence[step_no].flag_high = list()
+                else:
+                    sequence[step_no].flag_high = [step_params.flag_high]
+            elif isinstance(step_params.flag_high, dict):
+                sequence[step_no].flag_high = [flag for flag, state in
+                                               step_params.flag_high.items() if state]
+            else:
+                raise TypeError('"flag_high" step parameter of PulseSequence "{0}" is of unknown '
+                                'type'.format(sequence.name))
+
+            # Try to convert "flag_trigger" step parameter
+            if isinstance(step_params.flag_trigger, str):
+                if step_params.flag_trigger.upper() == 'OFF':
+                    sequence[step_no].flag_trigger = list()
+                else:
+                    sequence[step_no].flag_trigger = [step_params.flag_trigger]
+            elif isinstance(step_params.flag_trigger, dict):
+                sequence[step_no].flag_trigger = [flag for flag, state in
+                                                  step_params.flag_trigger.items() if state]
+            else:
+                raise TypeError('"flag_trigger" step parameter of PulseSequence "{0}" is of '
+                                'unknown type'.format(sequence.name))
         return
 
     def generate_predefined_sequence(self, predefined_sequence_name, kwargs_dict):
@@ -1069,14 +1153,15 @@ class SequenceGeneratorLogic(GenericLogic):
             self.sigPredefinedSequenceGenerated.emit(None, False)
             raise
         # Save objects
-        for block in blocks:
-            self.save_block(block)
-        for ensemble in ensembles:
-            ensemble.sampling_information = dict()
-            self.save_ensemble(ensemble)
-        for sequence in sequences:
-            sequence.sampling_information = dict()
-            self.save_sequence(sequence)
+        with self._asset_store.batch():
+            for block in blocks:
+                self.save_block(block)
+            for ensemble in ensembles:
+                ensemble.sampling_information = dict()
+                self.save_ensemble(ensemble)
+            for sequence in sequences:
+                sequence.sampling_information = dict()
+                self.save_sequence(sequence)
         self.sigPredefinedSequenceGenerated.emit(kwargs_dict.get('name'), len(sequences) > 0)
         return
 
@@ -1165,100 +1250,73 @@ class SequenceGeneratorLogic(GenericLogic):
                                              chronological low-to-high transition positions
                                              (in timebins; incl. repetitions) for each digital
                                              channel.
+
+        The results are cached until any of the PulseBlocks used, the block list of the ensemble,
+        the sample rate or the laser channel changes.
+        """
+        return self._get_cached_analysis(self._get_ensemble_analysis_key(ensemble),
+                                         self._analyze_block_ensemble, ensemble)
+
+    def _analyze_block_ensemble(self, ensemble):
+        """
+        Uncached version of analyze_block_ensemble.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to analyze
+
+        @return dict: see analyze_block_ensemble
         """
         # Determine the right laser channel to choose. For gated counting it should be the gate
         # channel instead of the laser trigger.
         laser_channel = self.generation_parameters['gate_channel'] if self.generation_parameters[
             'gate_channel'] else self.generation_parameters['laser_channel']
 
-        # memorize the digital channel state of the previous element
-        tmp_digital_high = dict()
-        # memorize the laser_on flag of the previous element (in case of non-digital laser channel)
-        tmp_laser_on = False
+        # All elements in chronological order (incl. repetitions) as indices into elements
+        elements, element_order, rep_numbers = self._get_ensemble_elements(ensemble)
+
         # Set of used analog and digital channels
         digital_channels = set()
         analog_channels = set()
-        # check for active channels and initialize tmp_digital_high/tmp_laser_on with the state of
-        # the very last element in the ensemble
+        # check for active channels and get the digital channel state/laser_on flag of the very
+        # last element in the ensemble to compare the first element with
+        initial_digital_high = dict()
+        initial_laser_on = False
         if len(ensemble) > 0:
             block = self.get_block(ensemble[0][0])
             digital_channels = block.digital_channels
             analog_channels = block.analog_channels
             block = self.get_block(ensemble[-1][0])
             if len(block) > 0:
-                tmp_digital_high = block[-1].digital_high.copy()
-                tmp_laser_on = block[-1].laser_on
-            else:
-                tmp_digital_high = {chnl: False for chnl in digital_channels}
-                tmp_laser_on = False
+                initial_digital_high = block[-1].digital_high
+                initial_laser_on = block[-1].laser_on
 
-        # dicts containing the bins where the digital channels are rising/falling
-        digital_rising_bins = {chnl: list() for chnl in digital_channels}
-        digital_falling_bins = {chnl: list() for chnl in digital_channels}
-        laser_rising_bins = list()
-        laser_falling_bins = list()
+        # Calculate the length of each element with its repetition count in sec and the ideal end
+        # time of each element. Round the end times to the nearest possible match in bins.
+        init_lengths = np.array([element.init_length_s for element in elements], dtype=float)
+        increments = np.array([element.increment_s for element in elements], dtype=float)
+        element_end_times = np.cumsum(
+            init_lengths[element_order] + rep_numbers * increments[element_order])
+        element_end_bins = np.rint(element_end_times * self.__sample_rate).astype('int64')
 
         # Array to store the length in bins for all elements including repetitions in the order
         # they are occuring in the waveform later on.
-        elements_length_bins = list()
-
-        # variables to keep track of the current timeframe
-        current_end_time = 0.0
-        current_start_bin = 0
+        elements_length_bins = np.diff(np.concatenate(([0], element_end_bins)))
+        element_start_bins = element_end_bins - elements_length_bins
 
-        # Loop through all blocks in the ensemble
-        for block_name, reps in ensemble:
-            # Get the stored PulseBlock instance
-            block = self.get_block(block_name)
-
-            # Iterate over all repetitions of the current block
-            for rep_no in range(reps + 1):
-                # Iterate over the Block_Elements inside the current block
-                for element in block:
-                    # save bin position if a transition from low to high or vice versa has occurred
-                    # in a digital channel
-                    if tmp_digital_high != element.digital_high:
-                        for chnl, state in element.digital_high.items():
-                            if not tmp_digital_high[chnl] and state:
-                                digital_rising_bins[chnl].append(current_start_bin)
-                            elif tmp_digital_high[chnl] and not state:
-                                digital_falling_bins[chnl].append(current_start_bin)
-                        tmp_digital_high = element.digital_high.copy()
-
-                    if not laser_channel.startswith('d') and tmp_laser_on != element.laser_on:
-                        if not tmp_laser_on and element.laser_on:
-                            laser_rising_bins.append(current_start_bin)
-                        else:
-                            laser_falling_bins.append(current_start_bin)
-                        tmp_laser_on = element.laser_on
-
-                    # Calculate length of the current element with current repetition count in sec
-                    # and add this to the ideal end time for the sequence up until this point.
-                    current_end_time += element.init_length_s + rep_no * element.increment_s
-
-                    # Nearest possible match including the discretization in bins
-                    current_end_bin = int(np.rint(current_end_time * self.__sample_rate))
-
-                    # append current element length in discrete bins to temporary array
-                    elements_length_bins.append(current_end_bin - current_start_bin)
-
-                    # advance bin offset for next element
-                    current_start_bin = current_end_bin
-
-        elements_length_bins = np.array(elements_length_bins, dtype='int64')
-
-        # convert rising/falling indices to numpy.ndarrays. Remove duplicates.
+        # dicts containing the bins where the digital channels are rising/falling
+        digital_rising_bins = dict()
+        digital_falling_bins = dict()
         for chnl in digital_channels:
-            digital_rising_bins[chnl] = sorted(set(digital_rising_bins[chnl]))
-            digital_falling_bins[chnl] = sorted(set(digital_falling_bins[chnl]))
-            digital_rising_bins[chnl] = np.array(digital_rising_bins[chnl], dtype='int64')
-            digital_falling_bins[chnl] = np.array(digital_falling_bins[chnl], dtype='int64')
+            states = np.array([element.digital_high.get(chnl, False) for element in elements],
+                              dtype=bool)
+            digital_rising_bins[chnl], digital_falling_bins[chnl] = self._get_transition_bins(
+                states[element_order], initial_digital_high.get(chnl, False), element_start_bins)
         if laser_channel.startswith('d'):
             laser_rising_bins = digital_rising_bins[laser_channel]
             laser_falling_bins = digital_falling_bins[laser_channel]
         else:
-            laser_rising_bins = np.array(sorted(set(laser_rising_bins)), dtype='int64')
-            laser_falling_bins = np.array(sorted(set(laser_falling_bins)), dtype='int64')
+            states = np.array([element.laser_on for element in elements], dtype=bool)
+            laser_rising_bins, laser_falling_bins = self._get_transition_bins(
+                states[element_order], initial_laser_on, element_start_bins)
 
         return_dict = dict()
         return_dict['number_of_samples'] = np.sum(elements_length_bins)
@@ -1270,11 +1328,116 @@ class SequenceGeneratorLogic(GenericLogic):
         return_dict['digital_channels'] = digital_channels
         return_dict['channel_set'] = analog_channels.union(digital_channels)
         return_dict['generation_parameters'] = self.generation_parameters.copy()
-        return_dict['ideal_length'] = current_end_time
+        return_dict['ideal_length'] = element_end_times[-1] if len(element_end_times) > 0 else 0.0
         return_dict['laser_rising_bins'] = laser_rising_bins
         return_dict['laser_falling_bins'] = laser_falling_bins
         return return_dict
 
+    def _get_ensemble_analysis_key(self, ensemble):
+        """
+        Creates a key identifying everything the analysis of a PulseBlockEnsemble depends on. The
+        PulseBlocks are identified by their unique version stamp (see PulseBlock).
+
+        @param PulseBlockEnsemble ensemble: the ensemble to analyze
+
+        @return tuple: hashable cache key or None if a PulseBlock can not be found or has no
+                       version stamp
+        """
+        laser_channel = self.generation_parameters['gate_channel'] if self.generation_parameters[
+            'gate_channel'] else self.generation_parameters['laser_channel']
+        block_versions = list()
+        for block_name, reps in ensemble.block_list:
+            version = getattr(self._saved_pulse_blocks.get(block_name), 'version', None)
+            if version is None:
+                return None
+            block_versions.append((block_name, reps, version))
+        return 'ensemble', float(self.__sample_rate), laser_channel, tuple(block_versions)
+
+    def _get_sequence_analysis_key(self, sequence):
+        """
+        Creates a key identifying everything the analysis of a PulseSequence depends on.
+
+        @param PulseSequence sequence: the sequence to analyze
+
+        @return tuple: hashable cache key or None if the analysis can not be cached
+        """
+        step_keys = list()
+        for seq_step in sequence:
+            ensemble = self._saved_pulse_block_ensembles.get(seq_step.ensemble)
+            ensemble_key = None if ensemble is None else self._get_ensemble_analysis_key(ensemble)
+            if ensemble_key is None:
+                return None
+            step_keys.append((seq_step.repetitions, ensemble_key))
+        return 'sequence', sequence.is_finite, tuple(step_keys)
+
+    def _get_cached_analysis(self, key, analyze_method, pulse_object):
+        """
+        Returns the cached analysis result for key or analyzes the pulse object and caches the
+        result.
+
+        @param tuple key: cache key (None disables caching)
+        @param callable analyze_method: uncached analysis method to call with pulse_object
+        @param object pulse_object: the PulseBlockEnsemble or PulseSequence to analyze
+
+        @return dict: copy of the analysis result
+        """
+        if key is None:
+            return analyze_method(pulse_object)
+        try:
+            info_dict = self._analysis_cache[key]
+            self._analysis_cache.move_to_end(key)
+        except KeyError:
+            info_dict = analyze_method(pulse_object)
+            self._analysis_cache[key] = info_dict
+            while len(self._analysis_cache) > self._analysis_cache_size:
+                self._analysis_cache.popitem(last=False)
+        # Callers are free to alter the returned dict and its content
+        info_dict = copy.deepcopy(info_dict)
+        info_dict['generation_parameters'] = self.generation_parameters.copy()
+        return info_dict
+
+    def _get_ensemble_elements(self, ensemble):
+        """
+        Lists the PulseBlockElements of all blocks in a PulseBlockEnsemble and the order they occur
+        in including repetitions.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to list the elements of
+
+        @return (list, numpy.ndarray, numpy.ndarray): the PulseBlockElements of all blocks (blocks
+                                                      used several times are listed each time),
+                                                      the index into this list and the repetition
+                                                      number for every element in chronological
+                                                      order
+        """
+        elements = list()
+        element_order = list()
+        rep_numbers = list()
+        for block_name, reps in ensemble.block_list:
+            block = self.get_block(block_name)
+            first_element = len(elements)
+            elements.extend(block.element_list)
+            element_order.append(np.tile(np.arange(first_element, len(elements)), reps + 1))
+            rep_numbers.append(np.repeat(np.arange(reps + 1), len(block.element_list)))
+        if len(element_order) > 0:
+            return elements, np.concatenate(element_order), np.concatenate(rep_numbers)
+        return elements, np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+
+    @staticmethod
+    def _get_transition_bins(states, initial_state, element_start_bins):
+        """
+        Finds the low-to-high and high-to-low transitions of a digital state.
+
+        @param numpy.ndarray states: state of each element in chronological order
+        @param bool initial_state: state before the first element
+        @param numpy.ndarray element_start_bins: first bin of each element
+
+        @return (numpy.ndarray, numpy.ndarray): sorted unique bins of rising and falling edges
+        """
+        previous_states = np.concatenate(([bool(initial_state)], states[:-1]))
+        rising_bins = np.unique(element_start_bins[states & np.logical_not(previous_states)])
+        falling_bins = np.unique(element_start_bins[previous_states & np.logical_not(states)])
+        return rising_bins.astype('int64'), falling_bins.astype('int64')
+
     def analyze_sequence(self, sequence):
         """
         This helper method runs through each step of a PulseSequence object and extracts
@@ -1303,6 +1466,19 @@ class SequenceGeneratorLogic(GenericLogic):
                                              chronological low-to-high transition positions
                                              (in timebins; incl. repetitions) for each digital
                                              channel.
+
+        The results are cached like the ones of analyze_block_ensemble.
+        """
+        return self._get_cached_analysis(self._get_sequence_analysis_key(sequence),
+                                         self._analyze_sequence, sequence)
+
+    def _analyze_sequence(self, sequence):
+        """
+        Uncached version of analyze_sequence.
+
+        @param PulseSequence sequence: the sequence to analyze
+
+        @return dict: see analyze_sequence
         """
         # Determine the right laser channel to choose. For gated counting it should be the gate
         # channel instead of the laser trigger.
@@ -1382,44 +1558,28 @@ class SequenceGeneratorLogic(GenericLogic):
                     # Append rising/falling bin arrays for each step to a list in order to merge
                     # them all later on into a single array. This is more efficient than having
                     # an intermediate array.
-                    # Pay special attention to transitions from one sequence step to another.
-                    for iteration in range(reps):
-                        bin_offset = iteration * ens_bins + starting_bin
-                        rising_bins = info_dict['digital_rising_bins'][chnl] + bin_offset
-                        falling_bins = info_dict['digital_falling_bins'][chnl] + bin_offset
-                        if iteration == 0 and prev_step_digital_state[chnl] != step_last_digital_state[chnl]:
-                            if prev_step_digital_state[chnl] and not step_first_digital_state[chnl]:
-                                falling_bins = np.append(bin_offset, falling_bins)
-                            elif not prev_step_digital_state[chnl] and step_first_digital_state[chnl]:
-                                rising_bins = np.append(bin_offset, rising_bins)
-                            elif prev_step_digital_state[chnl] == step_first_digital_state[chnl]:
-                                if step_last_digital_state[chnl]:
-                                    falling_bins = falling_bins[1:]
-                                else:
-                                    rising_bins = rising_bins[1:]
-
-                        digital_rising_bins[chnl].append(rising_bins)
-                        digital_falling_bins[chnl].append(falling_bins)
+                    rising_bins, falling_bins = self._get_step_transition_bins(
+                        info_dict['digital_rising_bins'][chnl],
+                        info_dict['digital_falling_bins'][chnl],
+                        ens_bins, reps, starting_bin,
+                        prev_step_digital_state[chnl],
+                        step_first_digital_state[chnl],
+                        step_last_digital_state[chnl])
+                    digital_rising_bins[chnl].append(rising_bins)
+                    digital_falling_bins[chnl].append(falling_bins)
 
                 # Append laser_bins arrays with bin offsets for each repetition analogous to the
                 # digital channels above.
                 if not laser_channel.startswith('d'):
-                    for iteration in range(reps):
-                        bin_offset = iteration * ens_bins + starting_bin
-                        rising_bins = info_dict['laser_rising_bins'] + bin_offset
-                        falling_bins = info_dict['laser_falling_bins'] + bin_offset
-                        if iteration == 0 and prev_step_laser_on_state != step_last_laser_on_state:
-                            if prev_step_laser_on_state and not step_first_laser_on_state:
-                                falling_bins = np.append(bin_offset, falling_bins)
-                            elif not prev_step_laser_on_state and step_first_laser_on_state:
-                                rising_bins = np.append(bin_offset, rising_bins)
-                            elif prev_step_laser_on_state == step_first_laser_on_state:
-                                if step_last_laser_on_state:
-                                    falling_bins = falling_bins[1:]
-                                else:
-                                    rising_bins = rising_bins[1:]
-                        laser_rising_bins.append(rising_bins)
-                        laser_falling_bins.append(falling_bins)
+                    rising_bins, falling_bins = self._get_step_transition_bins(
+                        info_dict['laser_rising_bins'],
+                        info_dict['laser_falling_bins'],
+                        ens_bins, reps, starting_bin,
+                        prev_step_laser_on_state,
+                        step_first_laser_on_state,
+                        step_last_laser_on_state)
+                    laser_rising_bins.append(rising_bins)
+                    laser_falling_bins.append(falling_bins)
 
                 # Increment the current starting bin offset for the next sequence step
                 starting_bin += ens_bins * reps
@@ -1481,6 +1641,47 @@ class SequenceGeneratorLogic(GenericLogic):
 
         return return_dict
 
+    @staticmethod
+    def _get_step_transition_bins(rising_bins, falling_bins, ens_bins, reps, starting_bin,
+                                  prev_state, first_state, last_state):
+        """
+        Repeats the rising/falling bins of a PulseBlockEnsemble for all repetitions of a sequence
+        step. Transitions from the previous sequence step are taken into account for the first
+        repetition.
+
+        @param numpy.ndarray rising_bins: rising bins of the ensemble
+        @param numpy.ndarray falling_bins: falling bins of the ensemble
+        @param int ens_bins: number of samples of the ensemble
+        @param int reps: number of times the ensemble is played in this step
+        @param int starting_bin: first bin of the sequence step
+        @param bool prev_state: channel state at the end of the previous sequence step
+        @param bool first_state: channel state at the start of the ensemble
+        @param bool last_state: channel state at the end of the ensemble
+
+        @return (numpy.ndarray, numpy.ndarray): rising and falling bins of the sequence step
+        """
+        first_rising = rising_bins + starting_bin
+        first_falling = falling_bins + starting_bin
+        if prev_state != last_state:
+            if prev_state and not first_state:
+                first_falling = np.append(starting_bin, first_falling)
+            elif not prev_state and first_state:
+                first_rising = np.append(starting_bin, first_rising)
+            elif prev_state == first_state:
+                if last_state:
+                    first_falling = first_falling[1:]
+                else:
+                    first_rising = first_rising[1:]
+        if reps < 2:
+            return first_rising, first_falling
+
+        # All further repetitions at once
+        bin_offsets = starting_bin + ens_bins * np.arange(1, reps, dtype='int64')
+        step_rising = (bin_offsets[:, np.newaxis] + rising_bins[np.newaxis, :]).ravel()
+        step_falling = (bin_offsets[:, np.newaxis] + falling_bins[np.newaxis, :]).ravel()
+        return (np.concatenate((first_rising, step_rising)),
+                np.concatenate((first_falling, step_falling)))
+
     def _sampling_ensemble_sanity_check(self, ensemble):
         blocks_missing = set()
         channel_activation_mismatch = False
@@ -1549,9 +1750,10 @@ class SequenceGeneratorLogic(GenericLogic):
 
         This method is creating the actual samples (voltages and logic states) for each time step
         of the analog and digital channels specified in the PulseBlockEnsemble.
-        Therefore it iterates through all blocks, repetitions and elements of the ensemble and
-        calculates the exact voltages (float64) according to the specified math_function. The
-        samples are later on stored inside a float32 array.
+        Therefore the ensemble is first compiled into flat arrays describing all elements
+        (incl. repetitions). Digital channels are then filled run by run and the exact voltages
+        (float64) are calculated for all elements sharing the same sampling function at once.
+        The samples are later on stored inside a float32 array.
         So each element is calculated with high precision (float64) and then down-converted to
         float32 to be stored.
 
@@ -1592,13 +1794,169 @@ class SequenceGeneratorLogic(GenericLogic):
         # Set the waveform name (excluding the device specific channel naming suffix, i.e. '_ch1')
         waveform_name = name_tag if name_tag else ensemble.name
 
+        # Skip sampling if the very same waveforms are still present on the device
+        cached_waveforms = self._get_cached_waveforms(ensemble, offset_bin, waveform_name)
+        if cached_waveforms is not None:
+            ensemble_info = cached_waveforms['ensemble_info'].copy()
+            if ensemble.rotating_frame:
+                offset_bin += ensemble_info['number_of_samples']
+            if waveform_name == ensemble.name and not ensemble.sampling_information:
+                self._set_ensemble_sampling_information(ensemble, ensemble_info,
+                                                        cached_waveforms['waveforms'])
+            self.log.debug('Waveforms for PulseBlockEnsemble "{0}" are unchanged on the device. '
+                           'Sampling skipped.'.format(ensemble.name))
+            if not self.__sequence_generation_in_progress:
+                self.module_state.unlock()
+            self.sigSampleEnsembleComplete.emit(ensemble)
+            return offset_bin, list(cached_waveforms['waveforms']), ensemble_info
+
         # check for old waveforms associated with the ensemble and delete them from pulse generator.
         self._delete_waveform_by_nametag(waveform_name)
 
         # Take current time
         start_time = time.time()
 
-        # get important parameters from the ensemble
+        # get important parameters from the ensemble and fulfil the waveform length constraint
+        ensemble_info = self._prepare_ensemble_sampling(ensemble)
+
+        # integer to keep track of the sampls already processed
+        processed_samples = 0
+        # set of written waveform names on the device
+        written_waveforms = set()
+
+        if self._is_pulse_stream_pulser() and not ensemble_info['analog_channels']:
+            # Pulse stream devices play run-length encoded pulses. Compile them directly from the
+            # elements instead of sampling every time bin.
+            pulses = self.compile_pulse_stream(ensemble)
+            if pulses is None:
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+            written_waveforms.update(self.pulsegenerator().write_pulse_stream(waveform_name,
+                                                                              pulses))
+            self._invalidate_sampled_names()
+            processed_samples = ensemble_info['number_of_samples']
+            bytes_per_ensemble = pulses.nbytes
+        else:
+            # Calculate the byte size per sample.
+            # One analog sample per channel is 4 bytes (np.float32) and one digital sample per
+            # channel is 1 byte (np.bool).
+            bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
+                ensemble_info['digital_channels'])
+
+            # Calculate the bytes estimate for the entire ensemble
+            bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
+
+            # Determine the size of the sample arrays to be written as a whole.
+            if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
+                array_length = ensemble_info['number_of_samples']
+            else:
+                array_length = self._overhead_bytes // bytes_per_sample
+
+            # Allocate the sample arrays that are used for a single write command
+            analog_buffers = dict()
+            digital_buffers = dict()
+            try:
+                for chnl in ensemble_info['analog_channels']:
+                    analog_buffers[chnl] = np.empty(array_length, dtype='float32')
+                for chnl in ensemble_info['digital_channels']:
+                    digital_buffers[chnl] = np.empty(array_length, dtype=bool)
+            except MemoryError:
+                self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
+                               'The sample array needed is too large to allocate in memory.\n'
+                               'Try using the overhead_bytes ConfigOption to limit memory usage.'
+                               ''.format(ensemble.name))
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+
+            # Flat arrays describing all elements (incl. repetitions) of the ensemble
+            compiled_ensemble = self._compile_block_ensemble(ensemble, ensemble_info)
+
+        # Sample and write the ensemble chunk by chunk
+        while processed_samples < ensemble_info['number_of_samples']:
+            chunk_length = min(array_length,
+                               ensemble_info['number_of_samples'] - processed_samples)
+            analog_samples = {chnl: arr[:chunk_length] for chnl, arr in analog_buffers.items()}
+            digital_samples = {chnl: arr[:chunk_length] for chnl, arr in digital_buffers.items()}
+            sample_ensemble_chunk(compiled_ensemble,
+                                  chunk_start=processed_samples,
+                                  chunk_length=chunk_length,
+                                  offset_bin=offset_bin,
+                                  rotating_frame=ensemble.rotating_frame,
+                                  sample_rate=self.__sample_rate,
+                                  analog_samples=analog_samples,
+                                  digital_samples=digital_samples,
+                                  grouped_max_length=self._grouped_sampling_max_length,
+                                  segment_cache=self._segment_cache)
+
+            # Set first/last chunk flags
+            is_first_chunk = processed_samples == 0
+            processed_samples += chunk_length
+            is_last_chunk = processed_samples == ensemble_info['number_of_samples']
+            written_samples, wfm_list = self.pulsegenerator().write_waveform(
+                name=waveform_name,
+                analog_samples=analog_samples,
+                digital_samples=digital_samples,
+                is_first_chunk=is_first_chunk,
+                is_last_chunk=is_last_chunk,
+                total_number_of_samples=ensemble_info['number_of_samples'])
+            self._invalidate_sampled_names()
+
+            # Update written waveforms set
+            written_waveforms.update(wfm_list)
+
+            # check if write process was successful
+            if written_samples != chunk_length:
+                self.log.error('Sampling of ensemble "{0}" failed. Write to device was '
+                               'unsuccessful.\nThe number of actually written samples ({1:d}) '
+                               'does not match the number of samples staged to write ({2:d}).'
+                               ''.format(ensemble.name, written_samples, chunk_length))
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+
+        # Remember the written waveforms to skip sampling the next time
+        self._add_cached_waveforms(ensemble, offset_bin, waveform_name, sorted(written_waveforms),
+                                   ensemble_info, bytes_per_ensemble)
+
+        # if the rotating frame should be preserved (default) increment the offset counter
+        if ensemble.rotating_frame:
+            offset_bin += processed_samples
+
+        # Save sampling related parameters to the sampling_information container within the
+        # PulseBlockEnsemble.
+        # This step is only performed if the resulting waveforms are named by the PulseBlockEnsemble
+        # and not by a sequence nametag
+        if waveform_name == ensemble.name:
+            self._set_ensemble_sampling_information(ensemble, ensemble_info,
+                                                    sorted(written_waveforms))
+
+        self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
+                      ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
+        if ensemble_info['number_of_samples'] == 0:
+            self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
+                             ''.format(ensemble.name))
+        if not self.__sequence_generation_in_progress:
+            self._evict_waveform_cache()
+            self.module_state.unlock()
+        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+        self.sigSampleEnsembleComplete.emit(ensemble)
+        return offset_bin, sorted(written_waveforms), ensemble_info
+
+    def _prepare_ensemble_sampling(self, ensemble):
+        """
+        Analyzes a PulseBlockEnsemble to sample and makes sure its length is a multiple of the
+        waveform length step size. This is done by appending an idle block to the ensemble.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to sample
+
+        @return dict: information about the ensemble returned by analyze_block_ensemble
+        """
         ensemble_info = self.analyze_block_ensemble(ensemble)
 
         # Make sure the length of the channel is a multiple of the step size.
@@ -1639,161 +1997,264 @@ class SequenceGeneratorLogic(GenericLogic):
             else:
                 self.log.warn('Extending waveform {0} by {2} bins. New length {1}.'.format(
                     ensemble.name, ensemble_info['number_of_samples'], extension_samples))
+        return ensemble_info
 
-        # Calculate the byte size per sample.
-        # One analog sample per channel is 4 bytes (np.float32) and one digital sample per channel
-        # is 1 byte (np.bool).
-        bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
-            ensemble_info['digital_channels'])
+    def _set_ensemble_sampling_information(self, ensemble, ensemble_info, waveforms):
+        """
+        Saves sampling related parameters to the sampling_information container within the
+        PulseBlockEnsemble.
 
-        # Calculate the bytes estimate for the entire ensemble
-        bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
+        @param PulseBlockEnsemble ensemble: the sampled ensemble
+        @param dict ensemble_info: information about the ensemble returned by analyze_block_ensemble
+        @param list waveforms: sorted list of the waveform names on the device
+        """
+        ensemble.sampling_information = dict()
+        ensemble.sampling_information.update(ensemble_info)
+        ensemble.sampling_information['pulse_generator_settings'] = self.pulse_generator_settings
+        ensemble.sampling_information['waveforms'] = list(waveforms)
+        self.save_ensemble(ensemble)
+        return
 
-        # Determine the size of the sample arrays to be written as a whole.
-        if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
-            array_length = ensemble_info['number_of_samples']
-        else:
-            array_length = self._overhead_bytes // bytes_per_sample
+    def _get_waveform_cache_key(self, ensemble, offset_bin, waveform_name):
+        """
+        Hashes everything the waveforms sampled from a PulseBlockEnsemble depend on, i.e. the
+        definitions of all blocks/elements, the offset_bin and the pulse generator settings.
 
-        # Allocate the sample arrays that are used for a single write command
-        analog_samples = dict()
-        digital_samples = dict()
-        try:
-            for chnl in ensemble_info['analog_channels']:
-                analog_samples[chnl] = np.empty(array_length, dtype='float32')
-            for chnl in ensemble_info['digital_channels']:
-                digital_samples[chnl] = np.empty(array_length, dtype=bool)
-        except MemoryError:
-            self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
-                           'The sample array needed is too large to allocate in memory.\n'
-                           'Try using the overhead_bytes ConfigOption to limit memory usage.'
-                           ''.format(ensemble.name))
-            if not self.__sequence_generation_in_progress:
-                self.module_state.unlock()
-            self.sigSampleEnsembleComplete.emit(None)
-            return -1, list(), dict()
+        @param PulseBlockEnsemble ensemble: the ensemble to sample
+        @param int offset_bin: the offset_bin passed to sample_pulse_block_ensemble
+        @param str waveform_name: the waveform name (excluding the channel naming suffix)
 
-        # integer to keep track of the sampls already processed
-        processed_samples = 0
-        # Index to keep track of the samples written into the preallocated samples array
-        array_write_index = 0
-        # Keep track of the number of elements already written
-        element_count = 0
-        # set of written waveform names on the device
-        written_waveforms = set()
-        # Iterate over all blocks within the PulseBlockEnsemble object
+        @return str: hex digest identifying the sampled waveforms
+        """
+        description = [waveform_name,
+                       int(offset_bin),
+                       ensemble.rotating_frame,
+                       self.__activation_config[0],
+                       sorted(self.__activation_config[1]),
+                       float(self.__sample_rate),
+                       [sorted(levels.items()) for levels in self.__analog_levels],
+                       [sorted(levels.items()) for levels in self.__digital_levels],
+                       bool(self.__interleave)]
         for block_name, reps in ensemble.block_list:
-            block = self.get_block(block_name)
-            # Iterate over all repetitions of the current block
-            for rep_no in range(reps + 1):
-                # Iterate over the PulseBlockElement instances inside the current block
-                for element in block.element_list:
-                    digital_high = element.digital_high
-                    pulse_function = element.pulse_function
-                    element_length_bins = ensemble_info['elements_length_bins'][element_count]
-
-                    # Indicator on how many samples of this element have been written already
-                    element_samples_written = 0
-
-                    while element_samples_written != element_length_bins:
-                        samples_to_add = min(array_length - array_write_index,
-                                             element_length_bins - element_samples_written)
-                        # create floating point time array for the current element inside rotating
-                        # frame if analog samples are to be calculated.
-                        if pulse_function:
-                            time_arr = (offset_bin + np.arange(
-                                samples_to_add, dtype='float64')) / self.__sample_rate
-
-                        # Calculate respective part of the sample arrays
-                        for chnl in digital_high:
-                            digital_samples[chnl][array_write_index:array_write_index + samples_to_add] = digital_high[
-                                chnl]
-                        for chnl in pulse_function:
-                            analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = pulse_function[
-                                                                                                             chnl].get_samples(
-                                time_arr) / self.__analog_levels[0][chnl]
-
-                        # Free memory
-                        if pulse_function:
-                            del time_arr
-
-                        element_samples_written += samples_to_add
-                        array_write_index += samples_to_add
-                        processed_samples += samples_to_add
-                        # if the rotating frame should be preserved (default) increment the offset
-                        # counter for the time array.
-                        if ensemble.rotating_frame:
-                            offset_bin += samples_to_add
-
-                        # Check if the temporary sample array is full and write to the device if so.
-                        if array_write_index == array_length:
-                            # Set first/last chunk flags
-                            is_first_chunk = array_write_index == processed_samples
-                            is_last_chunk = processed_samples == ensemble_info['number_of_samples']
-                            written_samples, wfm_list = self.pulsegenerator().write_waveform(
-                                name=waveform_name,
-                                analog_samples=analog_samples,
-                                digital_samples=digital_samples,
-                                is_first_chunk=is_first_chunk,
-                                is_last_chunk=is_last_chunk,
-                                total_number_of_samples=ensemble_info['number_of_samples'])
-
-                            # Update written waveforms set
-                            written_waveforms.update(wfm_list)
-
-                            # check if write process was successful
-                            if written_samples != array_length:
-                                self.log.error('Sampling of block "{0}" in ensemble "{1}" failed. '
-                                               'Write to device was unsuccessful.\nThe number of '
-                                               'actually written samples ({2:d}) does not match '
-                                               'the number of samples staged to write ({3:d}).'
-                                               ''.format(block_name, ensemble.name, written_samples,
-                                                         array_length))
-                                if not self.__sequence_generation_in_progress:
-                                    self.module_state.unlock()
-                                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-                                self.sigSampleEnsembleComplete.emit(None)
-                                return -1, list(), dict()
-
-                            # Reset array write start pointer
-                            array_write_index = 0
-
-                            # check if the temporary write array needs to be truncated for the next
-                            # part. (because it is the last part of the ensemble to write which can
-                            # be shorter than the previous chunks)
-                            if array_length > ensemble_info['number_of_samples'] - processed_samples:
-                                array_length = ensemble_info['number_of_samples'] - processed_samples
-                                analog_samples = dict()
-                                digital_samples = dict()
-                                for chnl in ensemble_info['analog_channels']:
-                                    analog_samples[chnl] = np.empty(array_length, dtype='float32')
-                                for chnl in ensemble_info['digital_channels']:
-                                    digital_samples[chnl] = np.empty(array_length, dtype=bool)
-
-                    # Increment element index
-                    element_count += 1
+            description.append((reps, self._saved_pulse_blocks[block_name].element_list))
+        return hashlib.sha1(repr(description).encode('utf-8')).hexdigest()
 
-        # Save sampling related parameters to the sampling_information container within the
-        # PulseBlockEnsemble.
-        # This step is only performed if the resulting waveforms are named by the PulseBlockEnsemble
-        # and not by a sequence nametag
-        if waveform_name == ensemble.name:
-            ensemble.sampling_information = dict()
-            ensemble.sampling_information.update(ensemble_info)
-            ensemble.sampling_information['pulse_generator_settings'] = self.pulse_generator_settings
-            ensemble.sampling_information['waveforms'] = sorted(written_waveforms)
-            self.save_ensemble(ensemble)
+    def _get_cached_waveforms(self, ensemble, offset_bin, waveform_name):
+        """
+        Looks up waveforms sampled before from the very same PulseBlockEnsemble and pulse
+        generator settings which are still present on the device.
 
-        self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
-                      ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
-        if ensemble_info['number_of_samples'] == 0:
-            self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
-                             ''.format(ensemble.name))
-        if not self.__sequence_generation_in_progress:
-            self.module_state.unlock()
-        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-        self.sigSampleEnsembleComplete.emit(ensemble)
-        return offset_bin, sorted(written_waveforms), ensemble_info
+        @param PulseBlockEnsemble ensemble: the ensemble to sample
+        @param int offset_bin: the offset_bin passed to sample_pulse_block_ensemble
+        @param str waveform_name: the waveform name (excluding the channel naming suffix)
+
+        @return dict: cache entry with keys 'waveforms' and 'ensemble_info' or None if the
+                      ensemble needs to be sampled
+        """
+        if self._waveform_cache_bytes < 0 or waveform_name not in self._waveform_cache:
+            return None
+        cache_entry = self._waveform_cache[waveform_name]
+        if cache_entry['key'] != self._get_waveform_cache_key(ensemble, offset_bin, waveform_name):
+            return None
+        if not self._get_sampled_waveform_set().issuperset(cache_entry['waveforms']):
+            del self._waveform_cache[waveform_name]
+            return None
+        self._waveform_cache.move_to_end(waveform_name)
+        return cache_entry
+
+    def _add_cached_waveforms(self, ensemble, offset_bin, waveform_name, waveforms, ensemble_info,
+                              number_of_bytes):
+        """
+        Adds freshly written waveforms to the waveform cache.
+
+        @param PulseBlockEnsemble ensemble: the sampled ensemble
+        @param int offset_bin: the offset_bin passed to sample_pulse_block_ensemble
+        @param str waveform_name: the waveform name (excluding the channel naming suffix)
+        @param list waveforms: sorted list of the waveform names on the device
+        @param dict ensemble_info: information about the ensemble returned by analyze_block_ensemble
+        @param int number_of_bytes: size of the sampled waveforms
+        """
+        if self._waveform_cache_bytes < 0 or not waveforms:
+            return
+        self._waveform_cache.pop(waveform_name, None)
+        self._waveform_cache[waveform_name] = {
+            'key': self._get_waveform_cache_key(ensemble, offset_bin, waveform_name),
+            'waveforms': list(waveforms),
+            'ensemble_info': ensemble_info.copy(),
+            'bytes': int(number_of_bytes)}
+        return
+
+    def _evict_waveform_cache(self):
+        """
+        Deletes the least recently used cached waveforms from the device until the remaining ones
+        fit into the waveform_cache_bytes budget.
+        The most recently sampled waveforms, loaded waveforms and waveforms used by sequences on
+        the device are never deleted.
+        """
+        if self._waveform_cache_bytes <= 0:
+            return
+        cached_bytes = sum(entry['bytes'] for entry in self._waveform_cache.values())
+        if cached_bytes <= self._waveform_cache_bytes:
+            return
+
+        protected_waveforms = set(self.pulsegenerator().get_loaded_assets()[0].values())
+        sampled_sequences = self.sampled_sequences
+        for sequence_name in sampled_sequences:
+            sequence = self._saved_pulse_sequences.get(sequence_name)
+            if sequence is not None and sequence.sampling_information:
+                protected_waveforms.update(sequence.sampling_information.get('waveforms', list()))
+
+        for name_tag, cache_entry in list(self._waveform_cache.items())[:-1]:
+            if cached_bytes <= self._waveform_cache_bytes:
+                break
+            if protected_waveforms.intersection(cache_entry['waveforms']):
+                continue
+            self.log.debug('Deleting least recently used waveforms "{0}" from the device.'
+                           ''.format(name_tag))
+            cached_bytes -= cache_entry['bytes']
+            self._delete_waveform_by_nametag(name_tag)
+        return
+
+    def _compile_block_ensemble(self, ensemble, ensemble_info):
+        """
+        Compiles a PulseBlockEnsemble into flat arrays describing all PulseBlockElements
+        (incl. repetitions) in chronological order.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to compile
+        @param dict ensemble_info: the ensemble information as returned by analyze_block_ensemble
+
+        @return dict: dictionary with keys
+                      'element_start_bins' and 'element_length_bins' (1D numpy.ndarray[int]):
+                          first sample and number of samples of each element
+                      'digital_states' (dict): digital channel descriptors as keys and the
+                          state of each element (1D numpy.ndarray[bool]) as values
+                      'analog_function_ids' (dict): analog channel descriptors as keys and the
+                          index into 'sampling_functions' for each element (1D numpy.ndarray[int],
+                          -1 for elements without sampling function) as values
+                      'sampling_functions' (list): all distinct sampling function objects
+                      'sampling_function_keys' (list): hashable key (class and parameters) of
+                          each sampling function identifying it in the segment cache (None if
+                          the parameters are not hashable)
+                      'analog_levels' (dict): pp-amplitude to normalize the samples of each
+                          analog channel with
+        """
+        elements, element_order, _ = self._get_ensemble_elements(ensemble)
+
+        # Digital state of each distinct element
+        digital_states = dict()
+        for chnl in ensemble_info['digital_channels']:
+            states = np.array([el.digital_high.get(chnl, False) for el in elements], dtype=bool)
+            digital_states[chnl] = states[element_order]
+
+        # Sampling functions with equal parameters are only kept once (see SamplingBase.__eq__)
+        sampling_functions = list()
+        sampling_function_keys = list()
+        function_keys = dict()
+        analog_function_ids = dict()
+        for chnl in ensemble_info['analog_channels']:
+            function_ids = np.full(len(elements), -1, dtype='int64')
+            for ii, element in enumerate(elements):
+                function = element.pulse_function.get(chnl)
+                if function is None:
+                    continue
+                key = (type(function), tuple(getattr(function, param)
+                                             for param in function.params))
+                try:
+                    hash(key)
+                    cache_key = key
+                except TypeError:
+                    # unhashable parameter values, do not merge with other sampling functions
+                    key = id(function)
+                    cache_key = None
+                if key not in function_keys:
+                    function_keys[key] = len(sampling_functions)
+                    sampling_functions.append(function)
+                    sampling_function_keys.append(cache_key)
+                function_ids[ii] = function_keys[key]
+            analog_function_ids[chnl] = function_ids[element_order]
+
+        element_length_bins = ensemble_info['elements_length_bins']
+        compiled_dict = dict()
+        compiled_dict['element_start_bins'] = np.cumsum(element_length_bins) - element_length_bins
+        compiled_dict['element_length_bins'] = element_length_bins
+        compiled_dict['digital_states'] = digital_states
+        compiled_dict['analog_function_ids'] = analog_function_ids
+        compiled_dict['sampling_functions'] = sampling_functions
+        compiled_dict['sampling_function_keys'] = sampling_function_keys
+        compiled_dict['analog_levels'] = {chnl: self.__analog_levels[0][chnl] for chnl in
+                                          ensemble_info['analog_channels']}
+        return compiled_dict
+
+    def compile_pulse_stream(self, ensemble):
+        """
+        Compiles a PulseBlockEnsemble with only digital channels directly into a run-length
+        encoded pulse stream as played by the Swabian Instruments PulseStreamer.
+
+        The pulses are created from the element lengths (in bins, as determined by
+        analyze_block_ensemble) and the digital_high states of the PulseBlockElements. Memory
+        and time needed scale with the number of elements (incl. repetitions) instead of the
+        number of samples. sample_pulse_block_ensemble uses it instead of sampling for pulsers
+        with the 'pstream' waveform format.
+
+        @param str|PulseBlockEnsemble ensemble: PulseBlockEnsemble instance or name of a saved
+                                                PulseBlockEnsemble to compile
+
+        @return numpy.ndarray: pulse stream of dtype core.util.pulse_stream.PULSE_STREAM_DTYPE
+                               or None if the ensemble can not be compiled
+        """
+        if isinstance(ensemble, str):
+            ensemble = self.get_ensemble(ensemble)
+            if not ensemble:
+                self.log.error('Unable to compile PulseBlockEnsemble. Not found in saved '
+                               'ensembles.')
+                return None
+        if self._sampling_ensemble_sanity_check(ensemble) < 0:
+            return None
+
+        ensemble_info = self.analyze_block_ensemble(ensemble)
+        if ensemble_info['analog_channels']:
+            self.log.error('Unable to compile PulseBlockEnsemble "{0}" into a pulse stream. Analog '
+                           'channels are not supported.'.format(ensemble.name))
+            return None
+
+        elements, element_order, _ = self._get_ensemble_elements(ensemble)
+        try:
+            return self._encode_pulse_stream(elements, element_order,
+                                             ensemble_info['elements_length_bins'],
+                                             ensemble_info['digital_channels'])
+        except ValueError as err:
+            self.log.error('Unable to compile PulseBlockEnsemble "{0}" into a pulse stream.\n{1}'
+                           ''.format(ensemble.name, err))
+            return None
+
+    @staticmethod
+    def _encode_pulse_stream(elements, element_order, elements_length_bins, digital_channels):
+        """
+        Creates the pulse stream of PulseBlockElements played in the given order.
+
+        @param list elements: the distinct PulseBlockElements
+        @param numpy.ndarray element_order: index into elements for every element in
+                                            chronological order (incl. repetitions)
+        @param numpy.ndarray elements_length_bins: length in bins of every element in
+                                                   chronological order
+        @param iterable digital_channels: the digital channels of the pulse stream
+
+        @return numpy.ndarray: pulse stream of dtype core.util.pulse_stream.PULSE_STREAM_DTYPE
+        """
+        # Bitmask of each distinct element, then of all elements in chronological order
+        digital_states = dict()
+        for chnl in digital_channels:
+            digital_states[chnl] = np.array([el.digital_high.get(chnl, False) for el in elements],
+                                            dtype=bool)
+        bitmasks = get_bitmasks(digital_states, len(elements))[element_order]
+        return run_length_encode(elements_length_bins, bitmasks)
+
+    def _is_pulse_stream_pulser(self):
+        """
+        @return bool: True if the pulser plays pulse streams ('pstream' waveform format) instead
+                      of sampled waveforms
+        """
+        return 'pstream' in getattr(self.pulse_generator_constraints, 'waveform_format', ())
 
     @QtCore.Slot(str)
     def sample_pulse_sequence(self, sequence):
@@ -1812,6 +2273,9 @@ class SequenceGeneratorLogic(GenericLogic):
                    this method.
 
         More sophisticated sequence sampling method can be implemented here.
+
+        If the ConfigOption sampling_processes is larger than 1, the PulseBlockEnsembles are
+        sampled concurrently in a process pool (see _sample_sequence_ensembles_parallel).
         """
         # Get PulseSequence from saved sequences if string has been passed as argument
         if isinstance(sequence, str):
@@ -1849,60 +2313,32 @@ class SequenceGeneratorLogic(GenericLogic):
         # Take current time
         start_time = time.time()
 
-        # Produce a set of created waveforms
-        written_waveforms = set()
-        # Keep track of generated PulseBlockEnsembles and their corresponding ensemble_info dict
-        generated_ensembles = dict()
-
-        # Create a list in the process with each element holding the created waveform names as a
-        # tuple and the corresponding sequence parameters as defined in the PulseSequence object
+        # Sample all PulseBlockEnsembles used by the sequence. The result holds the
+        # ensemble_info dict (incl. the created waveform names) for each waveform name tag and a
+        # list with each element holding the created waveform names as a tuple and the
+        # corresponding sequence parameters as defined in the PulseSequence object
         # Example: [(('waveform1', 'waveform2'), seq_param_dict1),
         #           (('waveform3', 'waveform4'), seq_param_dict2)]
-        sequence_param_dict_list = list()
-
-        # if all the Pulse_Block_Ensembles should be in the rotating frame, then each ensemble
-        # will be created in general with a different offset_bin. Therefore, in order to keep track
-        # of the sampled Pulse_Block_Ensembles one has to introduce a running number as an
-        # additional name tag, so keep the sampled files separate.
-        offset_bin = 0  # that will be used for phase preservation
-        for step_index, seq_step in enumerate(sequence):
-            if sequence.rotating_frame:
-                # to make something like 001
-                name_tag = seq_step.ensemble + '_' + str(step_index).zfill(3)
-            else:
-                name_tag = seq_step.ensemble
-                offset_bin = 0  # Keep the offset at 0
-
-            # Only sample ensembles if they have not already been sampled
-            if sequence.rotating_frame or seq_step.ensemble not in generated_ensembles:
-                offset_bin, waveform_list, ensemble_info = self.sample_pulse_block_ensemble(
-                    ensemble=seq_step.ensemble,
-                    offset_bin=offset_bin,
-                    name_tag=name_tag)
-
-                if len(waveform_list) == 0:
-                    self.log.error('Sampling of PulseBlockEnsemble "{0}" failed during sampling of '
-                                   'PulseSequence "{1}".\nFailed to create waveforms on device.'
-                                   ''.format(seq_step.ensemble, sequence.name))
-                    self.module_state.unlock()
-                    self.__sequence_generation_in_progress = False
-                    self.sigSampleSequenceComplete.emit(None)
-                    return
-
-                # Add to generated ensembles
-                ensemble_info['waveforms'] = waveform_list
-                generated_ensembles[name_tag] = ensemble_info
-
-                # Add created waveform names to the set
-                written_waveforms.update(waveform_list)
+        if self._sampling_processes > 1:
+            sampled_steps = self._sample_sequence_ensembles_parallel(sequence)
+        else:
+            sampled_steps = self._sample_sequence_ensembles(sequence)
+        if sampled_steps is None:
+            self.module_state.unlock()
+            self.__sequence_generation_in_progress = False
+            self.sigSampleSequenceComplete.emit(None)
+            return
+        generated_ensembles, sequence_param_dict_list = sampled_steps
 
-            # Append written sequence step to sequence_param_dict_list
-            sequence_param_dict_list.append(
-                (tuple(generated_ensembles[name_tag]['waveforms']), seq_step))
+        # Produce a set of created waveforms
+        written_waveforms = set()
+        for ensemble_info in generated_ensembles.values():
+            written_waveforms.update(ensemble_info['waveforms'])
 
         # pass the whole information to the sequence creation method:
         steps_written = self.pulsegenerator().write_sequence(sequence.name,
                                                              sequence_param_dict_list)
+        self._invalidate_sampled_names()
         if steps_written != len(sequence_param_dict_list):
             self.log.error('Writing PulseSequence "{0}" to the device memory failed.\n'
                            'Returned number of sequence steps ({1:d}) does not match desired '
@@ -1922,6 +2358,9 @@ class SequenceGeneratorLogic(GenericLogic):
         self.log.info('Time needed for sampling and writing PulseSequence {0} to device: {1} sec.'
                       ''.format(sequence.name, int(np.rint(time.time() - start_time))))
 
+        # Delete least recently used waveforms exceeding the waveform cache budget
+        self._evict_waveform_cache()
+
         # unlock module
         self.module_state.unlock()
         self.__sequence_generation_in_progress = False
@@ -1929,13 +2368,266 @@ class SequenceGeneratorLogic(GenericLogic):
         self.sigSampleSequenceComplete.emit(sequence)
         return
 
+    def _get_sequence_name_tags(self, sequence):
+        """
+        Returns the waveform name tag for each step of a PulseSequence.
+
+        If the sequence should be in the rotating frame, each ensemble will be created in general
+        with a different offset_bin. Therefore, in order to keep track of the sampled ensembles
+        one has to introduce a running number as an additional name tag, to keep the sampled files
+        separate. Otherwise the waveforms of each ensemble are only sampled once.
+
+        @param PulseSequence sequence: the sequence to sample
+
+        @return list: waveform name tag (str) for each sequence step
+        """
+        if sequence.rotating_frame:
+            # to make something like 001
+            return [seq_step.ensemble + '_' + str(step_index).zfill(3) for step_index, seq_step in
+                    enumerate(sequence)]
+        return [seq_step.ensemble for seq_step in sequence]
+
+    def _sample_sequence_ensembles(self, sequence):
+        """
+        Samples the PulseBlockEnsembles of a PulseSequence one after another.
+
+        @param PulseSequence sequence: the sequence to sample
+
+        @return tuple: (generated_ensembles, sequence_param_dict_list) as needed by
+                       sample_pulse_sequence or None if sampling failed
+        """
+        name_tags = self._get_sequence_name_tags(sequence)
+        number_of_ensembles = len(set(name_tags))
+        generated_ensembles = dict()
+        sequence_param_dict_list = list()
+        offset_bin = 0  # that will be used for phase preservation
+        for seq_step, name_tag in zip(sequence, name_tags):
+            if not sequence.rotating_frame:
+                offset_bin = 0  # Keep the offset at 0
+
+            # Only sample ensembles if they have not already been sampled
+            if name_tag not in generated_ensembles:
+                start_time = time.time()
+                offset_bin, waveform_list, ensemble_info = self.sample_pulse_block_ensemble(
+                    ensemble=seq_step.ensemble,
+                    offset_bin=offset_bin,
+                    name_tag=name_tag)
+
+                if len(waveform_list) == 0:
+                    self.log.error('Sampling of PulseBlockEnsemble "{0}" failed during sampling of '
+                                   'PulseSequence "{1}".\nFailed to create waveforms on device.'
+                                   ''.format(seq_step.ensemble, sequence.name))
+                    return None
+
+                # Add to generated ensembles
+                ensemble_info['waveforms'] = waveform_list
+                generated_ensembles[name_tag] = ensemble_info
+                self.sigSampleSequenceProgress.emit(len(generated_ensembles),
+                                                    number_of_ensembles,
+                                                    name_tag,
+                                                    time.time() - start_time)
+
+            # Append written sequence step to sequence_param_dict_list
+            sequence_param_dict_list.append(
+                (tuple(generated_ensembles[name_tag]['waveforms']), seq_step))
+        return generated_ensembles, sequence_param_dict_list
+
+    def _sample_sequence_ensembles_parallel(self, sequence):
+        """
+        Samples the PulseBlockEnsembles of a PulseSequence concurrently in a process pool.
+
+        The offset_bin of each ensemble only depends on the number of samples of the ensembles
+        before, which is known from analyze_block_ensemble. So all ensembles are analyzed (and
+        extended to the waveform length step size) first and then handed over to the worker
+        processes. The sampled waveforms are written to the device in sequence order in the logic
+        thread. Only a limited number of ensembles is sampled ahead to bound the memory used.
+
+        Ensembles with waveforms still present on the device (see waveform cache) or exceeding
+        the overhead_bytes ConfigOption are sampled in the logic thread by
+        sample_pulse_block_ensemble when it is their turn to be written.
+
+        @param PulseSequence sequence: the sequence to sample
+
+        @return tuple: (generated_ensembles, sequence_param_dict_list) as needed by
+                       sample_pulse_sequence or None if sampling failed
+        """
+        name_tags = self._get_sequence_name_tags(sequence)
+
+        # Determine the offset_bin of each ensemble to sample and compile the ensembles
+        jobs = list()
+        prepared_name_tags = set()
+        prepared_ensembles = dict()
+        offset_bin = 0
+        for seq_step, name_tag in zip(sequence, name_tags):
+            if name_tag in prepared_name_tags:
+                continue
+            prepared_name_tags.add(name_tag)
+            if not sequence.rotating_frame:
+                offset_bin = 0
+            ensemble = self.get_ensemble(seq_step.ensemble)
+            job = {'name_tag': name_tag,
+                   'ensemble': ensemble,
+                   'offset_bin': offset_bin,
+                   'compiled_ensemble': None,
+                   'future': None}
+            cached_waveforms = self._get_cached_waveforms(ensemble, offset_bin, name_tag)
+            if cached_waveforms is not None:
+                number_of_samples = cached_waveforms['ensemble_info']['number_of_samples']
+            else:
+                if ensemble.name not in prepared_ensembles:
+                    ensemble_info = self._prepare_ensemble_sampling(ensemble)
+                    bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
+                        ensemble_info['digital_channels'])
+                    number_of_bytes = bytes_per_sample * ensemble_info['number_of_samples']
+                    compiled_ensemble = None
+                    if ensemble_info['number_of_samples'] > 0 and (
+                            self._overhead_bytes == 0 or number_of_bytes <= self._overhead_bytes):
+                        compiled_ensemble = get_picklable_ensemble(
+                            self._compile_block_ensemble(ensemble, ensemble_info))
+                    prepared_ensembles[ensemble.name] = (ensemble_info, number_of_bytes,
+                                                         compiled_ensemble)
+                ensemble_info, number_of_bytes, compiled_ensemble = prepared_ensembles[
+                    ensemble.name]
+                job['ensemble_info'] = ensemble_info
+                job['number_of_bytes'] = number_of_bytes
+                job['compiled_ensemble'] = compiled_ensemble
+                number_of_samples = ensemble_info['number_of_samples']
+            jobs.append(job)
+            # if the rotating frame should be preserved (default) increment the offset counter
+            if ensemble.rotating_frame:
+                offset_bin += number_of_samples
+
+        if self._sampling_pool is None:
+            self._sampling_pool = ProcessPoolExecutor(max_workers=self._sampling_processes)
+        max_jobs_ahead = 2 * self._sampling_processes
+
+        # Write the sampled ensembles to the device in sequence order
+        generated_ensembles = dict()
+        submitted_jobs = 0
+        try:
+            for job_index, job in enumerate(jobs):
+                while submitted_jobs < min(len(jobs), job_index + max_jobs_ahead):
+                    self._submit_sampling_job(jobs[submitted_jobs])
+                    submitted_jobs += 1
+
+                start_time = time.time()
+                if job['future'] is None:
+                    _, waveform_list, ensemble_info = self.sample_pulse_block_ensemble(
+                        ensemble=job['ensemble'],
+                        offset_bin=job['offset_bin'],
+                        name_tag=job['name_tag'])
+                else:
+                    waveform_list, ensemble_info = self._write_sampled_ensemble(job)
+                    job['future'] = None
+
+                if len(waveform_list) == 0:
+                    self.log.error('Sampling of PulseBlockEnsemble "{0}" failed during sampling of '
+                                   'PulseSequence "{1}".\nFailed to create waveforms on device.'
+                                   ''.format(job['ensemble'].name, sequence.name))
+                    return None
+
+                ensemble_info['waveforms'] = waveform_list
+                generated_ensembles[job['name_tag']] = ensemble_info
+                self.sigSampleSequenceProgress.emit(len(generated_ensembles),
+                                                    len(jobs),
+                                                    job['name_tag'],
+                                                    time.time() - start_time)
+        finally:
+            # Do not sample ensembles in vain if writing has failed
+            for job in jobs:
+                if job['future'] is not None:
+                    job['future'].cancel()
+
+        sequence_param_dict_list = [(tuple(generated_ensembles[name_tag]['waveforms']), seq_step)
+                                    for seq_step, name_tag in zip(sequence, name_tags)]
+        return generated_ensembles, sequence_param_dict_list
+
+    def _submit_sampling_job(self, job):
+        """
+        Hands over a compiled PulseBlockEnsemble to the sampling process pool.
+
+        @param dict job: job description as created by _sample_sequence_ensembles_parallel
+        """
+        if job['compiled_ensemble'] is None:
+            return
+        job['future'] = self._sampling_pool.submit(
+            sample_ensemble,
+            compiled_ensemble=job['compiled_ensemble'],
+            number_of_samples=job['ensemble_info']['number_of_samples'],
+            offset_bin=job['offset_bin'],
+            rotating_frame=job['ensemble'].rotating_frame,
+            sample_rate=self.__sample_rate,
+            sampling_function_paths=self._sampling_function_paths,
+            grouped_max_length=self._grouped_sampling_max_length)
+        return
+
+    def _write_sampled_ensemble(self, job):
+        """
+        Waits for a PulseBlockEnsemble sampled in the process pool and writes it to the device.
+
+        @param dict job: job description as created by _sample_sequence_ensembles_parallel
+
+        @return tuple: (created_waveforms, ensemble_info) like sample_pulse_block_ensemble
+        """
+        ensemble = job['ensemble']
+        name_tag = job['name_tag']
+        try:
+            analog_samples, digital_samples, sampling_time = job['future'].result()
+        except Exception:
+            self.log.exception('Sampling of PulseBlockEnsemble "{0}" in a worker process failed.'
+                               ''.format(ensemble.name))
+            # The pool might be broken, start a new one next time
+            self._sampling_pool.shutdown(wait=False)
+            self._sampling_pool = None
+            self.sigSampleEnsembleComplete.emit(None)
+            return list(), dict()
+
+        # check for old waveforms associated with the ensemble and delete them from pulse generator.
+        self._delete_waveform_by_nametag(name_tag)
+
+        ensemble_info = job['ensemble_info'].copy()
+        written_samples, wfm_list = self.pulsegenerator().write_waveform(
+            name=name_tag,
+            analog_samples=analog_samples,
+            digital_samples=digital_samples,
+            is_first_chunk=True,
+            is_last_chunk=True,
+            total_number_of_samples=ensemble_info['number_of_samples'])
+        self._invalidate_sampled_names()
+        if written_samples != ensemble_info['number_of_samples']:
+            self.log.error('Sampling of ensemble "{0}" failed. Write to device was '
+                           'unsuccessful.\nThe number of actually written samples ({1:d}) '
+                           'does not match the number of samples staged to write ({2:d}).'
+                           ''.format(ensemble.name, written_samples,
+                                     ensemble_info['number_of_samples']))
+            self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+            self.sigSampleEnsembleComplete.emit(None)
+            return list(), dict()
+
+        written_waveforms = sorted(set(wfm_list))
+        self._add_cached_waveforms(ensemble, job['offset_bin'], name_tag, written_waveforms,
+                                   ensemble_info, job['number_of_bytes'])
+        if name_tag == ensemble.name:
+            self._set_ensemble_sampling_information(ensemble, ensemble_info, written_waveforms)
+
+        self.log.debug('Sampling PulseBlockEnsemble "{0}" in a worker process took {1:.3f} sec.'
+                       ''.format(name_tag, sampling_time))
+        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+        self.sigSampleEnsembleComplete.emit(ensemble)
+        return written_waveforms, ensemble_info
+
     def _delete_waveform(self, names):
         if isinstance(names, str):
             names = [names]
+        # Remove the deleted waveforms from the waveform cache
+        for name_tag, cache_entry in list(self._waveform_cache.items()):
+            if not set(names).isdisjoint(cache_entry['waveforms']):
+                del self._waveform_cache[name_tag]
         current_waveforms = self.sampled_waveforms
         for wfm in names:
             if wfm in current_waveforms:
                 self.pulsegenerator().delete_waveform(wfm)
+        self._invalidate_sampled_names()
         self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
         return
 
@@ -1960,5 +2652,6 @@ class SequenceGeneratorLogic(GenericLogic):
         for seq in names:
             if seq in current_sequences:
                 self.pulsegenerator().delete_sequence(seq)
+        self._invalidate_sampled_names()
         self.sigAvailableSequencesUpdated.emit(self.sampled_sequences)
         return
@@ -19,17 +19,22 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from cycler import cycler
+import copy
 import datetime
-import inspect
 import logging
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import re
 import sys
+import threading
 import time
 
 from collections import OrderedDict
+from qtpy import QtCore
 from core.module import ConfigOption
 from core.util import units
 from core.util.mutex import Mutex
@@ -38,6 +43,11 @@ from matplotlib.backends.backend_pdf import PdfPages
 from PIL import Image
 from PIL import PngImagePlugin
 
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
 
 class DailyLogHandler(logging.FileHandler):
     """
@@ -114,10 +124,152 @@ class FunctionImplementationError(Exception):
         return repr(self.value)
 
 
+class DataStreamWriter:
+    """
+    Streams rows of data into a binary file with a text header.
+
+    Incoming rows are collected in a preallocated buffer which is written to disk (and flushed to
+    the storage device) whenever chunk_size rows have been collected. The memory consumption thus
+    stays constant and everything but the last incomplete chunk survives a crash.
+
+    The file starts with the commented text header, terminated by the line
+    '# End of header'. The rest of the file is the raw row-major data array. It can be read back
+    with SaveLogic.load_data_stream.
+
+    While writing, len(writer) and indexing/slicing the writer (e.g. writer[-100:]) give access
+    to the rows passed so far without keeping them in memory.
+
+    @param str file_path: full path of the file to create
+    @param str header: header text (without comment characters)
+    @param int columns: number of values per row
+    @param int chunk_size: number of rows to buffer before writing to disk
+    @param dtype: numpy data type of the saved values
+    """
+    header_end = '# End of header\n'
+
+    def __init__(self, file_path, header, columns, chunk_size=1000, dtype=np.float64):
+        self._file_path = file_path
+        self._columns = int(columns)
+        self._dtype = np.dtype(dtype)
+        self._buffer = np.empty((max(int(chunk_size), 1), self._columns), dtype=self._dtype)
+        self._buffer_index = 0
+        self._rows_written = 0
+
+        header += 'Binary data type: {0}\n'.format(self._dtype.str)
+        header += 'Binary data columns: {0:d}\n'.format(self._columns)
+        header_str = '# ' + header.replace('\n', '\n# ').rstrip('# ') + self.header_end
+        header_bytes = header_str.encode('utf-8')
+        self._header_size = len(header_bytes)
+        self._file = open(file_path, 'wb')
+        self._file.write(header_bytes)
+        self._sync()
+
+    def __len__(self):
+        return self.rows_written
+
+    def __getitem__(self, key):
+        """
+        Reads back rows from disk and buffer. Supports integer indices and slices.
+
+        @param int|slice key: row index or slice of rows
+        @return numpy.ndarray: copy of the requested row(s)
+        """
+        rows = range(self.rows_written)[key]
+        if isinstance(rows, int):
+            return self._read_rows(rows, rows + 1)[0]
+        if len(rows) == 0:
+            return np.empty((0, self._columns), dtype=self._dtype)
+        start = min(rows[0], rows[-1])
+        stop = max(rows[0], rows[-1]) + 1
+        return self._read_rows(start, stop)[rows[0] - start::rows.step]
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @property
+    def rows_written(self):
+        """
+        Number of rows passed to this writer so far (including the rows still buffered).
+        """
+        return self._rows_written + self._buffer_index
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def write(self, rows):
+        """
+        Adds one row or a 2D array of rows to the stream.
+
+        @param array_like rows: single row of length columns or array of shape (n, columns)
+        """
+        rows = np.asarray(rows, dtype=self._dtype).reshape((-1, self._columns))
+        while rows.shape[0] > 0:
+            free = self._buffer.shape[0] - self._buffer_index
+            n = min(free, rows.shape[0])
+            self._buffer[self._buffer_index:self._buffer_index + n] = rows[:n]
+            self._buffer_index += n
+            rows = rows[n:]
+            if self._buffer_index == self._buffer.shape[0]:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows to disk.
+        """
+        if self._buffer_index > 0:
+            self._file.write(self._buffer[:self._buffer_index].tobytes())
+            self._rows_written += self._buffer_index
+            self._buffer_index = 0
+        self._sync()
+
+    def close(self):
+        """
+        Writes remaining rows to disk and closes the file.
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def _read_rows(self, start, stop):
+        """
+        Reads the rows start to stop (exclusive) from the file and the buffer.
+        """
+        written = self._rows_written
+        chunks = list()
+        if start < written:
+            file_data = np.memmap(self._file_path, dtype=self._dtype, mode='r',
+                                  offset=self._header_size, shape=(written, self._columns))
+            chunks.append(np.array(file_data[start:min(stop, written)]))
+            del file_data
+        if stop > written:
+            chunks.append(self._buffer[max(start - written, 0):stop - written].copy())
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate(chunks)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
 class SaveLogic(GenericLogic):
 
     """
     A general class which saves all kinds of data in a general sense.
+
+    Example config for copy-paste:
+
+    savelogic:
+        module.Class: 'save_logic.SaveLogic'
+        win_data_directory: 'C:/Data'
+        unix_data_directory: 'Data/'
+        log_into_daily_directory: True
+        default_filetype: 'hdf5'  # optional, 'text', 'npz' or 'hdf5'
+        hdf5_compression: 'gzip'  # optional, 'gzip', 'lzf' or None
+        hdf5_compression_level: 4  # optional, gzip compression level 0-9
+        save_queue_warning_size: 8  # optional, pending background save jobs before warning
     """
 
     _modclass = 'savelogic'
@@ -126,6 +278,18 @@ class SaveLogic(GenericLogic):
     _win_data_dir = ConfigOption('win_data_directory', 'C:/Data/')
     _unix_data_dir = ConfigOption('unix_data_directory', 'Data')
     log_into_daily_directory = ConfigOption('log_into_daily_directory', False, missing='warn')
+    # file format used by save_data if the calling module does not ask for a specific one
+    default_filetype = ConfigOption('default_filetype', 'text')
+    # compression filter for HDF5 datasets ('gzip', 'lzf' or None) and gzip level (0-9)
+    hdf5_compression = ConfigOption('hdf5_compression', 'gzip')
+    hdf5_compression_level = ConfigOption('hdf5_compression_level', 4)
+    # number of queued background save jobs above which back-pressure is reported
+    save_queue_warning_size = ConfigOption('save_queue_warning_size', 8)
+
+    # emitted with the job id and the list of written file paths when a background save finished
+    sigSaveJobFinished = QtCore.Signal(int, list)
+    # emitted with the number of pending jobs when the background save queue grows too long
+    sigSaveQueueBackPressure = QtCore.Signal(int)
 
     # Matplotlib style definition for saving plots
     mpl_qd_style = {
@@ -190,6 +354,27 @@ class SaveLogic(GenericLogic):
 
         self._daily_loghandler = None
 
+        # cache of resolved daily and module directories, reset when the date changes
+        self._directory_lock = threading.Lock()
+        self._daily_directory_date = None
+        self._daily_directory = None
+        self._module_directories = dict()
+
+        # background saving
+        self._save_executor = None
+        self._save_queue_lock = threading.Lock()
+        self._pending_save_jobs = set()
+        self._save_job_counter = 0
+
+        if self.default_filetype not in ('text', 'npz', 'hdf5'):
+            self.log.warning('Unknown default_filetype "{0}" in configuration. Falling back to '
+                             'default setting: "text".'.format(self.default_filetype))
+            self.default_filetype = 'text'
+        if self.default_filetype == 'hdf5' and h5py is None:
+            self.log.warning('Package "h5py" is not installed. Unable to use "hdf5" as '
+                             'default_filetype. Falling back to "text".')
+            self.default_filetype = 'text'
+
     def on_activate(self):
         """ Definition, configuration and initialisation of the SaveLogic.
         """
@@ -205,7 +390,15 @@ class SaveLogic(GenericLogic):
         else:
             self._daily_loghandler = None
 
+        # A single worker thread keeps the save jobs in order and the disk access sequential
+        self._save_executor = ThreadPoolExecutor(max_workers=1)
+
     def on_deactivate(self):
+        # finish all queued save jobs before deactivating
+        if self._save_executor is not None:
+            self._save_executor.shutdown(wait=True)
+            self._save_executor = None
+
         if self._daily_loghandler is not None:
             # removes the log handler logging into the daily directory
             logging.getLogger().removeHandler(self._daily_loghandler)
@@ -226,7 +419,8 @@ class SaveLogic(GenericLogic):
         self._daily_loghandler.setLevel(level)
 
     def save_data(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
-                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None):
+                  timestamp=None, filetype=None, fmt='%.15e', delimiter='\t', plotfig=None,
+                  module_name=None):
         """
         General save routine for data.
 
@@ -272,7 +466,12 @@ class SaveLogic(GenericLogic):
                                    filename and a timestamp, because then the timestamp will be
                                    ignored.
         @param string filetype: optional, the file format the data should be saved in. Valid inputs
-                                are 'text', 'xml' and 'npz'. Default is 'text'.
+                                are 'text', 'npz' and 'hdf5'. Default is the ConfigOption
+                                'default_filetype' which itself defaults to 'text'.
+                                For 'hdf5' each item of the data dict is written as a typed,
+                                chunked and compressed dataset and the parameters are stored as
+                                attributes of the file. In that case the data arrays may have any
+                                number of dimensions and the generated filename ends with '.h5'.
         @param string or list of strings fmt: optional, format specifier for saved data. See python
                                               documentation for
                                               "Format Specification Mini-Language". If you want for
@@ -287,6 +486,9 @@ class SaveLogic(GenericLogic):
                                               behaviour or failure to save right away.
         @param string delimiter: optional, insert here the delimiter, like '\n' for new line, '\t'
                                  for tab, ',' for a comma ect.
+        @param string module_name: optional, name of the calling module. Used for the default
+                                   directory, filelabel and header. If not passed it is
+                                   determined from the calling frame.
 
         1D data
         =======
@@ -316,12 +518,161 @@ class SaveLogic(GenericLogic):
 
         YOU ARE RESPONSIBLE FOR THE IDENTIFIER! DO NOT FORGET THE UNITS FOR THE SAVED TIME
         TRACE/MATRIX.
+
+        @return list: paths of all files written (data, parameters and figures) or -1 on error
+        """
+        if module_name is None:
+            module_name = self._get_caller_module_name()
+        return self._save_data(data=data, module_name=module_name, poi_name=self.active_poi_name,
+                               filepath=filepath, parameters=parameters, filename=filename,
+                               filelabel=filelabel, timestamp=timestamp, filetype=filetype,
+                               fmt=fmt, delimiter=delimiter, plotfig=plotfig)
+
+    def save_data_async(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
+                        timestamp=None, filetype=None, fmt='%.15e', delimiter='\t', plotfig=None,
+                        module_name=None, copy_data=True):
+        """
+        Queue data to be saved in the background. Returns immediately.
+
+        All parameters except copy_data are the same as for save_data. The data arrays and
+        parameters are copied before this method returns, so the caller can continue to modify
+        them. The figure passed as plotfig is handed over to the save job and will be closed by it.
+        Do not touch it anymore.
+
+        @param bool copy_data: optional, set to False if the data arrays are not referenced
+                               anywhere else (e.g. freshly created) to avoid copying them.
+
+        @return concurrent.futures.Future: handle to the save job. Its result is the list of saved
+                                           file paths (or -1 on error). Its attribute job_id is
+                                           the id emitted with sigSaveJobFinished.
+        """
+        if module_name is None:
+            module_name = self._get_caller_module_name()
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        if self._save_executor is None:
+            self.log.warning('Background saving not available while SaveLogic is inactive. '
+                             'Saving data in the calling thread.')
+            future = Future()
+            future.job_id = -1
+            future.set_result(self._save_data(
+                data=data, module_name=module_name, poi_name=self.active_poi_name,
+                filepath=filepath, parameters=parameters, filename=filename,
+                filelabel=filelabel, timestamp=timestamp, filetype=filetype, fmt=fmt,
+                delimiter=delimiter, plotfig=plotfig))
+            return future
+
+        # Take a snapshot of data and parameters so the caller can go on measuring
+        data_copy = OrderedDict()
+        for keyname, array in data.items():
+            data_copy[keyname] = np.array(array, copy=True) if copy_data else array
+        try:
+            parameters_copy = copy.deepcopy(parameters)
+        except Exception:
+            parameters_copy = copy.copy(parameters)
+
+        with self._save_queue_lock:
+            self._save_job_counter += 1
+            job_id = self._save_job_counter
+            future = self._save_executor.submit(
+                self._run_save_job, job_id, data=data_copy, module_name=module_name,
+                poi_name=self.active_poi_name, filepath=filepath, parameters=parameters_copy,
+                filename=filename, filelabel=filelabel, timestamp=timestamp, filetype=filetype,
+                fmt=fmt, delimiter=delimiter, plotfig=plotfig)
+            future.job_id = job_id
+            self._pending_save_jobs.add(job_id)
+            pending = len(self._pending_save_jobs)
+
+        if pending > self.save_queue_warning_size:
+            self.log.warning('{0:d} save jobs are waiting to be written to disk. Saving can not '
+                             'keep up with the rate of incoming data.'.format(pending))
+            self.sigSaveQueueBackPressure.emit(pending)
+        return future
+
+    @property
+    def pending_save_jobs(self):
+        """
+        Returns the number of save jobs queued or running in the background.
+        """
+        with self._save_queue_lock:
+            return len(self._pending_save_jobs)
+
+    def wait_for_save_jobs(self, timeout=None):
+        """
+        Blocks until all currently queued background save jobs are finished.
+
+        @param float timeout: optional, maximum time in seconds to wait
+        @return bool: True if all jobs have finished, False on timeout
+        """
+        if self._save_executor is None:
+            return True
+        # The single worker runs the jobs in order, so an empty job queued last finishes last.
+        marker = self._save_executor.submit(lambda: None)
+        try:
+            marker.result(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        return True
+
+    def _run_save_job(self, job_id, **kwargs):
+        """
+        Executes a save job in the background worker thread and reports the result.
+
+        @param int job_id: id of the save job
+        @param kwargs: keyword arguments passed on to _save_data
+        @return list: paths of all written files or -1 on error
+        """
+        try:
+            saved_files = self._save_data(**kwargs)
+        except Exception:
+            self.log.exception('Saving data in the background failed:')
+            saved_files = -1
+        with self._save_queue_lock:
+            self._pending_save_jobs.discard(job_id)
+        self.sigSaveJobFinished.emit(job_id, saved_files if isinstance(saved_files, list) else list())
+        return saved_files
+
+    def _get_caller_module_name(self):
+        """
+        Determines the name of the module calling a public save method.
+
+        Only looks at the globals of the calling frame instead of inspecting the whole stack.
+
+        @return str: module name of the caller or 'UNSPECIFIED'
+        """
+        try:
+            # frame 0 is this method, frame 1 the public save method, frame 2 its caller
+            module_name = sys._getframe(2).f_globals['__name__'].split('.')[-1]
+        except (ValueError, KeyError, AttributeError):
+            # Sometimes it is not possible to get the object which called the save_data function
+            # (such as when calling this from the console).
+            module_name = 'UNSPECIFIED'
+        return module_name
+
+    def _save_data(self, data, module_name, poi_name, filepath=None, parameters=None,
+                   filename=None, filelabel=None, timestamp=None, filetype=None, fmt='%.15e',
+                   delimiter='\t', plotfig=None):
+        """
+        Does the actual work for save_data and save_data_async. See save_data for parameters.
+
+        @param str module_name: name of the calling module
+        @param str poi_name: name of the active POI or empty string
+
+        @return list: paths of all files written or -1 on error
         """
         start_time = time.time()
+        saved_files = list()
         # Create timestamp if none is present
         if timestamp is None:
             timestamp = datetime.datetime.now()
 
+        if filetype is None:
+            filetype = self.default_filetype
+        if filetype == 'hdf5' and h5py is None:
+            self.log.error('Package "h5py" is not installed. Unable to save data as HDF5 file. '
+                           'Saving as textfile.')
+            filetype = 'text'
+
         # Try to cast data array into numpy.ndarray if it is not already one
         # Also collect information on arrays in the process and do sanity checks
         found_1d = False
@@ -342,7 +693,10 @@ class SaveLogic(GenericLogic):
                     return -1
 
             # determine dimensions
-            if data[keyname].ndim < 3:
+            if filetype == 'hdf5':
+                # HDF5 datasets can have arbitrary shapes. No reshaping needed.
+                pass
+            elif data[keyname].ndim < 3:
                 length = data[keyname].shape[0]
                 arr_length.append(length)
                 if length > max_line_num:
@@ -366,24 +720,12 @@ class SaveLogic(GenericLogic):
             arr_dtype.append(data[keyname].dtype)
 
         # Raise error if data contains a mixture of 1D and 2D arrays
-        if found_2d and found_1d:
+        if found_2d and found_1d and filetype != 'hdf5':
             self.log.error('Passed data dictionary contains 1D AND 2D arrays. This is not allowed. '
                            'Either fit all data arrays into a single 2D array or pass multiple 1D '
                            'arrays only. Saving data failed!')
             return -1
 
-        # try to trace back the functioncall to the class which was calling it.
-        try:
-            frm = inspect.stack()[1]
-            # this will get the object, which called the save_data function.
-            mod = inspect.getmodule(frm[0])
-            # that will extract the name of the class.
-            module_name = mod.__name__.split('.')[-1]
-        except:
-            # Sometimes it is not possible to get the object which called the save_data function
-            # (such as when calling this from the console).
-            module_name = 'UNSPECIFIED'
-
         # determine proper file path
         if filepath is None:
             filepath = self.get_path_for_module(module_name)
@@ -395,12 +737,13 @@ class SaveLogic(GenericLogic):
         # create filelabel if none has been passed
         if filelabel is None:
             filelabel = module_name
-        if self.active_poi_name != '':
-            filelabel = self.active_poi_name.replace(' ', '_') + '_' + filelabel
+        if poi_name != '':
+            filelabel = poi_name.replace(' ', '_') + '_' + filelabel
 
         # determine proper unique filename to save if none has been passed
         if filename is None:
-            filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.dat')
+            file_ext = '.h5' if filetype == 'hdf5' else '.dat'
+            filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + file_ext)
 
         # Check format specifier.
         if not isinstance(fmt, str) and len(fmt) != len(data):
@@ -410,27 +753,7 @@ class SaveLogic(GenericLogic):
             return -1
 
         # Create header string for the file
-        header = 'Saved Data from the class {0} on {1}.\n' \
-                 ''.format(module_name, timestamp.strftime('%d.%m.%Y at %Hh%Mm%Ss'))
-        header += '\nParameters:\n===========\n\n'
-        # Include the active POI name (if not empty) as a parameter in the header
-        if self.active_poi_name != '':
-            header += 'Measured at POI: {0}\n'.format(self.active_poi_name)
-        # add the parameters if specified:
-        if parameters is not None:
-            # check whether the format for the parameters have a dict type:
-            if isinstance(parameters, dict):
-                for entry, param in parameters.items():
-                    if isinstance(param, float):
-                        header += '{0}: {1:.16e}\n'.format(entry, param)
-                    else:
-                        header += '{0}: {1}\n'.format(entry, param)
-            # make a hardcore string conversion and try to save the parameters directly:
-            else:
-                self.log.error('The parameters are not passed as a dictionary! The SaveLogic will '
-                               'try to save the parameters nevertheless.')
-                header += 'not specified parameters: {0}\n'.format(parameters)
-        header += '\nData:\n=====\n'
+        header = self._create_header(module_name, poi_name, timestamp, parameters)
 
         # write data to file
         # FIXME: Implement other file formats
@@ -477,6 +800,7 @@ class SaveLogic(GenericLogic):
             self.save_array_as_text(data=data[identifier_str], filename=filename, filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=False)
+            saved_files.append(os.path.join(filepath, filename))
         # write npz file and save parameters in textfile
         elif filetype == 'npz':
             header += str(list(data.keys()))[1:-1]
@@ -484,71 +808,221 @@ class SaveLogic(GenericLogic):
             self.save_array_as_text(data=[], filename=filename[:-4]+'_params.dat', filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=False)
+            saved_files.append(os.path.join(filepath, filename[:-4] + '.npz'))
+            saved_files.append(os.path.join(filepath, filename[:-4] + '_params.dat'))
+        # write HDF5 file with one dataset per data item and the parameters as attributes
+        elif filetype == 'hdf5':
+            attributes = OrderedDict()
+            attributes['module_name'] = module_name
+            attributes['timestamp'] = timestamp.isoformat()
+            if poi_name != '':
+                attributes['Measured at POI'] = poi_name
+            if isinstance(parameters, dict):
+                attributes.update(parameters)
+            elif parameters is not None:
+                self.log.error('The parameters are not passed as a dictionary! The SaveLogic will '
+                               'try to save the parameters nevertheless.')
+                attributes['not specified parameters'] = parameters
+            self.save_array_as_hdf5(data=data, filename=filename, filepath=filepath,
+                                    attributes=attributes)
+            saved_files.append(os.path.join(filepath, filename))
         else:
-            self.log.error('Only saving of data as textfile and npz-file is implemented. Filetype "{0}" is not '
-                           'supported yet. Saving as textfile.'.format(filetype))
+            self.log.error('Only saving of data as textfile, npz-file and hdf5-file is implemented. '
+                           'Filetype "{0}" is not supported yet. Saving as textfile.'
+                           ''.format(filetype))
             self.save_array_as_text(data=data[identifier_str], filename=filename, filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=False)
+            saved_files.append(os.path.join(filepath, filename))
 
         #--------------------------------------------------------------------------------------------
         # Save thumbnail figure of plot
         if plotfig is not None:
-            # create Metadata
-            metadata = dict()
-            metadata['Title'] = 'Image produced by qudi: ' + module_name
-            metadata['Author'] = 'qudi - Software Suite'
-            metadata['Subject'] = 'Find more information on: https://github.com/Ulm-IQO/qudi'
-            metadata['Keywords'] = 'Python 3, Qt, experiment control, automation, measurement, software, framework, modular'
-            metadata['Producer'] = 'qudi - Software Suite'
-            if timestamp is not None:
-                metadata['CreationDate'] = timestamp
-                metadata['ModDate'] = timestamp
-            else:
-                metadata['CreationDate'] = time
-                metadata['ModDate'] = time
+            saved_files.extend(self.save_figure(plotfig, os.path.join(filepath, filename),
+                                                module_name=module_name, timestamp=timestamp))
+            self.log.debug('Time needed to save data: {0:.2f}s'.format(time.time()-start_time))
+        return saved_files
 
-            # determine the PDF-Filename
-            fig_fname_vector = os.path.join(filepath, filename)[:-4] + '_fig.pdf'
+    def save_figure(self, plotfig, file_path, module_name=None, timestamp=None):
+        """
+        Saves a matplotlib figure as PDF and PNG including qudi metadata and closes it.
 
-            # Create the PdfPages object to which we will save the pages:
-            # The with statement makes sure that the PdfPages object is closed properly at
-            # the end of the block, even if an Exception occurs.
-            with PdfPages(fig_fname_vector) as pdf:
-                pdf.savefig(plotfig, bbox_inches='tight', pad_inches=0.05)
+        @param matplotlib.figure.Figure plotfig: the figure to save
+        @param str file_path: path of the data file the figure belongs to. The figures are saved
+                              next to it with the endings '_fig.pdf' and '_fig.png'.
+        @param str module_name: optional, name of the module that produced the figure
+        @param datetime timestamp: optional, creation time of the figure
 
-                # We can also set the file's metadata via the PdfPages object:
-                pdf_metadata = pdf.infodict()
-                for x in metadata:
-                    pdf_metadata[x] = metadata[x]
+        @return list: paths of the saved PDF and PNG file
+        """
+        if module_name is None:
+            module_name = self._get_caller_module_name()
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        # create Metadata
+        metadata = dict()
+        metadata['Title'] = 'Image produced by qudi: ' + module_name
+        metadata['Author'] = 'qudi - Software Suite'
+        metadata['Subject'] = 'Find more information on: https://github.com/Ulm-IQO/qudi'
+        metadata['Keywords'] = 'Python 3, Qt, experiment control, automation, measurement, software, framework, modular'
+        metadata['Producer'] = 'qudi - Software Suite'
+        metadata['CreationDate'] = timestamp
+        metadata['ModDate'] = timestamp
+
+        # determine the PDF-Filename
+        fig_fname_vector = os.path.splitext(file_path)[0] + '_fig.pdf'
+
+        # Create the PdfPages object to which we will save the pages:
+        # The with statement makes sure that the PdfPages object is closed properly at
+        # the end of the block, even if an Exception occurs.
+        with PdfPages(fig_fname_vector) as pdf:
+            pdf.savefig(plotfig, bbox_inches='tight', pad_inches=0.05)
+
+            # We can also set the file's metadata via the PdfPages object:
+            pdf_metadata = pdf.infodict()
+            for x in metadata:
+                pdf_metadata[x] = metadata[x]
 
-            # determine the PNG-Filename and save the plain PNG
-            fig_fname_image = os.path.join(filepath, filename)[:-4] + '_fig.png'
-            plotfig.savefig(fig_fname_image, bbox_inches='tight', pad_inches=0.05)
+        # determine the PNG-Filename and save the plain PNG
+        fig_fname_image = os.path.splitext(file_path)[0] + '_fig.png'
+        plotfig.savefig(fig_fname_image, bbox_inches='tight', pad_inches=0.05)
 
-            # Use Pillow (an fork for PIL) to attach metadata to the PNG
-            png_image = Image.open(fig_fname_image)
-            png_metadata = PngImagePlugin.PngInfo()
+        # Use Pillow (an fork for PIL) to attach metadata to the PNG
+        png_image = Image.open(fig_fname_image)
+        png_metadata = PngImagePlugin.PngInfo()
 
-            # PIL can only handle Strings, so let's convert our times
-            metadata['CreationDate'] = metadata['CreationDate'].strftime('%Y%m%d-%H%M-%S')
-            metadata['ModDate'] = metadata['ModDate'].strftime('%Y%m%d-%H%M-%S')
+        # PIL can only handle Strings, so let's convert our times
+        metadata['CreationDate'] = metadata['CreationDate'].strftime('%Y%m%d-%H%M-%S')
+        metadata['ModDate'] = metadata['ModDate'].strftime('%Y%m%d-%H%M-%S')
 
-            for x in metadata:
-                # make sure every value of the metadata is a string
-                if not isinstance(metadata[x], str):
-                    metadata[x] = str(metadata[x])
+        for x in metadata:
+            # make sure every value of the metadata is a string
+            if not isinstance(metadata[x], str):
+                metadata[x] = str(metadata[x])
 
-                # add the metadata to the picture
-                png_metadata.add_text(x, metadata[x])
+            # add the metadata to the picture
+            png_metadata.add_text(x, metadata[x])
 
-            # save the picture again, this time including the metadata
-            png_image.save(fig_fname_image, "png", pnginfo=png_metadata)
+        # save the picture again, this time including the metadata
+        png_image.save(fig_fname_image, "png", pnginfo=png_metadata)
 
-            # close matplotlib figure
-            plt.close(plotfig)
-            self.log.debug('Time needed to save data: {0:.2f}s'.format(time.time()-start_time))
-            #----------------------------------------------------------------------------------
+        # close matplotlib figure
+        plt.close(plotfig)
+        return [fig_fname_vector, fig_fname_image]
+
+    def _create_header(self, module_name, poi_name, timestamp, parameters):
+        """
+        Creates the header string for saved data files.
+
+        @param str module_name: name of the calling module
+        @param str poi_name: name of the active POI or empty string
+        @param datetime timestamp: timestamp of the saved data
+        @param dict parameters: parameters to include in the header
+
+        @return str: header (without comment characters)
+        """
+        header = 'Saved Data from the class {0} on {1}.\n' \
+                 ''.format(module_name, timestamp.strftime('%d.%m.%Y at %Hh%Mm%Ss'))
+        header += '\nParameters:\n===========\n\n'
+        # Include the active POI name (if not empty) as a parameter in the header
+        if poi_name != '':
+            header += 'Measured at POI: {0}\n'.format(poi_name)
+        # add the parameters if specified:
+        if parameters is not None:
+            # check whether the format for the parameters have a dict type:
+            if isinstance(parameters, dict):
+                for entry, param in parameters.items():
+                    if isinstance(param, float):
+                        header += '{0}: {1:.16e}\n'.format(entry, param)
+                    else:
+                        header += '{0}: {1}\n'.format(entry, param)
+            # make a hardcore string conversion and try to save the parameters directly:
+            else:
+                self.log.error('The parameters are not passed as a dictionary! The SaveLogic will '
+                               'try to save the parameters nevertheless.')
+                header += 'not specified parameters: {0}\n'.format(parameters)
+        header += '\nData:\n=====\n'
+        return header
+
+    def open_data_stream(self, column_header, columns, parameters=None, filepath=None,
+                         filename=None, filelabel=None, timestamp=None, module_name=None,
+                         chunk_size=1000, dtype=np.float64):
+        """
+        Creates a binary file to stream data rows into while they are acquired.
+
+        @param str column_header: description of the columns, e.g. 'Time (s)\tSignal (counts/s)'
+        @param int columns: number of values per row
+        @param dict parameters: optional, parameters to save in the header
+        @param str filepath: optional, see save_data
+        @param str filename: optional, see save_data. Default ending is '.bin'
+        @param str filelabel: optional, see save_data
+        @param datetime timestamp: optional, see save_data
+        @param str module_name: optional, see save_data
+        @param int chunk_size: optional, number of rows buffered before writing to disk
+        @param dtype: optional, numpy data type of the saved values
+
+        @return DataStreamWriter: writer to pass the rows to. Close it when done.
+        """
+        if module_name is None:
+            module_name = self._get_caller_module_name()
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        if filepath is None:
+            filepath = self.get_path_for_module(module_name)
+        elif not os.path.exists(filepath):
+            os.makedirs(filepath)
+            self.log.info('Custom filepath does not exist. Created directory "{0}"'
+                          ''.format(filepath))
+        if filelabel is None:
+            filelabel = module_name
+        if self.active_poi_name != '':
+            filelabel = self.active_poi_name.replace(' ', '_') + '_' + filelabel
+        if filename is None:
+            filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.bin')
+
+        header = self._create_header(module_name, self.active_poi_name, timestamp, parameters)
+        header += column_header + '\n'
+        return DataStreamWriter(file_path=os.path.join(filepath, filename),
+                                header=header,
+                                columns=columns,
+                                chunk_size=chunk_size,
+                                dtype=dtype)
+
+    @staticmethod
+    def load_data_stream(file_path, mmap=True):
+        """
+        Reads a file written with a DataStreamWriter.
+
+        An incomplete last row (e.g. after a crash) is ignored.
+
+        @param str file_path: full path to the file
+        @param bool mmap: optional, if True the data is memory-mapped instead of read into memory
+
+        @return (numpy.ndarray, str): data array of shape (rows, columns), header text
+        """
+        with open(file_path, 'rb') as file:
+            header_lines = list()
+            for line in file:
+                line = line.decode('utf-8')
+                if line == DataStreamWriter.header_end:
+                    break
+                header_lines.append(line[2:] if line.startswith('# ') else line.lstrip('#'))
+            offset = file.tell()
+        header = ''.join(header_lines)
+        dtype = np.dtype(re.search(r'^Binary data type: (\S+)$', header, re.M).group(1))
+        columns = int(re.search(r'^Binary data columns: (\d+)$', header, re.M).group(1))
+        rows = (os.path.getsize(file_path) - offset) // (dtype.itemsize * columns)
+        if rows == 0:
+            return np.empty((0, columns), dtype=dtype), header
+        if mmap:
+            data = np.memmap(file_path, dtype=dtype, mode='r', offset=offset,
+                             shape=(rows, columns))
+        else:
+            with open(file_path, 'rb') as file:
+                file.seek(offset)
+                data = np.fromfile(file, dtype=dtype, count=rows * columns)
+            data = data.reshape((rows, columns))
+        return data, header
 
     def save_array_as_text(self, data, filename, filepath='', fmt='%.15e', header='',
                            delimiter='\t', comments='#', append=False):
@@ -567,6 +1041,105 @@ class SaveLogic(GenericLogic):
                            comments=comments)
         return
 
+    def save_array_as_hdf5(self, data, filename, filepath='', attributes=None):
+        """
+        An independent method, which saves a dictionary of numpy.ndarrays as HDF5 file.
+
+        @param dict data: The keys are used as dataset names, the items are array_like of any shape.
+        @param str filename: name of the file to create (including the file ending, e.g. '.h5')
+        @param str filepath: optional, directory to save the file in
+        @param dict attributes: optional, parameters to save as attributes of the root group.
+                                Values not natively supported by HDF5 are saved as strings.
+
+        Numeric datasets are written chunked and compressed according to the ConfigOptions
+        'hdf5_compression' and 'hdf5_compression_level'. Since "/" separates groups in HDF5 it is
+        replaced by "|" in the dataset name and the original key is kept in the dataset attribute
+        'identifier'.
+        """
+        if h5py is None:
+            self.log.error('Package "h5py" is not installed. Unable to save data as HDF5 file.')
+            return -1
+
+        compression = self.hdf5_compression if self.hdf5_compression else None
+        compression_opts = self.hdf5_compression_level if compression == 'gzip' else None
+
+        with h5py.File(os.path.join(filepath, filename), 'w') as file:
+            if attributes is not None:
+                for name, value in attributes.items():
+                    file.attrs[str(name)] = self._to_hdf5_attribute(value)
+
+            for keyname, array in data.items():
+                array = np.asarray(array)
+                dtype = None
+                if array.dtype.kind in 'UO':
+                    # variable length strings since numpy unicode is not supported by HDF5
+                    dtype = h5py.special_dtype(vlen=str)
+                    array = array.astype(str).astype(object)
+                chunked = array.ndim > 0 and array.size > 0
+                dataset = file.create_dataset(
+                    str(keyname).replace('/', '|'),
+                    data=array,
+                    dtype=dtype,
+                    chunks=True if chunked else None,
+                    compression=compression if chunked else None,
+                    compression_opts=compression_opts if chunked else None,
+                    shuffle=chunked and compression is not None and array.dtype.kind in 'biuf')
+                dataset.attrs['identifier'] = str(keyname)
+        return 0
+
+    @staticmethod
+    def _to_hdf5_attribute(value):
+        """
+        Converts a parameter into a type that can be stored as HDF5 attribute.
+
+        @param object value: parameter value
+        @return object: value itself if supported by HDF5, numeric ndarray or string representation
+        """
+        if isinstance(value, (str, bool, int, float, complex, np.number, np.bool_)):
+            return value
+        if isinstance(value, (list, tuple, np.ndarray)):
+            array = np.asarray(value)
+            if array.dtype.kind in 'biufc':
+                return array
+        return str(value)
+
+    def open_hdf5_data(self, file_path):
+        """
+        Opens a file saved with filetype 'hdf5' for lazy reading.
+
+        @param str file_path: full path to the HDF5 file
+        @return h5py.File: read-only file handle. Datasets are only read from disk when sliced
+                           (e.g. file['Counts'][10:20]) and the parameters are available via
+                           file.attrs. Close the file after use or use it as context manager.
+        """
+        if h5py is None:
+            self.log.error('Package "h5py" is not installed. Unable to open HDF5 file.')
+            return None
+        return h5py.File(file_path, 'r')
+
+    def load_hdf5_data(self, file_path):
+        """
+        Reads a file saved with filetype 'hdf5' completely into memory.
+
+        @param str file_path: full path to the HDF5 file
+        @return (OrderedDict, OrderedDict): data dict with the original keys and numpy.ndarrays as
+                                            items, parameters dict
+        """
+        data = OrderedDict()
+        parameters = OrderedDict()
+        if h5py is None:
+            self.log.error('Package "h5py" is not installed. Unable to load HDF5 file.')
+            return data, parameters
+        with h5py.File(file_path, 'r') as file:
+            for name, value in file.attrs.items():
+                parameters[name] = value
+            for name, dataset in file.items():
+                if h5py.check_dtype(vlen=dataset.dtype) is str and hasattr(dataset, 'asstr'):
+                    # h5py >= 3 returns bytes for variable length strings by default
+                    dataset = dataset.asstr()
+                data[file[name].attrs.get('identifier', name)] = dataset[()]
+        return data, parameters
+
     def get_daily_directory(self):
         """
         Creates the daily directory.
@@ -580,8 +1153,16 @@ class SaveLogic(GenericLogic):
 
         and the filepath is returned. There should be always a filepath
         returned.
+
+        The resolved directory is cached and only looked up again when the date
+        changes or the directory has been removed.
         """
+        today = time.strftime("%Y%m%d")
+        with self._directory_lock:
+            if self._daily_directory_date == today and os.path.isdir(self._daily_directory):
+                return self._daily_directory
 
+        messages = list()
         # First check if the directory exists and if not then the default
         # directory is taken.
         if not os.path.exists(self.data_dir):
@@ -589,14 +1170,15 @@ class SaveLogic(GenericLogic):
                 # no need to create it, since it will overwrite the existing
                 # data there.
                 if not os.path.exists(self.data_dir):
-                    os.makedirs(self.data_dir)
-                    self.log.warning('The specified Data Directory in the '
-                            'config file does not exist. Using default for '
-                            '{0} system instead. The directory {1} was '
-                            'created'.format(self.os_system, self.data_dir))
+                    os.makedirs(self.data_dir, exist_ok=True)
+                    messages.append((logging.WARNING,
+                                     'The specified Data Directory in the '
+                                     'config file does not exist. Using default for '
+                                     '{0} system instead. The directory {1} was '
+                                     'created'.format(self.os_system, self.data_dir)))
 
         # That is now the current directory:
-        current_dir = os.path.join(self.data_dir, time.strftime("%Y"), time.strftime("%m"))
+        current_dir = os.path.join(self.data_dir, today[:4], today[4:6])
 
         folder_exists = False   # Flag to indicate that the folder does not exist.
         if os.path.exists(current_dir):
@@ -604,21 +1186,31 @@ class SaveLogic(GenericLogic):
             # Get only the folders without the files there:
             folderlist = [d for d in os.listdir(current_dir) if os.path.isdir(os.path.join(current_dir, d))]
             # Search if there is a folder which starts with the current date:
-            for entry in folderlist:
-                if time.strftime("%Y%m%d") in (entry[:2]):
+            for entry in sorted(folderlist):
+                if entry.startswith(today):
                     current_dir = os.path.join(current_dir, str(entry))
                     folder_exists = True
                     break
 
         if not folder_exists:
-            current_dir = os.path.join(current_dir, time.strftime("%Y%m%d"))
-            self.log.info('Creating directory for today\'s data in \n'
-                    '{0}'.format(current_dir))
+            current_dir = os.path.join(current_dir, today)
+            messages.append((logging.INFO,
+                             'Creating directory for today\'s data in \n{0}'.format(current_dir)))
 
             # The exist_ok=True is necessary here to prevent Error 17 "File Exists"
             # Details at http://stackoverflow.com/questions/12468022/python-fileexists-error-when-making-directory
             os.makedirs(current_dir, exist_ok=True)
 
+        with self._directory_lock:
+            if self._daily_directory_date != today or self._daily_directory != current_dir:
+                # new day or new directory, so the module directories have to be resolved again
+                self._module_directories = dict()
+            self._daily_directory_date = today
+            self._daily_directory = current_dir
+
+        # Log outside the lock since the DailyLogHandler calls this method itself on rollover
+        for level, message in messages:
+            self.log.log(level, message)
         return current_dir
 
     def get_path_for_module(self, module_name):
@@ -629,8 +1221,19 @@ class SaveLogic(GenericLogic):
                                    directory. The module_name can be e.g. 'Confocal'.
         @return string: absolute path to the module name
         """
-        dir_path = os.path.join(self.get_daily_directory(), module_name)
-
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
+        daily_dir = self.get_daily_directory()
+        with self._directory_lock:
+            dir_path = self._module_directories.get(module_name)
+        if dir_path is not None:
+            # the folder may have been removed since it was cached
+            if not os.path.isdir(dir_path):
+                os.makedirs(dir_path, exist_ok=True)
+            return dir_path
+
+        dir_path = os.path.join(daily_dir, module_name)
+        os.makedirs(dir_path, exist_ok=True)
+        with self._directory_lock:
+            # only cache if the day did not roll over in the meantime
+            if self._daily_directory == daily_dir:
+                self._module_directories[module_name] = dir_path
         return dir_path
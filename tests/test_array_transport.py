@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the binary array transport in core/util/array_transport.py.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import pytest
+
+from core.util.array_transport import pack_array, unpack_array, get_array_header, \
+    is_transportable, ArraySender, ArrayReceiver
+
+ARRAYS = [np.array(3.5),
+          np.array(True),
+          np.empty(0, dtype='int64'),
+          np.arange(10, dtype='uint16'),
+          np.arange(24, dtype='>i4').reshape((2, 3, 4)),
+          np.arange(20.).reshape((4, 5))[:, ::2],
+          np.linspace(0, 1, 7) * (1 + 2j)]
+
+
+@pytest.mark.parametrize('array', ARRAYS)
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip(array, compress):
+    assert is_transportable(array)
+    unpacked = unpack_array(pack_array(array, compress=compress))
+    assert unpacked.shape == array.shape
+    assert unpacked.dtype == array.dtype
+    assert np.array_equal(unpacked, array)
+    assert unpacked.flags.writeable
+
+
+def test_compression():
+    array = np.zeros(100000, dtype='int64')
+    data = pack_array(array, compress=True)
+    assert get_array_header(data)['compression'] == 'zlib'
+    assert len(data) < array.nbytes // 10
+    assert np.array_equal(unpack_array(data), array)
+
+
+def test_delta_transfer():
+    rng = np.random.default_rng(0)
+    sender = ArraySender(compression_threshold=1024)
+    receiver = ArrayReceiver()
+    trace = rng.integers(0, 1000, 100000)
+    for ii in range(4):
+        data = sender.pack(trace, key='trace', reference_id=receiver.get_reference_id('trace'))
+        assert (get_array_header(data)['reference'] is None) == (ii == 0)
+        assert np.array_equal(receiver.unpack(data, key='trace'), trace)
+        trace = trace.copy()
+        trace[rng.integers(0, trace.size, 100)] += 1
+
+    # a scalar with the same key is sent without reference
+    data = sender.pack(np.array(5), key='trace', reference_id=receiver.get_reference_id('trace'))
+    assert get_array_header(data)['reference'] is None
+    assert receiver.unpack(data, key='trace').shape == ()
+
+
+def test_missing_reference():
+    sender = ArraySender(compression_threshold=0)
+    array = np.arange(1000)
+    sender.pack(array, key='a')
+    data = sender.pack(array, key='a', reference_id=1)
+    with pytest.raises(ValueError):
+        ArrayReceiver().unpack(data, key='a')
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the decoding and histogramming of PicoHarp 300 TTTR records in
+hardware/picoquant/picoharp_tttr.py with synthetic record streams.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import pytest
+
+from hardware.picoquant.picoharp_tttr import TTTRHistogram, MODE_T2, MODE_T3, SPECIAL_CHANNEL, \
+    T2_WRAPAROUND, T3_WRAPAROUND
+
+BIN_WIDTH = 4
+NUMBER_OF_BINS = 50
+MARKERS = [0b0001, 0b0101, 0b1000]
+
+
+def _t3_stream(rng):
+    """
+    Photons on channel 1 at random syncs (spanning several sync counter overflows), followed by
+    the marker records.
+
+    @return tuple: (records, photon syncs, photon dtimes)
+    """
+    syncs = np.sort(rng.integers(0, 3 * T3_WRAPAROUND, 2000))
+    dtimes = rng.integers(0, BIN_WIDTH * NUMBER_OF_BINS + 40, syncs.size)
+    records = list()
+    overflows = 0
+    for sync, dtime in zip(syncs, dtimes):
+        while sync // T3_WRAPAROUND > overflows:
+            records.append(SPECIAL_CHANNEL << 28)
+            overflows += 1
+        records.append((1 << 28) | (int(dtime) << 16) | int(sync % T3_WRAPAROUND))
+    for marker in MARKERS:
+        records.append((SPECIAL_CHANNEL << 28) | (marker << 16) | int(syncs[-1] % T3_WRAPAROUND))
+    return np.array(records, dtype=np.uint32), syncs, dtimes
+
+
+def _t2_stream(rng):
+    """
+    Sync records on channel 0 every 5000 time tags with photons on channel 1 in between (spanning
+    several time tag overflows), followed by the marker records. The photons before the first sync
+    can not be assigned to a sync.
+
+    @return tuple: (records, photon syncs, photon delays)
+    """
+    period = 5000
+    number_of_syncs = 3 * T2_WRAPAROUND // period
+    photon_times = np.sort(rng.integers(0, number_of_syncs * period, 2000))
+    events = [(time, 1) for time in photon_times]
+    events += [(sync * period + 100, 0) for sync in range(number_of_syncs)]
+    events.sort()
+    records = list()
+    overflows = 0
+    for time, channel in events:
+        while time // T2_WRAPAROUND > overflows:
+            records.append(SPECIAL_CHANNEL << 28)
+            overflows += 1
+        records.append((channel << 28) | int(time % T2_WRAPAROUND))
+    for marker in MARKERS:
+        records.append((SPECIAL_CHANNEL << 28) | marker)
+
+    syncs = (photon_times - 100) // period
+    keep = photon_times >= 100
+    delays = photon_times - 100 - syncs * period
+    return np.array(records, dtype=np.uint32), syncs[keep], delays[keep]
+
+
+def _expected_histogram(syncs, delays, number_of_gates):
+    bins = delays // BIN_WIDTH
+    in_range = bins < NUMBER_OF_BINS
+    if number_of_gates == 0:
+        return np.bincount(bins[in_range], minlength=NUMBER_OF_BINS)
+    gates = syncs[in_range] % number_of_gates
+    flat_bins = gates * NUMBER_OF_BINS + bins[in_range]
+    return np.bincount(flat_bins, minlength=number_of_gates * NUMBER_OF_BINS).reshape(
+        (number_of_gates, NUMBER_OF_BINS))
+
+
+def _add_in_chunks(histogram, records, rng):
+    borders = np.sort(rng.integers(0, records.size, 7))
+    for chunk in np.split(records, borders):
+        histogram.add_records(chunk)
+
+
+@pytest.mark.parametrize('mode', [MODE_T2, MODE_T3])
+@pytest.mark.parametrize('number_of_gates', [0, 3])
+def test_histogram(mode, number_of_gates):
+    rng = np.random.default_rng(mode * 10 + number_of_gates)
+    if mode == MODE_T3:
+        records, syncs, delays = _t3_stream(rng)
+    else:
+        records, syncs, delays = _t2_stream(rng)
+    histogram = TTTRHistogram(mode, BIN_WIDTH, NUMBER_OF_BINS, number_of_gates=number_of_gates)
+    _add_in_chunks(histogram, records, rng)
+
+    expected = _expected_histogram(syncs, delays, number_of_gates)
+    assert histogram.is_gated == (number_of_gates > 0)
+    assert np.array_equal(histogram.histogram, expected)
+    assert histogram.binned_photons == expected.sum()
+    assert histogram.processed_records == records.size
+    assert histogram.overflows == 2
+    assert np.array_equal(histogram.marker_counts, [2, 0, 1, 1])
+
+
+@pytest.mark.parametrize('mode', [MODE_T2, MODE_T3])
+def test_continue_after_pause(mode):
+    rng = np.random.default_rng(mode)
+    if mode == MODE_T3:
+        first_run, _, _ = _t3_stream(rng)
+        second_run, _, _ = _t3_stream(rng)
+    else:
+        first_run, _, _ = _t2_stream(rng)
+        second_run, _, _ = _t2_stream(rng)
+
+    histogram = TTTRHistogram(mode, BIN_WIDTH, NUMBER_OF_BINS, number_of_gates=3)
+    histogram.add_records(first_run)
+    first_histogram = histogram.histogram.copy()
+    syncs = histogram.number_of_syncs
+
+    # the restarted device counts the time tags from zero again
+    histogram.start_new_run()
+    histogram.add_records(second_run)
+    second = TTTRHistogram(mode, BIN_WIDTH, NUMBER_OF_BINS, number_of_gates=3)
+    second.add_records(second_run)
+    assert histogram.binned_photons == first_histogram.sum() + second.binned_photons
+    assert np.all(histogram.histogram >= first_histogram)
+    assert histogram.number_of_syncs > syncs
+
+
+def test_drop_negative_delays():
+    histogram = TTTRHistogram(MODE_T2, BIN_WIDTH, NUMBER_OF_BINS)
+    binned = histogram._bin_photons(np.zeros(4, dtype=np.int64),
+                                    np.array([-5, 0, BIN_WIDTH * NUMBER_OF_BINS, 7]))
+    assert binned == 2
+    assert histogram.histogram[0] == 1 and histogram.histogram[1] == 1
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the pulse stream helpers in core/util/pulse_stream.py.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+from core.util.pulse_stream import encode_samples, get_bitmasks, load_pulse_stream, \
+    run_length_encode, save_pulse_stream, PULSE_STREAM_DTYPE
+
+
+def _decode(pulses):
+    return np.repeat(pulses['digi'], pulses['ticks'].astype('int64'))
+
+
+def _digital_samples(length, seed=0):
+    rng = np.random.default_rng(seed)
+    # runs of random length, so consecutive samples are mostly equal
+    samples = dict()
+    for chnl in ('d_ch1', 'd_ch2', 'd_ch5'):
+        states = rng.random(length // 50 + 1) < 0.5
+        samples[chnl] = np.repeat(states, 50)[:length]
+    return samples
+
+
+def test_encode_decode():
+    samples = _digital_samples(10000)
+    pulses = encode_samples(samples)
+    assert pulses.dtype == PULSE_STREAM_DTYPE
+    assert np.all(pulses['ticks'] > 0)
+    assert np.all(pulses['digi'][1:] != pulses['digi'][:-1])
+    assert np.array_equal(_decode(pulses), get_bitmasks(samples, 10000))
+
+
+def test_save_load_chunks(tmp_path):
+    samples = _digital_samples(10000, seed=1)
+    filepath = str(tmp_path / 'test.pstream')
+    for start in range(0, 10000, 3000):
+        chunk = {chnl: states[start:start + 3000] for chnl, states in samples.items()}
+        save_pulse_stream(filepath, encode_samples(chunk), append=start > 0)
+    pulses = load_pulse_stream(filepath)
+    assert np.array_equal(pulses, encode_samples(samples))
+
+
+def test_split_long_pulses():
+    max_ticks = np.iinfo(PULSE_STREAM_DTYPE['ticks']).max
+    pulses = run_length_encode([3, 2 * max_ticks + 5, 0, 7], [1, 2, 4, 2])
+    assert np.array_equal(pulses['digi'], [1, 2, 2, 2])
+    assert np.array_equal(pulses['ticks'], [3, max_ticks, max_ticks, 12])
+
+
+def test_compile_ensemble_without_samples():
+    import tracemalloc
+    from logic.pulsed.pulse_objects import PulseBlockElement
+    from logic.pulsed.sequence_generator_logic import SequenceGeneratorLogic
+
+    # 1 ms at 1 GS/s: 250 repetitions of laser (3 us), wait (0.5 us) and trigger (0.5 us)
+    sample_rate = 1e9
+    elements = [PulseBlockElement(init_length_s=3e-6, digital_high={'d_ch1': True}),
+                PulseBlockElement(init_length_s=0.5e-6),
+                PulseBlockElement(init_length_s=0.5e-6,
+                                  digital_high={'d_ch1': False, 'd_ch2': True})]
+    element_order = np.tile(np.arange(len(elements)), 250)
+    elements_length_bins = np.array(
+        [int(round(elements[ii].init_length_s * sample_rate)) for ii in element_order])
+    assert elements_length_bins.sum() == 1000000
+
+    tracemalloc.start()
+    pulses = SequenceGeneratorLogic._encode_pulse_stream(
+        elements, element_order, elements_length_bins, ['d_ch1', 'd_ch2'])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # a single per-sample bool array would already take 1 MB
+    assert peak < 100000
+    assert pulses.size == 750
+    assert pulses['ticks'].sum() == 1000000
+    assert np.array_equal(pulses['digi'][:3], [1, 0, 2])
+    assert np.array_equal(pulses['ticks'][:3], [3000, 500, 500])
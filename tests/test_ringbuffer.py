@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the sweep buffer in core/util/ringbuffer.py.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+from core.util.ringbuffer import SweepBuffer
+
+
+def _append(buffer, sweeps):
+    for sweep in sweeps:
+        buffer.append(sweep)
+    return sweeps
+
+
+def _sweeps(start, stop, sweep_shape):
+    return np.arange(start, stop, dtype=float)[:, np.newaxis] * np.ones(sweep_shape)
+
+
+def test_window_average():
+    buffer = SweepBuffer(capacity=8, sweep_shape=(3,), average_length=4)
+    sweeps = _append(buffer, _sweeps(0, 20, (3,)))
+    assert np.allclose(buffer.average(), sweeps[-4:].mean(axis=0))
+
+
+def test_total_average():
+    buffer = SweepBuffer(capacity=4, sweep_shape=(3,))
+    sweeps = _append(buffer, _sweeps(0, 10, (3,)))
+    assert np.allclose(buffer.average(), sweeps.mean(axis=0))
+
+
+def test_grow_window_after_wrap():
+    buffer = SweepBuffer(capacity=5, sweep_shape=(2,), average_length=3)
+    sweeps = _append(buffer, _sweeps(0, 12, (2,)))
+    # only the 5 newest sweeps are still in memory
+    buffer.set_average_length(8)
+    assert buffer.stored == 5
+    assert np.allclose(buffer.average(), sweeps[-5:].mean(axis=0))
+
+    # the window fills up with new sweeps and then moves on
+    sweeps = np.concatenate((sweeps, _append(buffer, _sweeps(12, 15, (2,)))))
+    assert np.allclose(buffer.average(), sweeps[-8:].mean(axis=0))
+    sweeps = np.concatenate((sweeps, _append(buffer, _sweeps(15, 30, (2,)))))
+    assert np.allclose(buffer.average(), sweeps[-8:].mean(axis=0))
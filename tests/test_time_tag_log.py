@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the time tag log in core/util/time_tag_log.py.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import pytest
+
+from core.util.time_tag_log import TimeTagLogWriter, load_time_tag_log, histogram_time_tags
+
+RESOLUTION = 1e-12
+
+
+def _write_log(filepath, number_of_gates=0, chunk_size=1000):
+    """
+    Writes 5000 random events of 200 sweeps (1 us each) in several appends.
+
+    @return tuple: (sweeps, times) of the events written
+    """
+    rng = np.random.default_rng(number_of_gates)
+    sweeps = np.sort(rng.integers(0, 200, 5000)).astype(np.uint64)
+    times = rng.integers(0, 1000000, sweeps.size).astype(np.uint64)
+    writer = TimeTagLogWriter(filepath, RESOLUTION, number_of_gates, chunk_size=chunk_size)
+    for start in range(0, sweeps.size, 1700):
+        writer.append(sweeps[start:start + 1700], times[start:start + 1700])
+        writer.flush()
+    writer.add_sweeps(210)
+    writer.close()
+    return sweeps, times
+
+
+def test_write_load(tmp_path):
+    filepath = str(tmp_path / 'time_tags.dat')
+    sweeps, times = _write_log(filepath, number_of_gates=4)
+    tags, info_dict = load_time_tag_log(filepath)
+    assert info_dict == {'resolution': RESOLUTION, 'number_of_gates': 4, 'number_of_sweeps': 210}
+    assert np.array_equal(tags['sweep'], sweeps)
+    assert np.array_equal(tags['time'], times)
+
+
+def test_reject_other_files(tmp_path):
+    filepath = str(tmp_path / 'other.dat')
+    np.arange(10, dtype=np.uint64).tofile(filepath)
+    with pytest.raises(ValueError):
+        load_time_tag_log(filepath)
+
+
+@pytest.mark.parametrize('number_of_gates', [0, 3])
+@pytest.mark.parametrize('bin_width', [1e-9, 2.5e-9, 0.7e-9])
+def test_histogram(tmp_path, number_of_gates, bin_width):
+    filepath = str(tmp_path / 'time_tags.dat')
+    sweeps, times = _write_log(filepath, number_of_gates=number_of_gates)
+    tags, info_dict = load_time_tag_log(filepath)
+    histogram = histogram_time_tags(tags, info_dict['resolution'], bin_width, 1e-6,
+                                    number_of_gates=info_dict['number_of_gates'],
+                                    chunk_size=999)
+
+    bin_width_res = int(round(bin_width / RESOLUTION))
+    number_of_bins = -(-1000000 // bin_width_res)
+    bins = (times // np.uint64(bin_width_res)).astype(np.int64)
+    gates = (sweeps % max(number_of_gates, 1)).astype(np.int64)
+    in_range = bins < number_of_bins
+    expected = np.zeros((max(number_of_gates, 1), number_of_bins), dtype=np.int64)
+    np.add.at(expected, (gates[in_range], bins[in_range]), 1)
+    if number_of_gates == 0:
+        expected = expected[0]
+    assert histogram.shape == expected.shape
+    assert np.array_equal(histogram, expected)
+
+
+def test_number_of_bins():
+    tags = np.empty(0, dtype=[('sweep', '<u8'), ('time', '<u8')])
+    assert histogram_time_tags(tags, RESOLUTION, 1e-9, 1e-6).size == 1000
+    assert histogram_time_tags(tags, RESOLUTION, 3e-9, 1e-6).size == 334
+    assert histogram_time_tags(tags, RESOLUTION, 1e-9, 1e-6, number_of_gates=2).shape == (2, 1000)
+
+
+def test_append(tmp_path):
+    filepath = str(tmp_path / 'time_tags.dat')
+    sweeps, times = _write_log(filepath, number_of_gates=2)
+    writer = TimeTagLogWriter(filepath, RESOLUTION, 2, append=True)
+    writer.append(np.array([215, 220], dtype=np.uint64), np.array([5, 6], dtype=np.uint64))
+    writer.close()
+    tags, info_dict = load_time_tag_log(filepath)
+    assert info_dict['number_of_sweeps'] == 221
+    assert np.array_equal(tags['sweep'], np.append(sweeps, [215, 220]))
+    assert np.array_equal(tags['time'], np.append(times, [5, 6]))
+
+    with pytest.raises(ValueError):
+        TimeTagLogWriter(filepath, RESOLUTION, 3, append=True)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the pulsed analysis methods in
+logic/pulsed/pulsed_analysis_methods/basic_analysis_methods.py.
+
+The vectorized analysis methods are compared to the former implementation looping over all laser
+pulses. Run it from the qudi main directory:
+
+python tools/benchmark_pulsed_analysis.py [number_of_lasers] [number_of_bins]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from logic.pulsed.pulsed_analysis_methods.basic_analysis_methods import BasicPulseAnalyzer
+
+
+class _LogicStandIn:
+    """ Provides the settings the analyzer reads from PulsedMeasurementLogic. """
+    def __init__(self, bin_width):
+        self.fast_counter_settings = {'bin_width': bin_width, 'is_gated': False}
+        self.measurement_settings = dict()
+        self.sampling_information = dict()
+        self.log = logging.getLogger(__name__)
+
+
+def loop_mean_norm(laser_data, signal_start_bin, signal_end_bin, norm_start_bin, norm_end_bin):
+    """ Former implementation of analyse_mean_norm looping over all laser pulses. """
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        tmp_data = laser_arr[norm_start_bin:norm_end_bin]
+        reference_sum = np.sum(tmp_data)
+        reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        tmp_data = laser_arr[signal_start_bin:signal_end_bin]
+        signal_sum = np.sum(tmp_data)
+        signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        if reference_mean > 0 and signal_mean >= 0:
+            signal_data[ii] = signal_mean / reference_mean
+        else:
+            signal_data[ii] = 0.0
+        if reference_sum > 0 and signal_sum > 0:
+            error_data[ii] = signal_data[ii] * np.sqrt(1 / signal_sum + 1 / reference_sum)
+        else:
+            error_data[ii] = 0.0
+    return signal_data, error_data
+
+
+def loop_sum(laser_data, signal_start_bin, signal_end_bin):
+    """ Former implementation of analyse_sum looping over all laser pulses. """
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        signal = laser_arr[signal_start_bin:signal_end_bin].sum()
+        signal_data[ii] = signal
+        error_data[ii] = np.sqrt(signal)
+    return signal_data, error_data
+
+
+def loop_mean(laser_data, signal_start_bin, signal_end_bin):
+    """ Former implementation of analyse_mean looping over all laser pulses. """
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        signal_data[ii] = laser_arr[signal_start_bin:signal_end_bin].mean()
+        signal_sum = laser_arr[signal_start_bin:signal_end_bin].sum()
+        error_data[ii] = np.sqrt(signal_sum) / (signal_end_bin - signal_start_bin)
+    return signal_data, error_data
+
+
+def main(number_of_lasers=500, number_of_bins=3000, repetitions=20):
+    bin_width = 1e-9
+    laser_data = np.random.poisson(
+        20 * np.exp(-np.arange(number_of_bins) / 500), (number_of_lasers, number_of_bins))
+    analyzer = BasicPulseAnalyzer(_LogicStandIn(bin_width))
+
+    windows = {'signal_start': 0.0, 'signal_end': 200e-9,
+               'norm_start': 1000e-9, 'norm_end': 2000e-9}
+    bins = {key: round(value / bin_width) for key, value in windows.items()}
+    signal_windows = {key: windows[key] for key in ('signal_start', 'signal_end')}
+    signal_bins = (bins['signal_start'], bins['signal_end'])
+
+    cases = [
+        ('analyse_mean_norm',
+         lambda: loop_mean_norm(laser_data, bins['signal_start'], bins['signal_end'],
+                                bins['norm_start'], bins['norm_end']),
+         lambda: analyzer.analyse_mean_norm(laser_data, **windows)),
+        ('analyse_sum',
+         lambda: loop_sum(laser_data, *signal_bins),
+         lambda: analyzer.analyse_sum(laser_data, **signal_windows)),
+        ('analyse_mean',
+         lambda: loop_mean(laser_data, *signal_bins),
+         lambda: analyzer.analyse_mean(laser_data, **signal_windows)),
+    ]
+
+    print('{0:d} lasers x {1:d} bins, best of {2:d} runs'.format(
+        number_of_lasers, number_of_bins, repetitions))
+    print('{0:<20s}{1:>12s}{2:>16s}{3:>16s}{4:>10s}'.format(
+        'method', 'loop (ms)', 'new data (ms)', 'new window (ms)', 'equal'))
+    for name, loop_func, vectorized_func in cases:
+        equal = all(np.allclose(a, b) for a, b in zip(loop_func(), vectorized_func()))
+        loop_time = min(timeit.repeat(loop_func, number=1, repeat=repetitions))
+
+        # new laser data every call, as during a running measurement
+        def new_data():
+            analyzer._cumsum_laser_data = None
+            return vectorized_func()
+        new_data_time = min(timeit.repeat(new_data, number=1, repeat=repetitions))
+        # same laser data analysed again, e.g. after changing the analysis windows
+        vectorized_func()
+        window_time = min(timeit.repeat(vectorized_func, number=1, repeat=repetitions))
+
+        print('{0:<20s}{1:>12.3f}{2:>16.3f}{3:>16.3f}{4:>10s}'.format(
+            name, loop_time * 1e3, new_data_time * 1e3, window_time * 1e3, str(equal)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
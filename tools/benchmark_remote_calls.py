@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the method calls of remote modules (see core/remote.py) against a module server
+running on this computer.
+
+Compares the call latency of the remote module reference, the remote module proxy, asynchronous
+(pipelined) calls and batched calls, and the transfer of a fast counter data trace. get_status
+simulates a device query taking 1 ms. Run it from the qudi main directory:
+
+python tools/benchmark_remote_calls.py [number_of_calls] [number_of_bins]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import timeit
+import numpy as np
+import rpyc.utils.classic
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from core.remote import RemoteObjectManager, RemoteCallBatch, RPyCServer, call_async
+
+
+class _ManagerStandIn:
+    """ Provides what RemoteObjectManager reads from the qudi manager. """
+    def __init__(self):
+        self.tm = None
+        self.tree = {'defined': {'hardware': dict(), 'logic': dict(), 'gui': dict()}}
+
+
+class _BenchmarkModule:
+    """ Shared module with a cheap method, a device query and a fast counter like data trace. """
+    def __init__(self, number_of_bins):
+        self._trace = np.zeros(number_of_bins, dtype='int64')
+
+    def get_pos(self, param_list=None):
+        return {'x': 1e-3, 'y': 2e-3, 'z': 3e-3}
+
+    def get_status(self, param_list=None):
+        # waiting for the reply of the device releases the GIL
+        time.sleep(1e-3)
+        return 0
+
+    def get_data_trace(self):
+        # accumulate a few counts like a running measurement
+        self._trace[np.random.randint(0, self._trace.size, 1000)] += 1
+        return self._trace, {'elapsed_sweeps': None, 'elapsed_time': None}
+
+
+def _get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def main(number_of_calls=100, number_of_bins=1000000, repetitions=5):
+    manager = RemoteObjectManager(_ManagerStandIn())
+    manager.shareModule('benchmark', _BenchmarkModule(number_of_bins))
+    port = _get_free_port()
+    server = RPyCServer(manager.makeRemoteService(), 'localhost', port)
+    threading.Thread(target=server.run, daemon=True).start()
+    for attempt in range(50):
+        try:
+            module = manager.getRemoteModule('localhost', port, 'benchmark')
+            break
+        except OSError:
+            time.sleep(0.1)
+    else:
+        raise RuntimeError('Module server did not start.')
+    reference = module._module
+
+    def batched(attr):
+        with RemoteCallBatch() as batch:
+            futures = [batch.call(module, attr) for ii in range(number_of_calls)]
+        return [future.result() for future in futures]
+
+    def pipelined(attr):
+        futures = [call_async(module, attr) for ii in range(number_of_calls)]
+        return [future.result() for future in futures]
+
+    cases = list()
+    for attr in ('get_pos', 'get_status'):
+        cases += [
+            ('reference ({0})'.format(attr),
+             lambda attr=attr: [getattr(reference, attr)() for ii in range(number_of_calls)]),
+            ('proxy ({0})'.format(attr),
+             lambda attr=attr: [getattr(module, attr)() for ii in range(number_of_calls)]),
+            ('pipelined ({0})'.format(attr), lambda attr=attr: pipelined(attr)),
+            ('batched ({0})'.format(attr), lambda attr=attr: batched(attr)),
+        ]
+
+    print('{0:d} calls per run, best of {1:d} runs'.format(number_of_calls, repetitions))
+    print('{0:<24s}{1:>16s}'.format('method', 'per call (ms)'))
+    for name, func in cases:
+        func()
+        duration = min(timeit.repeat(func, number=1, repeat=repetitions))
+        print('{0:<24s}{1:>16.3f}'.format(name, duration / number_of_calls * 1e3))
+
+    trace_cases = [
+        ('obtain (data trace)',
+         lambda: rpyc.utils.classic.obtain(reference.get_data_trace()[0])),
+        ('proxy (data trace)', lambda: module.get_data_trace()[0]),
+    ]
+    print('\n{0:d} int64 bins per data trace, best of {1:d} runs'.format(number_of_bins,
+                                                                      repetitions))
+    print('{0:<24s}{1:>16s}'.format('method', 'per call (ms)'))
+    for name, func in trace_cases:
+        func()
+        duration = min(timeit.repeat(func, number=1, repeat=repetitions))
+        print('{0:<24s}{1:>16.3f}'.format(name, duration * 1e3))
+
+    manager.closeConnections()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -25,6 +25,8 @@ import os
 import numpy as np
 from collections import OrderedDict
 from lxml import etree as ET
+from core.util.pulse_stream import encode_samples, save_pulse_stream
+from core.util.waveform_files import MappedWaveformFile, WFM_SAMPLE_DTYPE, pack_markers
 
 
 class SamplesWriteMethods:
@@ -42,6 +44,9 @@ class SamplesWriteMethods:
         self._write_to_file['seqx'] = self._write_seqx
         self._write_to_file['fpga'] = self._write_fpga
         self._write_to_file['pstream'] = self._write_pstream
+        # Memory mapped waveform files being written chunk by chunk and the number of samples
+        # written to them so far (file path as key)
+        self._waveform_files = dict()
         return
 
     def _write_wfmx(self, name, analog_samples, digital_samples, total_number_of_samples,
@@ -72,120 +77,55 @@ class SamplesWriteMethods:
         # record the name of the created files
         created_files = []
 
-        # The overhead of the write process in bytes.
-        # Making this value bigger will result in a faster write process
-        # but consumes more memory
-        write_overhead_bytes = 1024*1024*256 # 256 MB
-        # The overhead of the write process in number of samples
-        write_overhead_samples = write_overhead_bytes//4
-
-        # if it is the first chunk, create the .WFMX file with header.
+        # if it is the first chunk, create the .WFMX file of each analog channel with its final
+        # size. It consists of the header, the analog samples (4 bytes each, np.float32) and the
+        # marker bytes (1 byte each, np.uint8).
         if is_first_chunk:
             # create header
             self._create_xml_file(total_number_of_samples, self.temp_dir)
             # read back the header xml-file and delete it afterwards
             temp_file = os.path.join(self.temp_dir, 'header.xml')
-            with open(temp_file, 'r') as header:
-                header_lines = header.readlines()
+            with open(temp_file, 'rb') as header:
+                header_bytes = header.read()
             os.remove(temp_file)
 
-            # create wfmx-file for each analog channel
             for channel in analog_samples:
                 filename = name + channel[1:] + '.wfmx'
                 created_files.append(filename)
-
                 filepath = os.path.join(self.waveform_dir, filename)
+                self._waveform_files[filepath] = [
+                    MappedWaveformFile(filepath, header_bytes, total_number_of_samples * 5), 0]
 
-                with open(filepath, 'wb') as wfmxfile:
-                    # write header
-                    for line in header_lines:
-                        wfmxfile.write(bytes(line, 'UTF-8'))
-
-        # append analog samples to the .WFMX files of each channel. Write
-        # digital samples in temporary files.
+        # Write the analog samples and the marker bytes of the chunk directly into their regions
+        # of the memory mapped .WFMX files.
         for channel in analog_samples:
             # get analog channel number as integer from string
             a_chnl_number = int(channel.strip('a_ch'))
             # get marker string descriptors for this analog channel
             markers = ['d_ch'+str((a_chnl_number*2)-1), 'd_ch'+str(a_chnl_number*2)]
-            # append analog samples chunk to .WFMX file
             filepath = os.path.join(self.waveform_dir, name + channel[1:] + '.wfmx')
-            with open(filepath, 'ab') as wfmxfile:
-                # append analog samples in binary format. One sample is 4
-                # bytes (np.float32). Write in chunks if array is very big to
-                # avoid large temporary copys in memory
-                number_of_full_chunks = int(analog_samples[channel].size//write_overhead_samples)
-                for start_ind in np.arange(0, number_of_full_chunks * write_overhead_samples,
-                                           write_overhead_samples):
-                    stop_ind = start_ind+write_overhead_samples
-                    wfmxfile.write(analog_samples[channel][start_ind:stop_ind])
-                # write rest
-                rest_start_ind = number_of_full_chunks*write_overhead_samples
-                wfmxfile.write(analog_samples[channel][rest_start_ind:])
-
-            # create the byte values corresponding to the marker states
+            wfmx_file, start_ind = self._waveform_files[filepath]
+            chunk_length = analog_samples[channel].size
+
+            mapped_samples = wfmx_file.map(4 * start_ind, 'float32', chunk_length)
+            mapped_samples[:] = analog_samples[channel]
+            mapped_samples.flush()
+            del mapped_samples
+
+            # the byte values corresponding to the marker states
             # (\x01 for marker 1, \x02 for marker 2, \x03 for both)
-            # and write them into a temporary file
-            filepath = os.path.join(self.temp_dir, name + channel[1:] + '_digi' + '.tmp')
-            with open(filepath, 'ab') as tmpfile:
-                if markers[0] not in digital_samples and markers[1] not in digital_samples:
-                    # no digital channels to write for this analog channel
-                    pass
-                elif markers[0] in digital_samples and markers[1] not in digital_samples:
-                    # Only marker one is active for this channel
-                    for start_ind in np.arange(0, number_of_full_chunks * write_overhead_bytes,
-                                               write_overhead_bytes):
-                        stop_ind = start_ind + write_overhead_bytes
-                        # append digital samples in binary format. One sample is 1 byte (np.uint8).
-                        tmpfile.write(digital_samples[markers[0]][start_ind:stop_ind])
-                    # write rest of digital samples
-                    rest_start_ind = number_of_full_chunks * write_overhead_bytes
-                    tmpfile.write(digital_samples[markers[0]][rest_start_ind:])
-                elif markers[0] not in digital_samples and markers[1] in digital_samples:
-                    # Only marker two is active for this channel
-                    for start_ind in np.arange(0, number_of_full_chunks * write_overhead_bytes,
-                                               write_overhead_bytes):
-                        stop_ind = start_ind + write_overhead_bytes
-                        # append digital samples in binary format. One sample is 1 byte (np.uint8).
-                        tmpfile.write(np.left_shift(
-                            digital_samples[markers[1]][start_ind:stop_ind].astype('uint8'),
-                            1))
-                    # write rest of digital samples
-                    rest_start_ind = number_of_full_chunks * write_overhead_bytes
-                    tmpfile.write(np.left_shift(
-                        digital_samples[markers[1]][rest_start_ind:].astype('uint8'), 1))
-                else:
-                    # Both markers are active for this channel
-                    for start_ind in np.arange(0, number_of_full_chunks * write_overhead_bytes,
-                                               write_overhead_bytes):
-                        stop_ind = start_ind + write_overhead_bytes
-                        # append digital samples in binary format. One sample is 1 byte (np.uint8).
-                        tmpfile.write(np.add(np.left_shift(
-                            digital_samples[markers[1]][start_ind:stop_ind].astype('uint8'), 1),
-                            digital_samples[markers[0]][start_ind:stop_ind]))
-                    # write rest of digital samples
-                    rest_start_ind = number_of_full_chunks * write_overhead_bytes
-                    tmpfile.write(np.add(np.left_shift(
-                        digital_samples[markers[1]][rest_start_ind:].astype('uint8'), 1),
-                        digital_samples[markers[0]][rest_start_ind:]))
-
-        # append the digital sample tmp file to the .WFMX file and delete the
-        # .tmp files if it was the last chunk to write.
-        if is_last_chunk:
-            for channel in analog_samples:
-                tmp_filepath = os.path.join(self.temp_dir, name + channel[1:] + '_digi' + '.tmp')
-                wfmx_filepath = os.path.join(self.waveform_dir, name + channel[1:] + '.wfmx')
-                with open(wfmx_filepath, 'ab') as wfmxfile:
-                    with open(tmp_filepath, 'rb') as tmpfile:
-                        # read and write files in max. write_overhead_bytes chunks to reduce
-                        # memory usage
-                        while True:
-                            tmp_data = tmpfile.read(write_overhead_bytes)
-                            if not tmp_data:
-                                break
-                            wfmxfile.write(tmp_data)
-                # delete tmp file
-                os.remove(tmp_filepath)
+            mapped_markers = wfmx_file.map(4 * total_number_of_samples + start_ind, 'uint8',
+                                           chunk_length)
+            pack_markers(mapped_markers,
+                         digital_samples.get(markers[0]),
+                         digital_samples.get(markers[1]))
+            mapped_markers.flush()
+            del mapped_markers
+
+            if is_last_chunk:
+                del self._waveform_files[filepath]
+            else:
+                self._waveform_files[filepath][1] += chunk_length
         return created_files
 
     def _write_wfm(self, name, analog_samples, digital_samples, total_number_of_samples,
@@ -239,46 +179,33 @@ class SamplesWriteMethods:
             filepath = os.path.join(self.waveform_dir, filename)
 
             if is_first_chunk:
-                with open(filepath, 'wb') as wfm_file:
-                    # write the first line, which is the header file, if first chunk is passed:
-                    num_bytes = str(int(total_number_of_samples * 5))
-                    num_digits = str(len(num_bytes))
-                    header = str.encode('MAGIC 1000\r\n#' + num_digits + num_bytes)
-                    wfm_file.write(header)
-
-            # now write the samples chunk in binary representation:
-            # First we create a structured numpy array representing one byte (numpy uint8)
-            # for the markers and 4 byte (numpy float32) for the analog samples.
-            write_array = np.empty(analog_samples[channel].size, dtype='float32, uint8')
-
-            # now we determine which markers are active for this channel and write them to
-            # write_array.
-            if markers[0] in digital_samples and markers[1] in digital_samples:
-                # both markers active for this channel
-                write_array['f1'] = np.add(
-                    np.left_shift(digital_samples[markers[1]][:].astype('uint8'), 1),
-                    digital_samples[markers[0]][:].astype('uint8'))
-            elif markers[0] in digital_samples and markers[1] not in digital_samples:
-                # only marker 1 active for this channel
-                write_array['f1'] = digital_samples[markers[0]][:].astype('uint8')
-            elif markers[0] not in digital_samples and markers[1] in digital_samples:
-                # only marker 2 active for this channel
-                write_array['f1'] = np.left_shift(digital_samples[markers[1]][:].astype('uint8'), 1)
+                # create the file with its final size. The header is followed by
+                # total_number_of_samples records of the samples and the footer, which encodes
+                # the sample rate used for that file.
+                num_bytes = str(int(total_number_of_samples * 5))
+                num_digits = str(len(num_bytes))
+                header = str.encode('MAGIC 1000\r\n#' + num_digits + num_bytes)
+                footer = str.encode('CLOCK {0:16.10E}\r\n'.format(self.sample_rate))
+                self._waveform_files[filepath] = [
+                    MappedWaveformFile(filepath, header, total_number_of_samples * 5, footer), 0]
+
+            # now write the samples chunk in binary representation directly into the file:
+            # Each record consists of 4 byte (numpy float32) for the analog sample followed by one
+            # byte (numpy uint8) for the markers.
+            wfm_file, start_ind = self._waveform_files[filepath]
+            chunk_length = analog_samples[channel].size
+            write_array = wfm_file.map(5 * start_ind, WFM_SAMPLE_DTYPE, chunk_length)
+            write_array['f0'] = analog_samples[channel]
+            pack_markers(write_array['f1'],
+                         digital_samples.get(markers[0]),
+                         digital_samples.get(markers[1]))
+            write_array.flush()
+            del write_array
+
+            if is_last_chunk:
+                del self._waveform_files[filepath]
             else:
-                # no markers active for this channel
-                write_array['f1'] = np.zeros(analog_samples[channel].size, dtype='uint8')
-            # Write analog samples into the write_array
-            write_array['f0'] = analog_samples[channel][:]
-
-            # Write write_array to file
-            with open(filepath, 'ab') as wfm_file:
-                wfm_file.write(write_array)
-
-                # append footer if it's the last chunk to write
-                if is_last_chunk:
-                    # the footer encodes the sample rate, which was used for that file:
-                    footer = str.encode('CLOCK {0:16.10E}\r\n'.format(self.sample_rate))
-                    wfm_file.write(footer)
+                self._waveform_files[filepath][1] += chunk_length
         return created_files
 
     def _write_fpga(self, name, analog_samples, digital_samples, total_number_of_samples,
@@ -349,7 +276,7 @@ class SamplesWriteMethods:
     def _write_pstream(self, name, analog_samples, digital_samples, total_number_of_samples,
                        is_first_chunk, is_last_chunk):
         """
-        Appends a sampled chunk of a whole waveform to a fpga-file. Create the file
+        Appends a sampled chunk of a whole waveform to a pstream-file. Create the file
         if it is the first chunk.
         If both flags (is_first_chunk, is_last_chunk) are set to TRUE it means
         that the whole ensemble is written as a whole in one big chunk.
@@ -379,13 +306,12 @@ class SamplesWriteMethods:
         will be compressed to three Pulse elements with duration 2, 2, 1 and with the correct
         respective bitmasks for the active channels. 
         
-        This function traverses the digital_samples array to identify where the active digital
-        channels are modified and compresses it down to a sequence of pulse elements each with 
-        a bitmask and a length. The file is then written to disk. 
-        
-        TODO: This is inefficient, as the original PulseElement representation inside Qudi is
-        first decompressed into a sample stream, then recompressed into the PulseStreamer 
-        representation. Work is required to enable the bypass of the interim stage. 
+        The chunk is compressed by locating the changes of the combined bitmask of all digital
+        channels and appended to the binary pulse stream file (see core.util.pulse_stream). A pulse
+        continuing over the chunk border is merged.
+
+        SequenceGeneratorLogic does not sample PulseBlockEnsembles for pulsers with the 'pstream'
+        waveform format, but compiles them directly (see compile_pulse_stream).
 
         @param name: string, represents the name of the sampled ensemble
         @param analog_samples: dict containing float32 numpy ndarrays, contains the
@@ -404,38 +330,18 @@ class SamplesWriteMethods:
         @return list: the list contains the string names of the created files for the passed
                       presampled arrays
         """
-        # FIXME: This method needs to be adapted to "digital_samples" now being a dictionary
-        import dill
-
         # record the name of the created files
         created_files = []
 
-        channel_number = len(digital_samples)
-
-        if channel_number != 8:
-            self.log.error('Pulse streamer needs 8 digital channels. {0} is not allowed!'
-                           ''.format(channel_number))
-            return -1
-
-        # fetch locations where digital channel states change, and eliminate duplicates
-        new_channel_indices = np.where(digital_samples[:-1,:] != digital_samples[1:,:])[0]
-        new_channel_indices = np.unique(new_channel_indices)
-
-        # add in indices for the start and end of the sequence to simplify iteration
-        new_channel_indices = np.insert(new_channel_indices, 0, [-1])
-        new_channel_indices = np.insert(new_channel_indices, new_channel_indices.size, [digital_samples.shape[0]-1])
+        # compress the chunk to (ticks, bitmask) pulses
+        pulses = encode_samples(digital_samples)
 
-        pulses = []
-        for new_channel_index in range(1, new_channel_indices.size):
-            pulse = [new_channel_indices[new_channel_index] - new_channel_indices[new_channel_index - 1], _convert_to_bitmask(digital_samples[new_channel_indices[new_channel_index - 1] + 1,:])]
-            pulses.append(pulse)
-
-        # append samples to file
+        # append pulses to file
         filename = name + '.pstream'
         created_files.append(filename)
 
         filepath = os.path.join(self.waveform_dir, filename)
-        dill.dump(pulses, open(filepath, 'wb'))
+        save_pulse_stream(filepath, pulses, append=not is_first_chunk)
 
         return created_files
 
@@ -595,40 +501,3 @@ class SamplesWriteMethods:
         f = open(filepath, "wb")
         f.write(text[39:-1])
         f.close()
-
-def _convert_to_bitmask(active_channels):
-    """ Convert a list of channels into a bitmask.
-    @param numpy.array active_channels: the list of active channels like
-                        e.g. [0,4,7]. Note that the channels start from 0.
-    @return int: The channel-list is converted into a bitmask (an sequence
-                 of 1 and 0). The returned integer corresponds to such a
-                 bitmask.
-    Note that you can get a binary representation of an integer in python
-    if you use the command bin(<integer-value>). All higher unneeded digits
-    will be dropped, i.e. 0b00100 is turned into 0b100. Examples are
-        bin(0) =    0b0
-        bin(1) =    0b1
-        bin(8) = 0b1000
-    Each bit value (read from right to left) corresponds to the fact that a
-    channel is on or off. I.e. if you have
-        0b001011
-    then it would mean that only channel 0, 1 and 3 are switched to on, the
-    others are off.
-    Helper method for write_pulse_form.
-    """
-    bits = 0  # that corresponds to: 0b0
-    active_channels = np.where(active_channels == True)
-    for channel in active_channels[0]:
-        # go through each list element and create the digital word out of
-        # 0 and 1 that represents the channel configuration. In order to do
-        # that a bitwise shift to the left (<< operator) is performed and
-        # the current channel configuration is compared with a bitwise OR
-        # to check whether the bit was already set. E.g.:
-        #   0b1001 | 0b0110: compare elementwise:
-        #           1 | 0 => 1
-        #           0 | 1 => 1
-        #           0 | 1 => 1
-        #           1 | 1 => 1
-        #                   => 0b1111
-        bits = bits | (1 << channel)
-    return bits